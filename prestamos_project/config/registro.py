@@ -0,0 +1,99 @@
+"""
+Registro (logging) estructurado y asíncrono.
+
+Las vistas solo ponen el registro en una cola en memoria (`QueueHandler`); un
+hilo aparte (`QueueListener`) lo escribe en la salida. Así una petición nunca
+espera por la E/S del log y las líneas de distintos hilos no se mezclan.
+Cada registro sale como una línea JSON con el id de la petición en curso.
+
+Los procesos hijos creados con fork (los pools de `run_worker`,
+`update_penalties`, `cierre_mensual`, `seed_portfolio`) heredan el manejador
+pero no su hilo: deben llamar a `preparar_proceso_hijo` como `initializer`.
+"""
+import atexit
+import contextvars
+import json
+import logging
+import queue
+import sys
+from logging.handlers import QueueHandler, QueueListener
+
+# Id de la petición que se está atendiendo (lo fija RequestLogMiddleware).
+request_id_actual = contextvars.ContextVar('request_id', default=None)
+
+# Atributos propios de LogRecord; el resto vienen de `extra=` y se incluyen en el JSON.
+_ATRIBUTOS_ESTANDAR = frozenset(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+
+class FiltroContexto(logging.Filter):
+    """Añade el id de la petición actual. Corre en el hilo de la petición, antes de encolar."""
+    def filter(self, record):
+        if not hasattr(record, 'request_id'):
+            record.request_id = request_id_actual.get()
+        return True
+
+
+class FormatoJSON(logging.Formatter):
+    """Da formato de una línea JSON al registro, incluyendo los campos de `extra=`."""
+    def format(self, record):
+        datos = {
+            'fecha': self.formatTime(record, '%Y-%m-%dT%H:%M:%S'),
+            'nivel': record.levelname,
+            'logger': record.name,
+            'mensaje': record.getMessage(),
+        }
+        for clave, valor in vars(record).items():
+            if clave not in _ATRIBUTOS_ESTANDAR and not clave.startswith('_'):
+                datos[clave] = valor
+        if record.exc_info:
+            datos['excepcion'] = self.formatException(record.exc_info)
+        return json.dumps(datos, ensure_ascii=False, default=str)
+
+
+class ManejadorCola(QueueHandler):
+    """
+    Encola los registros ya formateados y los escribe desde un hilo en segundo plano.
+
+    Cada proceso (p. ej. cada worker de gunicorn) crea su propio hilo al
+    configurar el logging; el hilo se detiene al salir vaciando la cola.
+    """
+    def __init__(self, salida='stderr'):
+        super().__init__(queue.SimpleQueue())
+        self.listener = QueueListener(self.queue, logging.StreamHandler(getattr(sys, salida)))
+        self.listener.start()
+        atexit.register(self.detener)
+
+    def detener(self):
+        if self.listener._thread is not None:
+            self.listener.stop()
+
+    def close(self):
+        self.detener()
+        super().close()
+
+
+def preparar_proceso_hijo():
+    """
+    `initializer` de los pools con fork: cambia cada `ManejadorCola` por un
+    `StreamHandler` directo a la misma salida. El hilo del padre no existe en
+    el hijo (lo encolado nunca se escribiría) y el pool termina a sus procesos
+    sin pasar por `atexit`, así que en el hijo se escribe sin cola.
+    """
+    loggers = [logging.getLogger()] + [
+        logger for logger in logging.Logger.manager.loggerDict.values() if isinstance(logger, logging.Logger)
+    ]
+    reemplazos = {}
+    for logger in loggers:
+        for manejador in list(logger.handlers):
+            if not isinstance(manejador, ManejadorCola):
+                continue
+            if manejador not in reemplazos:
+                directo = logging.StreamHandler(manejador.listener.handlers[0].stream)
+                directo.setLevel(manejador.level)
+                directo.setFormatter(manejador.formatter)
+                for filtro in manejador.filters:
+                    directo.addFilter(filtro)
+                reemplazos[manejador] = directo
+            logger.removeHandler(manejador)
+            logger.addHandler(reemplazos[manejador])
+
@@ -56,6 +56,10 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
+    'dashboard.middleware.RequestLogMiddleware',
+    'dashboard.middleware.MetricasMiddleware',
+    'dashboard.middleware.QueryCountMiddleware',
+    'dashboard.middleware.SQLProfilerMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -146,6 +150,48 @@ LOGIN_URL = 'login'
 LOGIN_REDIRECT_URL = 'panel_informativo'
 LOGOUT_REDIRECT_URL = 'login'
 
+# ==================================================
+# === CONFIGURACIÓN DE REGISTRO (LOGGING) ===
+# ==================================================
+# Registros en JSON, escritos desde un hilo en segundo plano (ver config/registro.py).
+LOG_LEVEL = env('LOG_LEVEL', default='INFO')
+
+# Perfil de SQL por vista (ver dashboard/perfil_sql.py). Desactivado no tiene costo.
+SQL_PROFILER = env.bool('SQL_PROFILER', default=False)
+# Las consultas que tarden más de este umbral (en milisegundos) se registran como aviso.
+SQL_LENTA_MS = env.float('SQL_LENTA_MS', default=100)
+
+# Métricas de Prometheus en /metrics (ver gestion_prestamos/metricas.py).
+# Con varios procesos (gunicorn, workers), METRICAS_DIR es la carpeta compartida donde
+# cada proceso vuelca sus valores. METRICAS_TOKEN, si se define, se exige como Bearer;
+# sin token, /metrics solo responde al staff con sesión iniciada.
+METRICAS_DIR = env('METRICAS_DIR', default=None)
+METRICAS_TOKEN = env('METRICAS_TOKEN', default=None)
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'json': {'()': 'config.registro.FormatoJSON'},
+    },
+    'filters': {
+        'contexto': {'()': 'config.registro.FiltroContexto'},
+    },
+    'handlers': {
+        'cola': {
+            'class': 'config.registro.ManejadorCola',
+            'formatter': 'json',
+            'filters': ['contexto'],
+        },
+    },
+    'root': {'handlers': ['cola'], 'level': 'WARNING'},
+    'loggers': {
+        'dashboard': {'handlers': ['cola'], 'level': LOG_LEVEL, 'propagate': False},
+        'gestion_prestamos': {'handlers': ['cola'], 'level': LOG_LEVEL, 'propagate': False},
+        'django.request': {'handlers': ['cola'], 'level': 'WARNING', 'propagate': False},
+    },
+}
+
 # ==================================================
 # === CONFIGURACIÓN DE CORREO ELECTRÓNICO (GMAIL) ===
 # ==================================================
@@ -1,6 +1,20 @@
+import logging
+import time
+import uuid
+
+from config.registro import request_id_actual
+from gestion_prestamos import metricas
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
 from django.shortcuts import redirect
 from django.urls import reverse
 
+from .perfil_sql import huella, perfil
+
+logger = logging.getLogger(__name__)
+
+
 class ForcePasswordChangeMiddleware:
     def __init__(self, get_response):
         self.get_response = get_response
@@ -26,3 +40,182 @@ class ForcePasswordChangeMiddleware:
                     pass
 
         return response
+
+
+class RequestLogMiddleware:
+    """
+    Asigna un id a cada petición (o respeta el de la cabecera `X-Request-ID`) y
+    registra al final una línea con la vista, el estado, la duración y las
+    consultas SQL. Debe ir antes de QueryCountMiddleware para leer su contador.
+    Si la petición termina en una excepción se registra con estado 500 y el
+    traceback antes de propagarla.
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.request_id = request.headers.get('X-Request-ID') or uuid.uuid4().hex
+        token = request_id_actual.set(request.request_id)
+        inicio = time.perf_counter()
+        try:
+            try:
+                response = self.get_response(request)
+            except Exception:
+                self.registrar(logger.exception, request, 500, inicio)
+                raise
+            response['X-Request-ID'] = request.request_id
+            self.registrar(logger.info, request, response.status_code, inicio)
+            return response
+        finally:
+            request_id_actual.reset(token)
+
+    @staticmethod
+    def registrar(nivel, request, estado, inicio):
+        consultas = getattr(request, 'consultas_db', None)
+        match = getattr(request, 'resolver_match', None)
+        nivel(
+            '%s %s %s', request.method, request.path, estado,
+            extra={
+                'request_id': request.request_id,
+                'vista': match.view_name if match else None,
+                'estado': estado,
+                'duracion_ms': round((time.perf_counter() - inicio) * 1000, 1),
+                'consultas': consultas.cantidad if consultas else None,
+            },
+        )
+
+
+class MetricasMiddleware:
+    """
+    Registra en `gestion_prestamos.metricas` la duración, el estado y las
+    consultas SQL de cada petición, por nombre de vista. Debe ir antes de
+    QueryCountMiddleware para leer su contador.
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        inicio = time.perf_counter()
+        response = self.get_response(request)
+        duracion = time.perf_counter() - inicio
+
+        match = getattr(request, 'resolver_match', None)
+        vista = match.view_name if match else 'sin_ruta'
+        metricas.peticiones.inc(vista=vista, metodo=request.method, estado=response.status_code)
+        metricas.duracion_peticiones.observar(duracion, vista=vista)
+        consultas = getattr(request, 'consultas_db', None)
+        if consultas is not None:
+            metricas.consultas_peticion.observar(consultas.cantidad, vista=vista)
+            metricas.consultas_total.inc(consultas.cantidad, vista=vista)
+        return response
+
+
+class ContadorConsultas:
+    """
+    Envoltorio de ejecución (`connection.execute_wrapper`) que cuenta las
+    consultas SQL y acumula su duración.
+    """
+    def __init__(self):
+        self.cantidad = 0
+        self.duracion = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duracion += time.perf_counter() - inicio
+            self.cantidad += 1
+
+
+class QueryCountMiddleware:
+    """
+    Cuenta las consultas y el tiempo de base de datos de cada petición.
+
+    El resultado queda en `request.consultas_db` y, en modo DEBUG o para
+    usuarios staff, se expone en la cabecera `Server-Timing` (visible en las
+    herramientas de desarrollo del navegador).
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        contador = ContadorConsultas()
+        inicio = time.perf_counter()
+        with _envolver_conexiones(contador):
+            response = self.get_response(request)
+        duracion_total = time.perf_counter() - inicio
+
+        request.consultas_db = contador
+        user = getattr(request, 'user', None)
+        if settings.DEBUG or (user is not None and user.is_authenticated and user.is_staff):
+            response['Server-Timing'] = (
+                f'db;dur={contador.duracion * 1000:.1f};desc="{contador.cantidad} consultas", '
+                f'total;dur={duracion_total * 1000:.1f}'
+            )
+        return response
+
+
+class RegistroConsultas:
+    """Envoltorio de ejecución que guarda el SQL y la duración de cada consulta."""
+    def __init__(self):
+        self.consultas = []
+
+    def __call__(self, execute, sql, params, many, context):
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.consultas.append((sql, time.perf_counter() - inicio))
+
+
+class SQLProfilerMiddleware:
+    """
+    Perfil de SQL por vista (opcional, se activa con SQL_PROFILER=True).
+
+    Agrupa las consultas de cada petición por huella en `perfil_sql.perfil` y
+    registra un aviso por cada consulta más lenta que SQL_LENTA_MS. Desactivado,
+    Django lo quita de la cadena de middlewares y no tiene ningún costo.
+    """
+    def __init__(self, get_response):
+        if not getattr(settings, 'SQL_PROFILER', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.umbral = getattr(settings, 'SQL_LENTA_MS', 100) / 1000
+
+    def __call__(self, request):
+        registro = RegistroConsultas()
+        with _envolver_conexiones(registro):
+            response = self.get_response(request)
+
+        match = getattr(request, 'resolver_match', None)
+        # Las rutas que no existen comparten una clave: si no, cada 404 agregaría una al perfil.
+        vista = match.view_name if match else 'sin_ruta'
+        consultas = [(huella(sql), duracion) for sql, duracion in registro.consultas]
+        perfil.registrar(vista, consultas)
+        for sql, duracion in consultas:
+            if duracion >= self.umbral:
+                logger.warning(
+                    'Consulta lenta',
+                    extra={'vista': vista, 'duracion_ms': round(duracion * 1000, 1), 'sql': sql},
+                )
+        return response
+
+
+class _envolver_conexiones:
+    """Instala el mismo envoltorio de ejecución en todas las conexiones configuradas."""
+    def __init__(self, contador):
+        self.contador = contador
+        self.contextos = []
+
+    def __enter__(self):
+        for alias in connections:
+            contexto = connections[alias].execute_wrapper(self.contador)
+            contexto.__enter__()
+            self.contextos.append(contexto)
+        return self.contador
+
+    def __exit__(self, *exc_info):
+        for contexto in reversed(self.contextos):
+            contexto.__exit__(*exc_info)
+        return False
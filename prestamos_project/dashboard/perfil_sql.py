@@ -0,0 +1,79 @@
+"""
+Perfil de consultas SQL por vista.
+
+Agrupa las consultas por "huella" (el SQL con los valores literales
+reemplazados) y guarda, para cada vista, las huellas más costosas en tiempo
+total. Lo alimenta SQLProfilerMiddleware y se consulta en `sql_profile_api`.
+"""
+import re
+import threading
+
+_RE_CADENA = re.compile(r"'(?:[^']|'')*'")
+_RE_NUMERO = re.compile(r'\b\d+(?:\.\d+)?\b')
+_RE_LISTA = re.compile(r'\(\s*(?:%s|\?)(?:\s*,\s*(?:%s|\?))*\s*\)')
+_RE_SAVEPOINT = re.compile(r'"s\d+_x\d+"')
+_RE_ESPACIOS = re.compile(r'\s+')
+
+
+def huella(sql):
+    """
+    Normaliza una consulta para agrupar las que solo difieren en sus valores:
+    `WHERE id IN (%s, %s, %s)` y `WHERE id IN (%s)` tienen la misma huella.
+    """
+    sql = _RE_SAVEPOINT.sub('"?"', sql)
+    sql = _RE_CADENA.sub('?', sql)
+    sql = _RE_NUMERO.sub('?', sql)
+    sql = _RE_LISTA.sub('(...)', sql)
+    return _RE_ESPACIOS.sub(' ', sql).strip()
+
+
+class PerfilSQL:
+    """
+    Acumulado en memoria, seguro entre hilos. Por vista conserva como máximo
+    `limite` huellas; al llenarse descarta la de menor tiempo total.
+    """
+    def __init__(self, limite=50):
+        self.limite = limite
+        self._lock = threading.Lock()
+        self._vistas = {}
+
+    def registrar(self, vista, consultas):
+        """`consultas` es una lista de (huella, duración en segundos) de una petición."""
+        with self._lock:
+            huellas = self._vistas.setdefault(vista, {})
+            for sql, duracion in consultas:
+                datos = huellas.get(sql)
+                if datos is None:
+                    if len(huellas) >= self.limite:
+                        menor = min(huellas, key=lambda clave: huellas[clave]['total'])
+                        del huellas[menor]
+                    datos = huellas[sql] = {'cantidad': 0, 'total': 0.0, 'maximo': 0.0}
+                datos['cantidad'] += 1
+                datos['total'] += duracion
+                datos['maximo'] = max(datos['maximo'], duracion)
+
+    def top(self, n=10, vista=None):
+        """Las `n` huellas con mayor tiempo total por vista, en milisegundos."""
+        with self._lock:
+            vistas = {vista: self._vistas.get(vista, {})} if vista else dict(self._vistas)
+            resultado = {}
+            for nombre, huellas in vistas.items():
+                ordenadas = sorted(huellas.items(), key=lambda item: item[1]['total'], reverse=True)[:n]
+                resultado[nombre] = [
+                    {
+                        'sql': sql,
+                        'cantidad': datos['cantidad'],
+                        'total_ms': round(datos['total'] * 1000, 2),
+                        'promedio_ms': round(datos['total'] * 1000 / datos['cantidad'], 3),
+                        'maximo_ms': round(datos['maximo'] * 1000, 2),
+                    }
+                    for sql, datos in ordenadas
+                ]
+            return resultado
+
+    def limpiar(self):
+        with self._lock:
+            self._vistas.clear()
+
+
+perfil = PerfilSQL()
@@ -1,3 +1,637 @@
-from django.test import TestCase
+import csv
+import datetime
+import io
+import json
+import logging
+import multiprocessing
+import os
+import tempfile
+import threading
+from pathlib import Path
+from decimal import Decimal
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern, URLResolver, reverse
+from django.utils import timezone
+
+from config.registro import FiltroContexto, FormatoJSON, ManejadorCola, preparar_proceso_hijo, request_id_actual
+from gestion_prestamos import calendario, metricas
+from gestion_prestamos.models import Capital, Cliente, Cuota, Job, Prestamo, TipoPrestamo
+from gestion_prestamos.utils import calcular_tabla_amortizacion
+
+from . import urls as dashboard_urls
+from .middleware import RequestLogMiddleware
+from .perfil_sql import huella, perfil
+
+# Máximo de consultas SQL por vista con los datos de `sembrar_cartera`.
+# Si una vista supera su presupuesto es casi siempre un N+1 nuevo: revise el
+# uso de select_related/prefetch_related antes de subir el número.
+PRESUPUESTO_CONSULTAS = {
+    'panel_informativo': 13,
+    'profile': 4,
+    'client_list': 6,
+    'client_add': 4,
+    'client_edit': 5,
+    'client_detail': 7,
+    'loan_add': 8,
+    # Total pagado cuota por cuota: crece con el plazo (12 cuotas). Las penalidades las
+    # suma el worker (la vista solo encola el cálculo). Tres más si el préstamo todavía
+    # no tiene la TAE guardada (ver `calcular_tae`).
+    'loan_detail': 28,
+    'loan_list': 6,
+    'loan_application_list': 5,
+    'loan_application_detail': 7,
+    'loan_application_approve': 5,
+    'loan_application_reject': 5,
+    'paid_loan_list': 5,
+    'payment_add': 6,
+    'loan_prepayment': 6,
+    'cobros_list': 5,
+    'aging_report': 5,
+    'aging_report_csv': 5,
+    'collections_forecast': 5,
+    'search_clients': 5,
+    'search_cuotas': 5,
+    'get_tipo_prestamo_details': 5,
+    'calculate_amortization_api': 4,
+    'loan_simulator_api': 4,
+    # Una más para los abonos a capital, que cambian el saldo de la liquidación.
+    'loan_payoff_api': 9,
+    'financial_details': 17,
+    'mora_analytics': 6,
+    'sql_profile_api': 4,
+    'metrics': 4,
+    # Portal de clientes
+    'client_login': 6,
+    'client_logout': 6,
+    'portal_dashboard': 21,  # suma el total pagado de cada cuota (12 cuotas)
+    'portal_loan_detail': 7,
+    'client_change_password': 4,
+    'portal_request_loan': 6,
+    'client_password_reset': 4,
+    'password_reset_done': 4,
+    'password_reset_confirm': 5,
+    'password_reset_complete': 4,
+}
+
+# Vistas del portal que se recorren con la sesión del cliente en lugar del staff.
+VISTAS_PORTAL = {'portal_dashboard', 'portal_loan_detail', 'client_change_password', 'portal_request_loan'}
+
+
+def nombres_de_urls(patrones):
+    """Nombres de todas las URLs de `dashboard/urls.py`, incluidas las anidadas."""
+    for patron in patrones:
+        if isinstance(patron, URLResolver):
+            yield from nombres_de_urls(patron.url_patterns)
+        elif isinstance(patron, URLPattern) and patron.name:
+            yield patron.name
+
+
+def crear_prestamo(cliente, tipo, monto, estado='aprobado', fecha=datetime.date(2025, 1, 15)):
+    prestamo = Prestamo.objects.create(
+        cliente=cliente, tipo_prestamo=tipo, monto=Decimal(monto), tasa_interes=Decimal('24.00'),
+        periodo_tasa='anual', plazo=12, frecuencia_pago='mensual', fecha_desembolso=fecha, estado=estado,
+    )
+    if estado != 'pendiente':
+        Cuota.objects.bulk_create(
+            Cuota(
+                prestamo=prestamo,
+                numero_cuota=fila['numero_cuota'],
+                fecha_vencimiento=fila['fecha_vencimiento'],
+                monto_cuota=fila['cuota_fija'],
+                capital=fila['capital'],
+                interes=fila['interes'],
+                saldo_pendiente=fila['saldo_pendiente'],
+            )
+            for fila in calcular_tabla_amortizacion(prestamo)
+        )
+    return prestamo
+
+
+def sembrar_cartera(tipo, cantidad, desde=0):
+    """Crea `cantidad` clientes, cada uno con un préstamo activo y pagos registrados."""
+    prestamos = []
+    for i in range(desde, desde + cantidad):
+        cliente = Cliente.objects.create(
+            nombres=f'Cliente{i}', apellidos='Prueba', numero_documento=f'{i:011d}', email=f'c{i}@ejemplo.com',
+        )
+        prestamo = crear_prestamo(cliente, tipo, 10000 + i * 100)
+        prestamo.registrar_pago(Decimal('1500.00'))
+        prestamos.append(prestamo)
+    return prestamos
+
+
+class PresupuestoConsultasTests(TestCase):
+    """Fija el máximo de consultas por vista para detectar regresiones N+1."""
+
+    @classmethod
+    def setUpTestData(cls):
+        Capital.objects.create(monto_inicial=Decimal('500000.00'))
+        cls.tipo = TipoPrestamo.objects.create(
+            nombre='Prueba Consultas', tasa_interes_predeterminada=Decimal('24.00'),
+            monto_maximo=Decimal('100000.00'), plazo_maximo_meses=24,
+        )
+        cls.staff = User.objects.create_user('staff', password='clave-staff', is_staff=True)
+        cls.prestamos = sembrar_cartera(cls.tipo, 5)
+        cls.prestamo = cls.prestamos[0]
+        cls.cliente = cls.prestamo.cliente
+        cls.cliente.debe_cambiar_contrasena = False
+        cls.cliente.save()
+        cls.cliente.user.set_password('clave-cliente')
+        cls.cliente.user.save()
+        cls.solicitud = crear_prestamo(cls.prestamos[1].cliente, cls.tipo, 5000, estado='pendiente')
+        crear_prestamo(cls.prestamos[2].cliente, cls.tipo, 3000, estado='pagado', fecha=datetime.date(2024, 1, 15))
+
+    def url_de(self, nombre):
+        argumentos = {
+            'client_edit': [self.cliente.pk],
+            'client_detail': [self.cliente.pk],
+            'loan_detail': [self.prestamo.pk],
+            'loan_application_detail': [self.solicitud.pk],
+            'loan_application_approve': [self.solicitud.pk],
+            'loan_application_reject': [self.solicitud.pk],
+            'payment_add': [self.prestamo.pk],
+            'loan_prepayment': [self.prestamo.pk],
+            'get_tipo_prestamo_details': [self.tipo.pk],
+            'loan_payoff_api': [self.prestamo.pk],
+            'portal_loan_detail': [self.prestamo.pk],
+            'password_reset_confirm': ['MQ', 'set-password'],
+        }
+        url = reverse(nombre, args=argumentos.get(nombre))
+        if nombre in ('search_clients', 'search_cuotas'):
+            url += '?term=Cliente'
+        return url
+
+    def contar_consultas(self, nombre):
+        if nombre in VISTAS_PORTAL:
+            self.client.login(username=self.cliente.numero_documento, password='clave-cliente')
+        else:
+            self.client.force_login(self.staff)
+        # Los feriados se cachean por proceso; se cuenta siempre la carga inicial.
+        calendario.invalidar_feriados()
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.client.get(self.url_de(nombre))
+        self.assertLess(response.status_code, 500, nombre)
+        return len(consultas)
+
+    def test_todas_las_urls_tienen_presupuesto(self):
+        self.assertEqual(set(nombres_de_urls(dashboard_urls.urlpatterns)), set(PRESUPUESTO_CONSULTAS))
+
+    def test_vistas_no_superan_su_presupuesto(self):
+        for nombre, presupuesto in PRESUPUESTO_CONSULTAS.items():
+            with self.subTest(vista=nombre):
+                self.assertLessEqual(self.contar_consultas(nombre), presupuesto)
+
+    def test_listados_no_crecen_con_la_cartera(self):
+        vistas = ['panel_informativo', 'cobros_list', 'aging_report', 'collections_forecast', 'search_cuotas', 'financial_details', 'loan_list']
+        antes = {nombre: self.contar_consultas(nombre) for nombre in vistas}
+        sembrar_cartera(self.tipo, 5, desde=100)
+        for nombre in vistas:
+            with self.subTest(vista=nombre):
+                self.assertEqual(self.contar_consultas(nombre), antes[nombre])
+
+
+class VistaPreviaAmortizacionTests(TestCase):
+    def test_incluye_la_tae_con_comision(self):
+        tipos = [
+            TipoPrestamo.objects.create(
+                nombre=f'Prueba Vista Previa {comision}', tasa_interes_predeterminada=Decimal('24.00'),
+                monto_maximo=Decimal('100000.00'), plazo_maximo_meses=24, comision_por_desembolso=Decimal(comision),
+            )
+            for comision in ('0.00', '3.00')
+        ]
+        cliente = Cliente.objects.create(nombres='Vista', apellidos='Previa', numero_documento='00500000001')
+        self.client.force_login(User.objects.create_user('staff', password='clave', is_staff=True))
+        datos = {
+            'cliente': cliente.pk, 'monto': '10000.00', 'tasa_interes': '24.00', 'periodo_tasa': 'anual', 'plazo': 12,
+            'fecha_desembolso': '2025-01-15', 'frecuencia_pago': 'mensual', 'tipo_amortizacion': 'saldo_insoluto',
+            'manejo_gastos': 'sumar_al_capital', 'limite': '3',
+        }
+        sin_comision, con_comision = (
+            self.client.post(reverse('calculate_amortization_api'), {**datos, 'tipo_prestamo': tipo.pk}).json()
+            for tipo in tipos
+        )
+        # La tabla se corta en `limite`, pero la TAE usa todas las cuotas.
+        self.assertEqual(len(sin_comision['amortization_table']), 3)
+        self.assertAlmostEqual(float(sin_comision['tae']), 26.82, delta=0.3)
+        self.assertGreater(Decimal(con_comision['tae']), Decimal(sin_comision['tae']) + 5)
+
+
+class SimuladorPrestamosTests(TestCase):
+    def setUp(self):
+        self.tipos = [
+            TipoPrestamo.objects.create(
+                nombre=f'Prueba Simulador {comision}', tasa_interes_predeterminada=Decimal('24.00'),
+                monto_maximo=Decimal('100000.00'), plazo_maximo_meses=36, comision_por_desembolso=Decimal(comision),
+            )
+            for comision in ('0.00', '2.00')
+        ]
+        self.client.force_login(User.objects.create_user('staff', password='clave', is_staff=True))
+        self.base = {'monto': '10000.00', 'fecha_desembolso': '2025-01-15', 'tipo_prestamo': self.tipos[0].pk}
+
+    def simular(self, **datos):
+        respuesta = self.client.post(reverse('loan_simulator_api'), json.dumps(datos), content_type='application/json')
+        return respuesta.status_code, respuesta.json()
+
+    def test_grilla_con_resumen_y_errores_por_escenario(self):
+        estado, datos = self.simular(
+            base=self.base,
+            variar={'plazo': [6, 12, 24], 'tipo_prestamo': [tipo.pk for tipo in self.tipos]},
+            escenarios=[{'plazo': 48}],
+        )
+        self.assertEqual(estado, 200)
+        escenarios = datos['escenarios']
+        self.assertEqual(len(escenarios), 7)
+        self.assertIn('plazo', escenarios[-1]['errores'])
+        self.assertNotIn('tabla', escenarios[0])
+
+        # El resumen coincide con la tabla que se guardaría para el préstamo.
+        doce_meses = escenarios[2]
+        self.assertEqual((doce_meses['parametros']['plazo'], doce_meses['numero_cuotas']), (12, 12))
+        prestamo = Prestamo(
+            tipo_prestamo=self.tipos[0], monto=Decimal('10000.00'), tasa_interes=Decimal('24.00'), plazo=12,
+            fecha_desembolso=datetime.date(2025, 1, 15),
+        )
+        tabla = calcular_tabla_amortizacion(prestamo)
+        self.assertEqual(Decimal(doce_meses['cuota']), tabla[0]['cuota_fija'])
+        self.assertEqual(Decimal(doce_meses['total_interes']), sum(fila['interes'] for fila in tabla))
+        self.assertEqual(Decimal(doce_meses['costo_total']), sum(fila['interes'] for fila in tabla))
+        self.assertAlmostEqual(float(doce_meses['tae']), 26.82, delta=0.3)
+        # Con comisión, el mismo plazo cuesta más.
+        con_comision = escenarios[3]
+        self.assertEqual(Decimal(con_comision['comision']), Decimal('200.00'))
+        self.assertGreater(Decimal(con_comision['tae']), Decimal(doce_meses['tae']))
+
+    def test_valores_no_finitos_o_fuera_de_rango_son_errores_del_escenario(self):
+        estado, datos = self.simular(base={**self.base, 'plazo': 12}, escenarios=[
+            {'monto': 'NaN'}, {'tasa_interes': 'Infinity'}, {'tasa_interes': '1e30'}, {'plazo': 'Infinity'},
+            {'tipo_prestamo': str(self.tipos[1].pk)},
+        ])
+        self.assertEqual(estado, 200)
+        escenarios = datos['escenarios']
+        self.assertEqual(escenarios[0]['errores'], {'monto': 'Debe ser un número.'})
+        self.assertEqual(escenarios[1]['errores'], {'tasa_interes': 'Debe ser un número.'})
+        # Mismo límite que PrestamoForm: la tasa admite hasta 5 dígitos.
+        self.assertEqual(list(escenarios[2]['errores']), ['tasa_interes'])
+        self.assertEqual(list(escenarios[3]['errores']), ['plazo'])
+        # El id del tipo en texto también se acepta.
+        self.assertNotIn('errores', escenarios[4])
+        self.assertEqual(escenarios[4]['comision'], '200.00')
+
+    def test_fecha_de_desembolso_fuera_del_calendario_es_error_del_escenario(self):
+        estado, datos = self.simular(base={**self.base, 'plazo': 12}, escenarios=[
+            {'fecha_desembolso': '9999-06-01'}, {'fecha_desembolso': '9999-12-31', 'frecuencia_pago': 'semanal'}, {},
+        ])
+        self.assertEqual(estado, 200)
+        escenarios = datos['escenarios']
+        for escenario in escenarios[:2]:
+            self.assertEqual(list(escenario['errores']), ['fecha_desembolso'])
+        self.assertEqual(escenarios[2]['numero_cuotas'], 12)
+
+    def test_consultas_no_crecen_con_los_escenarios(self):
+        consultas = []
+        for plazos in ([12], list(range(1, 37)) + list(range(1, 15))):
+            with CaptureQueriesContext(connection) as contexto:
+                estado, datos = self.simular(base=self.base, variar={'plazo': plazos})
+            self.assertEqual(estado, 200)
+            self.assertEqual(len(datos['escenarios']), len(plazos))
+            consultas.append(len(contexto))
+        self.assertEqual(consultas[0], consultas[1])
+
+    def test_tabla_completa_a_pedido_y_cuerpo_invalido(self):
+        estado, datos = self.simular(base={**self.base, 'plazo': 3, 'frecuencia_pago': 'quincenal'}, incluir_tabla=True)
+        self.assertEqual(estado, 200)
+        self.assertEqual([fila['numero_cuota'] for fila in datos['escenarios'][0]['tabla']], [1, 2, 3, 4, 5, 6])
+        self.assertEqual(datos['escenarios'][0]['tabla'][-1]['saldo_pendiente'], '0.00')
+
+        respuesta = self.client.post(reverse('loan_simulator_api'), 'no es json', content_type='application/json')
+        self.assertEqual(respuesta.status_code, 400)
+        estado, _ = self.simular(base=self.base, variar={'plazo': list(range(1, 202))})
+        self.assertEqual(estado, 400)
+
+    def test_grilla_se_rechaza_antes_de_expandirse(self):
+        # 100^5 combinaciones: si se armaran en memoria la prueba no terminaría.
+        grilla = {campo: list(range(100)) for campo in ('monto', 'tasa_interes', 'plazo', 'periodo_tasa', 'frecuencia_pago')}
+        estado, datos = self.simular(base=self.base, variar=grilla)
+        self.assertEqual((estado, datos['error']), (400, 'Se admiten hasta 200 escenarios por consulta.'))
+        # La grilla más los escenarios sueltos cuentan juntos.
+        estado, _ = self.simular(base=self.base, variar={'plazo': list(range(1, 101))}, escenarios=[{}] * 101)
+        self.assertEqual(estado, 400)
+        for variar in ({'plazo': 12}, {'plazo': 'abc'}, {'plazo': []}):
+            estado, datos = self.simular(base=self.base, variar=variar)
+            self.assertEqual((estado, datos['error']), (400, '"variar.plazo" debe ser una lista de valores no vacía.'))
+        estado, _ = self.simular(base=self.base, escenarios=[12])
+        self.assertEqual(estado, 400)
+
+
+class AntiguedadSaldosVistaTests(TestCase):
+    def test_csv_con_tramos_y_total(self):
+        tipo = TipoPrestamo.objects.create(
+            nombre='Prueba Antigüedad', tasa_interes_predeterminada=Decimal('24.00'),
+            monto_maximo=Decimal('100000.00'), plazo_maximo_meses=24,
+        )
+        sembrar_cartera(tipo, 2)
+        self.client.force_login(User.objects.create_user('staff', password='clave', is_staff=True))
+        respuesta = self.client.get(reverse('aging_report_csv'))
+        self.assertEqual(respuesta['Content-Type'], 'text/csv; charset=utf-8')
+        filas = list(csv.reader(io.StringIO(respuesta.content.decode())))
+        self.assertEqual(filas[0][:3], ['Tipo de préstamo', 'Cuotas 1-30', 'Saldo 1-30'])
+        self.assertEqual([fila[0] for fila in filas[1:]], ['Prueba Antigüedad', 'Total'])
+        self.assertEqual(filas[1][-2:], filas[2][-2:])
+
+
+class TrabajosEnVistasTests(TestCase):
+    def setUp(self):
+        self.tipo = TipoPrestamo.objects.create(
+            nombre='Prueba Trabajos', tasa_interes_predeterminada=Decimal('24.00'), tasa_penalidad_diaria=Decimal('0.001'),
+            monto_maximo=Decimal('100000.00'), plazo_maximo_meses=24,
+        )
+        self.client.force_login(User.objects.create_user('staff', password='clave', is_staff=True))
+
+    def test_aprobar_encola_la_tabla_de_amortizacion(self):
+        cliente = Cliente.objects.create(nombres='Trabajo', apellidos='Aprobado', numero_documento='00500000003')
+        solicitud = crear_prestamo(cliente, self.tipo, 6000, estado='pendiente')
+        self.client.post(reverse('loan_application_approve', args=[solicitud.pk]))
+        self.assertEqual(solicitud.cuotas.count(), 0)
+        job = Job.objects.get(nombre='generar_cuotas')
+        self.assertEqual((job.argumentos, job.prioridad), ({'prestamo_id': solicitud.pk}, 10))
+
+        call_command('run_worker', una_vez=True, stdout=io.StringIO())
+        solicitud.refresh_from_db()
+        self.assertEqual(solicitud.cuotas.count(), 12)
+        self.assertIsNotNone(solicitud.tae)
+
+    def test_detalle_encola_penalidades_una_sola_vez(self):
+        cliente = Cliente.objects.create(nombres='Trabajo', apellidos='Moroso', numero_documento='00500000004')
+        prestamo = crear_prestamo(cliente, self.tipo, 6000)
+        for _ in range(2):
+            self.client.get(reverse('loan_detail', args=[prestamo.pk]))
+        self.assertEqual(Job.objects.filter(nombre='penalidades_prestamo', estado='pendiente').count(), 1)
+        self.assertFalse(prestamo.cuotas.filter(monto_penalidad_acumulada__gt=0).exists())
+
+        call_command('run_worker', una_vez=True, stdout=io.StringIO())
+        self.assertTrue(prestamo.cuotas.filter(monto_penalidad_acumulada__gt=0).exists())
+        # Con las penalidades al día, la vista ya no encola nada.
+        self.client.get(reverse('loan_detail', args=[prestamo.pk]))
+        self.assertEqual(Job.objects.filter(nombre='penalidades_prestamo').count(), 1)
+
+
+class AbonoCapitalVistaTests(TestCase):
+    def setUp(self):
+        tipo = TipoPrestamo.objects.create(
+            nombre='Prueba Abono', tasa_interes_predeterminada=Decimal('24.00'),
+            monto_maximo=Decimal('100000.00'), plazo_maximo_meses=24,
+        )
+        cliente = Cliente.objects.create(nombres='Abono', apellidos='Vista', numero_documento='00500000002')
+        self.prestamo = crear_prestamo(cliente, tipo, 12000, fecha=timezone.localdate())
+        self.client.force_login(User.objects.create_user('staff', password='clave', is_staff=True))
+
+    def test_abono_no_se_cuenta_dos_veces(self):
+        panel = self.client.get(reverse('panel_informativo')).context
+        detalle = self.client.get(reverse('financial_details')).context
+        respuesta = self.client.post(
+            reverse('loan_prepayment', args=[self.prestamo.pk]), {'monto': '5000.00', 'modo': 'reducir_plazo'},
+        )
+        self.assertRedirects(respuesta, reverse('loan_detail', args=[self.prestamo.pk]))
+        self.assertLess(self.prestamo.cuotas.count(), 12)
+
+        # El abono pasa de la calle a la caja: el patrimonio no cambia.
+        despues = self.client.get(reverse('panel_informativo')).context
+        self.assertEqual(despues['dinero_en_caja'], panel['dinero_en_caja'] + Decimal('5000.00'))
+        self.assertEqual(despues['dinero_en_la_calle'], panel['dinero_en_la_calle'] - Decimal('5000.00'))
+        self.assertEqual(despues['patrimonio_total'], panel['patrimonio_total'])
+        cartera = self.client.get(reverse('financial_details')).context['cartera_activa']
+        self.assertEqual(cartera, detalle['cartera_activa'] - Decimal('5000.00'))
+
+    def test_monto_mayor_al_capital_muestra_el_error(self):
+        respuesta = self.client.post(
+            reverse('loan_prepayment', args=[self.prestamo.pk]), {'monto': '20000.00', 'modo': 'reducir_cuota'},
+        )
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertIn('no superar el capital pendiente', respuesta.context['form'].non_field_errors()[0])
+        self.assertEqual(self.prestamo.cuotas.count(), 12)
+
+
+class QueryCountMiddlewareTests(TestCase):
+    def setUp(self):
+        self.staff = User.objects.create_user('staff', password='clave-staff', is_staff=True)
+
+    def test_cabecera_server_timing_para_staff(self):
+        self.client.force_login(self.staff)
+        response = self.client.get(reverse('cobros_list'))
+        self.assertIn('db;dur=', response['Server-Timing'])
+        self.assertGreater(response.wsgi_request.consultas_db.cantidad, 0)
+
+    @override_settings(DEBUG=False)
+    def test_sin_cabecera_para_usuarios_no_staff(self):
+        response = self.client.get(reverse('client_login'))
+        self.assertNotIn('Server-Timing', response)
+
+
+def registrar_en_hijo(mensaje):
+    logging.getLogger('prueba.proceso_hijo').warning(mensaje)
+    return mensaje
+
+
+
+def pagos_registrados_en_hijo():
+    metricas.pagos_registrados.inc()
+    return metricas.registro.instantanea()['prestamos_pagos_registrados_total']['[]']
+
+
+class RegistroEstructuradoTests(TestCase):
+    def test_peticion_registra_vista_duracion_y_consultas(self):
+        staff = User.objects.create_user('staff', password='clave-staff', is_staff=True)
+        self.client.force_login(staff)
+        with self.assertLogs('dashboard.middleware', level='INFO') as registros:
+            response = self.client.get(reverse('cobros_list'), HTTP_X_REQUEST_ID='abc123')
+        self.assertEqual(response['X-Request-ID'], 'abc123')
+        registro = registros.records[-1]
+        self.assertEqual(registro.vista, 'cobros_list')
+        self.assertGreater(registro.consultas, 0)
+        self.assertIsNone(request_id_actual.get())
+
+    def test_excepcion_se_registra_con_estado_500(self):
+        def vista_que_falla(request):
+            raise RuntimeError('falla de la vista')
+
+        request = RequestFactory().get('/falla/', HTTP_X_REQUEST_ID='abc123')
+        with self.assertLogs('dashboard.middleware', level='ERROR') as registros:
+            with self.assertRaises(RuntimeError):
+                RequestLogMiddleware(vista_que_falla)(request)
+        (registro,) = registros.records
+        self.assertEqual((registro.estado, registro.request_id), (500, 'abc123'))
+        self.assertIs(registro.exc_info[0], RuntimeError)
+        self.assertIsNone(request_id_actual.get())
+
+    def test_formato_json_incluye_contexto_y_extra(self):
+        registro = logging.LogRecord('dashboard.views', logging.INFO, __file__, 1, 'Cliente %s', ('creado',), None)
+        registro.cliente_id = 7
+        token = request_id_actual.set('req-1')
+        try:
+            FiltroContexto().filter(registro)
+        finally:
+            request_id_actual.reset(token)
+        datos = json.loads(FormatoJSON().format(registro))
+        self.assertEqual(datos['mensaje'], 'Cliente creado')
+        self.assertEqual(datos['request_id'], 'req-1')
+        self.assertEqual(datos['cliente_id'], 7)
+
+    def test_registros_de_procesos_hijos_se_escriben(self):
+        logger = logging.getLogger('prueba.proceso_hijo')
+        manejador = ManejadorCola()
+        manejador.setFormatter(FormatoJSON())
+        logger.addHandler(manejador)
+        logger.propagate = False
+        with tempfile.TemporaryFile('w+') as salida:
+            manejador.listener.handlers[0].setStream(salida)
+            try:
+                logger.warning('desde el padre')
+                with multiprocessing.get_context('fork').Pool(1, initializer=preparar_proceso_hijo) as pool:
+                    pool.map(registrar_en_hijo, ['desde el hijo'])
+            finally:
+                logger.removeHandler(manejador)
+                manejador.close()
+            salida.seek(0)
+            mensajes = sorted(json.loads(linea)['mensaje'] for linea in salida)
+        self.assertEqual(mensajes, ['desde el hijo', 'desde el padre'])
+
+
+@override_settings(SQL_PROFILER=True, SQL_LENTA_MS=0)
+class SQLProfilerTests(TestCase):
+    def setUp(self):
+        perfil.limpiar()
+        tipo = TipoPrestamo.objects.create(
+            nombre='Prueba Perfil', tasa_interes_predeterminada=Decimal('24.00'),
+            monto_maximo=Decimal('100000.00'), plazo_maximo_meses=24,
+        )
+        self.prestamo = sembrar_cartera(tipo, 1)[0]
+        self.client.force_login(User.objects.create_user('staff', password='clave-staff', is_staff=True))
+
+    def test_huella_ignora_valores(self):
+        self.assertEqual(
+            huella("SELECT * FROM t WHERE id IN (%s, %s) AND nombre = 'Ana' LIMIT 21"),
+            huella("SELECT * FROM t WHERE id IN (%s)  AND nombre = 'Luis' LIMIT 5"),
+        )
+
+    def test_agregados_repetidos_de_loan_detail_son_visibles(self):
+        with self.assertLogs('dashboard.middleware', level='WARNING'):
+            self.client.get(reverse('loan_detail', args=[self.prestamo.pk]))
+        response = self.client.get(reverse('sql_profile_api'), {'vista': 'loan_detail', 'top': '50'})
+        huellas = response.json()['vistas']['loan_detail']
+        total_pagado = [h for h in huellas if 'SUM("prestamos_pago"."monto_pagado")' in h['sql']]
+        # `total_pagado` se consulta una vez por cuota pendiente: la huella se repite.
+        self.assertGreaterEqual(max(h['cantidad'] for h in total_pagado), 10)
+
+    def test_rutas_inexistentes_comparten_una_clave(self):
+        for ruta in ('/no-existe-1/', '/wp-admin/setup.php', '/.env'):
+            self.client.get(ruta)
+        vistas = set(perfil.top())
+        self.assertIn('sin_ruta', vistas)
+        self.assertFalse(any(vista.startswith('/') for vista in vistas))
+
+    def test_endpoint_solo_para_staff(self):
+        self.client.logout()
+        response = self.client.get(reverse('sql_profile_api'))
+        self.assertEqual(response.status_code, 302)
+
+
+class MetricasTests(TestCase):
+    def setUp(self):
+        self.staff = User.objects.create_user('staff', password='clave-staff', is_staff=True)
+
+    def test_exporta_peticiones_en_formato_prometheus(self):
+        self.client.get(reverse('client_login'))
+        self.client.force_login(self.staff)
+        response = self.client.get(reverse('metrics'))
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        texto = response.content.decode()
+        self.assertIn('# TYPE prestamos_http_duracion_segundos histogram', texto)
+        self.assertRegex(texto, r'prestamos_http_peticiones_total\{estado="200",metodo="GET",vista="client_login"\} \d+')
+        self.assertIn('prestamos_http_duracion_segundos_bucket{vista="client_login",le="+Inf"}', texto)
+
+    @override_settings(METRICAS_TOKEN='secreto')
+    def test_token_requerido_si_esta_configurado(self):
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 401)
+        response = self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer secreto')
+        self.assertEqual(response.status_code, 200)
+
+    @override_settings(METRICAS_TOKEN=None)
+    def test_sin_token_solo_staff(self):
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 401)
+        self.client.force_login(User.objects.create_user('cajero', password='clave'))
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 401)
+        self.client.force_login(self.staff)
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 200)
+
+    def test_modo_multiproceso_suma_los_archivos_de_cada_proceso(self):
+        with tempfile.TemporaryDirectory() as carpeta, override_settings(METRICAS_DIR=carpeta):
+            metricas.pagos_registrados.inc(2)
+            propio = metricas.registro.valores_combinados()['prestamos_pagos_registrados_total']['[]']
+            otro_proceso = {'prestamos_pagos_registrados_total': {'[]': 5}}
+            (Path(carpeta) / 'metricas_999999.json').write_text(json.dumps(otro_proceso))
+            self.client.force_login(self.staff)
+            texto = self.client.get(reverse('metrics')).content.decode()
+        self.assertIn(f'prestamos_pagos_registrados_total {propio + 5}', texto)
+
+    def test_proceso_hijo_no_repite_lo_contado_por_el_padre(self):
+        metricas.pagos_registrados.inc(3)
+        with multiprocessing.get_context('fork').Pool(1) as pool:
+            en_hijo = pool.apply(pagos_registrados_en_hijo)
+        self.assertEqual(en_hijo, 1)
+        self.assertGreaterEqual(metricas.registro.instantanea()['prestamos_pagos_registrados_total']['[]'], 3)
+
+    def test_volcados_concurrentes_y_errores_de_disco_no_fallan(self):
+        with tempfile.TemporaryDirectory() as carpeta, override_settings(METRICAS_DIR=carpeta):
+            errores = []
+
+            def volcar():
+                try:
+                    for _ in range(20):
+                        metricas.registro.volcar()
+                except Exception as error:
+                    errores.append(error)
+
+            hilos = [threading.Thread(target=volcar) for _ in range(8)]
+            for hilo in hilos:
+                hilo.start()
+            for hilo in hilos:
+                hilo.join()
+            self.assertEqual(errores, [])
+            self.assertEqual([archivo.name for archivo in Path(carpeta).iterdir()], [f'metricas_{os.getpid()}.json'])
+
+        with tempfile.NamedTemporaryFile() as archivo, override_settings(METRICAS_DIR=archivo.name):
+            # La carpeta no se puede crear: se registra un aviso y el contador sigue funcionando.
+            with self.assertLogs('gestion_prestamos.metricas', level='WARNING'):
+                metricas.registro.volcar()
+            metricas.pagos_registrados.inc()
+
+    def test_archivos_de_procesos_terminados_se_pliegan(self):
+        proceso = multiprocessing.get_context('fork').Process(target=int)
+        proceso.start()
+        proceso.join()
+        with tempfile.TemporaryDirectory() as carpeta, override_settings(METRICAS_DIR=carpeta):
+            carpeta = Path(carpeta)
+            (carpeta / f'metricas_{proceso.pid}.json').write_text(
+                json.dumps({'prestamos_pagos_registrados_total': {'[]': 5}})
+            )
+            (carpeta / metricas.ARCHIVO_FINALIZADOS).write_text(
+                json.dumps({'prestamos_pagos_registrados_total': {'[]': 2}})
+            )
+            primero = metricas.registro.valores_combinados()['prestamos_pagos_registrados_total']['[]']
+            self.assertFalse((carpeta / f'metricas_{proceso.pid}.json').exists())
+            self.assertEqual(
+                json.loads((carpeta / metricas.ARCHIVO_FINALIZADOS).read_text()),
+                {'prestamos_pagos_registrados_total': {'[]': 7}},
+            )
+            # Plegado una sola vez: la segunda lectura no vuelve a sumarlo.
+            segundo = metricas.registro.valores_combinados()['prestamos_pagos_registrados_total']['[]']
+            self.assertEqual(primero, segundo)
+            self.assertEqual(
+                sorted(archivo.name for archivo in carpeta.glob('metricas_*.json')),
+                sorted([metricas.ARCHIVO_FINALIZADOS, f'metricas_{os.getpid()}.json']),
+            )
@@ -55,9 +55,13 @@ urlpatterns = [
     # --- URLs para Pagos ---
     # Muestra el formulario para registrar un nuevo pago.
     path('pagos/nuevo/<int:loan_id>/', views.payment_add, name='payment_add'),
+    path('prestamos/<int:pk>/abono-capital/', views.loan_prepayment, name='loan_prepayment'),
 
     # --- URLs para Cobros ---
     path('cobros/', views.cobros_list, name='cobros_list'),
+    path('cobros/antiguedad/', views.aging_report, name='aging_report'),
+    path('cobros/antiguedad.csv', views.aging_report_csv, name='aging_report_csv'),
+    path('cobros/pronostico/', views.collections_forecast, name='collections_forecast'),
 
     # --- URLs para Select2 AJAX ---
     path('search/clients/', views.search_clients, name='search_clients'),
@@ -66,9 +70,16 @@ urlpatterns = [
     # --- API URLs ---
     path('api/tipo-prestamo/<int:pk>/', views.get_tipo_prestamo_details, name='get_tipo_prestamo_details'),
     path('api/calculate-amortization/', views.calculate_amortization_api, name='calculate_amortization_api'),
+    path('api/simulador/', views.loan_simulator_api, name='loan_simulator_api'),
+    path('api/prestamos/<int:pk>/liquidacion/', views.loan_payoff_api, name='loan_payoff_api'),
+    path('api/perfil-sql/', views.sql_profile_api, name='sql_profile_api'),
+
+    # --- Métricas (Prometheus) ---
+    path('metrics', views.metrics, name='metrics'),
 
     # --- URLs para Finanzas ---
     path('finanzas/', views.financial_details, name='financial_details'),
+    path('finanzas/mora/', views.mora_analytics, name='mora_analytics'),
 
     # --- URLs del Portal de Clientes ---
     path('portal/', include(portal_patterns)),
@@ -1,43 +1,53 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from decimal import Decimal
 from django.contrib.auth.decorators import login_required
+from django.contrib.admin.views.decorators import staff_member_required
+from django.conf import settings
 from django.db.models import Sum, Value, DecimalField, Count, F, Q
 from django.db.models.functions import Coalesce
-from gestion_prestamos.forms import ClienteForm, PrestamoForm, PagoForm, TipoPrestamoForm, GastoPrestamoForm, RequisitoForm, GaranteForm, LoanRequestForm
-from gestion_prestamos.models import Prestamo, Cliente, Pago, Cuota, TipoPrestamo, Capital, GastoPrestamo, TipoGasto, Requisito
+from gestion_prestamos.forms import AbonoCapitalForm, ClienteForm, PrestamoForm, PagoForm, TipoPrestamoForm, GastoPrestamoForm, RequisitoForm, GaranteForm, LoanRequestForm
+from gestion_prestamos.models import AbonoCapital, Prestamo, Cliente, Pago, Cuota, TipoPrestamo, Capital, GastoPrestamo, TipoGasto, Requisito
 from django.forms import modelformset_factory
-from gestion_prestamos.utils import calcular_tabla_amortizacion, calcular_penalidad_cuota
+from gestion_prestamos.calendario import siguiente_dia_habil
+from gestion_prestamos import abonos, antiguedad, caja, devengo, metricas as metricas_app, mora, pronostico, simulador, tae, trabajos
+from .perfil_sql import perfil
+from gestion_prestamos.utils import generar_tabla_amortizacion, generar_tabla_centavos, calcular_liquidacion
 from django.contrib import messages
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.forms import AuthenticationForm, PasswordChangeForm
 from django.http import JsonResponse, HttpResponse
 from django.utils import timezone
 from datetime import date, timedelta
+from itertools import islice
 from django.contrib.auth.views import PasswordChangeView
 from django.urls import reverse_lazy
+import csv
 import json
+import logging
+
+logger = logging.getLogger(__name__)
 
 # --- Vistas del Dashboard ---
 
 @login_required
 def panel_informativo(request):
     """Muestra el panel principal con datos agregados y métricas financieras."""
-    hoy = timezone.now()
-    
     # --- MÉTRICAS FINANCIERAS ---
-    capital_obj = Capital.objects.first()
-    capital_inicial = capital_obj.monto_inicial if capital_obj else Decimal('0.00')
-
     total_desembolsado = Prestamo.objects.aggregate(total=Coalesce(Sum('monto'), Decimal('0.00')))['total']
-    total_recibido = Pago.objects.aggregate(total=Coalesce(Sum('monto_pagado'), Decimal('0.00')))['total']
-    
-    dinero_en_caja = capital_inicial - total_desembolsado + total_recibido
 
-    cuotas_pagadas = Cuota.objects.filter(estado='pagada')
-    ganancia_realizada = cuotas_pagadas.aggregate(total=Coalesce(Sum('interes'), Decimal('0.00')))['total']
-    capital_devuelto = cuotas_pagadas.aggregate(total=Coalesce(Sum('capital'), Decimal('0.00')))['total']
+    # Saldo del último movimiento del libro de caja (no suma el historial).
+    dinero_en_caja = caja.saldo_actual()
 
-    dinero_en_la_calle = total_desembolsado - capital_devuelto
+    cuotas_pagadas = Cuota.objects.filter(estado='pagada').aggregate(
+        interes=Coalesce(Sum('interes'), Decimal('0.00')),
+        capital=Coalesce(Sum('capital'), Decimal('0.00')),
+    )
+    ganancia_realizada = cuotas_pagadas['interes']
+    capital_devuelto = cuotas_pagadas['capital']
+    # Los abonos a capital ya entraron a caja: se descuentan de lo prestado.
+    abonado = AbonoCapital.objects.aggregate(total=Coalesce(Sum('monto'), Decimal('0.00')))['total']
+
+    dinero_en_la_calle = total_desembolsado - capital_devuelto - abonado
 
     patrimonio_total = dinero_en_caja + dinero_en_la_calle
 
@@ -46,17 +56,21 @@ def panel_informativo(request):
     total_prestamos_activos = Prestamo.objects.filter(estado='aprobado').count()
     
     # --- AGENDA DE COBROS AMPLIADA ---
-    fecha_hoy = hoy.date()
-    fecha_manana = fecha_hoy + timedelta(days=1)
+    fecha_hoy = timezone.localdate()
+    # El siguiente día de cobro es el próximo día hábil; incluye lo que vence en
+    # el fin de semana o feriado intermedio.
+    fecha_manana = siguiente_dia_habil(fecha_hoy)
     fecha_semana = fecha_hoy + timedelta(days=7)
 
-    cobros_hoy = Cuota.objects.filter(fecha_vencimiento=fecha_hoy, estado__in=['pendiente', 'pagada_parcialmente'])
-    cobros_manana = Cuota.objects.filter(fecha_vencimiento=fecha_manana, estado__in=['pendiente', 'pagada_parcialmente'])
-    cobros_proximos_7_dias = Cuota.objects.filter(
-        fecha_vencimiento__gt=fecha_manana, 
-        fecha_vencimiento__lte=fecha_semana, 
-        estado__in=['pendiente', 'pagada_parcialmente']
-    ).order_by('fecha_vencimiento')
+    # Una sola consulta para toda la semana; se reparte por día en Python.
+    cobros_hoy, cobros_manana, cobros_proximos_7_dias = [], [], []
+    for cuota in pronostico.detalle_cobros(fecha_hoy, fecha_semana):
+        if cuota.fecha_vencimiento == fecha_hoy:
+            cobros_hoy.append(cuota)
+        elif cuota.fecha_vencimiento <= fecha_manana:
+            cobros_manana.append(cuota)
+        else:
+            cobros_proximos_7_dias.append(cuota)
 
     context = {
         # Métricas Financieras Reorganizadas
@@ -72,10 +86,11 @@ def panel_informativo(request):
         # Agenda de Cobros Ampliada
         'cobros_hoy': cobros_hoy,
         'cobros_manana': cobros_manana,
+        'fecha_manana': fecha_manana,
         'cobros_proximos_7_dias': cobros_proximos_7_dias,
 
         # Valor para mostrar alerta si no se ha configurado el capital
-        'capital_no_configurado': capital_obj is None,
+        'capital_no_configurado': not Capital.objects.exists(),
     }
     return render(request, 'dashboard/panel.html', context)
 
@@ -109,21 +124,17 @@ def client_list(request):
 @login_required
 def client_add(request):
     """Maneja la creación de un nuevo cliente."""
-    print("--- client_add view called ---")
     if request.method == 'POST':
-        print("--- POST request received ---")
-        print("POST data:", request.POST)
         form = ClienteForm(request.POST)
         if form.is_valid():
-            print("Form is valid")
-            form.save()
+            cliente = form.save()
+            logger.info('Cliente registrado', extra={'cliente_id': cliente.pk})
             messages.success(request, 'Cliente registrado exitosamente!')
             return redirect('client_list')
         else:
-            print("Form is not valid")
-            print(form.errors)
+            # Solo los nombres de los campos: los valores son datos personales.
+            logger.warning('Formulario de cliente inválido', extra={'campos_con_error': list(form.errors)})
     else:
-        print("--- GET request received ---")
         form = ClienteForm()
     context = {
         'form': form
@@ -133,22 +144,20 @@ def client_add(request):
 @login_required
 def client_edit(request, pk):
     """Maneja la edición de un cliente existente."""
-    print("--- client_edit view called ---")
     cliente = get_object_or_404(Cliente, pk=pk)
     if request.method == 'POST':
-        print("--- POST request received ---")
-        print("POST data:", request.POST)
         form = ClienteForm(request.POST, instance=cliente)
         if form.is_valid():
-            print("Form is valid")
             form.save()
+            logger.info('Cliente actualizado', extra={'cliente_id': cliente.pk})
             messages.success(request, 'Cliente actualizado exitosamente!')
             return redirect('client_list')
         else:
-            print("Form is not valid")
-            print(form.errors)
+            logger.warning(
+                'Formulario de cliente inválido',
+                extra={'cliente_id': cliente.pk, 'campos_con_error': list(form.errors)},
+            )
     else:
-        print("--- GET request received ---")
         form = ClienteForm(instance=cliente)
     context = {
         'form': form
@@ -178,7 +187,6 @@ def loan_add(request):
     RequisitoFormSet = modelformset_factory(Requisito, form=RequisitoForm, extra=0, can_delete=True)
 
     if request.method == 'POST':
-        print("--- loan_add view: POST request received ---")
         form = PrestamoForm(request.POST)
         gasto_formset = GastoFormSet(request.POST, queryset=GastoPrestamo.objects.none(), prefix='gastos')
         requisito_formset = RequisitoFormSet(request.POST, queryset=Requisito.objects.none(), prefix='requisitos')
@@ -188,26 +196,26 @@ def loan_add(request):
         gasto_formset_is_valid = gasto_formset.is_valid()
         requisito_formset_is_valid = requisito_formset.is_valid()
 
-        print(f"--- loan_add view: form.is_valid() -> {form_is_valid} ---")
-        print(f"--- loan_add view: gasto_formset.is_valid() -> {gasto_formset_is_valid} ---")
-        print(f"--- loan_add view: requisito_formset.is_valid() -> {requisito_formset_is_valid} ---")
+        logger.debug(
+            'Validación de préstamo',
+            extra={
+                'prestamo_valido': form_is_valid,
+                'gastos_validos': gasto_formset_is_valid,
+                'requisitos_validos': requisito_formset_is_valid,
+            },
+        )
 
         if form_is_valid and gasto_formset_is_valid and requisito_formset_is_valid:
-            print("--- loan_add view: All forms are valid, proceeding with further validations ---")
             tipo_prestamo = form.cleaned_data.get('tipo_prestamo')
             monto_solicitado = form.cleaned_data['monto']
 
             # Validar garante si el monto es < 100,000
             if monto_solicitado < 100000:
-                print("--- loan_add view: Loan amount is less than 100,000, validating guarantor form ---")
                 if not garante_form.is_valid():
-                    print("--- loan_add view: Guarantor form is NOT valid ---")
-                    print(garante_form.errors)
+                    logger.warning('Formulario de garante inválido', extra={'campos_con_error': list(garante_form.errors)})
                     messages.error(request, 'El formulario del garante no es válido. Por favor, revisa los campos.')
                     context = {'form': form, 'gasto_formset': gasto_formset, 'requisito_formset': requisito_formset, 'garante_form': garante_form}
                     return render(request, 'dashboard/loan_form.html', context)
-                else:
-                    print("--- loan_add view: Guarantor form is valid ---")
 
             # Validar que si el tipo de préstamo requiere garantía, se provea al menos una.
             if tipo_prestamo and tipo_prestamo.requiere_garantia:
@@ -246,6 +254,9 @@ def loan_add(request):
                     gasto.prestamo = prestamo
                     gasto.save()
 
+            # Salida de caja del desembolso y de los gastos
+            prestamo.registrar_desembolso()
+
             # Guardar requisitos/garantías
             for requisito_form in requisito_formset:
                 if requisito_form.is_valid() and requisito_form.cleaned_data and not requisito_form.cleaned_data.get('DELETE'):
@@ -253,25 +264,18 @@ def loan_add(request):
                     requisito.prestamo = prestamo
                     requisito.save()
 
-            tabla_amortizacion = calcular_tabla_amortizacion(prestamo)
-            for item_cuota in tabla_amortizacion:
-                Cuota.objects.create(
-                    prestamo=prestamo,
-                    numero_cuota=item_cuota['numero_cuota'],
-                    fecha_vencimiento=item_cuota['fecha_vencimiento'],
-                    monto_cuota=item_cuota['cuota_fija'],
-                    capital=item_cuota['capital'],
-                    interes=item_cuota['interes'],
-                    saldo_pendiente=item_cuota['saldo_pendiente']
-                )
-            
-            messages.success(request, f'¡Éxito! Préstamo de ${prestamo.monto:,.2f} para {prestamo.cliente.nombres} {prestamo.cliente.apellidos} ha sido registrado correctamente.')
+            # La tabla de amortización (y la TAE) la genera el worker.
+            trabajos.enqueue('generar_cuotas', prioridad=10, prestamo_id=prestamo.pk)
+
+            logger.info('Préstamo registrado', extra={'prestamo_id': prestamo.pk, 'cliente_id': prestamo.cliente_id})
+            messages.success(request, f'¡Éxito! Préstamo de ${prestamo.monto:,.2f} para {prestamo.cliente.nombres} {prestamo.cliente.apellidos} ha sido registrado correctamente. Su tabla de amortización se está generando.')
             return redirect('loan_list')
         else:
             # Mensaje de error principal más explícito
             error_count = len(form.errors) + len(gasto_formset.errors) + len(requisito_formset.errors)
             if garante_form.errors:
                 error_count += len(garante_form.errors)
+            logger.warning('Formulario de préstamo inválido', extra={'campos_con_error': list(form.errors)})
             messages.error(request, f'El formulario no es válido. Se encontraron {error_count} error(es). Por favor, revisa los campos marcados.')
             
             # Mensajes de advertencia para cada sección con errores
@@ -308,15 +312,19 @@ def loan_detail(request, pk):
     cuotas = prestamo.cuotas.all().order_by('numero_cuota')
     hoy = timezone.now().date()
 
-    # Bucle para calcular penalidades y estado de cada cuota ANTES de agregar
+    # Estado de cada cuota. Las penalidades de hoy las suma el worker: si alguna
+    # cuota vencida no está al día, se encola su cálculo.
     total_faltante = Decimal('0.00')
+    penalidades_atrasadas = False
     for cuota in cuotas:
         cuota.is_overdue = cuota.fecha_vencimiento < hoy and cuota.estado in ['pendiente', 'pagada_parcialmente']
-        calcular_penalidad_cuota(cuota) # Esto actualiza el monto de penalidad en la BD
+        if cuota.is_overdue and cuota.fecha_ultima_penalidad_calculada != hoy:
+            penalidades_atrasadas = True
         if cuota.estado != 'pagada':
             total_faltante += (cuota.monto_total_a_pagar - cuota.total_pagado)
+    if penalidades_atrasadas:
+        trabajos.enqueue_unico('penalidades_prestamo', prioridad=10, prestamo_id=prestamo.pk)
 
-    # Ahora que las penalidades están actualizadas, agregamos los totales
     totales_amortizacion = cuotas.aggregate(
         total_cuota=Coalesce(Sum('monto_cuota'), Value(0), output_field=DecimalField()),
         total_capital=Coalesce(Sum('capital'), Value(0), output_field=DecimalField()),
@@ -336,8 +344,12 @@ def loan_detail(request, pk):
         total=Coalesce(Sum('monto_pagado'), Value(0), output_field=DecimalField())
     )['total']
 
+    # Los préstamos anteriores al cálculo de la TAE la obtienen aquí hasta que corra `calcular_tae`.
+    tasa_efectiva = prestamo.tae if prestamo.tae is not None else tae.calcular(Prestamo.objects.filter(pk=prestamo.pk)).get(prestamo.pk)
+
     context = {
         'el_prestamo_actual': prestamo,
+        'tae': tasa_efectiva,
         'cuotas_del_prestamo': cuotas,
         'totales_amortizacion': totales_amortizacion,
         'pago_total_realizado': total_pagado,
@@ -351,7 +363,7 @@ def loan_detail(request, pk):
 def loan_list(request):
     """Muestra una lista de todos los préstamos activos con funcionalidad de búsqueda."""
     query = request.GET.get('q')
-    prestamos = Prestamo.objects.filter(estado='aprobado').select_related('cliente').order_by('-fecha_creacion')
+    prestamos = Prestamo.objects.filter(estado='aprobado').select_related('cliente', 'tipo_prestamo').order_by('-fecha_creacion')
     if query:
         prestamos = prestamos.filter(
             Q(id__icontains=query) |
@@ -369,7 +381,7 @@ def loan_list(request):
 def paid_loan_list(request):
     """Muestra una lista de todos los préstamos pagados con funcionalidad de búsqueda."""
     query = request.GET.get('q')
-    prestamos = Prestamo.objects.filter(estado='pagado').select_related('cliente').order_by('-fecha_creacion')
+    prestamos = Prestamo.objects.filter(estado='pagado').select_related('cliente', 'tipo_prestamo').order_by('-fecha_creacion')
     if query:
         prestamos = prestamos.filter(
             Q(id__icontains=query) |
@@ -408,11 +420,47 @@ def payment_add(request, loan_id):
     return render(request, 'dashboard/payment_form.html', context)
 
 
+@login_required
+def loan_prepayment(request, pk):
+    """Registra un abono a capital y reamortiza las cuotas futuras del préstamo."""
+    prestamo = get_object_or_404(Prestamo.objects.select_related('cliente'), pk=pk)
+    if request.method == 'POST':
+        form = AbonoCapitalForm(request.POST)
+        if form.is_valid():
+            try:
+                abono = abonos.abonar_capital(prestamo, form.cleaned_data['monto'], form.cleaned_data['modo'])
+            except ValueError as e:
+                form.add_error(None, str(e))
+            else:
+                messages.success(
+                    request,
+                    f'Abono de ${abono.monto:,.2f} aplicado: {abono.cuotas_anteriores} cuota(s) futuras reemplazadas por {abono.cuotas_nuevas}.'
+                )
+                return redirect('loan_detail', pk=prestamo.pk)
+    else:
+        form = AbonoCapitalForm()
+    futuras = abonos.cuotas_futuras(
+        list(prestamo.cuotas.order_by('numero_cuota').values_list(
+            'id', 'numero_cuota', 'estado', 'fecha_vencimiento', 'monto_cuota', 'interes', 'capital'
+        )),
+        timezone.localdate(),
+    )
+    context = {
+        'form': form,
+        'prestamo': prestamo,
+        'cuotas_futuras': len(futuras),
+        'capital_futuro': sum((fila[6] for fila in futuras), Decimal('0.00')),
+    }
+    return render(request, 'dashboard/prepayment_form.html', context)
+
+
 @login_required
 def cobros_list(request):
     """Muestra una lista de todas las cuotas vencidas y no pagadas."""
     hoy = timezone.now()
-    cuotas_vencidas = Cuota.objects.filter(fecha_vencimiento__lt=hoy, estado='pendiente').annotate(
+    cuotas_vencidas = Cuota.objects.filter(
+        fecha_vencimiento__lt=hoy, estado__in=['pendiente', 'pagada_parcialmente']
+    ).select_related('prestamo__cliente').annotate(
         dias_vencido=hoy - F('fecha_vencimiento')
     ).order_by('fecha_vencimiento')
     context = {
@@ -420,6 +468,98 @@ def cobros_list(request):
     }
     return render(request, 'dashboard/cobros_list.html', context)
 
+@login_required
+def aging_report(request):
+    """Antigüedad de saldos: cuotas vencidas por tipo de préstamo y tramo de atraso."""
+    context = {
+        'matriz': antiguedad.matriz_antiguedad(),
+        'hoy': timezone.localdate(),
+    }
+    return render(request, 'dashboard/aging_report.html', context)
+
+@login_required
+def aging_report_csv(request):
+    """La misma matriz de `aging_report` en CSV (una fila por tipo de préstamo)."""
+    hoy = timezone.localdate()
+    matriz = antiguedad.matriz_antiguedad(hoy)
+    response = HttpResponse(content_type='text/csv; charset=utf-8')
+    response['Content-Disposition'] = f'attachment; filename="antiguedad_saldos_{hoy:%Y%m%d}.csv"'
+    writer = csv.writer(response)
+    encabezado = ['Tipo de préstamo']
+    for tramo in matriz['tramos']:
+        encabezado += [f'Cuotas {tramo}', f'Saldo {tramo}']
+    writer.writerow(encabezado + ['Cuotas total', 'Saldo total'])
+    for fila in matriz['filas'] + [{'tipo': 'Total', **matriz['totales']}]:
+        celdas = []
+        for celda in fila['celdas']:
+            celdas += [celda['cuotas'], celda['monto']]
+        writer.writerow([fila['tipo'], *celdas, fila['cuotas'], fila['monto']])
+    return response
+
+@staff_member_required
+def mora_analytics(request):
+    """Roll rates del mes elegido y curvas de cosecha, a partir de las fotos de `snapshot_mora`."""
+    periodos = mora.periodos_registrados()
+    periodo = periodos[0] if periodos else None
+    elegido = request.GET.get('periodo', '')
+    for disponible in periodos:
+        if f'{disponible:%Y-%m}' == elegido:
+            periodo = disponible
+
+    def porcentaje(valor):
+        return None if valor != valor else round(float(valor) * 100, 1)  # NaN: sin datos
+
+    roll_rate = []
+    if periodo:
+        matriz = mora.matriz_roll_rate(periodo)
+        for origen, etiqueta in enumerate(mora.ETIQUETAS[:mora.CANCELADO]):
+            roll_rate.append({
+                'etiqueta': etiqueta,
+                'total': int(matriz['conteos'][origen].sum()),
+                'celdas': [
+                    {'conteo': int(conteo), 'tasa': porcentaje(tasa), 'tasa_saldo': porcentaje(tasa_saldo)}
+                    for conteo, tasa, tasa_saldo in zip(
+                        matriz['conteos'][origen], matriz['tasas'][origen], matriz['tasas_saldo'][origen]
+                    )
+                ],
+            })
+    vintage = mora.curvas_vintage()
+    context = {
+        'periodos': periodos,
+        'periodo': periodo,
+        'etiquetas': mora.ETIQUETAS,
+        'roll_rate': roll_rate,
+        'meses_vintage': range(vintage['meses']),
+        'vintage': [
+            {'cohorte': cohorte, 'tasas': [porcentaje(tasa) for tasa in fila]}
+            for cohorte, fila in zip(vintage['cohortes'], vintage['tasas'])
+        ],
+    }
+    return render(request, 'dashboard/mora_analytics.html', context)
+
+@login_required
+def collections_forecast(request):
+    """Cobros esperados por día para los próximos 7, 30 o 90 días, con el detalle del día elegido."""
+    dias = int(request.GET['dias']) if request.GET.get('dias', '').isdigit() else 30
+    if dias not in pronostico.HORIZONTES:
+        dias = 30
+    hoy = timezone.localdate()
+    calendario_cobros = pronostico.cobros_por_dia(dias, hoy)
+
+    fecha_detalle = None
+    try:
+        fecha_detalle = date.fromisoformat(request.GET.get('fecha', ''))
+    except ValueError:
+        pass
+    context = {
+        'horizontes': pronostico.HORIZONTES,
+        'dias': dias,
+        'calendario': calendario_cobros,
+        'fecha_detalle': fecha_detalle,
+        'detalle': pronostico.detalle_cobros(fecha_detalle) if fecha_detalle else None,
+    }
+    return render(request, 'dashboard/collections_forecast.html', context)
+
 # --- Vistas para Select2 AJAX ---
 
 @login_required
@@ -444,7 +584,7 @@ def search_clients(request):
 def search_cuotas(request):
     term = request.GET.get('term', '')
     loan_id = request.GET.get('loan_id')
-    cuotas = Cuota.objects.filter(estado='pendiente')
+    cuotas = Cuota.objects.filter(estado='pendiente').select_related('prestamo__cliente')
     if loan_id:
         cuotas = cuotas.filter(prestamo_id=loan_id)
     if term:
@@ -489,7 +629,15 @@ def calculate_amortization_api(request):
             # Crear un objeto Prestamo temporal sin guardarlo en la BD
             prestamo = form.save(commit=False)
             try:
-                tabla_amortizacion = calcular_tabla_amortizacion(prestamo)
+                # `limite` permite pedir solo la primera página de la tabla; el
+                # generador no calcula las filas restantes.
+                limite = request.POST.get('limite')
+                filas = generar_tabla_amortizacion(prestamo)
+                if limite and limite.isdigit():
+                    filas = islice(filas, int(limite))
+                tabla_amortizacion = list(filas)
+                # La TAE necesita todas las cuotas, aunque se muestre solo una página.
+                tasa_efectiva = tae.tae_de_tabla(prestamo, generar_tabla_centavos(prestamo))
                 # Convertir objetos Decimal y date a string para la serialización JSON
                 for cuota in tabla_amortizacion:
                     for key, value in cuota.items():
@@ -497,7 +645,10 @@ def calculate_amortization_api(request):
                             cuota[key] = f'{value:,.2f}'
                         elif isinstance(value, date):
                             cuota[key] = value.strftime('%Y-%m-%d')
-                return JsonResponse({'amortization_table': tabla_amortizacion})
+                return JsonResponse({
+                    'amortization_table': tabla_amortizacion,
+                    'tae': str(tasa_efectiva) if tasa_efectiva is not None else None,
+                })
             except Exception as e:
                 return JsonResponse({'error': f'Error al calcular la amortización: {str(e)}'}, status=400)
         else:
@@ -505,6 +656,54 @@ def calculate_amortization_api(request):
             return JsonResponse({'error': 'Formulario inválido', 'errors': form.errors}, status=400)
     return JsonResponse({'error': 'Método no permitido'}, status=405)
 
+@login_required
+def loan_simulator_api(request):
+    """
+    Compara varias condiciones de préstamo en una sola llamada. Recibe JSON:
+    {"base": {...}, "variar": {campo: [valores]}, "escenarios": [{...}],
+    "incluir_tabla": false}, con los campos del formulario de préstamo (ver
+    gestion_prestamos/simulador.py). Devuelve un resumen por escenario.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Método no permitido'}, status=405)
+    try:
+        datos = json.loads(request.body)
+    except ValueError:
+        datos = None
+    if not isinstance(datos, dict):
+        return JsonResponse({'error': 'Cuerpo inválido: se espera un objeto JSON con "base", "variar" y/o "escenarios".'}, status=400)
+    try:
+        escenarios = simulador.expandir(datos.get('base') or {}, datos.get('variar'), datos.get('escenarios'))
+    except ValueError as error:
+        return JsonResponse({'error': str(error)}, status=400)
+    return JsonResponse({'escenarios': simulador.simular(escenarios, bool(datos.get('incluir_tabla')))})
+
+@login_required
+def loan_payoff_api(request, pk):
+    """
+    Devuelve en JSON la cotización de liquidación de un préstamo.
+    Acepta `?fecha=AAAA-MM-DD`; si no se indica, se cotiza para hoy.
+    """
+    prestamo = get_object_or_404(Prestamo, pk=pk)
+    fecha = timezone.localdate()
+    fecha_param = request.GET.get('fecha')
+    if fecha_param:
+        try:
+            fecha = date.fromisoformat(fecha_param)
+        except ValueError:
+            return JsonResponse({'error': 'Fecha inválida. Use el formato AAAA-MM-DD.'}, status=400)
+
+    liquidacion = calcular_liquidacion(prestamo, fecha)
+    data = {'prestamo_id': prestamo.id}
+    for key, value in liquidacion.items():
+        if isinstance(value, Decimal):
+            data[key] = str(value)
+        elif isinstance(value, date):
+            data[key] = value.strftime('%Y-%m-%d')
+        else:
+            data[key] = value
+    return JsonResponse(data)
+
 @login_required
 def financial_details(request):
     """Muestra una página con un desglose detallado de las métricas financieras."""
@@ -512,18 +711,28 @@ def financial_details(request):
     capital_inicial = capital_obj.monto_inicial if capital_obj else Decimal('0.00')
     total_desembolsado = Prestamo.objects.aggregate(total=Coalesce(Sum('monto'), Decimal('0.00')))['total']
     total_recibido_pagos = Pago.objects.aggregate(total=Coalesce(Sum('monto_pagado'), Decimal('0.00')))['total']
-    dinero_en_caja = capital_inicial - total_desembolsado + total_recibido_pagos
-    cuotas_pagadas = Cuota.objects.filter(estado='pagada')
-    capital_devuelto = cuotas_pagadas.aggregate(total=Coalesce(Sum('capital'), Decimal('0.00')))['total']
-    ganancia_realizada = cuotas_pagadas.aggregate(total=Coalesce(Sum('interes'), Decimal('0.00')))['total']
-    cartera_activa = total_desembolsado - capital_devuelto
+    dinero_en_caja = caja.saldo_actual()
+    cuotas_pagadas = Cuota.objects.filter(estado='pagada').aggregate(
+        capital=Coalesce(Sum('capital'), Decimal('0.00')),
+        interes=Coalesce(Sum('interes'), Decimal('0.00')),
+    )
+    capital_devuelto = cuotas_pagadas['capital']
+    ganancia_realizada = cuotas_pagadas['interes']
+    abonado = AbonoCapital.objects.aggregate(total=Coalesce(Sum('monto'), Decimal('0.00')))['total']
+    cartera_activa = total_desembolsado - capital_devuelto - abonado
     ganancia_potencial = Cuota.objects.filter(
         prestamo__estado='aprobado', 
         estado__in=['pendiente', 'pagada_parcialmente']
     ).aggregate(total=Coalesce(Sum('interes'), Decimal('0.00')))['total']
-    num_prestamos_activos = Prestamo.objects.filter(estado='aprobado').count()
-    num_prestamos_pagados = Prestamo.objects.filter(estado='pagado').count()
+    por_estado = Prestamo.objects.aggregate(
+        activos=Count('id', filter=Q(estado='aprobado')),
+        pagados=Count('id', filter=Q(estado='pagado')),
+    )
+    num_prestamos_activos = por_estado['activos']
+    num_prestamos_pagados = por_estado['pagados']
     hoy = timezone.now()
+    # Intereses en base devengado (filas de `devengar_intereses`, sin recalcular tablas).
+    devengado = devengo.resumen(timezone.localdate())
     prestamos_en_atraso = Prestamo.objects.filter(
         estado='aprobado',
         cuotas__fecha_vencimiento__lt=hoy,
@@ -531,8 +740,8 @@ def financial_details(request):
     ).distinct().count()
     total_prestamos = Prestamo.objects.count()
     monto_promedio = total_desembolsado / total_prestamos if total_prestamos > 0 else Decimal('0.00')
-    pagos_recientes = Pago.objects.order_by('-fecha_pago')[:10]
-    prestamos_recientes = Prestamo.objects.order_by('-fecha_desembolso')[:5]
+    pagos_recientes = Pago.objects.select_related('cuota__prestamo__cliente').order_by('-fecha_pago')[:10]
+    prestamos_recientes = Prestamo.objects.select_related('cliente').order_by('-fecha_desembolso')[:5]
     context = {
         'capital_inicial': capital_inicial,
         'total_desembolsado': total_desembolsado,
@@ -541,6 +750,8 @@ def financial_details(request):
         'cartera_activa': cartera_activa,
         'ganancia_realizada': ganancia_realizada,
         'ganancia_potencial': ganancia_potencial,
+        'interes_devengado_mes': devengado['mes'],
+        'interes_devengado_total': devengado['total'],
         'num_prestamos_activos': num_prestamos_activos,
         'num_prestamos_pagados': num_prestamos_pagados,
         'num_prestamos_en_atraso': prestamos_en_atraso,
@@ -550,6 +761,36 @@ def financial_details(request):
     }
     return render(request, 'dashboard/financial_details.html', context)
 
+@staff_member_required
+def sql_profile_api(request):
+    """
+    Devuelve en JSON las consultas SQL más costosas por vista (solo staff).
+    Acepta `?vista=<nombre>` y `?top=<n>`; con POST `limpiar=1` reinicia el acumulado.
+    """
+    if request.method == 'POST' and request.POST.get('limpiar'):
+        perfil.limpiar()
+    top = request.GET.get('top', '10')
+    data = {
+        'activo': settings.SQL_PROFILER,
+        'umbral_lenta_ms': settings.SQL_LENTA_MS,
+        'vistas': perfil.top(int(top) if top.isdigit() else 10, request.GET.get('vista')),
+    }
+    return JsonResponse(data)
+
+def metrics(request):
+    """
+    Métricas en formato de texto de Prometheus. Con METRICAS_TOKEN se exige
+    como Bearer (para el scraper); sin él, solo el staff con sesión puede verlas.
+    """
+    token = settings.METRICAS_TOKEN
+    if token:
+        autorizado = request.headers.get('Authorization') == f'Bearer {token}'
+    else:
+        autorizado = request.user.is_authenticated and request.user.is_staff
+    if not autorizado:
+        return HttpResponse('No autorizado', status=401, content_type='text/plain')
+    return HttpResponse(metricas_app.registro.exportar(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
 # --- Vistas del Portal de Clientes ---
 
 def client_login(request):
@@ -736,7 +977,7 @@ def request_loan(request):
 def loan_application_list(request):
     """Muestra una lista de todas las solicitudes de préstamo pendientes."""
     query = request.GET.get('q')
-    prestamos = Prestamo.objects.filter(estado='pendiente').select_related('cliente').order_by('-fecha_creacion')
+    prestamos = Prestamo.objects.filter(estado='pendiente').select_related('cliente', 'tipo_prestamo').order_by('-fecha_creacion')
     if query:
         prestamos = prestamos.filter(
             Q(id__icontains=query) |
@@ -776,27 +1017,10 @@ def loan_application_approve(request, pk):
         prestamo.fecha_aprobacion = timezone.now() # Asignar fecha de aprobación
         prestamo.save()
         
-        # Generar tabla de amortización solo si no existe
-        if not prestamo.cuotas.exists():
-            try:
-                tabla_amortizacion = calcular_tabla_amortizacion(prestamo)
-                for item_cuota in tabla_amortizacion:
-                    Cuota.objects.create(
-                        prestamo=prestamo,
-                        numero_cuota=item_cuota['numero_cuota'],
-                        fecha_vencimiento=item_cuota['fecha_vencimiento'],
-                        monto_cuota=item_cuota['cuota_fija'],
-                        capital=item_cuota['capital'],
-                        interes=item_cuota['interes'],
-                        saldo_pendiente=item_cuota['saldo_pendiente']
-                    )
-                messages.success(request, f"La solicitud de préstamo #{prestamo.id} ha sido aprobada y movida a préstamos activos.")
-            except Exception as e:
-                messages.error(request, f"Error al generar la tabla de amortización para el préstamo #{prestamo.id}: {e}")
-                prestamo.estado = 'pendiente' # Revertir estado si falla
-                prestamo.save()
-        else:
-            messages.success(request, f"La solicitud de préstamo #{prestamo.id} ha sido aprobada y movida a préstamos activos.")
+        prestamo.registrar_desembolso()
+        # La tabla de amortización la genera el worker (si el préstamo ya tiene cuotas, la tarea no hace nada).
+        trabajos.enqueue_unico('generar_cuotas', prioridad=10, prestamo_id=prestamo.pk)
+        messages.success(request, f"La solicitud de préstamo #{prestamo.id} ha sido aprobada y movida a préstamos activos.")
 
     return redirect('loan_application_list')
 
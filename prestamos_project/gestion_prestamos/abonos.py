@@ -0,0 +1,91 @@
+"""
+Abonos a capital con reamortización de las cuotas futuras.
+
+Un abono baja el capital pendiente y reemplaza solo las cuotas futuras (las
+pendientes, sin pagos y que todavía no vencen): se borran y se crean con
+`bulk_create` las de la nueva tabla (ver utils.generar_reamortizacion). Las
+cuotas pagadas, con pagos parciales o vencidas no se tocan. El cliente elige
+entre reducir el plazo (misma cuota, menos cuotas) o reducir la cuota (mismas
+fechas, cuota menor).
+
+La operación lee todas las cuotas del préstamo en una consulta y escribe en
+bloque, así la cantidad de consultas no depende del plazo restante. La TAE
+guardada se recalcula con la nueva tabla y el abono como un pago más.
+"""
+from django.db import transaction
+from django.utils import timezone
+
+from . import tae
+from .dinero import a_centavos, a_decimal
+from .models import AbonoCapital, Cuota, MovimientoCaja, Prestamo
+from .utils import REDUCIR_CUOTA, REDUCIR_PLAZO, generar_reamortizacion
+
+MODOS = (REDUCIR_PLAZO, REDUCIR_CUOTA)
+
+
+def cuotas_futuras(filas, hoy):
+    """
+    De las filas (id, numero, estado, vencimiento, monto, interes, capital)
+    de un préstamo, ordenadas por número, las del final que se pueden
+    reamortizar: pendientes y con vencimiento desde `hoy`.
+    """
+    futuras = []
+    for fila in reversed(filas):
+        if fila[2] != 'pendiente' or fila[3] < hoy:
+            break
+        futuras.append(fila)
+    return futuras[::-1]
+
+
+def abonar_capital(prestamo, monto, modo, hoy=None):
+    """
+    Aplica `monto` al capital de `prestamo` y reamortiza sus cuotas futuras.
+    Devuelve el `AbonoCapital` creado; lanza ValueError si el préstamo
+    no tiene cuotas futuras o el monto no está entre 0 y su capital.
+    """
+    if modo not in MODOS:
+        raise ValueError(f"Modo inválido: use '{REDUCIR_PLAZO}' o '{REDUCIR_CUOTA}'.")
+    hoy = hoy or timezone.localdate()
+    abono = a_centavos(monto)
+
+    with transaction.atomic():
+        prestamo = Prestamo.objects.select_for_update().select_related('tipo_prestamo').get(pk=prestamo.pk)
+        if prestamo.estado != 'aprobado':
+            raise ValueError('Solo se puede abonar a préstamos activos.')
+        filas = list(prestamo.cuotas.order_by('numero_cuota').values_list(
+            'id', 'numero_cuota', 'estado', 'fecha_vencimiento', 'monto_cuota', 'interes', 'capital'
+        ))
+        futuras = cuotas_futuras(filas, hoy)
+        if not futuras:
+            raise ValueError('El préstamo no tiene cuotas futuras para reamortizar.')
+        saldo = sum(a_centavos(fila[6]) for fila in futuras)
+        if not 0 < abono <= saldo:
+            raise ValueError(f'El abono debe ser mayor que cero y no superar el capital pendiente (${a_decimal(saldo):,.2f}).')
+
+        primera = futuras[0]
+        referencia = tuple(a_centavos(valor) for valor in primera[4:7])
+        nuevas = [
+            Cuota(
+                prestamo=prestamo, numero_cuota=primera[1] + i - 1, fecha_vencimiento=fecha,
+                monto_cuota=a_decimal(cuota), interes=a_decimal(interes), capital=a_decimal(capital),
+                saldo_pendiente=a_decimal(saldo_restante),
+            )
+            for i, fecha, cuota, interes, capital, saldo_restante in generar_reamortizacion(
+                prestamo, saldo - abono, [fila[3] for fila in futuras], modo, referencia
+            )
+        ]
+        Cuota.objects.filter(id__in=[fila[0] for fila in futuras]).delete()
+        Cuota.objects.bulk_create(nuevas)
+
+        registro = AbonoCapital.objects.create(
+            prestamo=prestamo, monto=a_decimal(abono), modo=modo,
+            saldo_anterior=a_decimal(saldo), saldo_nuevo=a_decimal(saldo - abono),
+            cuotas_anteriores=len(futuras), cuotas_nuevas=len(nuevas),
+            cuota_anterior=primera[4], cuota_nueva=nuevas[0].monto_cuota if nuevas else None,
+        )
+        MovimientoCaja.registrar('abono', registro.monto, f'Abono a capital del préstamo #{prestamo.id}', prestamo=prestamo)
+        tae.actualizar(Prestamo.objects.filter(pk=prestamo.pk))
+        # Un abono por todo el capital futuro salda el préstamo si no quedan cuotas por cobrar.
+        if not nuevas and all(fila[2] == 'pagada' for fila in filas[:len(filas) - len(futuras)]):
+            Prestamo.objects.filter(pk=prestamo.pk).update(estado='pagado')
+    return registro
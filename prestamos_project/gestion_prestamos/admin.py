@@ -1,5 +1,5 @@
 from django.contrib import admin, messages
-from .models import Cliente, Prestamo, Cuota, Pago, TipoPrestamo, Capital, TipoGasto, GastoPrestamo
+from .models import Cliente, Prestamo, Cuota, Pago, TipoPrestamo, Capital, TipoGasto, GastoPrestamo, DiaFeriado, Job, ScheduledTask, EjecucionPenalidades, MovimientoCaja, Cuenta, Asiento, SaldoCuentaPeriodo, DevengoInteres, CierreMensual, PeriodoCerrado, MoraMensual, SupuestoProyeccion, AbonoCapital
 from django.contrib.auth.models import User
 import secrets
 import string
@@ -89,7 +89,7 @@ class PrestamoAdmin(admin.ModelAdmin):
     search_fields = ('cliente__nombres', 'cliente__apellidos', 'id')
     list_filter = ('estado', 'frecuencia_pago', 'tipo_prestamo', 'fecha_desembolso')
     list_display_links = ('id', 'cliente')
-    readonly_fields = ('fecha_creacion', 'total_gastos_asociados', 'monto_desembolsado')
+    readonly_fields = ('fecha_creacion', 'total_gastos_asociados', 'monto_desembolsado', 'tae')
     inlines = [GastoPrestamoInline, CuotaInline]
 
     fieldsets = (
@@ -97,7 +97,7 @@ class PrestamoAdmin(admin.ModelAdmin):
             'fields': (('cliente', 'tipo_prestamo'), 'estado')
         }),
         ('Detalles Financieros', {
-            'fields': ('monto', ('tasa_interes', 'periodo_tasa'), 'manejo_gastos', 'total_gastos_asociados', 'monto_desembolsado')
+            'fields': ('monto', ('tasa_interes', 'periodo_tasa'), 'manejo_gastos', 'total_gastos_asociados', 'monto_desembolsado', 'tae')
         }),
         ('Plazos y Frecuencia', {
             'fields': (('plazo', 'frecuencia_pago'), ('fecha_desembolso', 'fecha_inicio_pago'))
@@ -125,4 +125,119 @@ class CapitalAdmin(admin.ModelAdmin):
 @admin.register(TipoGasto)
 class TipoGastoAdmin(admin.ModelAdmin):
     list_display = ('nombre', 'descripcion')
-    search_fields = ('nombre',)
\ No newline at end of file
+    search_fields = ('nombre',)
+
+@admin.register(DiaFeriado)
+class DiaFeriadoAdmin(admin.ModelAdmin):
+    list_display = ('fecha', 'descripcion')
+    search_fields = ('descripcion',)
+    date_hierarchy = 'fecha'
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'nombre', 'cola', 'estado', 'progreso', 'intentos', 'fecha_creacion', 'fecha_fin')
+    list_filter = ('estado', 'cola', 'nombre')
+    readonly_fields = ('intentos', 'progreso', 'mensaje_progreso', 'resultado', 'error', 'worker',
+                       'fecha_creacion', 'fecha_inicio', 'fecha_fin')
+
+@admin.register(ScheduledTask)
+class ScheduledTaskAdmin(admin.ModelAdmin):
+    list_display = ('nombre', 'tarea', 'intervalo_minutos', 'hora', 'activa', 'proxima_ejecucion',
+                    'ultima_ejecucion', 'ultimo_resultado', 'ultima_duracion')
+    list_filter = ('activa', 'ultimo_resultado')
+    readonly_fields = ('bloqueada_hasta', 'bloqueada_por', 'ultima_ejecucion', 'ultima_duracion', 'ultimo_resultado',
+                       'ultimo_error', 'ejecuciones', 'fallos', 'ejecuciones_omitidas')
+
+@admin.register(EjecucionPenalidades)
+class EjecucionPenalidadesAdmin(admin.ModelAdmin):
+    list_display = ('id', 'fecha_corte', 'estado', 'cuotas_actualizadas', 'monto_penalidades', 'fecha_inicio', 'fecha_fin')
+    list_filter = ('estado',)
+    date_hierarchy = 'fecha_corte'
+
+@admin.register(MovimientoCaja)
+class MovimientoCajaAdmin(admin.ModelAdmin):
+    list_display = ('secuencia', 'fecha', 'tipo', 'monto', 'saldo', 'descripcion')
+    list_filter = ('tipo',)
+    date_hierarchy = 'fecha'
+
+    # El libro es de solo anexar: se corrige con ajustes, no editando filas.
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+@admin.register(Cuenta)
+class CuentaAdmin(admin.ModelAdmin):
+    list_display = ('codigo', 'nombre', 'tipo')
+    list_filter = ('tipo',)
+
+@admin.register(Asiento)
+class AsientoAdmin(admin.ModelAdmin):
+    list_display = ('fecha', 'regla', 'referencia', 'cuenta_debe', 'cuenta_haber', 'monto', 'descripcion')
+    list_filter = ('regla', 'cuenta_debe', 'cuenta_haber')
+    search_fields = ('referencia', 'descripcion')
+    date_hierarchy = 'fecha'
+
+    # Los asientos se generan con `contabilizar`; editarlos descuadraría los saldos por período.
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+@admin.register(SaldoCuentaPeriodo)
+class SaldoCuentaPeriodoAdmin(admin.ModelAdmin):
+    list_display = ('periodo', 'cuenta', 'debe', 'haber')
+    list_filter = ('cuenta',)
+    date_hierarchy = 'periodo'
+
+@admin.register(DevengoInteres)
+class DevengoInteresAdmin(admin.ModelAdmin):
+    list_display = ('periodo', 'prestamo', 'fecha_corte', 'monto')
+    date_hierarchy = 'periodo'
+    raw_id_fields = ('prestamo',)
+
+class SoloLecturaAdmin(admin.ModelAdmin):
+    """Los cierres son instantáneas: se consultan, no se editan."""
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+@admin.register(CierreMensual)
+class CierreMensualAdmin(SoloLecturaAdmin):
+    list_display = ('periodo', 'prestamo', 'saldo_capital', 'interes_devengado', 'penalidades', 'pagos_recibidos', 'dias_atraso')
+    list_filter = ('periodo',)
+    raw_id_fields = ('prestamo',)
+
+@admin.register(PeriodoCerrado)
+class PeriodoCerradoAdmin(SoloLecturaAdmin):
+    list_display = ('periodo', 'fecha_cierre', 'prestamos', 'saldo_capital', 'interes_devengado', 'penalidades', 'pagos_recibidos')
+
+@admin.register(MoraMensual)
+class MoraMensualAdmin(SoloLecturaAdmin):
+    list_display = ('periodo', 'prestamo', 'cohorte', 'tramo', 'dias_atraso', 'saldo_capital')
+    list_filter = ('periodo', 'tramo')
+    raw_id_fields = ('prestamo',)
+
+@admin.register(SupuestoProyeccion)
+class SupuestoProyeccionAdmin(admin.ModelAdmin):
+    list_display = ('tipo_prestamo', 'tramo', 'tasa_incumplimiento', 'tasa_prepago', 'volatilidad', 'tasa_recuperacion')
+    list_filter = ('tipo_prestamo', 'tramo')
+
+@admin.register(AbonoCapital)
+class AbonoCapitalAdmin(SoloLecturaAdmin):
+    list_display = ('fecha', 'prestamo', 'monto', 'modo', 'saldo_anterior', 'saldo_nuevo', 'cuotas_anteriores', 'cuotas_nuevas')
+    list_filter = ('modo',)
+    raw_id_fields = ('prestamo',)
@@ -0,0 +1,94 @@
+"""
+Antigüedad de saldos (aging) de la cartera vencida.
+
+`matriz_antiguedad` agrupa las cuotas vencidas y no saldadas por tipo de
+préstamo y tramo de días de atraso (1-30, 31-60, 61-90 y más de 90) en una
+sola consulta: el tramo es un CASE sobre la fecha de vencimiento (los límites
+se calculan como fechas, así la condición usa el índice de `Cuota`) y el saldo
+de cada cuota es su monto más la penalidad menos la suma de sus pagos.
+"""
+import datetime
+from decimal import Decimal
+
+from django.db.models import Case, Count, DecimalField, F, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import Cuota, Pago
+
+CERO = Decimal('0.00')
+
+# (etiqueta, días de atraso mínimos): cada tramo va hasta el mínimo del siguiente.
+TRAMOS = [('1-30', 1), ('31-60', 31), ('61-90', 61), ('90+', 91)]
+
+ESTADOS_ABIERTOS = ('pendiente', 'pagada_parcialmente', 'vencida')
+
+SIN_TIPO = 'Sin tipo'
+
+
+def _tramo(hoy):
+    """CASE que asigna el tramo según la fecha de vencimiento."""
+    casos = [
+        When(fecha_vencimiento__gt=hoy - datetime.timedelta(days=siguiente), then=Value(etiqueta))
+        for (etiqueta, _), (_, siguiente) in zip(TRAMOS, TRAMOS[1:])
+    ]
+    return Case(*casos, default=Value(TRAMOS[-1][0]))
+
+
+DECIMAL = DecimalField(max_digits=14, decimal_places=2)
+
+
+def saldo_por_cobrar():
+    """Expresión SQL: monto de la cuota más la penalidad, menos la suma de sus pagos."""
+    pagado = (
+        Pago.objects.filter(cuota=OuterRef('pk')).order_by().values('cuota')
+        .annotate(total=Sum('monto_pagado')).values('total')
+    )
+    return (
+        F('monto_cuota') + F('monto_penalidad_acumulada')
+        - Coalesce(Subquery(pagado, output_field=DECIMAL), Value(CERO), output_field=DECIMAL)
+    )
+
+
+def saldos_por_tramo(hoy=None):
+    """
+    Filas (tipo de préstamo, tramo, cuotas, saldo) de la cartera vencida al
+    día `hoy`, calculadas con un único GROUP BY.
+    """
+    hoy = hoy or timezone.localdate()
+    return (
+        Cuota.objects.filter(estado__in=ESTADOS_ABIERTOS, fecha_vencimiento__lt=hoy)
+        .annotate(tramo=_tramo(hoy), saldo=saldo_por_cobrar())
+        .values('prestamo__tipo_prestamo__nombre', 'tramo')
+        .annotate(cuotas=Count('id'), monto=Sum('saldo', output_field=DECIMAL))
+        .order_by()
+    )
+
+
+def matriz_antiguedad(hoy=None):
+    """
+    Matriz tipo de préstamo x tramo con la cantidad de cuotas y el saldo.
+
+    Devuelve {'tramos': [...], 'filas': [...], 'totales': {...}}; cada fila
+    tiene 'tipo', 'celdas' (una por tramo, con 'cuotas' y 'monto'), 'cuotas'
+    y 'monto'. Los totales tienen la misma forma, sin 'tipo'.
+    """
+    etiquetas = [etiqueta for etiqueta, _ in TRAMOS]
+
+    def vacia():
+        return {'celdas': [{'cuotas': 0, 'monto': CERO} for _ in etiquetas], 'cuotas': 0, 'monto': CERO}
+
+    por_tipo = {}
+    totales = vacia()
+    for fila in saldos_por_tramo(hoy):
+        tipo = fila['prestamo__tipo_prestamo__nombre'] or SIN_TIPO
+        indice = etiquetas.index(fila['tramo'])
+        monto = fila['monto'] or CERO
+        for destino in (por_tipo.setdefault(tipo, vacia()), totales):
+            destino['celdas'][indice]['cuotas'] += fila['cuotas']
+            destino['celdas'][indice]['monto'] += monto
+            destino['cuotas'] += fila['cuotas']
+            destino['monto'] += monto
+
+    filas = [{'tipo': tipo, **datos} for tipo, datos in sorted(por_tipo.items())]
+    return {'tramos': etiquetas, 'filas': filas, 'totales': totales}
@@ -5,4 +5,5 @@ class PrestamosConfig(AppConfig):
     name = 'gestion_prestamos'
 
     def ready(self):
-        import gestion_prestamos.signals
\ No newline at end of file
+        import gestion_prestamos.signals
+        import gestion_prestamos.tareas
\ No newline at end of file
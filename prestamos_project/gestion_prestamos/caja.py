@@ -0,0 +1,175 @@
+"""
+Dinero en caja a partir del libro `MovimientoCaja`.
+
+Cada movimiento guarda el saldo acumulado, así que el dinero en caja actual es
+una lectura de la última fila. El de una fecha pasada suma los movimientos
+hasta esa fecha por el índice de `fecha`: el saldo guardado sigue el orden de
+anexado, no el de las fechas.
+
+Los movimientos se anexan desde los caminos que mueven dinero: el desembolso
+(`Prestamo.registrar_desembolso`, que también registra los gastos), el pago
+(`Prestamo.registrar_pago`), el abono a capital (abonos.py), el capital
+(signals.py) y las eliminaciones, que se compensan con un ajuste.
+`reconstruir` rehace el libro completo a partir del historial (lo usan la
+migración inicial y el comando `rebuild_caja`).
+"""
+import datetime
+import heapq
+import threading
+from contextlib import contextmanager
+from decimal import Decimal
+
+from django.apps import apps as apps_django
+from django.db import transaction
+from django.db.models import Min, Sum
+from django.utils import timezone
+
+from .models import Capital, MovimientoCaja
+
+CERO = Decimal('0.00')
+
+# Estados de un préstamo cuyo dinero ya salió de caja.
+ESTADOS_SIN_DESEMBOLSO = ('pendiente', 'rechazado')
+
+
+def saldo_actual():
+    """Dinero en caja: saldo del último movimiento."""
+    return MovimientoCaja.objects.order_by('-secuencia').values_list('saldo', flat=True).first() or CERO
+
+
+def saldo_al(fecha):
+    """
+    Dinero en caja al cierre del día `fecha`: suma de los movimientos fechados
+    hasta ese día. No se lee el `saldo` guardado porque se acumula en orden de
+    `secuencia`, y un movimiento con fecha anterior anexado después lo desfasa.
+    """
+    limite = timezone.make_aware(datetime.datetime.combine(fecha + datetime.timedelta(days=1), datetime.time.min))
+    return MovimientoCaja.objects.filter(fecha__lt=limite).aggregate(total=Sum('monto'))['total'] or CERO
+
+
+def sincronizar_capital():
+    """Registra como aporte (o ajuste) la diferencia entre el capital y lo ya anotado en caja."""
+    capital = Capital.objects.aggregate(total=Sum('monto_inicial'))['total'] or CERO
+    anotado = MovimientoCaja.objects.filter(tipo='capital').aggregate(total=Sum('monto'))['total'] or CERO
+    if capital != anotado:
+        MovimientoCaja.registrar('capital', capital - anotado, 'Capital de la empresa')
+
+
+_estado = threading.local()
+
+
+@contextmanager
+def sin_compensaciones():
+    """
+    Desactiva los ajustes por eliminación (p. ej. al borrar datos sintéticos
+    en bloque); quien lo usa debe reconstruir el libro al terminar.
+    """
+    _estado.desactivado = True
+    try:
+        yield
+    finally:
+        _estado.desactivado = False
+
+
+def compensando():
+    """False dentro de `sin_compensaciones`: las eliminaciones no generan ajustes ni anulaciones."""
+    return not getattr(_estado, 'desactivado', False)
+
+
+def revertir(descripcion, **filtro):
+    """Compensa con un ajuste el neto de los movimientos que cumplen `filtro` (p. ej. al borrar un pago)."""
+    if not compensando():
+        return
+    neto = MovimientoCaja.objects.filter(**filtro).aggregate(total=Sum('monto'))['total']
+    if neto:
+        MovimientoCaja.registrar('ajuste', -neto, descripcion)
+
+
+def _inicio_del_dia(fecha):
+    return timezone.make_aware(datetime.datetime.combine(fecha, datetime.time.min))
+
+
+def _eventos(apps):
+    """Desembolsos, gastos, pagos y abonos del historial, en orden cronológico (un solo recorrido)."""
+    Prestamo = apps.get_model('gestion_prestamos', 'Prestamo')
+    GastoPrestamo = apps.get_model('gestion_prestamos', 'GastoPrestamo')
+    Pago = apps.get_model('gestion_prestamos', 'Pago')
+
+    desembolsados = Prestamo.objects.exclude(estado__in=ESTADOS_SIN_DESEMBOLSO)
+    desembolsos = (
+        (_inicio_del_dia(fecha), 0, pk, 'desembolso', -(desembolsado or monto), f'Desembolso del préstamo #{pk}',
+         {'prestamo_id': pk})
+        for pk, fecha, desembolsado, monto in desembolsados.order_by('fecha_desembolso', 'id')
+        .values_list('id', 'fecha_desembolso', 'monto_desembolsado', 'monto').iterator()
+    )
+    gastos = (
+        (_inicio_del_dia(fecha), 1, pk, 'gasto', -monto, f'Gasto - préstamo #{prestamo_id}',
+         {'prestamo_id': prestamo_id, 'gasto_id': pk})
+        for pk, fecha, monto, prestamo_id in GastoPrestamo.objects.filter(prestamo__in=desembolsados)
+        .order_by('prestamo__fecha_desembolso', 'id')
+        .values_list('id', 'prestamo__fecha_desembolso', 'monto', 'prestamo_id').iterator()
+    )
+    pagos = (
+        (fecha, 2, pk, 'pago', monto, f'Pago del préstamo #{prestamo_id}', {'prestamo_id': prestamo_id, 'pago_id': pk})
+        for pk, fecha, monto, prestamo_id in Pago.objects.filter(monto_pagado__gt=0).order_by('fecha_pago', 'id')
+        .values_list('id', 'fecha_pago', 'monto_pagado', 'cuota__prestamo_id').iterator()
+    )
+    try:
+        AbonoCapital = apps.get_model('gestion_prestamos', 'AbonoCapital')
+    except LookupError:
+        # Las migraciones anteriores a los abonos reconstruyen el libro sin ellos.
+        abonos = ()
+    else:
+        abonos = (
+            (fecha, 3, pk, 'abono', monto, f'Abono a capital del préstamo #{prestamo_id}', {'prestamo_id': prestamo_id})
+            for pk, fecha, monto, prestamo_id in AbonoCapital.objects.order_by('fecha', 'id')
+            .values_list('id', 'fecha', 'monto', 'prestamo_id').iterator()
+        )
+    return heapq.merge(desembolsos, gastos, pagos, abonos, key=lambda evento: evento[:3])
+
+
+def reconstruir(apps=apps_django, tamano_lote=2000):
+    """
+    Borra el libro y lo rehace reproduciendo el historial en orden: el capital
+    primero y luego desembolsos, gastos, pagos y abonos. Devuelve los movimientos creados.
+    """
+    Capital = apps.get_model('gestion_prestamos', 'Capital')
+    Prestamo = apps.get_model('gestion_prestamos', 'Prestamo')
+    Pago = apps.get_model('gestion_prestamos', 'Pago')
+    MovimientoCaja = apps.get_model('gestion_prestamos', 'MovimientoCaja')
+
+    with transaction.atomic():
+        MovimientoCaja.objects.all().delete()
+        secuencia = 0
+        saldo = CERO
+        lote = []
+
+        capital = Capital.objects.aggregate(total=Sum('monto_inicial'), fecha=Min('fecha_registro'))
+        if capital['total']:
+            # El capital es lo primero que entra a caja aunque se haya cargado después.
+            primeras = [
+                capital['fecha'],
+                Pago.objects.aggregate(fecha=Min('fecha_pago'))['fecha'],
+            ]
+            primer_desembolso = Prestamo.objects.exclude(estado__in=ESTADOS_SIN_DESEMBOLSO).aggregate(
+                fecha=Min('fecha_desembolso'))['fecha']
+            if primer_desembolso:
+                primeras.append(_inicio_del_dia(primer_desembolso))
+            secuencia, saldo = 1, capital['total']
+            lote.append(MovimientoCaja(
+                secuencia=1, fecha=min(f for f in primeras if f), tipo='capital', monto=saldo, saldo=saldo,
+                descripcion='Capital de la empresa',
+            ))
+
+        for fecha, _, _, tipo, monto, descripcion, relaciones in _eventos(apps):
+            secuencia += 1
+            saldo += monto
+            lote.append(MovimientoCaja(
+                secuencia=secuencia, fecha=fecha, tipo=tipo, monto=monto, saldo=saldo, descripcion=descripcion,
+                **relaciones
+            ))
+            if len(lote) >= tamano_lote:
+                MovimientoCaja.objects.bulk_create(lote)
+                lote = []
+        MovimientoCaja.objects.bulk_create(lote)
+    return secuencia
@@ -0,0 +1,145 @@
+"""
+Calendario de vencimientos.
+
+Precalcula y guarda en caché las secuencias de fechas de vencimiento por
+(fecha de inicio, frecuencia, cantidad). Muchos préstamos comparten la misma
+fecha de desembolso y frecuencia, así que generar las tablas de miles de
+préstamos reutiliza las mismas secuencias en lugar de recalcularlas.
+
+También ajusta las fechas que caen en días no laborables (fines de semana y
+los feriados guardados en `DiaFeriado`) según la regla configurada en el
+tipo de préstamo. Lo usan la generación de tablas, el cálculo de los días de
+gracia de las penalidades y la agenda de cobros.
+"""
+import calendar
+import datetime
+import time
+from functools import lru_cache
+
+# Sábado y domingo (date.weekday()).
+DIAS_FIN_DE_SEMANA = (5, 6)
+
+# Los feriados se leen de la base de datos una vez y se refrescan al guardar o
+# borrar un `DiaFeriado` (ver signals.py). Otros procesos los recargan al vencer el TTL.
+TTL_FERIADOS = 300
+
+_feriados = {'fechas': None, 'cargado': 0.0}
+
+
+def _fecha_sin_ajuste(fecha_inicio, frecuencia, i):
+    """Fecha de vencimiento de la cuota `i` según la frecuencia de pago."""
+    if frecuencia == 'quincenal':
+        return fecha_inicio + datetime.timedelta(days=15 * i)
+    if frecuencia == 'semanal':
+        return fecha_inicio + datetime.timedelta(weeks=i)
+    # Mensual (y por defecto): mismo día del mes, ajustado al último día si no existe.
+    año_futuro = fecha_inicio.year + (fecha_inicio.month + i - 1) // 12
+    mes_futuro = (fecha_inicio.month + i - 1) % 12 + 1
+    ultimo_dia_del_mes = calendar.monthrange(año_futuro, mes_futuro)[1]
+    dia_vencimiento = min(fecha_inicio.day, ultimo_dia_del_mes)
+    return datetime.date(año_futuro, mes_futuro, dia_vencimiento)
+
+
+@lru_cache(maxsize=4096)
+def _secuencia(fecha_inicio, frecuencia, cantidad):
+    return tuple(_fecha_sin_ajuste(fecha_inicio, frecuencia, i) for i in range(1, cantidad + 1))
+
+
+# Recibe el conjunto de feriados (no lo lee de `_feriados`): forma parte de la
+# clave de la caché, así una invalidación concurrente no mezcla dos versiones.
+@lru_cache(maxsize=4096)
+def _secuencia_ajustada(fecha_inicio, frecuencia, cantidad, ajuste, fechas_feriado):
+    return tuple(
+        _ajustar(fecha, ajuste, fechas_feriado)
+        for fecha in _secuencia(fecha_inicio, frecuencia, cantidad)
+    )
+
+
+def feriados():
+    """Devuelve el conjunto de fechas feriadas, leyéndolo de la BD si hace falta."""
+    fechas = _feriados['fechas']
+    if fechas is None or time.monotonic() - _feriados['cargado'] > TTL_FERIADOS:
+        from .models import DiaFeriado
+        leidas = frozenset(DiaFeriado.objects.values_list('fecha', flat=True))
+        # Si no cambiaron se conserva el mismo objeto: las claves de `_secuencia_ajustada` siguen sirviendo.
+        if leidas != fechas:
+            fechas = leidas
+        _feriados['fechas'] = fechas
+        _feriados['cargado'] = time.monotonic()
+    return fechas
+
+
+def invalidar_feriados():
+    """Obliga a recargar los feriados en la próxima consulta."""
+    _feriados['fechas'] = None
+
+
+def _es_habil(fecha, fechas_feriado):
+    return fecha.weekday() not in DIAS_FIN_DE_SEMANA and fecha not in fechas_feriado
+
+
+def _ajustar(fecha, ajuste, fechas_feriado):
+    if ajuste == 'ninguno' or _es_habil(fecha, fechas_feriado):
+        return fecha
+    paso = -1 if ajuste == 'anterior' else 1
+    ajustada = fecha
+    while not _es_habil(ajustada, fechas_feriado):
+        ajustada += datetime.timedelta(days=paso)
+    if ajuste == 'siguiente_modificado' and ajustada.month != fecha.month:
+        # No se permite saltar al mes siguiente: se retrocede al último día hábil.
+        ajustada = fecha
+        while not _es_habil(ajustada, fechas_feriado):
+            ajustada -= datetime.timedelta(days=1)
+    return ajustada
+
+
+def es_dia_habil(fecha):
+    """Indica si la fecha no es fin de semana ni feriado."""
+    return _es_habil(fecha, feriados())
+
+
+def ajustar_fecha(fecha, ajuste):
+    """
+    Mueve una fecha no laborable según la regla de ajuste:
+    'ninguno', 'siguiente', 'anterior' o 'siguiente_modificado'.
+    """
+    if ajuste == 'ninguno':
+        return fecha
+    return _ajustar(fecha, ajuste, feriados())
+
+
+def siguiente_dia_habil(fecha):
+    """Primer día hábil estrictamente posterior a `fecha`."""
+    return ajustar_fecha(fecha + datetime.timedelta(days=1), 'siguiente')
+
+
+def fechas_vencimiento(fecha_inicio, frecuencia, cantidad, ajuste='ninguno'):
+    """
+    Devuelve la secuencia (tupla) de fechas de vencimiento de `cantidad` cuotas.
+
+    Args:
+        fecha_inicio (date): Fecha de desembolso.
+        frecuencia (str): 'semanal', 'quincenal' o 'mensual'.
+        cantidad (int): Número de cuotas.
+        ajuste (str): Regla para días no laborables (ver `ajustar_fecha`).
+    """
+    if ajuste == 'ninguno':
+        return _secuencia(fecha_inicio, frecuencia, cantidad)
+    return _secuencia_ajustada(fecha_inicio, frecuencia, cantidad, ajuste, feriados())
+
+
+def ajuste_de(tipo_prestamo):
+    """Regla de ajuste configurada en el tipo de préstamo ('ninguno' si no hay tipo)."""
+    return tipo_prestamo.ajuste_dia_no_laborable if tipo_prestamo else 'ninguno'
+
+
+def fecha_inicio_penalidad(fecha_vencimiento, tipo_prestamo):
+    """
+    Fecha a partir de la cual una cuota vencida empieza a generar penalidad.
+    Si el tipo de préstamo ajusta días no laborables, el fin del período de
+    gracia se traslada al siguiente día hábil.
+    """
+    fecha = fecha_vencimiento + datetime.timedelta(days=tipo_prestamo.dias_gracia)
+    if ajuste_de(tipo_prestamo) == 'ninguno':
+        return fecha
+    return ajustar_fecha(fecha, 'siguiente')
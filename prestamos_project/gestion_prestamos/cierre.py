@@ -0,0 +1,123 @@
+"""
+Cierre mensual de la cartera.
+
+Para cada préstamo desembolsado antes de fin de mes calcula, a partir del
+historial (no del estado actual de las cuotas):
+
+- saldo de capital al cierre: capital de las cuotas menos lo recuperado, con
+  los pagos aplicados primero al interés, luego al capital y al final a la
+  penalidad (la misma regla que la contabilidad);
+- interés devengado en el mes (ver devengo.py);
+- penalidad generada en el mes, con el motor a fecha de penalidades.py;
+- pagos recibidos en el mes;
+- días de atraso al cierre de la cuota impaga más antigua.
+
+`calcular_bloque` trabaja sobre un rango de ids de préstamos y solo lee, así
+que los bloques se pueden repartir entre procesos; el comando `cierre_mensual`
+junta los resultados y escribe las filas `CierreMensual` y el `PeriodoCerrado`
+en una sola transacción.
+"""
+import datetime
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Count, Sum
+
+from .calendario import fecha_inicio_penalidad
+from .dinero import a_centavos, a_decimal
+from .devengo import devengado_por_prestamo
+from .models import CierreMensual, Cuota, Pago, PeriodoCerrado, Prestamo, TipoPrestamo
+from .penalidades import inicio_del_dia, pagos_por_dia, penalidad_en_intervalo
+
+# Un préstamo en estos estados todavía no se desembolsó.
+ESTADOS_SIN_DESEMBOLSO = ('pendiente', 'rechazado')
+
+
+def limites_del_mes(periodo):
+    """(primer día del mes, primer día del mes siguiente)."""
+    inicio = periodo.replace(day=1)
+    return inicio, (inicio + datetime.timedelta(days=32)).replace(day=1)
+
+
+def prestamos_del_cierre(periodo):
+    """Préstamos que entran en el cierre del mes de `periodo`."""
+    _, fin = limites_del_mes(periodo)
+    return Prestamo.objects.filter(fecha_desembolso__lt=fin).exclude(estado__in=ESTADOS_SIN_DESEMBOLSO)
+
+
+def calcular_bloque(desde_id, hasta_id, periodo):
+    """
+    Cifras de cierre de los préstamos con id en [desde_id, hasta_id], como
+    diccionarios listos para crear `CierreMensual` (se pueden enviar entre procesos).
+    """
+    inicio, fin = limites_del_mes(periodo)
+    ultimo_dia = fin - datetime.timedelta(days=1)
+    prestamos = prestamos_del_cierre(periodo).filter(id__gte=desde_id, id__lte=hasta_id)
+    tipos = {tipo.id: tipo for tipo in TipoPrestamo.objects.all()}
+
+    pagos = defaultdict(list)
+    filas_pagos = (
+        Pago.objects.filter(cuota__prestamo__in=prestamos, fecha_pago__lt=inicio_del_dia(fin))
+        .order_by('cuota_id', 'fecha_pago', 'id')
+        .values_list('cuota_id', 'fecha_pago', 'monto_pagado')
+    )
+    for cuota_id, fecha_pago, monto in filas_pagos.iterator():
+        pagos[cuota_id].append((fecha_pago, monto))
+
+    cierres = {
+        prestamo_id: {
+            'prestamo_id': prestamo_id, 'saldo_capital': 0, 'interes_devengado': 0, 'penalidades': 0,
+            'pagos_recibidos': 0, 'dias_atraso': 0,
+        }
+        for prestamo_id in prestamos.values_list('id', flat=True)
+    }
+    cuotas = (
+        Cuota.objects.filter(prestamo__in=prestamos).order_by('prestamo_id', 'numero_cuota')
+        .values_list('id', 'prestamo_id', 'prestamo__tipo_prestamo_id', 'fecha_vencimiento', 'monto_cuota', 'capital', 'interes')
+    )
+    for cuota_id, prestamo_id, tipo_id, vencimiento, monto_cuota, capital, interes in cuotas.iterator():
+        cierre = cierres[prestamo_id]
+        pagos_cuota = pagos_por_dia(pagos.get(cuota_id, []))
+        pagado = sum(monto for _, monto in pagos_cuota)
+        cierre['pagos_recibidos'] += sum(monto for fecha, monto in pagos_cuota if fecha >= inicio)
+
+        capital_c, interes_c, monto_c = a_centavos(capital), a_centavos(interes), a_centavos(monto_cuota)
+        cierre['saldo_capital'] += capital_c - min(capital_c, max(0, pagado - interes_c))
+
+        if vencimiento < ultimo_dia and pagado < monto_c and not cierre['dias_atraso']:
+            cierre['dias_atraso'] = (ultimo_dia - vencimiento).days
+        tipo = tipos.get(tipo_id)
+        if tipo and vencimiento < fin:
+            cierre['penalidades'] += penalidad_en_intervalo(
+                monto_c, tipo.tasa_penalidad_diaria, fecha_inicio_penalidad(vencimiento, tipo), inicio, fin, pagos_cuota
+            )
+
+    devengado = devengado_por_prestamo(inicio, fin, Cuota.objects.filter(prestamo__in=prestamos))
+    for prestamo_id, centavos in devengado.items():
+        cierres[prestamo_id]['interes_devengado'] = centavos
+
+    for cierre in cierres.values():
+        for campo in ('saldo_capital', 'interes_devengado', 'penalidades', 'pagos_recibidos'):
+            cierre[campo] = a_decimal(cierre[campo])
+    return list(cierres.values())
+
+
+def bloques(periodo, tamano_bloque):
+    """Rangos [desde_id, hasta_id] de préstamos del cierre, de `tamano_bloque` préstamos cada uno."""
+    ids = list(prestamos_del_cierre(periodo).order_by('id').values_list('id', flat=True))
+    return [[ids[i], ids[min(i + tamano_bloque, len(ids)) - 1]] for i in range(0, len(ids), tamano_bloque)]
+
+
+def guardar_cierre(periodo, filas):
+    """Escribe las instantáneas del mes y lo marca cerrado. Devuelve el `PeriodoCerrado`."""
+    periodo = periodo.replace(day=1)
+    with transaction.atomic():
+        CierreMensual.objects.bulk_create(
+            [CierreMensual(periodo=periodo, **fila) for fila in filas], batch_size=2000
+        )
+        totales = CierreMensual.objects.filter(periodo=periodo).aggregate(
+            prestamos=Count('id'), saldo_capital=Sum('saldo_capital', default=0),
+            interes_devengado=Sum('interes_devengado', default=0), penalidades=Sum('penalidades', default=0),
+            pagos_recibidos=Sum('pagos_recibidos', default=0),
+        )
+        return PeriodoCerrado.objects.create(periodo=periodo, **totales)
@@ -0,0 +1,280 @@
+"""
+Contabilidad por partida doble.
+
+Cada `Asiento` mueve un monto de una cuenta (debe) a otra (haber). Las reglas
+de contabilización convierten la actividad de un día en asientos:
+
+- Capital:     Caja / Capital social.
+- Desembolso:  Cartera de préstamos / Caja, por lo entregado al cliente.
+- Gasto:       Gastos de préstamos / Caja (se paga el gasto) y
+               Cartera de préstamos / Recuperación de gastos (el gasto forma
+               parte del monto que el cliente devuelve).
+- Pago:        Caja / Ingresos por intereses, Cartera de préstamos (capital)
+               e Ingresos por penalidades. Lo pagado de cada cuota se aplica
+               primero al interés, luego al capital y por último a la penalidad.
+- Abono:       Caja / Cartera de préstamos, por todo el monto abonado a capital.
+
+`contabilizar_dia` arma los asientos del día en memoria y los inserta con
+`bulk_create`; es idempotente porque cada asiento lleva una referencia única a
+su origen (p. ej. 'pago:125'). Al mismo tiempo suma los montos en
+`SaldoCuentaPeriodo` (una fila por cuenta y mes), así la balanza de
+comprobación lee unas pocas filas en lugar de recorrer todos los asientos.
+
+Los días contabilizados no quedan cerrados:
+
+- Un pago, abono o aporte cargado con fecha pasada (o un préstamo aprobado
+  con una fecha de desembolso ya contabilizada) no tiene asiento;
+  `contabilizar_atrasados` busca esos días y los vuelve a contabilizar.
+- Al borrar un pago, un gasto o un préstamo, `anular` registra con fecha de
+  hoy la contrapartida de sus asientos (ver signals.py).
+"""
+import datetime
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import CharField, Exists, OuterRef, Sum, Value
+from django.db.models.functions import Cast, Concat
+from django.utils import timezone
+
+from .models import AbonoCapital, Asiento, Capital, Cuenta, GastoPrestamo, Pago, Prestamo, SaldoCuentaPeriodo
+
+CERO = Decimal('0.00')
+
+# Códigos del catálogo de cuentas (creado en la migración 0036).
+CAJA = '1101'
+CARTERA = '1201'
+CAPITAL_SOCIAL = '3101'
+INGRESOS_INTERESES = '4101'
+INGRESOS_PENALIDADES = '4102'
+RECUPERACION_GASTOS = '4103'
+GASTOS_PRESTAMOS = '5101'
+
+# Un préstamo en estos estados todavía no se desembolsó.
+ESTADOS_SIN_DESEMBOLSO = ('pendiente', 'rechazado')
+
+
+def periodo_de(fecha):
+    """Primer día del mes de `fecha` (clave de período de los saldos)."""
+    return fecha.replace(day=1)
+
+
+def _rango_del_dia(fecha):
+    inicio = timezone.make_aware(datetime.datetime.combine(fecha, datetime.time.min))
+    return inicio, inicio + datetime.timedelta(days=1)
+
+
+def distribuir_pago(pagado_antes, monto, interes, capital):
+    """
+    Divide un pago de una cuota en (interés, capital, penalidad) según lo que
+    ya se había pagado de esa cuota: interés primero, luego capital, y el
+    resto a la penalidad.
+    """
+    partes = []
+    inicio, fin = pagado_antes, pagado_antes + monto
+    for limite_inferior, limite_superior in ((CERO, interes), (interes, interes + capital)):
+        partes.append(max(CERO, min(fin, limite_superior) - max(inicio, limite_inferior)))
+    partes.append(monto - sum(partes))
+    return tuple(partes)
+
+
+def asientos_del_dia(fecha):
+    """
+    Genera los asientos de la actividad de `fecha` como tuplas
+    (regla, referencia, debe, haber, monto, descripcion, prestamo_id).
+    """
+    inicio, fin = _rango_del_dia(fecha)
+
+    for pk, monto in Capital.objects.filter(fecha_registro__gte=inicio, fecha_registro__lt=fin).values_list('id', 'monto_inicial'):
+        yield 'capital', f'capital:{pk}', CAJA, CAPITAL_SOCIAL, monto, 'Aporte de capital', None
+
+    desembolsados = Prestamo.objects.filter(fecha_desembolso=fecha).exclude(estado__in=ESTADOS_SIN_DESEMBOLSO)
+    for pk, desembolsado, monto in desembolsados.values_list('id', 'monto_desembolsado', 'monto'):
+        yield 'desembolso', f'prestamo:{pk}', CARTERA, CAJA, desembolsado or monto, f'Desembolso del préstamo #{pk}', pk
+
+    gastos = GastoPrestamo.objects.filter(prestamo__in=desembolsados).values_list('id', 'monto', 'prestamo_id', 'tipo_gasto__nombre')
+    for pk, monto, prestamo_id, tipo in gastos:
+        yield 'gasto', f'gasto:{pk}', GASTOS_PRESTAMOS, CAJA, monto, f'{tipo} - préstamo #{prestamo_id}', prestamo_id
+        yield 'gasto_financiado', f'gasto:{pk}', CARTERA, RECUPERACION_GASTOS, monto, f'{tipo} a cargo del cliente - préstamo #{prestamo_id}', prestamo_id
+
+    abonos = AbonoCapital.objects.filter(fecha__gte=inicio, fecha__lt=fin).values_list('id', 'monto', 'prestamo_id')
+    for pk, monto, prestamo_id in abonos:
+        yield 'abono_capital', f'abono:{pk}', CAJA, CARTERA, monto, f'Abono a capital del préstamo #{prestamo_id}', prestamo_id
+
+    # Para repartir cada pago hace falta lo pagado antes en la misma cuota:
+    # se recorren en orden todos los pagos de las cuotas que recibieron pagos hoy.
+    cuotas_del_dia = Pago.objects.filter(fecha_pago__gte=inicio, fecha_pago__lt=fin).values('cuota_id')
+    pagos = (
+        Pago.objects.filter(cuota_id__in=cuotas_del_dia, fecha_pago__lt=fin)
+        .order_by('cuota_id', 'fecha_pago', 'id')
+        .values_list('id', 'cuota_id', 'fecha_pago', 'monto_pagado', 'cuota__interes', 'cuota__capital',
+                     'cuota__prestamo_id', 'cuota__numero_cuota')
+    )
+    cuota_actual, pagado_antes = None, CERO
+    for pk, cuota_id, fecha_pago, monto, interes, capital, prestamo_id, numero in pagos.iterator():
+        if cuota_id != cuota_actual:
+            cuota_actual, pagado_antes = cuota_id, CERO
+        if fecha_pago >= inicio and monto > 0:
+            a_interes, a_capital, a_penalidad = distribuir_pago(pagado_antes, monto, interes, capital)
+            descripcion = f'Pago cuota #{numero} del préstamo #{prestamo_id}'
+            for regla, haber, parte in (
+                ('pago_interes', INGRESOS_INTERESES, a_interes),
+                ('pago_capital', CARTERA, a_capital),
+                ('pago_penalidad', INGRESOS_PENALIDADES, a_penalidad),
+            ):
+                if parte:
+                    yield regla, f'pago:{pk}', CAJA, haber, parte, descripcion, prestamo_id
+        pagado_antes += monto
+
+
+def contabilizar_dia(fecha):
+    """
+    Contabiliza la actividad de `fecha`: inserta en bloque los asientos que
+    todavía no existen y actualiza los saldos del período. Devuelve cuántos
+    asientos creó.
+    """
+    cuentas = dict(Cuenta.objects.values_list('codigo', 'id'))
+    candidatos = list(asientos_del_dia(fecha))
+    if not candidatos:
+        return 0
+
+    with transaction.atomic():
+        existentes = set(
+            Asiento.objects.filter(referencia__in={c[1] for c in candidatos}).values_list('regla', 'referencia')
+        )
+        nuevos = [
+            Asiento(
+                fecha=fecha, regla=regla, referencia=referencia, cuenta_debe_id=cuentas[debe],
+                cuenta_haber_id=cuentas[haber], monto=monto, descripcion=descripcion[:255], prestamo_id=prestamo_id,
+            )
+            for regla, referencia, debe, haber, monto, descripcion, prestamo_id in candidatos
+            if (regla, referencia) not in existentes
+        ]
+        Asiento.objects.bulk_create(nuevos)
+        acumular_saldos(nuevos)
+    return len(nuevos)
+
+
+def _sin_asiento(prefijo, reglas):
+    """Filtro: el objeto de la fila no tiene asientos de `reglas` con referencia `prefijo` + pk."""
+    referencia = Concat(Value(prefijo), Cast(OuterRef('pk'), CharField()), output_field=CharField())
+    return ~Exists(Asiento.objects.filter(regla__in=reglas, referencia=referencia))
+
+
+def dias_sin_contabilizar(hasta):
+    """Días anteriores a `hasta` con actividad que todavía no tiene asiento, en orden."""
+    limite, _ = _rango_del_dia(hasta)
+    momentos = [
+        *Capital.objects.filter(_sin_asiento('capital:', ['capital']), fecha_registro__lt=limite)
+        .values_list('fecha_registro', flat=True),
+        *Pago.objects.filter(
+            _sin_asiento('pago:', ['pago_interes', 'pago_capital', 'pago_penalidad']), monto_pagado__gt=0, fecha_pago__lt=limite,
+        ).values_list('fecha_pago', flat=True),
+        *AbonoCapital.objects.filter(_sin_asiento('abono:', ['abono_capital']), fecha__lt=limite).values_list('fecha', flat=True),
+    ]
+    dias = {timezone.localdate(momento) for momento in momentos}
+
+    desembolsados = Prestamo.objects.filter(fecha_desembolso__lt=hasta).exclude(estado__in=ESTADOS_SIN_DESEMBOLSO)
+    dias.update(desembolsados.filter(_sin_asiento('prestamo:', ['desembolso'])).values_list('fecha_desembolso', flat=True))
+    dias.update(
+        GastoPrestamo.objects.filter(_sin_asiento('gasto:', ['gasto']), prestamo__in=desembolsados)
+        .values_list('prestamo__fecha_desembolso', flat=True)
+    )
+    return sorted(dias)
+
+
+def contabilizar_atrasados(hasta):
+    """
+    Vuelve a contabilizar los días anteriores a `hasta` con actividad sin
+    asiento (cargada con fecha pasada). Devuelve (días, asientos creados).
+    """
+    dias = dias_sin_contabilizar(hasta)
+    return len(dias), sum(contabilizar_dia(dia) for dia in dias)
+
+
+def anular(referencia, fecha=None):
+    """
+    Registra la contrapartida de los asientos con `referencia` (p. ej.
+    'pago:125') cuando se borra su origen: mismos montos con el debe y el
+    haber invertidos, fechados `fecha` (hoy por omisión). Devuelve cuántos creó.
+    """
+    originales = list(Asiento.objects.filter(referencia=referencia))
+    if not originales:
+        return 0
+    fecha = fecha or timezone.localdate()
+    reversos = [
+        Asiento(
+            fecha=fecha, regla=asiento.regla, referencia=f'anulacion:{referencia}', cuenta_debe_id=asiento.cuenta_haber_id,
+            cuenta_haber_id=asiento.cuenta_debe_id, monto=asiento.monto,
+            descripcion=f'Anulación: {asiento.descripcion}'[:255], prestamo_id=asiento.prestamo_id,
+        )
+        for asiento in originales
+    ]
+    with transaction.atomic():
+        Asiento.objects.bulk_create(reversos)
+        acumular_saldos(reversos)
+    return len(reversos)
+
+
+def acumular_saldos(asientos):
+    """Suma los asientos a `SaldoCuentaPeriodo` (crea las filas que falten)."""
+    sumas = defaultdict(lambda: [CERO, CERO])
+    for asiento in asientos:
+        periodo = periodo_de(asiento.fecha)
+        sumas[(asiento.cuenta_debe_id, periodo)][0] += asiento.monto
+        sumas[(asiento.cuenta_haber_id, periodo)][1] += asiento.monto
+    if not sumas:
+        return
+
+    periodos = {periodo for _, periodo in sumas}
+    filas = {
+        (fila.cuenta_id, fila.periodo): fila
+        for fila in SaldoCuentaPeriodo.objects.select_for_update().filter(periodo__in=periodos)
+    }
+    nuevas = []
+    for (cuenta_id, periodo), (debe, haber) in sumas.items():
+        fila = filas.get((cuenta_id, periodo))
+        if fila is None:
+            nuevas.append(SaldoCuentaPeriodo(cuenta_id=cuenta_id, periodo=periodo, debe=debe, haber=haber))
+        else:
+            fila.debe += debe
+            fila.haber += haber
+    SaldoCuentaPeriodo.objects.bulk_update([f for clave, f in filas.items() if clave in sumas], ['debe', 'haber'])
+    SaldoCuentaPeriodo.objects.bulk_create(nuevas)
+
+
+def recalcular_saldos():
+    """Rehace `SaldoCuentaPeriodo` desde los asientos (por si se editaron a mano)."""
+    with transaction.atomic():
+        SaldoCuentaPeriodo.objects.all().delete()
+        for inicio in Asiento.objects.dates('fecha', 'month'):
+            acumular_saldos(Asiento.objects.filter(fecha__year=inicio.year, fecha__month=inicio.month).only(
+                'fecha', 'monto', 'cuenta_debe_id', 'cuenta_haber_id'
+            ).iterator())
+
+
+def balanza_de_comprobacion(periodo):
+    """
+    Balanza al cierre del mes de `periodo`: por cuenta, los movimientos del mes
+    y el saldo acumulado (positivo = deudor). Lee solo `SaldoCuentaPeriodo`.
+    """
+    periodo = periodo_de(periodo)
+    acumulados = {
+        cuenta_id: debe - haber
+        for cuenta_id, debe, haber in SaldoCuentaPeriodo.objects.filter(periodo__lte=periodo)
+        .values('cuenta_id').annotate(debe=Sum('debe'), haber=Sum('haber'))
+        .values_list('cuenta_id', 'debe', 'haber')
+    }
+    del_mes = {fila.cuenta_id: fila for fila in SaldoCuentaPeriodo.objects.filter(periodo=periodo)}
+    filas = []
+    for cuenta in Cuenta.objects.order_by('codigo'):
+        mes = del_mes.get(cuenta.id)
+        filas.append({
+            'codigo': cuenta.codigo,
+            'nombre': cuenta.nombre,
+            'tipo': cuenta.tipo,
+            'debe': mes.debe if mes else CERO,
+            'haber': mes.haber if mes else CERO,
+            'saldo': acumulados.get(cuenta.id) or CERO,
+        })
+    return filas
@@ -0,0 +1,98 @@
+"""
+Núcleo de aritmética de dinero en centavos enteros.
+
+Los cálculos repetitivos (tablas de amortización, penalidades, distribución de
+pagos) trabajan con enteros de Python en lugar de `Decimal`. La conversión a
+`Decimal` se hace solo en el borde con los modelos (al crear una `Cuota`, un
+`Pago` o al responder JSON).
+
+Reglas de redondeo:
+  - Todos los montos visibles se expresan en centavos enteros.
+  - Los valores intermedios que arrastran fracciones de centavo (saldo e interés
+    de una tabla) se guardan en punto fijo binario: centavos × 2**BITS_FRACCION.
+    Así pasar a centavos es un desplazamiento de bits en lugar de una división.
+  - Toda conversión a centavos redondea al entero más cercano y, en caso de
+    empate exacto, al par (ROUND_HALF_EVEN). Es la misma regla que aplica
+    `Decimal.quantize` con el contexto por defecto, por lo que los resultados
+    coinciden al centavo con los cálculos anteriores hechos con `Decimal`.
+"""
+from decimal import Decimal, ROUND_HALF_EVEN
+from math import gcd
+
+CENTAVO = Decimal('0.01')
+
+# Bits de fracción por centavo (~1e-18 de centavo). Es suficiente para que el
+# error acumulado en una tabla de cientos de cuotas no alcance medio centavo.
+BITS_FRACCION = 60
+FRACCION = 1 << BITS_FRACCION
+_MASCARA = FRACCION - 1
+_MEDIO = FRACCION >> 1
+
+
+def dividir(numerador, denominador):
+    """
+    División entera con redondeo al más cercano, empates al par (ROUND_HALF_EVEN).
+    El denominador debe ser positivo.
+    """
+    cociente, resto = divmod(numerador, denominador)
+    resto *= 2
+    if resto > denominador or (resto == denominador and cociente & 1):
+        cociente += 1
+    return cociente
+
+
+def a_punto_fijo(centavos):
+    """Convierte centavos enteros a punto fijo."""
+    return centavos << BITS_FRACCION
+
+
+def de_punto_fijo(valor):
+    """Redondea un valor en punto fijo a centavos enteros (ROUND_HALF_EVEN)."""
+    centavos = valor >> BITS_FRACCION
+    resto = valor & _MASCARA
+    if resto > _MEDIO or (resto == _MEDIO and centavos & 1):
+        centavos += 1
+    return centavos
+
+
+def reducir(numerador, denominador):
+    """Simplifica una fracción para que las multiplicaciones usen enteros pequeños."""
+    divisor = gcd(numerador, denominador) or 1
+    return numerador // divisor, denominador // divisor
+
+
+def a_centavos(valor):
+    """
+    Convierte un monto en unidades de moneda (`Decimal`, `int` o `str`) a
+    centavos enteros: `a_centavos(5)` es 500. Nunca recibe centavos; los
+    valores que ya están en centavos (filas de `generar_tabla_centavos`,
+    resultados de `dividir`) se usan tal cual o se pasan a `a_decimal`.
+    """
+    if valor is None:
+        return 0
+    if isinstance(valor, int):
+        return valor * 100
+    return int(Decimal(valor).quantize(CENTAVO, rounding=ROUND_HALF_EVEN).scaleb(2))
+
+
+def a_decimal(centavos):
+    """Convierte centavos enteros a un `Decimal` con dos decimales."""
+    return Decimal(centavos) * CENTAVO
+
+
+def a_fraccion(valor):
+    """Convierte un `Decimal` (tasa, porcentaje) a una fracción exacta (numerador, denominador)."""
+    return Decimal(valor).as_integer_ratio()
+
+
+def penalidad_centavos(base_centavos, tasa_diaria, dias):
+    """
+    Penalidad por mora en centavos: base × tasa diaria × días, redondeada al centavo.
+
+    Args:
+        base_centavos (int): Monto sobre el que se aplica la penalidad.
+        tasa_diaria (Decimal): Tasa diaria como fracción (ej. 0.01 para 1%).
+        dias (int): Días de atraso a cobrar.
+    """
+    numerador, denominador = a_fraccion(tasa_diaria)
+    return dividir(base_centavos * numerador * dias, denominador)
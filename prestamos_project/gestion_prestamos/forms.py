@@ -1,7 +1,8 @@
 from django import forms
-from .models import Cliente, Prestamo, Pago, Cuota, TipoPrestamo, GastoPrestamo, TipoGasto, Requisito, Garante
+from .models import AbonoCapital, Cliente, Prestamo, Pago, Cuota, TipoPrestamo, GastoPrestamo, TipoGasto, Requisito, Garante
 from django_select2.forms import Select2Widget
 from datetime import date
+from decimal import Decimal
 import re
 
 # Django ModelForm para el modelo Cliente.
@@ -247,6 +248,21 @@ class PagoForm(forms.Form):
         widget=forms.NumberInput(attrs={'class': 'form-control'})
     )
 
+class AbonoCapitalForm(forms.Form):
+    monto = forms.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        min_value=Decimal('0.01'),
+        label='Monto a Abonar',
+        widget=forms.NumberInput(attrs={'class': 'form-control', 'step': '0.01'})
+    )
+    modo = forms.ChoiceField(
+        choices=AbonoCapital.MODO_CHOICES,
+        initial='reducir_plazo',
+        label='Aplicar el abono para',
+        widget=forms.RadioSelect(attrs={'class': 'form-check-input'})
+    )
+
 class RequisitoForm(forms.ModelForm):
     class Meta:
         model = Requisito
@@ -0,0 +1,76 @@
+import time
+from datetime import date
+from decimal import Decimal
+from itertools import islice
+
+from django.core.management.base import BaseCommand
+from gestion_prestamos.models import Prestamo
+from gestion_prestamos.utils import METODOS_AMORTIZACION, _calcular_metodo_frances
+
+
+class Command(BaseCommand):
+    help = 'Mide el tiempo de generación de tablas de amortización para cada método registrado.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--prestamos', type=int, default=1000, help='Cantidad de préstamos a simular.')
+        parser.add_argument('--plazo', type=int, default=120, help='Plazo en meses de cada préstamo.')
+        parser.add_argument('--frecuencia', default='semanal', choices=['semanal', 'quincenal', 'mensual'])
+        parser.add_argument('--pagina', type=int, default=12, help='Filas de la vista previa (primera página).')
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.SUCCESS('--- Benchmark de tablas de amortización ---'))
+
+        prestamos = [
+            Prestamo(
+                monto=Decimal(10000 + i),
+                tasa_interes=Decimal('24.00'),
+                periodo_tasa='anual',
+                plazo=options['plazo'],
+                frecuencia_pago=options['frecuencia'],
+                fecha_desembolso=date(2025, 1, 31),
+            )
+            for i in range(options['prestamos'])
+        ]
+        filas_por_prestamo = len(list(METODOS_AMORTIZACION['frances'](prestamos[0])))
+        self.stdout.write(
+            f"{len(prestamos)} préstamos, {filas_por_prestamo} cuotas cada uno ({options['frecuencia']})."
+        )
+
+        for nombre, generador in METODOS_AMORTIZACION.items():
+            inicio = time.perf_counter()
+            for prestamo in prestamos:
+                for _ in generador(prestamo):
+                    pass
+            completa = time.perf_counter() - inicio
+
+            inicio = time.perf_counter()
+            for prestamo in prestamos:
+                for _ in islice(generador(prestamo), options['pagina']):
+                    pass
+            pagina = time.perf_counter() - inicio
+
+            self.stdout.write(
+                f"  - {nombre:<8} tabla completa: {completa * 1000:9.1f} ms | "
+                f"primera página ({options['pagina']} filas): {pagina * 1000:8.1f} ms"
+            )
+
+        # Costo de la conversión a Decimal que se hace en el borde con los modelos:
+        # 'centavos' mide solo la aritmética (tuplas de enteros); 'centavos+decimal'
+        # incluye pasar cada fila a Decimal.
+        self.stdout.write('Método francés, tabla completa:')
+        variantes = (
+            ('centavos', lambda prestamo: list(METODOS_AMORTIZACION['frances'](prestamo))),
+            ('centavos+decimal', _calcular_metodo_frances),
+        )
+        tiempos = {}
+        for nombre, funcion in variantes:
+            inicio = time.perf_counter()
+            for prestamo in prestamos:
+                funcion(prestamo)
+            tiempos[nombre] = time.perf_counter() - inicio
+            self.stdout.write(
+                f"  - {nombre:<16} {tiempos[nombre] * 1000:9.1f} ms "
+                f"({tiempos[nombre] / tiempos['centavos']:.2f}x frente a centavos)"
+            )
+
+        self.stdout.write(self.style.SUCCESS('--- Benchmark finalizado ---'))
@@ -0,0 +1,202 @@
+import io
+import json
+import statistics
+import time
+import tracemalloc
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from gestion_prestamos.models import Cliente, Cuota, Prestamo
+from gestion_prestamos.utils import generar_tabla_centavos
+
+LINEA_BASE_PREDETERMINADA = Path(settings.BASE_DIR) / 'benchmarks' / 'linea_base.json'
+
+USUARIO_STAFF = 'benchmark'
+
+
+class Revertir(Exception):
+    """Se lanza dentro de un `transaction.atomic` para deshacer lo que hizo un escenario."""
+
+
+def percentil(muestras, p):
+    if len(muestras) == 1:
+        return muestras[0]
+    return statistics.quantiles(muestras, n=100, method='inclusive')[p - 1]
+
+
+class Command(BaseCommand):
+    help = (
+        'Mide las vistas y procesos más usados (p50/p95, consultas SQL y memoria pico) sobre los datos '
+        'actuales y los compara con una línea base guardada.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeticiones', type=int, default=20, help='Peticiones por vista.')
+        parser.add_argument('--repeticiones-procesos', type=int, default=3,
+                            help='Repeticiones de los procesos por lotes (update_penalties).')
+        parser.add_argument('--prestamos-tabla', type=int, default=500,
+                            help='Préstamos usados para medir la generación de tablas.')
+        parser.add_argument('--sembrar', type=int, default=0,
+                            help='Si no hay préstamos activos, ejecuta seed_portfolio con esta cantidad de clientes.')
+        parser.add_argument('--linea-base', type=Path, default=LINEA_BASE_PREDETERMINADA,
+                            help='Archivo JSON con la línea base.')
+        parser.add_argument('--guardar-linea-base', action='store_true',
+                            help='Guarda los resultados como nueva línea base.')
+        parser.add_argument('--tolerancia', type=float, default=0.25,
+                            help='Aumento relativo del p95 permitido frente a la línea base (0.25 = 25%%).')
+        parser.add_argument('--salida', type=Path, help='Escribe el informe JSON en este archivo.')
+
+    def handle(self, *args, **options):
+        prestamo = self.prestamo_de_referencia(options['sembrar'])
+
+        staff, _ = User.objects.get_or_create(username=USUARIO_STAFF, defaults={'is_staff': True})
+        self.cliente_staff = Client(HTTP_HOST='localhost')
+        self.cliente_staff.force_login(staff)
+        self.cliente_portal = Client(HTTP_HOST='localhost')
+        self.cliente_portal.force_login(self.usuario_portal(prestamo.cliente))
+
+        escenarios = {
+            'panel_informativo': self.vista(reverse('panel_informativo')),
+            'loan_detail': self.vista(reverse('loan_detail', args=[prestamo.pk])),
+            'loan_list': self.vista(reverse('loan_list')),
+            'cobros_list': self.vista(reverse('cobros_list')),
+            'aging_report': self.vista(reverse('aging_report')),
+            'search_clients': self.vista(reverse('search_clients') + f'?term={prestamo.cliente.nombres}'),
+            'payment_add': self.vista(reverse('payment_add', args=[prestamo.pk])),
+            'payment_add_post': self.vista(
+                reverse('payment_add', args=[prestamo.pk]), datos={'monto_pagado': '100.00'}
+            ),
+            'portal_dashboard': self.vista(reverse('portal_dashboard'), cliente=self.cliente_portal),
+        }
+        resultados = {nombre: self.medir(funcion, options['repeticiones']) for nombre, funcion in escenarios.items()}
+
+        resultados['update_penalties'] = self.medir(
+            lambda: call_command('update_penalties', stdout=io.StringIO()), options['repeticiones_procesos']
+        )
+        prestamos_tabla = list(
+            Prestamo.objects.filter(estado='aprobado').select_related('tipo_prestamo')[:options['prestamos_tabla']]
+        )
+        resultados['generar_tablas'] = self.medir(
+            lambda: [list(generar_tabla_centavos(p)) for p in prestamos_tabla], options['repeticiones_procesos']
+        )
+
+        informe = {
+            'fecha': timezone.now().isoformat(),
+            'base_de_datos': connection.vendor,
+            'datos': {
+                'clientes': Cliente.objects.count(),
+                'prestamos': Prestamo.objects.count(),
+                'cuotas': Cuota.objects.count(),
+                'prestamos_tabla': len(prestamos_tabla),
+            },
+            'escenarios': resultados,
+        }
+
+        linea_base = options['linea_base']
+        if linea_base.exists() and not options['guardar_linea_base']:
+            informe['regresiones'] = self.comparar(resultados, json.loads(linea_base.read_text()), options['tolerancia'])
+
+        texto = json.dumps(informe, indent=2, ensure_ascii=False)
+        if options['salida']:
+            options['salida'].write_text(texto)
+        self.stdout.write(texto)
+
+        if options['guardar_linea_base']:
+            linea_base.parent.mkdir(parents=True, exist_ok=True)
+            linea_base.write_text(texto)
+            self.stdout.write(self.style.SUCCESS(f'Línea base guardada en {linea_base}'))
+        elif informe.get('regresiones'):
+            raise CommandError(f"Se detectaron {len(informe['regresiones'])} regresión(es) de rendimiento.")
+
+    def prestamo_de_referencia(self, clientes_a_sembrar):
+        """Préstamo activo con más cuotas: el peor caso de `loan_detail`."""
+        prestamos = Prestamo.objects.filter(estado='aprobado')
+        if not prestamos.exists() and clientes_a_sembrar:
+            call_command('seed_portfolio', clientes=clientes_a_sembrar, stdout=io.StringIO())
+        prestamo = prestamos.select_related('cliente').order_by('-plazo', 'pk').first()
+        if prestamo is None:
+            raise CommandError('No hay préstamos activos. Ejecute seed_portfolio o use --sembrar.')
+        return prestamo
+
+    def usuario_portal(self, cliente):
+        """Los clientes sintéticos no tienen usuario: se le crea uno al cliente de referencia."""
+        if cliente.user is None:
+            cliente.user, _ = User.objects.get_or_create(username=f'{USUARIO_STAFF}-{cliente.pk}')
+            cliente.debe_cambiar_contrasena = False
+            cliente.save(update_fields=['user', 'debe_cambiar_contrasena'])
+        return cliente.user
+
+    def vista(self, url, datos=None, cliente=None):
+        cliente = cliente or self.cliente_staff
+
+        def peticion():
+            respuesta = cliente.post(url, datos) if datos is not None else cliente.get(url)
+            if respuesta.status_code >= 400:
+                raise CommandError(f'{url} respondió {respuesta.status_code}.')
+        return peticion
+
+    def medir(self, funcion, repeticiones):
+        """
+        Ejecuta el escenario `repeticiones` veces dentro de una transacción que se
+        revierte, para que los escenarios que escriben (pagos, penalidades) partan
+        siempre del mismo estado.
+        """
+        tiempos = []
+        consultas = 0
+        for _ in range(max(repeticiones, 1)):
+            with CaptureQueriesContext(connection) as capturadas:
+                inicio = time.perf_counter()
+                self.en_transaccion_revertida(funcion)
+                tiempos.append((time.perf_counter() - inicio) * 1000)
+            consultas = max(consultas, len(capturadas))
+
+        # La memoria se mide aparte: tracemalloc hace más lentas las mediciones de tiempo.
+        tracemalloc.start()
+        self.en_transaccion_revertida(funcion)
+        _, pico = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        return {
+            'repeticiones': len(tiempos),
+            'p50_ms': round(percentil(tiempos, 50), 2),
+            'p95_ms': round(percentil(tiempos, 95), 2),
+            'consultas': consultas,
+            'memoria_pico_kb': round(pico / 1024, 1),
+        }
+
+    def en_transaccion_revertida(self, funcion):
+        try:
+            with transaction.atomic():
+                funcion()
+                raise Revertir
+        except Revertir:
+            pass
+
+    def comparar(self, resultados, linea_base, tolerancia):
+        regresiones = []
+        for nombre, actual in resultados.items():
+            base = linea_base.get('escenarios', {}).get(nombre)
+            if base is None:
+                continue
+            if actual['p95_ms'] > base['p95_ms'] * (1 + tolerancia):
+                regresiones.append({
+                    'escenario': nombre, 'metrica': 'p95_ms', 'base': base['p95_ms'], 'actual': actual['p95_ms'],
+                })
+            if actual['consultas'] > base['consultas']:
+                regresiones.append({
+                    'escenario': nombre, 'metrica': 'consultas', 'base': base['consultas'], 'actual': actual['consultas'],
+                })
+        for regresion in regresiones:
+            self.stderr.write(
+                f"REGRESIÓN en {regresion['escenario']}: {regresion['metrica']} "
+                f"{regresion['base']} -> {regresion['actual']}"
+            )
+        return regresiones
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+from gestion_prestamos import metricas, tae
+from gestion_prestamos.models import Prestamo
+
+
+class Command(BaseCommand):
+    help = 'Calcula y guarda la tasa anual efectiva (TAE) de los préstamos con cuotas.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--todos', action='store_true', help='Recalcula también los préstamos que ya tienen TAE.')
+        parser.add_argument('--chunk-size', type=int, default=2000, help='Préstamos por bloque (se resuelven juntos).')
+
+    def handle(self, *args, **options):
+        tamano_bloque = options['chunk_size']
+        if tamano_bloque < 1:
+            raise CommandError('--chunk-size debe ser mayor que cero.')
+        prestamos = Prestamo.objects.filter(cuotas__isnull=False).distinct()
+        if not options['todos']:
+            prestamos = prestamos.filter(tae__isnull=True)
+        ids = list(prestamos.order_by('id').values_list('id', flat=True))
+        if not ids:
+            self.stdout.write(self.style.SUCCESS('No hay préstamos sin TAE.'))
+            return
+
+        with metricas.medir_trabajo('calcular_tae'):
+            for i in range(0, len(ids), tamano_bloque):
+                bloque = ids[i:i + tamano_bloque]
+                tae.actualizar(Prestamo.objects.filter(id__gte=bloque[0], id__lte=bloque[-1], id__in=prestamos))
+                if options['verbosity'] >= 2:
+                    self.stdout.write(f'  - Bloque {bloque[0]}-{bloque[-1]}: {len(bloque)} préstamo(s)')
+        self.stdout.write(self.style.SUCCESS(f'--- TAE calculada para {len(ids)} préstamo(s) ---'))
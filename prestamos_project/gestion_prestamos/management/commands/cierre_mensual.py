@@ -0,0 +1,73 @@
+import datetime
+import multiprocessing
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.utils import timezone
+from config.registro import preparar_proceso_hijo
+from gestion_prestamos import cierre, metricas
+from gestion_prestamos.models import PeriodoCerrado
+
+
+def _mes(valor):
+    return datetime.datetime.strptime(valor, '%Y-%m').date()
+
+
+def _calcular_en_proceso(argumentos):
+    """Calcula un bloque en un proceso del pool, con conexiones propias."""
+    connections.close_all()
+    try:
+        return cierre.calcular_bloque(*argumentos)
+    finally:
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    help = 'Cierra un mes: guarda por préstamo saldo, intereses, penalidades, pagos y atraso, y marca el período cerrado.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--periodo', type=_mes, metavar='AAAA-MM', help='Mes a cerrar. Por defecto, el mes anterior.')
+        parser.add_argument('--workers', type=int, default=1, help='Procesos en paralelo (requiere PostgreSQL).')
+        parser.add_argument('--chunk-size', type=int, default=500, help='Préstamos por bloque.')
+
+    def handle(self, *args, **options):
+        if options['chunk_size'] < 1:
+            raise CommandError('--chunk-size debe ser mayor que cero.')
+        hoy = timezone.localdate()
+        periodo = options['periodo'] or (hoy.replace(day=1) - datetime.timedelta(days=1)).replace(day=1)
+        _, fin = cierre.limites_del_mes(periodo)
+        if fin > hoy:
+            raise CommandError(f'El mes {periodo:%m/%Y} todavía no terminó.')
+        if PeriodoCerrado.objects.filter(periodo=periodo).exists():
+            self.stdout.write(self.style.WARNING(f'El período {periodo:%m/%Y} ya está cerrado; no se hizo nada.'))
+            return
+
+        with metricas.medir_trabajo('cierre_mensual'):
+            cerrado = self.cerrar(periodo, options['workers'], options['chunk_size'])
+        self.stdout.write(f'Préstamos: {cerrado.prestamos}')
+        self.stdout.write(f'Saldo de capital: ${cerrado.saldo_capital:,.2f}')
+        self.stdout.write(f'Interés devengado: ${cerrado.interes_devengado:,.2f}')
+        self.stdout.write(f'Penalidades: ${cerrado.penalidades:,.2f}')
+        self.stdout.write(f'Pagos recibidos: ${cerrado.pagos_recibidos:,.2f}')
+        self.stdout.write(self.style.SUCCESS(f'--- Período {periodo:%m/%Y} cerrado ---'))
+
+    def cerrar(self, periodo, workers, tamano_bloque):
+        rangos = cierre.bloques(periodo, tamano_bloque)
+        if workers > 1 and connection.vendor == 'sqlite':
+            self.stdout.write(self.style.WARNING('SQLite no admite conexiones entre procesos: se usará un solo proceso.'))
+            workers = 1
+        self.stdout.write(f'Calculando {len(rangos)} bloque(s) con {workers} proceso(s).')
+
+        argumentos = [(desde_id, hasta_id, periodo) for desde_id, hasta_id in rangos]
+        filas = []
+        if workers > 1:
+            if 'fork' not in multiprocessing.get_all_start_methods():
+                raise CommandError('--workers requiere un sistema que soporte procesos "fork".')
+            connections.close_all()
+            with multiprocessing.get_context('fork').Pool(workers, initializer=preparar_proceso_hijo) as pool:
+                for resultado in pool.imap_unordered(_calcular_en_proceso, argumentos):
+                    filas.extend(resultado)
+        else:
+            for argumento in argumentos:
+                filas.extend(cierre.calcular_bloque(*argumento))
+        return cierre.guardar_cierre(periodo, filas)
@@ -0,0 +1,64 @@
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from gestion_prestamos import contabilidad
+
+
+def _mes(valor):
+    return datetime.datetime.strptime(valor, '%Y-%m').date()
+
+
+class Command(BaseCommand):
+    help = 'Genera los asientos contables de la actividad diaria y muestra la balanza de comprobación.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fecha', type=datetime.date.fromisoformat,
+                            help='Día a contabilizar (AAAA-MM-DD). Por defecto, ayer.')
+        parser.add_argument('--desde', type=datetime.date.fromisoformat,
+                            help='Con --hasta: contabiliza cada día del rango (ambos inclusive).')
+        parser.add_argument('--hasta', type=datetime.date.fromisoformat)
+        parser.add_argument('--recalcular-saldos', action='store_true',
+                            help='Rehace los saldos por período a partir de los asientos.')
+        parser.add_argument('--balanza', type=_mes, metavar='AAAA-MM',
+                            help='Muestra la balanza de comprobación del mes, sin contabilizar.')
+
+    def handle(self, *args, **options):
+        if options['balanza']:
+            self.mostrar_balanza(options['balanza'])
+            return
+        if options['recalcular_saldos']:
+            contabilidad.recalcular_saldos()
+            self.stdout.write(self.style.SUCCESS('Saldos por período recalculados.'))
+            return
+
+        desde, hasta = options['desde'], options['hasta']
+        if (desde is None) != (hasta is None):
+            raise CommandError('--desde y --hasta se usan juntos.')
+        if desde and options['fecha']:
+            raise CommandError('Use --fecha o --desde/--hasta, no ambos.')
+        if not desde:
+            desde = hasta = options['fecha'] or timezone.localdate() - datetime.timedelta(days=1)
+        if desde > hasta:
+            raise CommandError('--desde debe ser anterior o igual a --hasta.')
+
+        total = 0
+        dia = desde
+        while dia <= hasta:
+            creados = contabilidad.contabilizar_dia(dia)
+            total += creados
+            if creados and options['verbosity'] >= 2:
+                self.stdout.write(f'  - {dia:%d/%m/%Y}: {creados} asiento(s)')
+            dia += datetime.timedelta(days=1)
+        self.stdout.write(self.style.SUCCESS(f'{total} asiento(s) contabilizados del {desde:%d/%m/%Y} al {hasta:%d/%m/%Y}.'))
+
+    def mostrar_balanza(self, periodo):
+        self.stdout.write(self.style.SUCCESS(f'--- Balanza de comprobación {periodo:%m/%Y} ---'))
+        total_debe = total_haber = contabilidad.CERO
+        for fila in contabilidad.balanza_de_comprobacion(periodo):
+            total_debe += fila['debe']
+            total_haber += fila['haber']
+            self.stdout.write(
+                f"{fila['codigo']:<6} {fila['nombre']:<32} {fila['debe']:>14,.2f} {fila['haber']:>14,.2f} {fila['saldo']:>14,.2f}"
+            )
+        self.stdout.write(f"{'Totales':<39} {total_debe:>14,.2f} {total_haber:>14,.2f}")
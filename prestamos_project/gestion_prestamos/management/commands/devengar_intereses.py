@@ -0,0 +1,33 @@
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from gestion_prestamos import devengo
+from gestion_prestamos.dinero import a_decimal
+
+
+class Command(BaseCommand):
+    help = 'Calcula el interés devengado por préstamo en el mes, hasta la fecha de corte.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fecha', type=datetime.date.fromisoformat,
+                            help='Fecha de corte (AAAA-MM-DD, inclusive). Por defecto, ayer.')
+        parser.add_argument('--desde', type=datetime.date.fromisoformat,
+                            help='Recalcula también los meses anteriores desde esta fecha (cada uno hasta su último día).')
+
+    def handle(self, *args, **options):
+        fecha_corte = options['fecha'] or timezone.localdate() - datetime.timedelta(days=1)
+        if fecha_corte > timezone.localdate():
+            raise CommandError('La fecha de corte no puede ser futura.')
+        desde = options['desde'] or fecha_corte
+        if desde > fecha_corte:
+            raise CommandError('--desde debe ser anterior a la fecha de corte.')
+
+        periodo = desde.replace(day=1)
+        while periodo <= fecha_corte:
+            siguiente = (periodo + datetime.timedelta(days=32)).replace(day=1)
+            corte = min(fecha_corte, siguiente - datetime.timedelta(days=1))
+            prestamos, centavos = devengo.devengar_mes(corte)
+            self.stdout.write(f'{periodo:%m/%Y} (hasta {corte:%d/%m/%Y}): {prestamos} préstamo(s), ${a_decimal(centavos):,.2f}')
+            periodo = siguiente
+        self.stdout.write(self.style.SUCCESS('--- Devengo de intereses finalizado ---'))
@@ -0,0 +1,41 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from gestion_prestamos import metricas, proyeccion
+
+
+class Command(BaseCommand):
+    help = 'Proyecta los cobros mensuales de la cartera con escenarios de incumplimiento y prepago.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--meses', type=int, default=24, help='Horizonte de la proyección.')
+        parser.add_argument('--escenarios', type=int, default=2000, help='Cantidad de escenarios Monte Carlo.')
+        parser.add_argument('--semilla', type=int, help='Semilla del generador (resultados reproducibles).')
+        parser.add_argument('--json', action='store_true', help='Imprime el resultado completo en JSON.')
+
+    def handle(self, *args, **options):
+        if options['meses'] < 1 or options['escenarios'] < 1:
+            raise CommandError('--meses y --escenarios deben ser mayores que cero.')
+        with metricas.medir_trabajo('proyectar_cartera'):
+            resultado = proyeccion.proyectar(options['meses'], options['escenarios'], options['semilla'])
+
+        if options['json']:
+            resultado['meses'] = [mes.isoformat() for mes in resultado['meses']]
+            self.stdout.write(json.dumps(resultado))
+            return
+
+        bajo, medio, alto = resultado['percentiles']
+        self.stdout.write(self.style.SUCCESS(
+            f"--- Proyección de {resultado['prestamos']} préstamo(s), {options['escenarios']} escenario(s) ---"
+        ))
+        self.stdout.write(f"{'Mes':<8} {'Programado':>14} {f'P{bajo}':>14} {f'P{medio}':>14} {f'P{alto}':>14}")
+        for i, mes in enumerate(resultado['meses']):
+            self.stdout.write(
+                f"{mes:%m/%Y}  {resultado['programado'][i]:>14,.2f} {resultado['cobros'][bajo][i]:>14,.2f} "
+                f"{resultado['cobros'][medio][i]:>14,.2f} {resultado['cobros'][alto][i]:>14,.2f}"
+            )
+        perdida = resultado['perdida_total']
+        self.stdout.write(self.style.WARNING(
+            f"Pérdida en el horizonte: P{bajo} ${perdida[bajo]:,.2f} | P{medio} ${perdida[medio]:,.2f} | "
+            f"P{alto} ${perdida[alto]:,.2f} (esperada ${resultado['perdida_esperada']:,.2f})"
+        ))
@@ -0,0 +1,20 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from gestion_prestamos import caja
+
+
+class Command(BaseCommand):
+    help = 'Rehace el libro de caja (MovimientoCaja) reproduciendo el historial de capital, desembolsos, gastos y pagos.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=2000, help='Movimientos por inserción en bloque.')
+
+    def handle(self, *args, **options):
+        if options['chunk_size'] < 1:
+            raise CommandError('--chunk-size debe ser mayor que cero.')
+        self.stdout.write(self.style.SUCCESS('--- Reconstruyendo el libro de caja ---'))
+        inicio = time.perf_counter()
+        movimientos = caja.reconstruir(tamano_lote=options['chunk_size'])
+        self.stdout.write(f'{movimientos} movimientos registrados en {time.perf_counter() - inicio:.1f} s.')
+        self.stdout.write(self.style.SUCCESS(f'Dinero en caja: ${caja.saldo_actual():,.2f}'))
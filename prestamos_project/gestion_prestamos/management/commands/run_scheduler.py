@@ -0,0 +1,29 @@
+import os
+import socket
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from gestion_prestamos import programador
+
+
+class Command(BaseCommand):
+    help = 'Ejecuta las tareas periódicas configuradas en "Tareas Programadas" (ScheduledTask).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--intervalo', type=float, default=30.0, help='Segundos entre revisiones de tareas vencidas.')
+        parser.add_argument('--una-vez', action='store_true', help='Ejecuta las tareas vencidas y termina.')
+        parser.add_argument('--instancia', help='Nombre de esta instancia en el bloqueo (por defecto host:pid).')
+
+    def handle(self, *args, **options):
+        instancia = options['instancia'] or f'{socket.gethostname()}:{os.getpid()}'
+        self.stdout.write(self.style.SUCCESS(f'--- Programador iniciado ({instancia}) ---'))
+        while True:
+            close_old_connections()
+            for job in programador.ejecutar_pendientes(instancia):
+                estilo = self.style.SUCCESS if job.estado == 'completado' else self.style.ERROR
+                self.stdout.write(estilo(f'{job.nombre}: {job.estado}'))
+            if options['una_vez']:
+                break
+            time.sleep(options['intervalo'])
+        self.stdout.write(self.style.SUCCESS('--- Programador finalizado ---'))
@@ -0,0 +1,74 @@
+import datetime
+import multiprocessing
+import os
+import socket
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections, connection, connections
+from config.registro import preparar_proceso_hijo
+from gestion_prestamos import trabajos
+
+
+def ciclo_worker(nombre, colas, intervalo, una_vez, max_trabajos, tiempo_maximo):
+    """Reclama y ejecuta trabajos hasta que se agote la cola (con --una-vez) o el máximo."""
+    ejecutados = 0
+    while not max_trabajos or ejecutados < max_trabajos:
+        close_old_connections()
+        trabajos.rescatar_trabajos_colgados(tiempo_maximo)
+        job = trabajos.reclamar(nombre, colas)
+        if job is None:
+            if una_vez:
+                break
+            time.sleep(intervalo)
+            continue
+        trabajos.ejecutar(job)
+        ejecutados += 1
+    return ejecutados
+
+
+def _ciclo_en_proceso(argumentos):
+    connections.close_all()
+    try:
+        return ciclo_worker(*argumentos)
+    finally:
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    help = 'Ejecuta los trabajos en segundo plano encolados con `trabajos.enqueue()`.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--cola', action='append', dest='colas', help='Cola a atender (se puede repetir).')
+        parser.add_argument('--procesos', type=int, default=1, help='Workers en paralelo (requiere PostgreSQL).')
+        parser.add_argument('--intervalo', type=float, default=2.0, help='Segundos de espera cuando no hay trabajos.')
+        parser.add_argument('--una-vez', action='store_true', help='Termina cuando la cola queda vacía.')
+        parser.add_argument('--max-trabajos', type=int, default=0, help='Termina tras N trabajos por proceso (0 = sin límite).')
+        parser.add_argument('--tiempo-maximo', type=int, default=30,
+                            help='Minutos tras los que un trabajo en proceso se considera abandonado y se reencola.')
+
+    def handle(self, *args, **options):
+        colas = tuple(options['colas'] or ['default'])
+        procesos = options['procesos']
+        if procesos > 1 and connection.vendor == 'sqlite':
+            self.stdout.write(self.style.WARNING('SQLite no admite escrituras concurrentes: se usará un solo proceso.'))
+            procesos = 1
+
+        base = f'{socket.gethostname()}:{os.getpid()}'
+        argumentos = [
+            (f'{base}:{i}', colas, options['intervalo'], options['una_vez'], options['max_trabajos'],
+             datetime.timedelta(minutes=options['tiempo_maximo']))
+            for i in range(procesos)
+        ]
+        self.stdout.write(self.style.SUCCESS(f"--- Worker iniciado ({procesos} proceso(s), colas: {', '.join(colas)}) ---"))
+
+        if procesos > 1:
+            if 'fork' not in multiprocessing.get_all_start_methods():
+                raise CommandError('--procesos requiere un sistema que soporte procesos "fork".')
+            connections.close_all()
+            with multiprocessing.get_context('fork').Pool(procesos, initializer=preparar_proceso_hijo) as pool:
+                ejecutados = sum(pool.map(_ciclo_en_proceso, argumentos))
+        else:
+            ejecutados = ciclo_worker(*argumentos[0])
+
+        self.stdout.write(self.style.SUCCESS(f'--- Worker finalizado: {ejecutados} trabajo(s) ejecutado(s) ---'))
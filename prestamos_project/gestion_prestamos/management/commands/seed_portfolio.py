@@ -0,0 +1,257 @@
+import datetime
+import math
+import multiprocessing
+import random
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections, transaction
+from django.utils import timezone
+from config.registro import preparar_proceso_hijo
+from gestion_prestamos import caja
+from gestion_prestamos.dinero import a_decimal, dividir
+from gestion_prestamos.models import Cliente, Cuota, Pago, Prestamo, TipoPrestamo
+from gestion_prestamos.utils import generar_tabla_centavos
+
+# Los documentos sintéticos llevan este prefijo para poder borrarlos con --limpiar.
+PREFIJO_DOCUMENTO = 'SEED-'
+
+NOMBRES = ['Ana', 'Luis', 'María', 'José', 'Carmen', 'Pedro', 'Rosa', 'Juan', 'Elena', 'Miguel', 'Lucía', 'Rafael']
+APELLIDOS = ['Pérez', 'Gómez', 'Rodríguez', 'Martínez', 'Santos', 'Díaz', 'Reyes', 'Castillo', 'Núñez', 'Rosario']
+
+# Distribuciones de la cartera (pesos relativos).
+FRECUENCIAS = (('mensual', 6), ('quincenal', 3), ('semanal', 1))
+TIPOS_AMORTIZACION = (('saldo_insoluto', 8), ('capital_fijo', 1), ('interes_simple', 1))
+# Comportamiento de pago del préstamo: al día, atrasado (deja de pagar en algún
+# momento y deja una cuota parcial) o incobrable (paga pocas cuotas).
+PERFILES_PAGO = (('al_dia', 70), ('atrasado', 22), ('incobrable', 8))
+
+
+def elegir(rng, opciones):
+    valores, pesos = zip(*opciones)
+    return rng.choices(valores, weights=pesos)[0]
+
+
+class GeneradorCartera:
+    """Construye en memoria los objetos de un bloque de clientes, de forma reproducible."""
+
+    def __init__(self, tipos, semilla, fecha_corte, meses_historia):
+        self.tipos = tipos
+        self.semilla = semilla
+        self.fecha_corte = fecha_corte
+        self.meses_historia = meses_historia
+
+    def rng_de_bloque(self, indice_bloque):
+        # Cada bloque tiene su propio generador: el resultado no depende del
+        # número de procesos ni del orden en que se procesan los bloques.
+        return random.Random(self.semilla * 1_000_003 + indice_bloque)
+
+    def cliente(self, rng, i):
+        return Cliente(
+            nombres=rng.choice(NOMBRES),
+            apellidos=f'{rng.choice(APELLIDOS)} {rng.choice(APELLIDOS)}',
+            numero_documento=f'{PREFIJO_DOCUMENTO}{self.semilla}-{i:09d}',
+            telefono=f'809{rng.randint(1_000_000, 9_999_999)}',
+            ingresos_mensuales=Decimal(rng.randint(15_000, 150_000)),
+            debe_cambiar_contrasena=False,
+        )
+
+    def prestamo(self, rng, cliente, estado, fecha_desembolso):
+        tipo = rng.choice(self.tipos)
+        minimo = max(tipo.monto_minimo, Decimal('1000'))
+        maximo = max(tipo.monto_maximo, minimo)
+        # Montos con distribución log-uniforme: muchos préstamos pequeños y pocos grandes.
+        monto = Decimal(round(math.exp(rng.uniform(math.log(minimo), math.log(maximo))), -2))
+        plazo = rng.randint(max(tipo.plazo_minimo_meses, 1), max(tipo.plazo_maximo_meses, 1))
+        tasa = tipo.tasa_interes_predeterminada * Decimal(rng.randint(90, 110)) / 100
+        aprobado = estado in ('aprobado', 'pagado')
+        return Prestamo(
+            cliente=cliente,
+            tipo_prestamo=tipo,
+            monto=monto,
+            monto_desembolsado=monto,
+            tasa_interes=tasa.quantize(Decimal('0.01')),
+            periodo_tasa=tipo.periodo_tasa,
+            plazo=plazo,
+            frecuencia_pago=elegir(rng, FRECUENCIAS),
+            tipo_amortizacion=elegir(rng, TIPOS_AMORTIZACION),
+            fecha_desembolso=fecha_desembolso,
+            estado=estado,
+            fecha_aprobacion=timezone.make_aware(
+                datetime.datetime.combine(fecha_desembolso, datetime.time(9))
+            ) if aprobado else None,
+        )
+
+    def prestamos_del_cliente(self, rng, cliente):
+        """Historial de 1 a 3 préstamos; solo el último puede seguir activo."""
+        cantidad = elegir(rng, ((1, 6), (2, 3), (3, 1)))
+        dias_historia = self.meses_historia * 30
+        fechas = sorted(
+            self.fecha_corte - datetime.timedelta(days=rng.randint(1, dias_historia)) for _ in range(cantidad)
+        )
+        prestamos = [self.prestamo(rng, cliente, 'pagado', fecha) for fecha in fechas[:-1]]
+        estado_final = elegir(rng, (('aprobado', 88), ('pendiente', 8), ('rechazado', 4)))
+        prestamos.append(self.prestamo(rng, cliente, estado_final, fechas[-1]))
+        return prestamos
+
+    def cuotas_y_pagos(self, rng, prestamo):
+        """
+        Genera la tabla de amortización y los pagos hasta la fecha de corte.
+        Devuelve (cuotas, pagos); cada pago se acompaña de su fecha real.
+        """
+        if prestamo.estado in ('pendiente', 'rechazado'):
+            return [], []
+        perfil = 'al_dia' if prestamo.estado == 'pagado' else elegir(rng, PERFILES_PAGO)
+        filas = list(generar_tabla_centavos(prestamo))
+        vencidas = sum(1 for fila in filas if fila[1] < self.fecha_corte)
+        if perfil == 'atrasado':
+            pagadas = rng.randint(0, max(vencidas - 1, 0))
+        elif perfil == 'incobrable':
+            pagadas = min(vencidas, rng.randint(0, 2))
+        else:
+            pagadas = vencidas
+        if prestamo.estado == 'pagado':
+            pagadas = len(filas)
+
+        cuotas, pagos = [], []
+        for numero, fecha, cuota_c, interes_c, capital_c, saldo_c in filas:
+            cuota = Cuota(
+                prestamo=prestamo,
+                numero_cuota=numero,
+                fecha_vencimiento=fecha,
+                monto_cuota=a_decimal(cuota_c),
+                capital=a_decimal(capital_c),
+                interes=a_decimal(interes_c),
+                saldo_pendiente=a_decimal(saldo_c),
+            )
+            if numero <= pagadas:
+                cuota.estado = 'pagada'
+                pagado_c = cuota_c
+            elif numero == pagadas + 1 and perfil == 'atrasado' and fecha < self.fecha_corte and rng.random() < 0.5:
+                cuota.estado = 'pagada_parcialmente'
+                pagado_c = dividir(cuota_c * rng.randint(10, 90), 100)
+            else:
+                pagado_c = 0
+            cuotas.append(cuota)
+            if pagado_c:
+                # Los pagos a tiempo llegan unos días antes o después del vencimiento.
+                fecha_pago = min(fecha + datetime.timedelta(days=rng.randint(-5, 10)), self.fecha_corte)
+                pagos.append((cuota, pagado_c, fecha_pago))
+        return cuotas, pagos
+
+
+def sembrar_bloque(generador, indice_bloque, desde, hasta, tamano_lote):
+    """Crea los clientes [desde, hasta) con sus préstamos, cuotas y pagos. Devuelve los totales."""
+    rng = generador.rng_de_bloque(indice_bloque)
+    with transaction.atomic():
+        clientes = Cliente.objects.bulk_create(
+            [generador.cliente(rng, i) for i in range(desde, hasta)], batch_size=tamano_lote
+        )
+        prestamos = []
+        for cliente in clientes:
+            prestamos.extend(generador.prestamos_del_cliente(rng, cliente))
+        prestamos = Prestamo.objects.bulk_create(prestamos, batch_size=tamano_lote)
+
+        cuotas, pagos, saldados = [], [], []
+        for prestamo in prestamos:
+            cuotas_prestamo, pagos_prestamo = generador.cuotas_y_pagos(rng, prestamo)
+            cuotas.extend(cuotas_prestamo)
+            pagos.extend(pagos_prestamo)
+            if prestamo.estado == 'aprobado' and all(cuota.estado == 'pagada' for cuota in cuotas_prestamo):
+                saldados.append(prestamo.pk)
+        Cuota.objects.bulk_create(cuotas, batch_size=tamano_lote)
+        Prestamo.objects.filter(pk__in=saldados).update(estado='pagado')
+
+        objetos_pago = [Pago(cuota=cuota, monto_pagado=a_decimal(monto_c)) for cuota, monto_c, _ in pagos]
+        Pago.objects.bulk_create(objetos_pago, batch_size=tamano_lote)
+        # `fecha_pago` es auto_now_add: bulk_create la fija en "ahora", así que
+        # se corrige después con la fecha simulada.
+        zona = timezone.get_current_timezone()
+        for pago, (_, _, fecha_pago) in zip(objetos_pago, pagos):
+            pago.fecha_pago = timezone.make_aware(datetime.datetime.combine(fecha_pago, datetime.time(12)), zona)
+        Pago.objects.bulk_update(objetos_pago, ['fecha_pago'], batch_size=tamano_lote)
+    return len(clientes), len(prestamos), len(cuotas), len(objetos_pago)
+
+
+def _sembrar_en_proceso(argumentos):
+    # Cada proceso hijo abre sus propias conexiones; las heredadas del padre no se comparten.
+    connections.close_all()
+    try:
+        return sembrar_bloque(*argumentos)
+    finally:
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    help = (
+        'Genera una cartera sintética y reproducible (clientes, préstamos, cuotas y pagos) '
+        'para pruebas de rendimiento.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clientes', type=int, default=1000, help='Cantidad de clientes a crear.')
+        parser.add_argument('--semilla', type=int, default=42, help='Semilla aleatoria (misma semilla, mismos datos).')
+        parser.add_argument('--fecha-corte', type=datetime.date.fromisoformat, default=None,
+                            help='Fecha "de hoy" de la simulación (AAAA-MM-DD). Por defecto, hoy.')
+        parser.add_argument('--meses-historia', type=int, default=24,
+                            help='Antigüedad máxima de los desembolsos, en meses.')
+        parser.add_argument('--bloque', type=int, default=500, help='Clientes por transacción.')
+        parser.add_argument('--chunk-size', type=int, default=5000, help='Filas por INSERT (batch_size).')
+        parser.add_argument('--workers', type=int, default=1,
+                            help='Procesos en paralelo. Útil con PostgreSQL; SQLite serializa las escrituras.')
+        parser.add_argument('--limpiar', action='store_true',
+                            help='Borra antes los clientes sintéticos creados por este comando.')
+
+    def handle(self, *args, **options):
+        tipos = list(TipoPrestamo.objects.all())
+        if not tipos:
+            raise CommandError('No hay tipos de préstamo configurados.')
+
+        if options['limpiar']:
+            with caja.sin_compensaciones():
+                borrados, _ = Cliente.objects.filter(numero_documento__startswith=PREFIJO_DOCUMENTO).delete()
+            self.stdout.write(f'Se borraron {borrados} registros sintéticos anteriores.')
+        elif Cliente.objects.filter(numero_documento__startswith=f"{PREFIJO_DOCUMENTO}{options['semilla']}-").exists():
+            raise CommandError('Ya existe una cartera con esta semilla. Use --limpiar o cambie --semilla.')
+
+        generador = GeneradorCartera(
+            tipos, options['semilla'], options['fecha_corte'] or timezone.localdate(), options['meses_historia']
+        )
+        bloque = max(options['bloque'], 1)
+        tareas = [
+            (generador, indice, desde, min(desde + bloque, options['clientes']), options['chunk_size'])
+            for indice, desde in enumerate(range(0, options['clientes'], bloque))
+        ]
+
+        workers = options['workers']
+        if workers > 1 and connection.vendor == 'sqlite':
+            self.stdout.write(self.style.WARNING('SQLite no admite escrituras concurrentes: se usará un solo proceso.'))
+            workers = 1
+
+        self.stdout.write(self.style.SUCCESS('--- Generando cartera sintética ---'))
+        inicio = time.perf_counter()
+        if workers > 1:
+            if 'fork' not in multiprocessing.get_all_start_methods():
+                raise CommandError('--workers requiere un sistema que soporte procesos "fork".')
+            connections.close_all()
+            with multiprocessing.get_context('fork').Pool(workers, initializer=preparar_proceso_hijo) as pool:
+                resultados = pool.imap_unordered(_sembrar_en_proceso, tareas)
+                totales = self.acumular(resultados, len(tareas))
+        else:
+            totales = self.acumular((sembrar_bloque(*tarea) for tarea in tareas), len(tareas))
+
+        # El historial sintético tiene fechas pasadas: el libro de caja se rehace completo.
+        movimientos = caja.reconstruir()
+        duracion = time.perf_counter() - inicio
+        self.stdout.write(self.style.SUCCESS(
+            f'{totales[0]} clientes, {totales[1]} préstamos, {totales[2]} cuotas y {totales[3]} pagos '
+            f'creados en {duracion:.1f} s ({movimientos} movimientos de caja).'
+        ))
+
+    def acumular(self, resultados, cantidad_bloques):
+        totales = [0, 0, 0, 0]
+        for numero, resultado in enumerate(resultados, start=1):
+            totales = [total + parcial for total, parcial in zip(totales, resultado)]
+            self.stdout.write(f'  - Bloque {numero}/{cantidad_bloques}: {totales[2]} cuotas acumuladas')
+        return totales
@@ -0,0 +1,38 @@
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from gestion_prestamos import metricas, mora
+from gestion_prestamos.models import MoraMensual
+
+
+def _mes(valor):
+    return datetime.datetime.strptime(valor, '%Y-%m').date()
+
+
+class Command(BaseCommand):
+    help = 'Registra el tramo de mora de cada préstamo al cierre de los meses que todavía no tienen foto.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=500, help='Préstamos por bloque de cálculo.')
+        parser.add_argument('--rehacer-desde', type=_mes, metavar='AAAA-MM',
+                            help='Borra las fotos desde este mes y las vuelve a generar.')
+
+    def handle(self, *args, **options):
+        if options['chunk_size'] < 1:
+            raise CommandError('--chunk-size debe ser mayor que cero.')
+        if options['rehacer_desde']:
+            borradas, _ = MoraMensual.objects.filter(periodo__gte=options['rehacer_desde']).delete()
+            self.stdout.write(self.style.WARNING(f'Se borraron {borradas} fila(s) desde {options["rehacer_desde"]:%m/%Y}.'))
+
+        # Solo meses completos: hasta el mes anterior al actual.
+        ultimo_completo = mora.mes_anterior(timezone.localdate())
+        meses = mora.meses_pendientes(ultimo_completo)
+        if not meses:
+            self.stdout.write(self.style.SUCCESS('No hay meses nuevos para registrar.'))
+            return
+        with metricas.medir_trabajo('snapshot_mora'):
+            for periodo in meses:
+                filas = mora.registrar_mes(periodo, options['chunk_size'])
+                self.stdout.write(f'{periodo:%m/%Y}: {filas} préstamo(s)')
+        self.stdout.write(self.style.SUCCESS(f'--- {len(meses)} mes(es) registrados ---'))
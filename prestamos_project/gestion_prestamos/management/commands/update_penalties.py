@@ -1,68 +1,168 @@
-from django.core.management.base import BaseCommand
+import datetime
+import multiprocessing
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections, transaction
 from django.utils import timezone
-from gestion_prestamos.models import Cuota
-from gestion_prestamos.utils import calcular_penalidad_cuota
-from decimal import Decimal
+from config.registro import preparar_proceso_hijo
+from gestion_prestamos.dinero import a_centavos, a_decimal
+from gestion_prestamos.models import Cuota, EjecucionPenalidades
+from gestion_prestamos import metricas, penalidades
+from gestion_prestamos.utils import procesar_bloque_penalidades
+
+
+def _procesar_en_proceso(argumentos):
+    """Procesa un bloque en un proceso del pool, con conexiones propias."""
+    desde_id, hasta_id, hoy = argumentos
+    connections.close_all()
+    try:
+        return [desde_id, hasta_id], *procesar_bloque_penalidades(desde_id, hasta_id, hoy)
+    finally:
+        connections.close_all()
+
 
 class Command(BaseCommand):
     help = 'Calcula y actualiza las penalidades por mora para todas las cuotas vencidas.'
 
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=1, help='Procesos en paralelo (requiere PostgreSQL).')
+        parser.add_argument('--chunk-size', type=int, default=1000,
+                            help='Cuotas por bloque; cada bloque se confirma en su propia transacción.')
+        parser.add_argument('--reiniciar', action='store_true',
+                            help='Ignora el punto de control de una ejecución interrumpida y empieza de nuevo.')
+        parser.add_argument('--as-of', dest='as_of', type=datetime.date.fromisoformat,
+                            help='Recalcula desde el historial de pagos la penalidad de toda la cartera a esta fecha (AAAA-MM-DD).')
+        parser.add_argument('--from', dest='desde', type=datetime.date.fromisoformat,
+                            help='Con --to: recalcula solo las cuotas abiertas en algún día de [--from, --to).')
+        parser.add_argument('--to', dest='hasta', type=datetime.date.fromisoformat,
+                            help='Fecha de corte del recálculo por período (exclusive).')
+
     def handle(self, *args, **options):
+        if options['chunk_size'] < 1:
+            raise CommandError('--chunk-size debe ser mayor que cero.')
+        self.verbosity = options['verbosity']
+        as_of, desde, hasta = options['as_of'], options['desde'], options['hasta']
+        if (desde is None) != (hasta is None):
+            raise CommandError('--from y --to se usan juntos.')
+        if as_of and hasta:
+            raise CommandError('Use --as-of o --from/--to, no ambos.')
+        if desde and desde >= hasta:
+            raise CommandError('--from debe ser anterior a --to.')
+        fecha_corte = as_of or hasta
+        if fecha_corte and fecha_corte > timezone.localdate():
+            raise CommandError('La fecha de corte no puede ser futura.')
+
+        if fecha_corte:
+            cuotas = penalidades.cuotas_abiertas_en(desde, hasta) if desde else penalidades.cuotas_a_fecha(as_of)
+            with metricas.medir_trabajo('update_penalties_historico'):
+                self.recalcular_a_fecha(cuotas, fecha_corte, options['chunk_size'])
+            return
+        with metricas.medir_trabajo('update_penalties'):
+            self.actualizar_penalidades(options['workers'], options['chunk_size'], options['reiniciar'])
+
+    def actualizar_penalidades(self, workers, tamano_bloque, reiniciar):
         self.stdout.write(self.style.SUCCESS('--- Iniciando cálculo de penalidades por mora ---'))
 
         hoy = timezone.localdate()
+        ejecucion = self.ejecucion_a_reanudar(hoy, reiniciar)
 
-        # Seleccionar cuotas que son candidatas para tener penalidades
-        # 1. Deben estar 'pendientes' o 'pagada_parcialmente'.
-        # 2. Su fecha de vencimiento debe ser anterior a hoy.
-        cuotas_vencidas = Cuota.objects.filter(
-            estado__in=['pendiente', 'pagada_parcialmente'],
-            fecha_vencimiento__lt=hoy
-        )
-
-        if not cuotas_vencidas.exists():
-            self.stdout.write(self.style.SUCCESS('No se encontraron cuotas vencidas para calcular penalidades.'))
-            self.stdout.write(self.style.SUCCESS('--- Proceso finalizado ---'))
-            return
+        if ejecucion is None:
+            # Seleccionar cuotas que son candidatas para tener penalidades
+            # 1. Deben estar 'pendientes' o 'pagada_parcialmente'.
+            # 2. Su fecha de vencimiento debe ser anterior a hoy.
+            ids = list(
+                Cuota.objects.filter(estado__in=['pendiente', 'pagada_parcialmente'], fecha_vencimiento__lt=hoy)
+                .order_by('id').values_list('id', flat=True)
+            )
+            if not ids:
+                self.stdout.write(self.style.SUCCESS('No se encontraron cuotas vencidas para calcular penalidades.'))
+                self.stdout.write(self.style.SUCCESS('--- Proceso finalizado ---'))
+                return
+            self.stdout.write(f'Se encontraron {len(ids)} cuotas vencidas para procesar.')
+            rangos = [
+                [ids[i], ids[min(i + tamano_bloque, len(ids)) - 1]] for i in range(0, len(ids), tamano_bloque)
+            ]
+            ejecucion = EjecucionPenalidades.objects.create(fecha_corte=hoy, rangos=rangos)
 
-        self.stdout.write(f'Se encontraron {cuotas_vencidas.count()} cuotas vencidas para procesar.')
-
-        cuotas_actualizadas = 0
-        for cuota in cuotas_vencidas:
-            self.stdout.write('---')
-            self.stdout.write(f'Procesando Cuota #{cuota.id}:')
-            self.stdout.write(f'  - Fecha de Vencimiento: {cuota.fecha_vencimiento}')
-
-            tipo_prestamo = cuota.prestamo.tipo_prestamo
-            if not tipo_prestamo:
-                self.stdout.write(self.style.ERROR('  - ERROR: No tiene tipo de préstamo asociado.'))
-                continue
-
-            dias_gracia = tipo_prestamo.dias_gracia
-            fecha_inicio_penalidad = cuota.fecha_vencimiento + timezone.timedelta(days=dias_gracia)
-
-            self.stdout.write(f'  - Días de Gracia: {dias_gracia}')
-            self.stdout.write(f'  - Hoy es: {hoy}')
-            self.stdout.write(f'  - La penalidad empieza el: {fecha_inicio_penalidad}')
-
-            if fecha_inicio_penalidad >= hoy:
-                self.stdout.write(self.style.WARNING('  - RESULTADO: La cuota está en período de gracia. No se calcula penalidad.'))
-                continue
-
-            penalidad_anterior = cuota.monto_penalidad_acumulada
-            
-            # La lógica de cálculo está en utils.py
-            calcular_penalidad_cuota(cuota)
-            
-            # Refrescar la cuota desde la BD para obtener el valor actualizado
-            cuota.refresh_from_db()
-            
-            if cuota.monto_penalidad_acumulada > penalidad_anterior:
-                cuotas_actualizadas += 1
-                self.stdout.write(
-                    f'  - Cuota #{cuota.numero_cuota} (Préstamo #{cuota.prestamo.id}): ' 
-                    f'Penalidad actualizada de ${penalidad_anterior:,.2f} a ${cuota.monto_penalidad_acumulada:,.2f}'
-                )
-
-        self.stdout.write(self.style.WARNING(f'\nSe actualizaron penalidades en {cuotas_actualizadas} cuota(s).'))
+        pendientes = ejecucion.pendientes()
+        if workers > 1 and connection.vendor == 'sqlite':
+            self.stdout.write(self.style.WARNING('SQLite no admite escrituras concurrentes: se usará un solo proceso.'))
+            workers = 1
+        self.stdout.write(f'Procesando {len(pendientes)} bloque(s) con {workers} proceso(s).')
+
+        argumentos = [(desde_id, hasta_id, hoy) for desde_id, hasta_id in pendientes]
+        if workers > 1:
+            if 'fork' not in multiprocessing.get_all_start_methods():
+                raise CommandError('--workers requiere un sistema que soporte procesos "fork".')
+            connections.close_all()
+            with multiprocessing.get_context('fork').Pool(workers, initializer=preparar_proceso_hijo) as pool:
+                for resultado in pool.imap_unordered(_procesar_en_proceso, argumentos):
+                    self.registrar_bloque(ejecucion, *resultado)
+        else:
+            for desde_id, hasta_id, fecha_corte in argumentos:
+                resultado = procesar_bloque_penalidades(desde_id, hasta_id, fecha_corte)
+                self.registrar_bloque(ejecucion, [desde_id, hasta_id], *resultado)
+
+        ejecucion.estado = 'completada'
+        ejecucion.fecha_fin = timezone.now()
+        ejecucion.save(update_fields=['estado', 'fecha_fin'])
+
+        self.stdout.write(self.style.WARNING(f'\nSe actualizaron penalidades en {ejecucion.cuotas_actualizadas} cuota(s).'))
         self.stdout.write(self.style.SUCCESS('\n--- Cálculo de penalidades finalizado ---'))
+
+    def ejecucion_a_reanudar(self, hoy, reiniciar):
+        """
+        La ejecución interrumpida de hoy, si existe. Las de días anteriores se
+        abandonan: sus cuotas vuelven a entrar en la selección de hoy.
+        """
+        ejecucion = EjecucionPenalidades.objects.filter(estado='en_proceso').first()
+        if ejecucion is None:
+            return None
+        if reiniciar or ejecucion.fecha_corte != hoy:
+            EjecucionPenalidades.objects.filter(estado='en_proceso').update(estado='abandonada', fecha_fin=timezone.now())
+            return None
+        self.stdout.write(self.style.WARNING(
+            f'Reanudando la ejecución #{ejecucion.id}: {len(ejecucion.pendientes())} de {len(ejecucion.rangos)} bloque(s) pendientes.'
+        ))
+        return ejecucion
+
+    def registrar_bloque(self, ejecucion, rango, actualizadas, monto_centavos):
+        """Guarda el punto de control tras confirmar un bloque."""
+        ejecucion.rangos_completados.append(rango)
+        ejecucion.cuotas_actualizadas += actualizadas
+        ejecucion.monto_penalidades += a_decimal(monto_centavos)
+        ejecucion.save(update_fields=['rangos_completados', 'cuotas_actualizadas', 'monto_penalidades'])
+        metricas.penalidades_cuotas.inc(actualizadas)
+        metricas.penalidades_monto.inc(monto_centavos / 100)
+        if self.verbosity >= 2:
+            self.stdout.write(f'  - Bloque {rango[0]}-{rango[1]}: {actualizadas} cuota(s), ${a_decimal(monto_centavos):,.2f}')
+
+    def recalcular_a_fecha(self, cuotas, fecha_corte, tamano_bloque):
+        """
+        Reemplaza la penalidad guardada por la acumulada a `fecha_corte` según
+        el historial de pagos. Los cambios se leen en una sola pasada y se
+        escriben por bloques, cada uno en su propia transacción.
+        """
+        self.stdout.write(self.style.SUCCESS(f'--- Recalculando penalidades al {fecha_corte:%d/%m/%Y} ---'))
+        revisadas = 0
+        cambios = []
+        diferencia = 0
+        for cuota, penalidad, inicio in penalidades.recalcular_a_fecha(cuotas, fecha_corte, tamano_bloque):
+            revisadas += 1
+            calculada = fecha_corte if inicio and inicio < fecha_corte else None
+            anterior = a_centavos(cuota.monto_penalidad_acumulada)
+            if penalidad != anterior or calculada != cuota.fecha_ultima_penalidad_calculada:
+                cambios.append((cuota.id, penalidad, calculada))
+                diferencia += penalidad - anterior
+
+        for i in range(0, len(cambios), tamano_bloque):
+            bloque = [
+                Cuota(id=cuota_id, monto_penalidad_acumulada=a_decimal(penalidad), fecha_ultima_penalidad_calculada=calculada)
+                for cuota_id, penalidad, calculada in cambios[i:i + tamano_bloque]
+            ]
+            with transaction.atomic():
+                Cuota.objects.bulk_update(bloque, ['monto_penalidad_acumulada', 'fecha_ultima_penalidad_calculada'])
+
+        self.stdout.write(f'Cuotas revisadas: {revisadas}. Cuotas corregidas: {len(cambios)}.')
+        self.stdout.write(self.style.WARNING(f'Diferencia neta en penalidades: ${a_decimal(diferencia):,.2f}'))
+        self.stdout.write(self.style.SUCCESS('--- Recálculo finalizado ---'))
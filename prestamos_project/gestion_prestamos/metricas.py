@@ -0,0 +1,362 @@
+"""
+Métricas operativas en formato de texto de Prometheus.
+
+Contadores e histogramas en memoria, seguros entre hilos, sin dependencias
+externas. Se exponen en `/metrics` (ver dashboard.views.metrics).
+
+Modo multiproceso: si se define METRICAS_DIR (p. ej. con varios workers de
+gunicorn o procesos `run_worker`), cada proceso vuelca sus valores en
+`<METRICAS_DIR>/metricas_<pid>.json` como máximo una vez por segundo y al
+terminar; `/metrics` suma los archivos de todos los procesos. Los archivos de
+procesos que ya terminaron se suman a `metricas_finalizados.json` y se borran,
+así la carpeta no crece con cada reinicio y lo contado no se pierde. Un
+proceso hijo creado con fork empieza con los valores en cero: lo heredado ya
+está en el archivo del padre.
+
+Un volcado nunca debe hacer fallar a quien cuenta (una petición, un pago): se
+hace de a un hilo por vez, en un temporal único, y un error de E/S solo se
+registra.
+"""
+import atexit
+import json
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+BUCKETS_SEGUNDOS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+BUCKETS_CONSULTAS = (1, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+INTERVALO_VOLCADO = 1.0
+ARCHIVO_FINALIZADOS = 'metricas_finalizados.json'
+
+logger = logging.getLogger(__name__)
+
+
+def _clave(etiquetas):
+    return json.dumps(sorted(etiquetas.items()), ensure_ascii=False)
+
+
+def _formatear_etiquetas(pares, extra=()):
+    pares = list(pares) + list(extra)
+    if not pares:
+        return ''
+    texto = ','.join(
+        '{}="{}"'.format(nombre, str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for nombre, valor in pares
+    )
+    return '{' + texto + '}'
+
+
+def _formatear_numero(valor):
+    if valor == float('inf'):
+        return '+Inf'
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+
+class Metrica:
+    tipo = None
+
+    def __init__(self, nombre, ayuda, registro):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.valores = {}
+        self._registro = registro
+        registro.metricas[nombre] = self
+
+    @property
+    def _lock(self):
+        return self._registro.lock
+
+
+class Contador(Metrica):
+    tipo = 'counter'
+
+    def inc(self, cantidad=1, **etiquetas):
+        clave = _clave(etiquetas)
+        with self._lock:
+            self.valores[clave] = self.valores.get(clave, 0) + cantidad
+        self._registro.volcar_si_corresponde()
+
+    def establecer(self, valor, **etiquetas):
+        """Fija el valor acumulado (para contadores que se leen de otra fuente, como lru_cache)."""
+        with self._lock:
+            self.valores[_clave(etiquetas)] = valor
+
+    @staticmethod
+    def combinar(a, b):
+        return a + b
+
+    def lineas(self, valores):
+        for clave, valor in sorted(valores.items()):
+            yield f'{self.nombre}{_formatear_etiquetas(json.loads(clave))} {_formatear_numero(valor)}'
+
+
+class Histograma(Metrica):
+    tipo = 'histogram'
+
+    def __init__(self, nombre, ayuda, registro, buckets=BUCKETS_SEGUNDOS):
+        super().__init__(nombre, ayuda, registro)
+        self.buckets = tuple(buckets)
+
+    def observar(self, valor, **etiquetas):
+        clave = _clave(etiquetas)
+        with self._lock:
+            # [conteo por bucket (no acumulado)..., +Inf, suma]
+            datos = self.valores.get(clave)
+            if datos is None:
+                datos = self.valores[clave] = [0] * (len(self.buckets) + 1) + [0.0]
+            for i, limite in enumerate(self.buckets):
+                if valor <= limite:
+                    datos[i] += 1
+                    break
+            else:
+                datos[len(self.buckets)] += 1
+            datos[-1] += valor
+        self._registro.volcar_si_corresponde()
+
+    @staticmethod
+    def combinar(a, b):
+        return [x + y for x, y in zip(a, b)]
+
+    def lineas(self, valores):
+        for clave, datos in sorted(valores.items()):
+            etiquetas = json.loads(clave)
+            acumulado = 0
+            for limite, conteo in zip(self.buckets + (float('inf'),), datos[:-1]):
+                acumulado += conteo
+                le = (('le', _formatear_numero(limite)),)
+                yield f'{self.nombre}_bucket{_formatear_etiquetas(etiquetas, le)} {acumulado}'
+            yield f'{self.nombre}_sum{_formatear_etiquetas(etiquetas)} {_formatear_numero(datos[-1])}'
+            yield f'{self.nombre}_count{_formatear_etiquetas(etiquetas)} {acumulado}'
+
+
+class Registro:
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.metricas = {}
+        self.recolectores = []
+        self.al_reiniciar = []
+        self._ultimo_volcado = 0.0
+        self._volcando = threading.Lock()
+
+    def contador(self, nombre, ayuda):
+        return Contador(nombre, ayuda, self)
+
+    def histograma(self, nombre, ayuda, buckets=BUCKETS_SEGUNDOS):
+        return Histograma(nombre, ayuda, self, buckets)
+
+    def recolector(self, funcion):
+        """Registra una función que actualiza métricas justo antes de exportarlas."""
+        self.recolectores.append(funcion)
+        return funcion
+
+    def reinicio(self, funcion):
+        """Registra una función que se llama en el proceso hijo después de un fork."""
+        self.al_reiniciar.append(funcion)
+        return funcion
+
+    def reiniciar_en_hijo(self):
+        """Tras un fork: valores en cero y un lock nuevo (el del padre pudo quedar tomado)."""
+        self.lock = threading.RLock()
+        self._volcando = threading.Lock()
+        for metrica in self.metricas.values():
+            metrica.valores = {}
+        self._ultimo_volcado = 0.0
+        for funcion in self.al_reiniciar:
+            funcion()
+
+    # --- Modo multiproceso ---
+
+    def directorio(self):
+        from django.conf import settings
+        directorio = getattr(settings, 'METRICAS_DIR', None)
+        return Path(directorio) if directorio else None
+
+    def instantanea(self):
+        for recolector in self.recolectores:
+            recolector()
+        with self.lock:
+            return {nombre: dict(metrica.valores) for nombre, metrica in self.metricas.items()}
+
+    def volcar(self, esperar=True):
+        """
+        Escribe el archivo de este proceso. Con `esperar=False` no hace nada si
+        otro hilo ya está volcando. Los errores de E/S se registran, no se propagan.
+        """
+        directorio = self.directorio()
+        if directorio is None:
+            return
+        if not self._volcando.acquire(blocking=esperar):
+            return
+        temporal = None
+        try:
+            directorio.mkdir(parents=True, exist_ok=True)
+            descriptor, temporal = tempfile.mkstemp(dir=directorio, prefix=f'metricas_{os.getpid()}_', suffix='.tmp')
+            with os.fdopen(descriptor, 'w') as archivo:
+                json.dump(self.instantanea(), archivo)
+            os.replace(temporal, directorio / f'metricas_{os.getpid()}.json')
+            temporal = None
+        except OSError:
+            logger.warning('No se pudieron volcar las métricas', exc_info=True, extra={'directorio': str(directorio)})
+        finally:
+            if temporal is not None:
+                Path(temporal).unlink(missing_ok=True)
+            self._ultimo_volcado = time.monotonic()
+            self._volcando.release()
+
+    def volcar_si_corresponde(self):
+        if time.monotonic() - self._ultimo_volcado >= INTERVALO_VOLCADO:
+            self.volcar(esperar=False)
+
+    def valores_combinados(self):
+        directorio = self.directorio()
+        if directorio is None:
+            return self.instantanea()
+        self.volcar()
+        self.plegar_finalizados(directorio)
+        combinados = {}
+        for archivo in directorio.glob('metricas_*.json'):
+            try:
+                datos = json.loads(archivo.read_text())
+            except (OSError, ValueError):
+                continue
+            self._combinar(combinados, datos)
+        return combinados
+
+    def _combinar(self, combinados, datos):
+        for nombre, valores in datos.items():
+            metrica = self.metricas.get(nombre)
+            if metrica is None:
+                continue
+            destino = combinados.setdefault(nombre, {})
+            for clave, valor in valores.items():
+                destino[clave] = metrica.combinar(destino[clave], valor) if clave in destino else valor
+
+    def plegar_finalizados(self, directorio):
+        """Suma los archivos de procesos que ya no existen a ARCHIVO_FINALIZADOS y los borra."""
+        muertos = [archivo for archivo in directorio.glob('metricas_*.json') if not _proceso_vivo(archivo)]
+        if not muertos:
+            return
+        # Un lock de archivo: dos procesos exportando a la vez no deben plegar el mismo archivo dos veces.
+        # fcntl solo existe en POSIX, igual que los workers con fork que usan este modo; se importa aquí
+        # para que el módulo (que importa models.py) cargue en cualquier plataforma.
+        import fcntl
+        with open(directorio / '.metricas.lock', 'w') as bloqueo:
+            fcntl.flock(bloqueo, fcntl.LOCK_EX)
+            finalizados = directorio / ARCHIVO_FINALIZADOS
+            try:
+                combinados = json.loads(finalizados.read_text())
+            except (OSError, ValueError):
+                combinados = {}
+            plegados = []
+            for archivo in muertos:
+                try:
+                    self._combinar(combinados, json.loads(archivo.read_text()))
+                except (OSError, ValueError):
+                    continue
+                plegados.append(archivo)
+            if not plegados:
+                return
+            temporal = finalizados.with_suffix('.tmp')
+            temporal.write_text(json.dumps(combinados))
+            os.replace(temporal, finalizados)
+            for archivo in plegados:
+                archivo.unlink(missing_ok=True)
+
+    def exportar(self):
+        """Texto en formato de exposición de Prometheus (versión 0.0.4)."""
+        valores = self.valores_combinados()
+        lineas = []
+        for nombre, metrica in self.metricas.items():
+            lineas.append(f'# HELP {nombre} {metrica.ayuda}')
+            lineas.append(f'# TYPE {nombre} {metrica.tipo}')
+            lineas.extend(metrica.lineas(valores.get(nombre, {})))
+        return '\n'.join(lineas) + '\n'
+
+
+def _proceso_vivo(archivo):
+    """Si el proceso dueño de `metricas_<pid>.json` sigue corriendo (los demás archivos cuentan como vivos)."""
+    pid = archivo.stem.removeprefix('metricas_')
+    if not pid.isdigit():
+        return True
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+registro = Registro()
+atexit.register(registro.volcar)
+os.register_at_fork(after_in_child=registro.reiniciar_en_hijo)
+
+peticiones = registro.contador('prestamos_http_peticiones_total', 'Peticiones HTTP por vista, método y estado.')
+duracion_peticiones = registro.histograma(
+    'prestamos_http_duracion_segundos', 'Duración de las peticiones HTTP por vista.'
+)
+consultas_peticion = registro.histograma(
+    'prestamos_db_consultas_por_peticion', 'Consultas SQL por petición, por vista.', BUCKETS_CONSULTAS
+)
+consultas_total = registro.contador('prestamos_db_consultas_total', 'Consultas SQL ejecutadas, por vista.')
+cache_aciertos = registro.contador('prestamos_cache_aciertos_total', 'Aciertos de caché por caché.')
+cache_fallos = registro.contador('prestamos_cache_fallos_total', 'Fallos de caché por caché.')
+pagos_registrados = registro.contador('prestamos_pagos_registrados_total', 'Pagos registrados.')
+pagos_monto = registro.contador('prestamos_pagos_monto_total', 'Monto total de los pagos registrados.')
+penalidades_monto = registro.contador(
+    'prestamos_penalidades_monto_total', 'Monto de penalidad acumulado por las ejecuciones de update_penalties.'
+)
+penalidades_cuotas = registro.contador(
+    'prestamos_penalidades_cuotas_total', 'Cuotas cuya penalidad aumentó en update_penalties.'
+)
+duracion_trabajos = registro.histograma(
+    'prestamos_trabajo_duracion_segundos', 'Duración de los trabajos y procesos por lotes.'
+)
+trabajos = registro.contador('prestamos_trabajos_total', 'Trabajos ejecutados por nombre y resultado.')
+
+
+@contextmanager
+def medir_trabajo(nombre):
+    """Registra la duración y el resultado ('ok' o 'error') de un trabajo."""
+    inicio = time.perf_counter()
+    resultado = 'error'
+    try:
+        yield
+        resultado = 'ok'
+    finally:
+        duracion_trabajos.observar(time.perf_counter() - inicio, trabajo=nombre)
+        trabajos.inc(trabajo=nombre, resultado=resultado)
+
+
+# Aciertos y fallos que un proceso hijo heredó en las cachés del padre; no son suyos.
+_base_caches = {}
+
+
+def _caches():
+    from . import calendario
+    return (('calendario', calendario._secuencia), ('calendario_ajustado', calendario._secuencia_ajustada))
+
+
+@registro.recolector
+def _caches_del_calendario():
+    for nombre, funcion in _caches():
+        info = funcion.cache_info()
+        aciertos, fallos = _base_caches.get(nombre, (0, 0))
+        cache_aciertos.establecer(info.hits - aciertos, cache=nombre)
+        cache_fallos.establecer(info.misses - fallos, cache=nombre)
+
+
+@registro.reinicio
+def _base_de_caches_heredadas():
+    # Sin importar nada dentro del fork: si el calendario no está cargado, no hay nada heredado.
+    if 'gestion_prestamos.calendario' not in sys.modules:
+        return
+    for nombre, funcion in _caches():
+        info = funcion.cache_info()
+        _base_caches[nombre] = (info.hits, info.misses)
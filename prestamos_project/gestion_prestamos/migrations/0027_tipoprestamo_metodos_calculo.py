@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-19 18:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion_prestamos', '0026_prestamo_fecha_aprobacion'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='tipoprestamo',
+            name='metodo_calculo',
+            field=models.CharField(choices=[('frances', 'Francés (cuota fija)'), ('aleman', 'Alemán (capital fijo)'), ('simple', 'Interés Simple')], default='frances', max_length=20, verbose_name='Método de Cálculo'),
+        ),
+    ]
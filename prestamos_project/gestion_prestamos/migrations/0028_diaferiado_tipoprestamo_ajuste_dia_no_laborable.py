@@ -0,0 +1,32 @@
+# Generated by Django 5.2.5 on 2026-10-19 18:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion_prestamos', '0027_tipoprestamo_metodos_calculo'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DiaFeriado',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField(unique=True, verbose_name='Fecha')),
+                ('descripcion', models.CharField(max_length=100, verbose_name='Descripción')),
+            ],
+            options={
+                'verbose_name': 'Día Feriado',
+                'verbose_name_plural': 'Días Feriados',
+                'db_table': 'prestamos_dia_feriado',
+                'ordering': ['fecha'],
+            },
+        ),
+        migrations.AddField(
+            model_name='tipoprestamo',
+            name='ajuste_dia_no_laborable',
+            field=models.CharField(choices=[('ninguno', 'No ajustar'), ('siguiente', 'Día hábil siguiente'), ('anterior', 'Día hábil anterior'), ('siguiente_modificado', 'Día hábil siguiente (sin cambiar de mes)')], default='ninguno', help_text='Qué hacer cuando una cuota vence en fin de semana o feriado.', max_length=25, verbose_name='Ajuste de Vencimientos en Días No Laborables'),
+        ),
+    ]
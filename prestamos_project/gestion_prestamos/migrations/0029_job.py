@@ -0,0 +1,42 @@
+# Generated by Django 5.2.5 on 2026-10-19 18:47
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion_prestamos', '0028_diaferiado_tipoprestamo_ajuste_dia_no_laborable'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Job',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nombre', models.CharField(max_length=100, verbose_name='Tarea')),
+                ('argumentos', models.JSONField(blank=True, default=dict, verbose_name='Argumentos')),
+                ('cola', models.CharField(default='default', max_length=50, verbose_name='Cola')),
+                ('prioridad', models.IntegerField(default=0, help_text='Mayor número, antes se ejecuta.', verbose_name='Prioridad')),
+                ('estado', models.CharField(choices=[('pendiente', 'Pendiente'), ('en_proceso', 'En Proceso'), ('completado', 'Completado'), ('fallido', 'Fallido')], default='pendiente', max_length=20, verbose_name='Estado')),
+                ('intentos', models.IntegerField(default=0, verbose_name='Intentos')),
+                ('max_intentos', models.IntegerField(default=3, verbose_name='Máximo de Intentos')),
+                ('ejecutar_despues', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Ejecutar Después De')),
+                ('progreso', models.IntegerField(default=0, verbose_name='Progreso (%)')),
+                ('mensaje_progreso', models.CharField(blank=True, default='', max_length=255, verbose_name='Mensaje de Progreso')),
+                ('resultado', models.JSONField(blank=True, null=True, verbose_name='Resultado')),
+                ('error', models.TextField(blank=True, default='', verbose_name='Último Error')),
+                ('worker', models.CharField(blank=True, default='', max_length=100, verbose_name='Worker')),
+                ('fecha_creacion', models.DateTimeField(auto_now_add=True, verbose_name='Fecha de Creación')),
+                ('fecha_inicio', models.DateTimeField(blank=True, null=True, verbose_name='Fecha de Inicio')),
+                ('fecha_fin', models.DateTimeField(blank=True, null=True, verbose_name='Fecha de Finalización')),
+            ],
+            options={
+                'verbose_name': 'Trabajo en Segundo Plano',
+                'verbose_name_plural': 'Trabajos en Segundo Plano',
+                'db_table': 'prestamos_job',
+                'indexes': [models.Index(fields=['estado', 'cola', 'ejecutar_despues'], name='job_pendientes_idx')],
+            },
+        ),
+    ]
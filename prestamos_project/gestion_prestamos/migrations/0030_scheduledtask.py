@@ -0,0 +1,43 @@
+# Generated by Django 5.2.5 on 2026-10-19 18:50
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion_prestamos', '0029_job'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScheduledTask',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nombre', models.CharField(max_length=100, unique=True, verbose_name='Nombre')),
+                ('tarea', models.CharField(help_text='Nombre de una tarea registrada con @tarea.', max_length=100, verbose_name='Tarea')),
+                ('argumentos', models.JSONField(blank=True, default=dict, verbose_name='Argumentos')),
+                ('intervalo_minutos', models.PositiveIntegerField(blank=True, null=True, verbose_name='Cada (minutos)')),
+                ('hora', models.TimeField(blank=True, help_text='Hora local de ejecución diaria.', null=True, verbose_name='Hora Diaria')),
+                ('activa', models.BooleanField(default=True, verbose_name='Activa')),
+                ('proxima_ejecucion', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Próxima Ejecución')),
+                ('tiempo_maximo_minutos', models.PositiveIntegerField(default=30, help_text='Duración del bloqueo; si la instancia que la ejecuta cae, otra la retoma al vencer.', verbose_name='Tiempo Máximo (minutos)')),
+                ('bloqueada_hasta', models.DateTimeField(blank=True, null=True, verbose_name='Bloqueada Hasta')),
+                ('bloqueada_por', models.CharField(blank=True, default='', max_length=100, verbose_name='Bloqueada Por')),
+                ('ultima_ejecucion', models.DateTimeField(blank=True, null=True, verbose_name='Última Ejecución')),
+                ('ultima_duracion', models.FloatField(blank=True, null=True, verbose_name='Última Duración (s)')),
+                ('ultimo_resultado', models.CharField(blank=True, choices=[('ok', 'Correcta'), ('error', 'Con Error')], default='', max_length=10, verbose_name='Último Resultado')),
+                ('ultimo_error', models.TextField(blank=True, default='', verbose_name='Último Error')),
+                ('ejecuciones', models.PositiveIntegerField(default=0, verbose_name='Ejecuciones')),
+                ('fallos', models.PositiveIntegerField(default=0, verbose_name='Fallos')),
+                ('ejecuciones_omitidas', models.PositiveIntegerField(default=0, help_text='Ejecuciones perdidas (servidor apagado) que se cubrieron con una sola ejecución.', verbose_name='Ejecuciones Recuperadas')),
+            ],
+            options={
+                'verbose_name': 'Tarea Programada',
+                'verbose_name_plural': 'Tareas Programadas',
+                'db_table': 'prestamos_tarea_programada',
+                'ordering': ['nombre'],
+            },
+        ),
+    ]
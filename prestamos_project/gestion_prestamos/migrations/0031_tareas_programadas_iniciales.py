@@ -0,0 +1,33 @@
+import datetime
+
+from django.db import migrations
+
+
+def crear_tareas_programadas(apps, schema_editor):
+    """
+    Programa las tareas nocturnas: primero las penalidades por mora y luego
+    el cierre de los préstamos que quedaron saldados.
+    """
+    ScheduledTask = apps.get_model('gestion_prestamos', 'ScheduledTask')
+    tareas = [
+        {"nombre": "Penalidades por mora", "tarea": "update_penalties", "hora": datetime.time(0, 30)},
+        {"nombre": "Estados de préstamos", "tarea": "actualizar_estados_prestamos", "hora": datetime.time(1, 0)},
+    ]
+    for datos in tareas:
+        ScheduledTask.objects.get_or_create(nombre=datos["nombre"], defaults=datos)
+
+
+def eliminar_tareas_programadas(apps, schema_editor):
+    ScheduledTask = apps.get_model('gestion_prestamos', 'ScheduledTask')
+    ScheduledTask.objects.filter(nombre__in=["Penalidades por mora", "Estados de préstamos"]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion_prestamos', '0030_scheduledtask'),
+    ]
+
+    operations = [
+        migrations.RunPython(crear_tareas_programadas, eliminar_tareas_programadas),
+    ]
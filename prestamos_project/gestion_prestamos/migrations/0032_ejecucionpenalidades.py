@@ -0,0 +1,34 @@
+# Generated by Django 5.2.5 on 2026-10-19 18:52
+
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion_prestamos', '0031_tareas_programadas_iniciales'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EjecucionPenalidades',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha_corte', models.DateField(verbose_name='Fecha de Corte')),
+                ('estado', models.CharField(choices=[('en_proceso', 'En Proceso'), ('completada', 'Completada'), ('abandonada', 'Abandonada')], default='en_proceso', max_length=20, verbose_name='Estado')),
+                ('rangos', models.JSONField(default=list, help_text='Rangos [desde_id, hasta_id] a procesar.', verbose_name='Bloques')),
+                ('rangos_completados', models.JSONField(default=list, verbose_name='Bloques Completados')),
+                ('cuotas_actualizadas', models.PositiveIntegerField(default=0, verbose_name='Cuotas Actualizadas')),
+                ('monto_penalidades', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14, verbose_name='Monto de Penalidades')),
+                ('fecha_inicio', models.DateTimeField(auto_now_add=True, verbose_name='Fecha de Inicio')),
+                ('fecha_fin', models.DateTimeField(blank=True, null=True, verbose_name='Fecha de Finalización')),
+            ],
+            options={
+                'verbose_name': 'Ejecución de Penalidades',
+                'verbose_name_plural': 'Ejecuciones de Penalidades',
+                'db_table': 'prestamos_ejecucion_penalidades',
+                'ordering': ['-fecha_inicio'],
+            },
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.5 on 2026-10-19 18:58
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion_prestamos', '0032_ejecucionpenalidades'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MovimientoCaja',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('secuencia', models.PositiveBigIntegerField(unique=True, verbose_name='Secuencia')),
+                ('fecha', models.DateTimeField(db_index=True, default=django.utils.timezone.now, verbose_name='Fecha')),
+                ('tipo', models.CharField(choices=[('capital', 'Aporte de Capital'), ('desembolso', 'Desembolso'), ('gasto', 'Gasto de Préstamo'), ('pago', 'Pago Recibido'), ('ajuste', 'Ajuste')], max_length=20, verbose_name='Tipo')),
+                ('monto', models.DecimalField(decimal_places=2, help_text='Positivo: entrada. Negativo: salida.', max_digits=15, verbose_name='Monto')),
+                ('saldo', models.DecimalField(decimal_places=2, max_digits=15, verbose_name='Saldo en Caja')),
+                ('descripcion', models.CharField(blank=True, default='', max_length=255, verbose_name='Descripción')),
+                ('gasto', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='movimientos_caja', to='gestion_prestamos.gastoprestamo')),
+                ('pago', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='movimientos_caja', to='gestion_prestamos.pago')),
+                ('prestamo', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='movimientos_caja', to='gestion_prestamos.prestamo')),
+            ],
+            options={
+                'verbose_name': 'Movimiento de Caja',
+                'verbose_name_plural': 'Movimientos de Caja',
+                'db_table': 'prestamos_movimiento_caja',
+                'ordering': ['-secuencia'],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+from django.db import migrations
+
+
+def reconstruir_caja(apps, schema_editor):
+    """Carga en el libro de caja el historial existente."""
+    from gestion_prestamos.caja import reconstruir
+    reconstruir(apps)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion_prestamos', '0033_movimientocaja'),
+    ]
+
+    operations = [
+        migrations.RunPython(reconstruir_caja, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,69 @@
+# Generated by Django 5.2.5 on 2026-10-19 19:02
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion_prestamos', '0034_reconstruir_caja'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Cuenta',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('codigo', models.CharField(max_length=10, unique=True, verbose_name='Código')),
+                ('nombre', models.CharField(max_length=100, verbose_name='Nombre')),
+                ('tipo', models.CharField(choices=[('activo', 'Activo'), ('pasivo', 'Pasivo'), ('patrimonio', 'Patrimonio'), ('ingreso', 'Ingreso'), ('gasto', 'Gasto')], max_length=20, verbose_name='Tipo')),
+            ],
+            options={
+                'verbose_name': 'Cuenta Contable',
+                'verbose_name_plural': 'Cuentas Contables',
+                'db_table': 'prestamos_cuenta',
+                'ordering': ['codigo'],
+            },
+        ),
+        migrations.CreateModel(
+            name='Asiento',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField(db_index=True, verbose_name='Fecha')),
+                ('regla', models.CharField(choices=[('capital', 'Aporte de Capital'), ('desembolso', 'Desembolso'), ('gasto', 'Gasto de Préstamo'), ('gasto_financiado', 'Gasto a Cargo del Cliente'), ('pago_interes', 'Interés Cobrado'), ('pago_capital', 'Capital Recuperado'), ('pago_penalidad', 'Penalidad Cobrada')], max_length=30, verbose_name='Regla')),
+                ('referencia', models.CharField(max_length=50, verbose_name='Referencia')),
+                ('monto', models.DecimalField(decimal_places=2, max_digits=15, verbose_name='Monto')),
+                ('descripcion', models.CharField(blank=True, default='', max_length=255, verbose_name='Descripción')),
+                ('fecha_registro', models.DateTimeField(auto_now_add=True, verbose_name='Fecha de Registro')),
+                ('prestamo', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='asientos', to='gestion_prestamos.prestamo')),
+                ('cuenta_debe', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='asientos_debe', to='gestion_prestamos.cuenta', verbose_name='Cuenta Debe')),
+                ('cuenta_haber', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='asientos_haber', to='gestion_prestamos.cuenta', verbose_name='Cuenta Haber')),
+            ],
+            options={
+                'verbose_name': 'Asiento Contable',
+                'verbose_name_plural': 'Asientos Contables',
+                'db_table': 'prestamos_asiento',
+                'ordering': ['-fecha', '-id'],
+                'constraints': [models.UniqueConstraint(fields=('regla', 'referencia'), name='asiento_unico_por_origen')],
+            },
+        ),
+        migrations.CreateModel(
+            name='SaldoCuentaPeriodo',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('periodo', models.DateField(help_text='Primer día del mes.', verbose_name='Período')),
+                ('debe', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=15, verbose_name='Debe')),
+                ('haber', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=15, verbose_name='Haber')),
+                ('cuenta', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='saldos', to='gestion_prestamos.cuenta')),
+            ],
+            options={
+                'verbose_name': 'Saldo de Cuenta por Período',
+                'verbose_name_plural': 'Saldos de Cuentas por Período',
+                'db_table': 'prestamos_saldo_cuenta_periodo',
+                'ordering': ['periodo', 'cuenta'],
+                'constraints': [models.UniqueConstraint(fields=('cuenta', 'periodo'), name='saldo_unico_por_cuenta_periodo')],
+            },
+        ),
+    ]
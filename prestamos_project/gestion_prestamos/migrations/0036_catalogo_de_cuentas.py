@@ -0,0 +1,42 @@
+import datetime
+
+from django.db import migrations
+
+CUENTAS = [
+    ("1101", "Caja", "activo"),
+    ("1201", "Cartera de préstamos", "activo"),
+    ("3101", "Capital social", "patrimonio"),
+    ("4101", "Ingresos por intereses", "ingreso"),
+    ("4102", "Ingresos por penalidades", "ingreso"),
+    ("4103", "Recuperación de gastos", "ingreso"),
+    ("5101", "Gastos de préstamos", "gasto"),
+]
+
+
+def crear_catalogo(apps, schema_editor):
+    """Crea el catálogo de cuentas y programa la contabilización diaria."""
+    Cuenta = apps.get_model('gestion_prestamos', 'Cuenta')
+    for codigo, nombre, tipo in CUENTAS:
+        Cuenta.objects.get_or_create(codigo=codigo, defaults={"nombre": nombre, "tipo": tipo})
+
+    ScheduledTask = apps.get_model('gestion_prestamos', 'ScheduledTask')
+    ScheduledTask.objects.get_or_create(
+        nombre="Contabilidad diaria",
+        defaults={"tarea": "contabilizar_dia", "hora": datetime.time(1, 30)},
+    )
+
+
+def eliminar_catalogo(apps, schema_editor):
+    apps.get_model('gestion_prestamos', 'ScheduledTask').objects.filter(nombre="Contabilidad diaria").delete()
+    apps.get_model('gestion_prestamos', 'Cuenta').objects.filter(codigo__in=[c[0] for c in CUENTAS]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion_prestamos', '0035_cuenta_asiento_saldocuentaperiodo'),
+    ]
+
+    operations = [
+        migrations.RunPython(crear_catalogo, eliminar_catalogo),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.5 on 2026-10-19 19:04
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion_prestamos', '0036_catalogo_de_cuentas'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DevengoInteres',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('periodo', models.DateField(db_index=True, help_text='Primer día del mes.', verbose_name='Período')),
+                ('fecha_corte', models.DateField(verbose_name='Devengado Hasta')),
+                ('monto', models.DecimalField(decimal_places=2, max_digits=12, verbose_name='Interés Devengado')),
+                ('prestamo', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='devengos', to='gestion_prestamos.prestamo')),
+            ],
+            options={
+                'verbose_name': 'Devengo de Intereses',
+                'verbose_name_plural': 'Devengos de Intereses',
+                'db_table': 'prestamos_devengo_interes',
+                'ordering': ['-periodo', 'prestamo'],
+                'constraints': [models.UniqueConstraint(fields=('prestamo', 'periodo'), name='devengo_unico_por_prestamo_periodo')],
+            },
+        ),
+    ]
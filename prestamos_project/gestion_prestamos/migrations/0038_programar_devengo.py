@@ -0,0 +1,27 @@
+import datetime
+
+from django.db import migrations
+
+
+def programar_devengo(apps, schema_editor):
+    """El devengo corre cada noche, después de las penalidades y antes de la contabilidad."""
+    ScheduledTask = apps.get_model('gestion_prestamos', 'ScheduledTask')
+    ScheduledTask.objects.get_or_create(
+        nombre="Devengo de intereses",
+        defaults={"tarea": "devengar_intereses", "hora": datetime.time(1, 15)},
+    )
+
+
+def eliminar_programacion(apps, schema_editor):
+    apps.get_model('gestion_prestamos', 'ScheduledTask').objects.filter(nombre="Devengo de intereses").delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion_prestamos', '0037_devengointeres'),
+    ]
+
+    operations = [
+        migrations.RunPython(programar_devengo, eliminar_programacion),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 5.2.5 on 2026-10-19 19:06
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion_prestamos', '0038_programar_devengo'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PeriodoCerrado',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('periodo', models.DateField(help_text='Primer día del mes.', unique=True, verbose_name='Período')),
+                ('fecha_cierre', models.DateTimeField(auto_now_add=True, verbose_name='Fecha de Cierre')),
+                ('prestamos', models.PositiveIntegerField(default=0, verbose_name='Préstamos')),
+                ('saldo_capital', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=15, verbose_name='Saldo de Capital')),
+                ('interes_devengado', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=15, verbose_name='Interés Devengado')),
+                ('penalidades', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=15, verbose_name='Penalidades')),
+                ('pagos_recibidos', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=15, verbose_name='Pagos Recibidos')),
+            ],
+            options={
+                'verbose_name': 'Período Cerrado',
+                'verbose_name_plural': 'Períodos Cerrados',
+                'db_table': 'prestamos_periodo_cerrado',
+                'ordering': ['-periodo'],
+            },
+        ),
+        migrations.CreateModel(
+            name='CierreMensual',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('periodo', models.DateField(db_index=True, help_text='Primer día del mes.', verbose_name='Período')),
+                ('saldo_capital', models.DecimalField(decimal_places=2, max_digits=12, verbose_name='Saldo de Capital al Cierre')),
+                ('interes_devengado', models.DecimalField(decimal_places=2, max_digits=12, verbose_name='Interés Devengado')),
+                ('penalidades', models.DecimalField(decimal_places=2, max_digits=12, verbose_name='Penalidades Generadas')),
+                ('pagos_recibidos', models.DecimalField(decimal_places=2, max_digits=12, verbose_name='Pagos Recibidos')),
+                ('dias_atraso', models.PositiveIntegerField(default=0, verbose_name='Días de Atraso')),
+                ('prestamo', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='cierres', to='gestion_prestamos.prestamo')),
+            ],
+            options={
+                'verbose_name': 'Cierre Mensual',
+                'verbose_name_plural': 'Cierres Mensuales',
+                'db_table': 'prestamos_cierre_mensual',
+                'ordering': ['-periodo', 'prestamo'],
+                'constraints': [models.UniqueConstraint(fields=('prestamo', 'periodo'), name='cierre_unico_por_prestamo_periodo')],
+            },
+        ),
+    ]
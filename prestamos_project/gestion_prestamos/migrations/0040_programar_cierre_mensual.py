@@ -0,0 +1,27 @@
+import datetime
+
+from django.db import migrations
+
+
+def programar_cierre(apps, schema_editor):
+    """Revisa cada noche si el mes anterior está cerrado; el primer día del mes lo cierra."""
+    ScheduledTask = apps.get_model('gestion_prestamos', 'ScheduledTask')
+    ScheduledTask.objects.get_or_create(
+        nombre="Cierre mensual",
+        defaults={"tarea": "cierre_mensual", "hora": datetime.time(2, 0)},
+    )
+
+
+def eliminar_programacion(apps, schema_editor):
+    apps.get_model('gestion_prestamos', 'ScheduledTask').objects.filter(nombre="Cierre mensual").delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion_prestamos', '0039_cierremensual_periodocerrado'),
+    ]
+
+    operations = [
+        migrations.RunPython(programar_cierre, eliminar_programacion),
+    ]
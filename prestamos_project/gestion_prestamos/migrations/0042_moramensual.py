@@ -0,0 +1,33 @@
+# Generated by Django 5.2.5 on 2026-10-19 19:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion_prestamos', '0041_cuota_estado_venc_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MoraMensual',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('periodo', models.DateField(db_index=True, help_text='Primer día del mes.', verbose_name='Período')),
+                ('cohorte', models.DateField(help_text='Mes de desembolso.', verbose_name='Cohorte')),
+                ('tramo', models.PositiveSmallIntegerField(choices=[(0, 'Al día'), (1, '1-30'), (2, '31-60'), (3, '61-90'), (4, '90+'), (5, 'Cancelado')], verbose_name='Tramo de Atraso')),
+                ('dias_atraso', models.PositiveIntegerField(default=0, verbose_name='Días de Atraso')),
+                ('saldo_capital', models.DecimalField(decimal_places=2, max_digits=12, verbose_name='Saldo de Capital')),
+                ('prestamo', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='mora_mensual', to='gestion_prestamos.prestamo')),
+            ],
+            options={
+                'verbose_name': 'Mora Mensual',
+                'verbose_name_plural': 'Mora Mensual',
+                'db_table': 'prestamos_mora_mensual',
+                'ordering': ['-periodo', 'prestamo'],
+                'constraints': [models.UniqueConstraint(fields=('prestamo', 'periodo'), name='mora_unica_por_prestamo_periodo')],
+            },
+        ),
+    ]
@@ -0,0 +1,27 @@
+import datetime
+
+from django.db import migrations
+
+
+def programar_snapshot(apps, schema_editor):
+    """Después del cierre mensual; los días sin meses nuevos no hace nada."""
+    ScheduledTask = apps.get_model('gestion_prestamos', 'ScheduledTask')
+    ScheduledTask.objects.get_or_create(
+        nombre="Mora mensual",
+        defaults={"tarea": "snapshot_mora", "hora": datetime.time(2, 30)},
+    )
+
+
+def eliminar_programacion(apps, schema_editor):
+    apps.get_model('gestion_prestamos', 'ScheduledTask').objects.filter(nombre="Mora mensual").delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion_prestamos', '0042_moramensual'),
+    ]
+
+    operations = [
+        migrations.RunPython(programar_snapshot, eliminar_programacion),
+    ]
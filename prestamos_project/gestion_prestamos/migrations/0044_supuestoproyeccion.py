@@ -0,0 +1,34 @@
+# Generated by Django 5.2.5 on 2026-10-19 19:14
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion_prestamos', '0043_programar_snapshot_mora'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SupuestoProyeccion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tramo', models.PositiveSmallIntegerField(choices=[(0, 'Al día'), (1, '1-30'), (2, '31-60'), (3, '61-90'), (4, '90+')], verbose_name='Tramo de Atraso')),
+                ('tasa_incumplimiento', models.DecimalField(decimal_places=4, help_text='Fracción de los préstamos vigentes que deja de pagar cada mes (0.02 = 2%).', max_digits=6, verbose_name='Incumplimiento Mensual')),
+                ('tasa_prepago', models.DecimalField(decimal_places=4, default=Decimal('0.0000'), help_text='Fracción de los préstamos vigentes que cancela por adelantado cada mes.', max_digits=6, verbose_name='Prepago Mensual')),
+                ('volatilidad', models.DecimalField(decimal_places=3, default=Decimal('0.300'), help_text='Dispersión (lognormal) de las tasas entre escenarios.', max_digits=5, verbose_name='Volatilidad')),
+                ('tasa_recuperacion', models.DecimalField(decimal_places=4, default=Decimal('0.0000'), help_text='Fracción del capital incumplido que se recupera.', max_digits=5, verbose_name='Recuperación')),
+                ('tipo_prestamo', models.ForeignKey(blank=True, help_text='Vacío: aplica a todos los tipos sin supuesto propio.', null=True, on_delete=django.db.models.deletion.CASCADE, related_name='supuestos_proyeccion', to='gestion_prestamos.tipoprestamo', verbose_name='Tipo de Préstamo')),
+            ],
+            options={
+                'verbose_name': 'Supuesto de Proyección',
+                'verbose_name_plural': 'Supuestos de Proyección',
+                'db_table': 'prestamos_supuesto_proyeccion',
+                'ordering': ['tipo_prestamo', 'tramo'],
+                'constraints': [models.UniqueConstraint(fields=('tipo_prestamo', 'tramo'), name='supuesto_unico_por_tipo_tramo')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-19 19:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion_prestamos', '0044_supuestoproyeccion'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='prestamo',
+            name='tae',
+            field=models.DecimalField(blank=True, decimal_places=2, help_text='Tasa anual efectiva: incluye comisión por desembolso y gastos.', max_digits=10, null=True, verbose_name='TAE (%)'),
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.2.5 on 2026-10-19 19:24
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion_prestamos', '0045_prestamo_tae'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='asiento',
+            name='regla',
+            field=models.CharField(choices=[('capital', 'Aporte de Capital'), ('desembolso', 'Desembolso'), ('gasto', 'Gasto de Préstamo'), ('gasto_financiado', 'Gasto a Cargo del Cliente'), ('pago_interes', 'Interés Cobrado'), ('pago_capital', 'Capital Recuperado'), ('pago_penalidad', 'Penalidad Cobrada'), ('abono_capital', 'Abono a Capital')], max_length=30, verbose_name='Regla'),
+        ),
+        migrations.AlterField(
+            model_name='movimientocaja',
+            name='tipo',
+            field=models.CharField(choices=[('capital', 'Aporte de Capital'), ('desembolso', 'Desembolso'), ('gasto', 'Gasto de Préstamo'), ('pago', 'Pago Recibido'), ('abono', 'Abono a Capital'), ('ajuste', 'Ajuste')], max_length=20, verbose_name='Tipo'),
+        ),
+        migrations.CreateModel(
+            name='AbonoCapital',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('monto', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='Monto Abonado')),
+                ('modo', models.CharField(choices=[('reducir_plazo', 'Reducir Plazo'), ('reducir_cuota', 'Reducir Cuota')], max_length=20, verbose_name='Modo')),
+                ('fecha', models.DateTimeField(auto_now_add=True, verbose_name='Fecha')),
+                ('saldo_anterior', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='Saldo Anterior')),
+                ('saldo_nuevo', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='Saldo Nuevo')),
+                ('cuotas_anteriores', models.PositiveIntegerField(verbose_name='Cuotas Futuras Antes')),
+                ('cuotas_nuevas', models.PositiveIntegerField(verbose_name='Cuotas Futuras Después')),
+                ('cuota_anterior', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='Cuota Anterior')),
+                ('cuota_nueva', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True, verbose_name='Cuota Nueva')),
+                ('prestamo', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='abonos_capital', to='gestion_prestamos.prestamo')),
+            ],
+            options={
+                'verbose_name': 'Abono a Capital',
+                'verbose_name_plural': 'Abonos a Capital',
+                'db_table': 'prestamos_abono_capital',
+                'ordering': ['-fecha'],
+            },
+        ),
+    ]
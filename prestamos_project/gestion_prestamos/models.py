@@ -1,8 +1,11 @@
 from django.contrib.auth.models import User
-from django.db import models
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, models, transaction
 from django.db.models import Q, UniqueConstraint
 from decimal import Decimal
 from django.utils import timezone
+from . import metricas
+from .dinero import a_centavos, a_decimal
 
 # ==================================================
 # === MODELO TIPO DE GASTO ===
@@ -141,9 +144,8 @@ class Garante(models.Model):
 class TipoPrestamo(models.Model):
     METODO_CALCULO_CHOICES = [
         ('frances', 'Francés (cuota fija)'),
-        # Futuros métodos:
-        # ('aleman', 'Alemán (capital fijo)'),
-        # ('simple', 'Interés Simple'),
+        ('aleman', 'Alemán (capital fijo)'),
+        ('simple', 'Interés Simple'),
     ]
     PERIODO_TASA_CHOICES = [
         ('anual', 'Anual'),
@@ -190,6 +192,20 @@ class TipoPrestamo(models.Model):
         help_text="Marcar si este tipo de préstamo exige una garantía o requisito adicional."
     )
 
+    AJUSTE_DIA_NO_LABORABLE_CHOICES = [
+        ('ninguno', 'No ajustar'),
+        ('siguiente', 'Día hábil siguiente'),
+        ('anterior', 'Día hábil anterior'),
+        ('siguiente_modificado', 'Día hábil siguiente (sin cambiar de mes)'),
+    ]
+    ajuste_dia_no_laborable = models.CharField(
+        max_length=25,
+        choices=AJUSTE_DIA_NO_LABORABLE_CHOICES,
+        default='ninguno',
+        verbose_name="Ajuste de Vencimientos en Días No Laborables",
+        help_text="Qué hacer cuando una cuota vence en fin de semana o feriado."
+    )
+
     def __str__(self):
         return self.nombre
 
@@ -278,6 +294,11 @@ class Prestamo(models.Model):
 
     total_gastos_asociados = models.DecimalField(max_digits=10, decimal_places=2, default=0, verbose_name="Total de Gastos Asociados")
     monto_desembolsado = models.DecimalField(max_digits=10, decimal_places=2, default=0, verbose_name="Monto Desembolsado")
+    # Tasa anual efectiva con comisión y gastos; la calcula tae.py al generar las cuotas.
+    tae = models.DecimalField(
+        max_digits=10, decimal_places=2, null=True, blank=True, verbose_name="TAE (%)",
+        help_text="Tasa anual efectiva: incluye comisión por desembolso y gastos."
+    )
 
     garante = models.ForeignKey('Garante', on_delete=models.SET_NULL, null=True, blank=True, verbose_name="Garante")
 
@@ -287,12 +308,28 @@ class Prestamo(models.Model):
     def __str__(self):
         return f"Préstamo #{self.id} - {self.cliente.nombres} {self.cliente.apellidos}"
 
+    def registrar_desembolso(self):
+        """
+        Registra en caja la salida del desembolso y de los gastos asociados.
+        Se llama al aprobar el préstamo; si ya se registró, no hace nada.
+        """
+        if self.movimientos_caja.filter(tipo='desembolso').exists():
+            return
+        MovimientoCaja.registrar(
+            'desembolso', -(self.monto_desembolsado or self.monto), f'Desembolso del préstamo #{self.id}', prestamo=self
+        )
+        for gasto in self.gastos_asociados.select_related('tipo_gasto'):
+            MovimientoCaja.registrar(
+                'gasto', -gasto.monto, f'{gasto.tipo_gasto.nombre} - préstamo #{self.id}', prestamo=self, gasto=gasto
+            )
+
     def registrar_pago(self, monto_pagado):
         """
         Registra un pago para este préstamo y lo distribuye entre las cuotas pendientes.
         La fecha del pago se establece automáticamente al momento de la creación.
         """
-        monto_a_distribuir = monto_pagado
+        # La distribución se hace en centavos enteros (ver dinero.py).
+        monto_a_distribuir = a_centavos(monto_pagado)
         cuotas_pendientes = self.cuotas.filter(
             estado__in=['pendiente', 'pagada_parcialmente', 'vencida']
         ).order_by('numero_cuota')
@@ -302,18 +339,26 @@ class Prestamo(models.Model):
                 break
 
             # AHORA INCLUYE LA PENALIDAD
-            monto_necesario = cuota.monto_total_a_pagar - cuota.total_pagado
+            monto_necesario = a_centavos(cuota.monto_total_a_pagar) - a_centavos(cuota.total_pagado)
             pago_a_cuota = min(monto_a_distribuir, monto_necesario)
 
             # La fecha_pago ya no se pasa, se crea automáticamente.
-            Pago.objects.create(
+            pago = Pago.objects.create(
                 cuota=cuota,
-                monto_pagado=pago_a_cuota
+                monto_pagado=a_decimal(pago_a_cuota)
             )
+            if pago_a_cuota > 0:
+                MovimientoCaja.registrar(
+                    'pago', pago.monto_pagado, f'Pago cuota #{cuota.numero_cuota} del préstamo #{self.id}',
+                    prestamo=self, pago=pago,
+                )
             
             cuota.actualizar_estado()
             monto_a_distribuir -= pago_a_cuota
 
+        metricas.pagos_registrados.inc()
+        metricas.pagos_monto.inc(float(monto_pagado))
+
         # Se verifica si el préstamo está completamente saldado.
         if not self.cuotas.filter(estado__in=['pendiente', 'pagada_parcialmente', 'vencida']).exists():
             self.estado = 'pagado'
@@ -398,6 +443,10 @@ class Cuota(models.Model):
         verbose_name_plural = "Cuotas"
         unique_together = ('prestamo', 'numero_cuota')
         ordering = ['prestamo', 'numero_cuota']
+        indexes = [
+            # Cartera vencida: cobros y antigüedad de saldos filtran por estado y vencimiento.
+            models.Index(fields=['estado', 'fecha_vencimiento'], name='cuota_estado_venc_idx'),
+        ]
 
 
 # ==================================================
@@ -418,6 +467,39 @@ class Pago(models.Model):
         verbose_name = "Pago"
         verbose_name_plural = "Pagos"
 
+
+# ==================================================
+# === MODELO ABONO A CAPITAL ===
+# ==================================================
+# Pago extraordinario que se aplica al capital. Las cuotas futuras se
+# reemplazan por una nueva tabla para el saldo que queda (ver abonos.py); este
+# registro conserva cómo estaba el préstamo antes y cómo quedó.
+class AbonoCapital(models.Model):
+    MODO_CHOICES = [
+        ('reducir_plazo', 'Reducir Plazo'),
+        ('reducir_cuota', 'Reducir Cuota'),
+    ]
+
+    prestamo = models.ForeignKey(Prestamo, on_delete=models.CASCADE, related_name="abonos_capital")
+    monto = models.DecimalField(max_digits=10, decimal_places=2, verbose_name="Monto Abonado")
+    modo = models.CharField(max_length=20, choices=MODO_CHOICES, verbose_name="Modo")
+    fecha = models.DateTimeField(auto_now_add=True, verbose_name="Fecha")
+    saldo_anterior = models.DecimalField(max_digits=10, decimal_places=2, verbose_name="Saldo Anterior")
+    saldo_nuevo = models.DecimalField(max_digits=10, decimal_places=2, verbose_name="Saldo Nuevo")
+    cuotas_anteriores = models.PositiveIntegerField(verbose_name="Cuotas Futuras Antes")
+    cuotas_nuevas = models.PositiveIntegerField(verbose_name="Cuotas Futuras Después")
+    cuota_anterior = models.DecimalField(max_digits=10, decimal_places=2, verbose_name="Cuota Anterior")
+    cuota_nueva = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True, verbose_name="Cuota Nueva")
+
+    def __str__(self):
+        return f"Abono de {self.monto} al préstamo #{self.prestamo_id} ({self.get_modo_display()})"
+
+    class Meta:
+        db_table = 'prestamos_abono_capital'
+        verbose_name = "Abono a Capital"
+        verbose_name_plural = "Abonos a Capital"
+        ordering = ['-fecha']
+
 # ==================================================
 # === MODELO CAPITAL ===
 # ==================================================
@@ -444,6 +526,24 @@ class Capital(models.Model):
         verbose_name_plural = "Capital de la Empresa"
 
 
+# ==================================================
+# === MODELO DÍA FERIADO ===
+# ==================================================
+# Almacena los feriados usados para ajustar vencimientos a días hábiles.
+class DiaFeriado(models.Model):
+    fecha = models.DateField(unique=True, verbose_name="Fecha")
+    descripcion = models.CharField(max_length=100, verbose_name="Descripción")
+
+    def __str__(self):
+        return f"{self.fecha:%d/%m/%Y} - {self.descripcion}"
+
+    class Meta:
+        db_table = 'prestamos_dia_feriado'
+        verbose_name = "Día Feriado"
+        verbose_name_plural = "Días Feriados"
+        ordering = ['fecha']
+
+
 # ==================================================
 # === MODELO REQUISITO ===
 # ==================================================
@@ -467,4 +567,442 @@ class Requisito(models.Model):
 
     class Meta:
         verbose_name = "Requisito"
-        verbose_name_plural = "Requisitos"
\ No newline at end of file
+        verbose_name_plural = "Requisitos"
+
+# ==================================================
+# === MODELO TRABAJO EN SEGUNDO PLANO (JOB) ===
+# ==================================================
+# Cola de trabajos pesados que se ejecutan fuera de las peticiones web
+# (ver trabajos.py y el comando `run_worker`).
+class Job(models.Model):
+    ESTADO_CHOICES = [
+        ('pendiente', 'Pendiente'),
+        ('en_proceso', 'En Proceso'),
+        ('completado', 'Completado'),
+        ('fallido', 'Fallido'),
+    ]
+
+    nombre = models.CharField(max_length=100, verbose_name="Tarea")
+    argumentos = models.JSONField(default=dict, blank=True, verbose_name="Argumentos")
+    cola = models.CharField(max_length=50, default='default', verbose_name="Cola")
+    prioridad = models.IntegerField(default=0, verbose_name="Prioridad", help_text="Mayor número, antes se ejecuta.")
+    estado = models.CharField(max_length=20, choices=ESTADO_CHOICES, default='pendiente', verbose_name="Estado")
+    intentos = models.IntegerField(default=0, verbose_name="Intentos")
+    max_intentos = models.IntegerField(default=3, verbose_name="Máximo de Intentos")
+    ejecutar_despues = models.DateTimeField(default=timezone.now, verbose_name="Ejecutar Después De")
+    progreso = models.IntegerField(default=0, verbose_name="Progreso (%)")
+    mensaje_progreso = models.CharField(max_length=255, blank=True, default='', verbose_name="Mensaje de Progreso")
+    resultado = models.JSONField(null=True, blank=True, verbose_name="Resultado")
+    error = models.TextField(blank=True, default='', verbose_name="Último Error")
+    worker = models.CharField(max_length=100, blank=True, default='', verbose_name="Worker")
+    fecha_creacion = models.DateTimeField(auto_now_add=True, verbose_name="Fecha de Creación")
+    fecha_inicio = models.DateTimeField(null=True, blank=True, verbose_name="Fecha de Inicio")
+    fecha_fin = models.DateTimeField(null=True, blank=True, verbose_name="Fecha de Finalización")
+
+    def __str__(self):
+        return f"Job #{self.id} - {self.nombre} ({self.get_estado_display()})"
+
+    def reportar_progreso(self, porcentaje, mensaje=''):
+        """Guarda el avance del trabajo sin tocar el resto de los campos."""
+        self.progreso = max(0, min(100, int(porcentaje)))
+        self.mensaje_progreso = mensaje[:255]
+        Job.objects.filter(pk=self.pk).update(progreso=self.progreso, mensaje_progreso=self.mensaje_progreso)
+
+    class Meta:
+        db_table = 'prestamos_job'
+        verbose_name = "Trabajo en Segundo Plano"
+        verbose_name_plural = "Trabajos en Segundo Plano"
+        indexes = [
+            models.Index(fields=['estado', 'cola', 'ejecutar_despues'], name='job_pendientes_idx'),
+        ]
+
+
+# ==================================================
+# === MODELO TAREA PROGRAMADA ===
+# ==================================================
+# Tareas periódicas que ejecuta el comando `run_scheduler` (ver programador.py).
+# Cada fila apunta a una tarea registrada en trabajos.py y define cuándo se
+# ejecuta: cada `intervalo_minutos` o todos los días a la `hora` indicada.
+class ScheduledTask(models.Model):
+    RESULTADO_CHOICES = [
+        ('ok', 'Correcta'),
+        ('error', 'Con Error'),
+    ]
+
+    nombre = models.CharField(max_length=100, unique=True, verbose_name="Nombre")
+    tarea = models.CharField(max_length=100, verbose_name="Tarea", help_text="Nombre de una tarea registrada con @tarea.")
+    argumentos = models.JSONField(default=dict, blank=True, verbose_name="Argumentos")
+    intervalo_minutos = models.PositiveIntegerField(null=True, blank=True, verbose_name="Cada (minutos)")
+    hora = models.TimeField(null=True, blank=True, verbose_name="Hora Diaria", help_text="Hora local de ejecución diaria.")
+    activa = models.BooleanField(default=True, verbose_name="Activa")
+    proxima_ejecucion = models.DateTimeField(default=timezone.now, verbose_name="Próxima Ejecución")
+    tiempo_maximo_minutos = models.PositiveIntegerField(
+        default=30, verbose_name="Tiempo Máximo (minutos)",
+        help_text="Duración del bloqueo; si la instancia que la ejecuta cae, otra la retoma al vencer."
+    )
+    bloqueada_hasta = models.DateTimeField(null=True, blank=True, verbose_name="Bloqueada Hasta")
+    bloqueada_por = models.CharField(max_length=100, blank=True, default='', verbose_name="Bloqueada Por")
+    ultima_ejecucion = models.DateTimeField(null=True, blank=True, verbose_name="Última Ejecución")
+    ultima_duracion = models.FloatField(null=True, blank=True, verbose_name="Última Duración (s)")
+    ultimo_resultado = models.CharField(max_length=10, choices=RESULTADO_CHOICES, blank=True, default='', verbose_name="Último Resultado")
+    ultimo_error = models.TextField(blank=True, default='', verbose_name="Último Error")
+    ejecuciones = models.PositiveIntegerField(default=0, verbose_name="Ejecuciones")
+    fallos = models.PositiveIntegerField(default=0, verbose_name="Fallos")
+    ejecuciones_omitidas = models.PositiveIntegerField(
+        default=0, verbose_name="Ejecuciones Recuperadas",
+        help_text="Ejecuciones perdidas (servidor apagado) que se cubrieron con una sola ejecución."
+    )
+
+    def __str__(self):
+        return f"{self.nombre} ({self.tarea})"
+
+    def clean(self):
+        if bool(self.intervalo_minutos) == bool(self.hora):
+            raise ValidationError("Indique un intervalo en minutos o una hora diaria (solo uno de los dos).")
+
+    class Meta:
+        db_table = 'prestamos_tarea_programada'
+        verbose_name = "Tarea Programada"
+        verbose_name_plural = "Tareas Programadas"
+        ordering = ['nombre']
+
+
+# ==================================================
+# === MODELO EJECUCIÓN DE PENALIDADES (PUNTO DE CONTROL) ===
+# ==================================================
+# Registra el avance de `update_penalties` por bloques de cuotas para que una
+# ejecución interrumpida se reanude donde quedó.
+class EjecucionPenalidades(models.Model):
+    ESTADO_CHOICES = [
+        ('en_proceso', 'En Proceso'),
+        ('completada', 'Completada'),
+        ('abandonada', 'Abandonada'),
+    ]
+
+    fecha_corte = models.DateField(verbose_name="Fecha de Corte")
+    estado = models.CharField(max_length=20, choices=ESTADO_CHOICES, default='en_proceso', verbose_name="Estado")
+    rangos = models.JSONField(default=list, verbose_name="Bloques", help_text="Rangos [desde_id, hasta_id] a procesar.")
+    rangos_completados = models.JSONField(default=list, verbose_name="Bloques Completados")
+    cuotas_actualizadas = models.PositiveIntegerField(default=0, verbose_name="Cuotas Actualizadas")
+    monto_penalidades = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'), verbose_name="Monto de Penalidades")
+    fecha_inicio = models.DateTimeField(auto_now_add=True, verbose_name="Fecha de Inicio")
+    fecha_fin = models.DateTimeField(null=True, blank=True, verbose_name="Fecha de Finalización")
+
+    def __str__(self):
+        return f"Penalidades al {self.fecha_corte:%d/%m/%Y} ({self.get_estado_display()})"
+
+    def pendientes(self):
+        completados = {tuple(rango) for rango in self.rangos_completados}
+        return [rango for rango in self.rangos if tuple(rango) not in completados]
+
+    class Meta:
+        db_table = 'prestamos_ejecucion_penalidades'
+        verbose_name = "Ejecución de Penalidades"
+        verbose_name_plural = "Ejecuciones de Penalidades"
+        ordering = ['-fecha_inicio']
+
+
+# ==================================================
+# === MODELO MOVIMIENTO DE CAJA ===
+# ==================================================
+# Libro de caja de solo anexar: cada entrada o salida de dinero (aporte de
+# capital, desembolso, gasto, pago) es una fila que guarda el saldo acumulado.
+# El dinero en caja es el saldo de la última fila, y el de una fecha pasada el
+# de la última fila hasta esa fecha (ver caja.py). Las correcciones se
+# registran como nuevas filas de ajuste; nunca se editan las existentes.
+class MovimientoCaja(models.Model):
+    TIPO_CHOICES = [
+        ('capital', 'Aporte de Capital'),
+        ('desembolso', 'Desembolso'),
+        ('gasto', 'Gasto de Préstamo'),
+        ('pago', 'Pago Recibido'),
+        ('abono', 'Abono a Capital'),
+        ('ajuste', 'Ajuste'),
+    ]
+
+    secuencia = models.PositiveBigIntegerField(unique=True, verbose_name="Secuencia")
+    fecha = models.DateTimeField(default=timezone.now, db_index=True, verbose_name="Fecha")
+    tipo = models.CharField(max_length=20, choices=TIPO_CHOICES, verbose_name="Tipo")
+    monto = models.DecimalField(max_digits=15, decimal_places=2, verbose_name="Monto", help_text="Positivo: entrada. Negativo: salida.")
+    saldo = models.DecimalField(max_digits=15, decimal_places=2, verbose_name="Saldo en Caja")
+    descripcion = models.CharField(max_length=255, blank=True, default='', verbose_name="Descripción")
+    prestamo = models.ForeignKey(Prestamo, on_delete=models.SET_NULL, null=True, blank=True, related_name='movimientos_caja')
+    pago = models.ForeignKey(Pago, on_delete=models.SET_NULL, null=True, blank=True, related_name='movimientos_caja')
+    gasto = models.ForeignKey(GastoPrestamo, on_delete=models.SET_NULL, null=True, blank=True, related_name='movimientos_caja')
+
+    def __str__(self):
+        return f"{self.get_tipo_display()} ${self.monto:,.2f} (saldo ${self.saldo:,.2f})"
+
+    @classmethod
+    def registrar(cls, tipo, monto, descripcion='', **relaciones):
+        """
+        Anexa un movimiento con el saldo acumulado. Si otro proceso anexó a la
+        vez, la secuencia única lo detecta y se reintenta sobre el nuevo último.
+        """
+        for _ in range(5):
+            ultimo = cls.objects.order_by('-secuencia').values_list('secuencia', 'saldo').first() or (0, Decimal('0.00'))
+            try:
+                with transaction.atomic():
+                    return cls.objects.create(
+                        secuencia=ultimo[0] + 1, tipo=tipo, monto=monto, saldo=ultimo[1] + monto,
+                        descripcion=descripcion[:255], **relaciones
+                    )
+            except IntegrityError:
+                continue
+        raise IntegrityError('No se pudo anexar el movimiento de caja: demasiadas escrituras concurrentes.')
+
+    class Meta:
+        db_table = 'prestamos_movimiento_caja'
+        verbose_name = "Movimiento de Caja"
+        verbose_name_plural = "Movimientos de Caja"
+        ordering = ['-secuencia']
+
+
+# ==================================================
+# === CONTABILIDAD POR PARTIDA DOBLE ===
+# ==================================================
+# Catálogo de cuentas contables.
+class Cuenta(models.Model):
+    TIPO_CHOICES = [
+        ('activo', 'Activo'),
+        ('pasivo', 'Pasivo'),
+        ('patrimonio', 'Patrimonio'),
+        ('ingreso', 'Ingreso'),
+        ('gasto', 'Gasto'),
+    ]
+
+    codigo = models.CharField(max_length=10, unique=True, verbose_name="Código")
+    nombre = models.CharField(max_length=100, verbose_name="Nombre")
+    tipo = models.CharField(max_length=20, choices=TIPO_CHOICES, verbose_name="Tipo")
+
+    def __str__(self):
+        return f"{self.codigo} - {self.nombre}"
+
+    @property
+    def es_deudora(self):
+        """Activos y gastos aumentan por el debe; el resto, por el haber."""
+        return self.tipo in ('activo', 'gasto')
+
+    class Meta:
+        db_table = 'prestamos_cuenta'
+        verbose_name = "Cuenta Contable"
+        verbose_name_plural = "Cuentas Contables"
+        ordering = ['codigo']
+
+
+# Cada asiento debita una cuenta y acredita otra por el mismo monto, así el
+# libro siempre cuadra. `regla` y `referencia` identifican su origen
+# (p. ej. 'pago_capital', 'pago:125'), lo que vuelve idempotente la
+# contabilización diaria (ver contabilidad.py).
+class Asiento(models.Model):
+    REGLA_CHOICES = [
+        ('capital', 'Aporte de Capital'),
+        ('desembolso', 'Desembolso'),
+        ('gasto', 'Gasto de Préstamo'),
+        ('gasto_financiado', 'Gasto a Cargo del Cliente'),
+        ('pago_interes', 'Interés Cobrado'),
+        ('pago_capital', 'Capital Recuperado'),
+        ('pago_penalidad', 'Penalidad Cobrada'),
+        ('abono_capital', 'Abono a Capital'),
+    ]
+
+    fecha = models.DateField(db_index=True, verbose_name="Fecha")
+    regla = models.CharField(max_length=30, choices=REGLA_CHOICES, verbose_name="Regla")
+    referencia = models.CharField(max_length=50, verbose_name="Referencia")
+    cuenta_debe = models.ForeignKey(Cuenta, on_delete=models.PROTECT, related_name='asientos_debe', verbose_name="Cuenta Debe")
+    cuenta_haber = models.ForeignKey(Cuenta, on_delete=models.PROTECT, related_name='asientos_haber', verbose_name="Cuenta Haber")
+    monto = models.DecimalField(max_digits=15, decimal_places=2, verbose_name="Monto")
+    descripcion = models.CharField(max_length=255, blank=True, default='', verbose_name="Descripción")
+    prestamo = models.ForeignKey(Prestamo, on_delete=models.SET_NULL, null=True, blank=True, related_name='asientos')
+    fecha_registro = models.DateTimeField(auto_now_add=True, verbose_name="Fecha de Registro")
+
+    def __str__(self):
+        return f"{self.fecha:%d/%m/%Y} {self.get_regla_display()} ${self.monto:,.2f}"
+
+    class Meta:
+        db_table = 'prestamos_asiento'
+        verbose_name = "Asiento Contable"
+        verbose_name_plural = "Asientos Contables"
+        ordering = ['-fecha', '-id']
+        constraints = [
+            models.UniqueConstraint(fields=['regla', 'referencia'], name='asiento_unico_por_origen'),
+        ]
+
+
+# Balanza de comprobación materializada: sumas del debe y el haber por cuenta y
+# mes, actualizadas al contabilizar cada lote de asientos.
+class SaldoCuentaPeriodo(models.Model):
+    cuenta = models.ForeignKey(Cuenta, on_delete=models.CASCADE, related_name='saldos')
+    periodo = models.DateField(verbose_name="Período", help_text="Primer día del mes.")
+    debe = models.DecimalField(max_digits=15, decimal_places=2, default=Decimal('0.00'), verbose_name="Debe")
+    haber = models.DecimalField(max_digits=15, decimal_places=2, default=Decimal('0.00'), verbose_name="Haber")
+
+    def __str__(self):
+        return f"{self.cuenta} {self.periodo:%m/%Y}"
+
+    class Meta:
+        db_table = 'prestamos_saldo_cuenta_periodo'
+        verbose_name = "Saldo de Cuenta por Período"
+        verbose_name_plural = "Saldos de Cuentas por Período"
+        ordering = ['periodo', 'cuenta']
+        constraints = [
+            models.UniqueConstraint(fields=['cuenta', 'periodo'], name='saldo_unico_por_cuenta_periodo'),
+        ]
+
+
+# ==================================================
+# === MODELO DEVENGO DE INTERESES ===
+# ==================================================
+# Interés devengado por préstamo en un mes hasta `fecha_corte` (ver devengo.py).
+# Los reportes en base devengado leen estas filas en lugar de recalcular las
+# tablas de amortización.
+class DevengoInteres(models.Model):
+    prestamo = models.ForeignKey(Prestamo, on_delete=models.CASCADE, related_name='devengos')
+    periodo = models.DateField(db_index=True, verbose_name="Período", help_text="Primer día del mes.")
+    fecha_corte = models.DateField(verbose_name="Devengado Hasta")
+    monto = models.DecimalField(max_digits=12, decimal_places=2, verbose_name="Interés Devengado")
+
+    def __str__(self):
+        return f"Préstamo #{self.prestamo_id} {self.periodo:%m/%Y}: ${self.monto:,.2f}"
+
+    class Meta:
+        db_table = 'prestamos_devengo_interes'
+        verbose_name = "Devengo de Intereses"
+        verbose_name_plural = "Devengos de Intereses"
+        ordering = ['-periodo', 'prestamo']
+        constraints = [
+            models.UniqueConstraint(fields=['prestamo', 'periodo'], name='devengo_unico_por_prestamo_periodo'),
+        ]
+
+
+# ==================================================
+# === CIERRE MENSUAL ===
+# ==================================================
+# Instantánea inmutable de un préstamo al cierre de un mes (ver cierre.py).
+# Los reportes del período leen estas filas; nunca se recalculan.
+class CierreMensual(models.Model):
+    prestamo = models.ForeignKey(Prestamo, on_delete=models.PROTECT, related_name='cierres')
+    periodo = models.DateField(db_index=True, verbose_name="Período", help_text="Primer día del mes.")
+    saldo_capital = models.DecimalField(max_digits=12, decimal_places=2, verbose_name="Saldo de Capital al Cierre")
+    interes_devengado = models.DecimalField(max_digits=12, decimal_places=2, verbose_name="Interés Devengado")
+    penalidades = models.DecimalField(max_digits=12, decimal_places=2, verbose_name="Penalidades Generadas")
+    pagos_recibidos = models.DecimalField(max_digits=12, decimal_places=2, verbose_name="Pagos Recibidos")
+    dias_atraso = models.PositiveIntegerField(default=0, verbose_name="Días de Atraso")
+
+    def __str__(self):
+        return f"Cierre {self.periodo:%m/%Y} - Préstamo #{self.prestamo_id}"
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError("Un cierre mensual no se modifica una vez creado.")
+        super().save(*args, **kwargs)
+
+    class Meta:
+        db_table = 'prestamos_cierre_mensual'
+        verbose_name = "Cierre Mensual"
+        verbose_name_plural = "Cierres Mensuales"
+        ordering = ['-periodo', 'prestamo']
+        constraints = [
+            models.UniqueConstraint(fields=['prestamo', 'periodo'], name='cierre_unico_por_prestamo_periodo'),
+        ]
+
+
+# Marca un mes como cerrado, con los totales de sus instantáneas.
+class PeriodoCerrado(models.Model):
+    periodo = models.DateField(unique=True, verbose_name="Período", help_text="Primer día del mes.")
+    fecha_cierre = models.DateTimeField(auto_now_add=True, verbose_name="Fecha de Cierre")
+    prestamos = models.PositiveIntegerField(default=0, verbose_name="Préstamos")
+    saldo_capital = models.DecimalField(max_digits=15, decimal_places=2, default=Decimal('0.00'), verbose_name="Saldo de Capital")
+    interes_devengado = models.DecimalField(max_digits=15, decimal_places=2, default=Decimal('0.00'), verbose_name="Interés Devengado")
+    penalidades = models.DecimalField(max_digits=15, decimal_places=2, default=Decimal('0.00'), verbose_name="Penalidades")
+    pagos_recibidos = models.DecimalField(max_digits=15, decimal_places=2, default=Decimal('0.00'), verbose_name="Pagos Recibidos")
+
+    def __str__(self):
+        return f"Período {self.periodo:%m/%Y} cerrado"
+
+    class Meta:
+        db_table = 'prestamos_periodo_cerrado'
+        verbose_name = "Período Cerrado"
+        verbose_name_plural = "Períodos Cerrados"
+        ordering = ['-periodo']
+
+
+# ==================================================
+# === MODELO MORA MENSUAL ===
+# ==================================================
+# Foto compacta del estado de mora de cada préstamo al cierre de cada mes; la
+# generan `snapshot_mora` (solo los meses nuevos) y la leen los análisis de
+# roll rates y cosechas (ver mora.py).
+class MoraMensual(models.Model):
+    TRAMO_CHOICES = [
+        (0, 'Al día'),
+        (1, '1-30'),
+        (2, '31-60'),
+        (3, '61-90'),
+        (4, '90+'),
+        (5, 'Cancelado'),
+    ]
+
+    prestamo = models.ForeignKey(Prestamo, on_delete=models.CASCADE, related_name='mora_mensual')
+    periodo = models.DateField(db_index=True, verbose_name="Período", help_text="Primer día del mes.")
+    cohorte = models.DateField(verbose_name="Cohorte", help_text="Mes de desembolso.")
+    tramo = models.PositiveSmallIntegerField(choices=TRAMO_CHOICES, verbose_name="Tramo de Atraso")
+    dias_atraso = models.PositiveIntegerField(default=0, verbose_name="Días de Atraso")
+    saldo_capital = models.DecimalField(max_digits=12, decimal_places=2, verbose_name="Saldo de Capital")
+
+    def __str__(self):
+        return f"Préstamo #{self.prestamo_id} {self.periodo:%m/%Y}: {self.get_tramo_display()}"
+
+    class Meta:
+        db_table = 'prestamos_mora_mensual'
+        verbose_name = "Mora Mensual"
+        verbose_name_plural = "Mora Mensual"
+        ordering = ['-periodo', 'prestamo']
+        constraints = [
+            models.UniqueConstraint(fields=['prestamo', 'periodo'], name='mora_unica_por_prestamo_periodo'),
+        ]
+
+
+# ==================================================
+# === MODELO SUPUESTO DE PROYECCIÓN ===
+# ==================================================
+# Tasas mensuales de incumplimiento y prepago usadas por la proyección de flujos
+# de la cartera (ver proyeccion.py), por tipo de préstamo y tramo de atraso.
+# Una fila sin tipo de préstamo aplica a todos los tipos que no tengan la suya.
+class SupuestoProyeccion(models.Model):
+    TRAMO_CHOICES = MoraMensual.TRAMO_CHOICES[:5]
+
+    tipo_prestamo = models.ForeignKey(
+        TipoPrestamo, on_delete=models.CASCADE, null=True, blank=True, related_name='supuestos_proyeccion',
+        verbose_name="Tipo de Préstamo", help_text="Vacío: aplica a todos los tipos sin supuesto propio."
+    )
+    tramo = models.PositiveSmallIntegerField(choices=TRAMO_CHOICES, verbose_name="Tramo de Atraso")
+    tasa_incumplimiento = models.DecimalField(
+        max_digits=6, decimal_places=4, verbose_name="Incumplimiento Mensual",
+        help_text="Fracción de los préstamos vigentes que deja de pagar cada mes (0.02 = 2%)."
+    )
+    tasa_prepago = models.DecimalField(
+        max_digits=6, decimal_places=4, default=Decimal('0.0000'), verbose_name="Prepago Mensual",
+        help_text="Fracción de los préstamos vigentes que cancela por adelantado cada mes."
+    )
+    volatilidad = models.DecimalField(
+        max_digits=5, decimal_places=3, default=Decimal('0.300'), verbose_name="Volatilidad",
+        help_text="Dispersión (lognormal) de las tasas entre escenarios."
+    )
+    tasa_recuperacion = models.DecimalField(
+        max_digits=5, decimal_places=4, default=Decimal('0.0000'), verbose_name="Recuperación",
+        help_text="Fracción del capital incumplido que se recupera."
+    )
+
+    def __str__(self):
+        tipo = self.tipo_prestamo or 'Todos los tipos'
+        return f"{tipo} - {self.get_tramo_display()}"
+
+    class Meta:
+        db_table = 'prestamos_supuesto_proyeccion'
+        verbose_name = "Supuesto de Proyección"
+        verbose_name_plural = "Supuestos de Proyección"
+        ordering = ['tipo_prestamo', 'tramo']
+        constraints = [
+            models.UniqueConstraint(fields=['tipo_prestamo', 'tramo'], name='supuesto_unico_por_tipo_tramo'),
+        ]
@@ -0,0 +1,177 @@
+"""
+Roll rates y cosechas (vintage) de la cartera a partir de `MoraMensual`.
+
+`registrar_mes` guarda una fila compacta por préstamo y mes con su tramo de
+atraso al cierre, usando las mismas cifras del cierre mensual (saldo de
+capital y días de atraso, ver cierre.py): las filas `CierreMensual` si el mes
+ya está cerrado, o calculadas al momento si no. Un préstamo cancelado aparece
+una sola vez como 'Cancelado' y después deja de registrarse.
+
+Con esas filas:
+
+- `matriz_roll_rate(periodo)`: de los préstamos en cada tramo el mes anterior,
+  qué proporción está en cada tramo este mes (por cantidad y por saldo).
+- `curvas_vintage(tramo_minimo)`: para cada cohorte (mes de desembolso), el
+  saldo en mora en cada mes desde el desembolso como proporción del monto
+  desembolsado de la cohorte.
+
+Los conteos y las matrices se arman con NumPy (`np.add.at` sobre los pares de
+tramos), sin recorrer fila por fila en Python.
+"""
+import datetime
+
+import numpy as np
+from django.db import transaction
+from django.db.models import F, Q, Sum
+from django.db.models.functions import TruncMonth
+
+from . import cierre
+from .antiguedad import TRAMOS
+from .models import CierreMensual, MoraMensual, PeriodoCerrado, Prestamo
+
+CANCELADO = 5
+ETIQUETAS = [etiqueta for _, etiqueta in MoraMensual.TRAMO_CHOICES]
+# Días de atraso mínimos de los tramos 1-4 (los mismos de antigüedad de saldos).
+LIMITES = np.array([minimo for _, minimo in TRAMOS])
+
+
+def mes_siguiente(periodo):
+    return (periodo.replace(day=1) + datetime.timedelta(days=32)).replace(day=1)
+
+
+def mes_anterior(periodo):
+    return (periodo.replace(day=1) - datetime.timedelta(days=1)).replace(day=1)
+
+
+def tramos(dias_atraso, saldos):
+    """Tramo de cada préstamo: 0 al día, 1-4 según los días de atraso, 5 cancelado."""
+    resultado = np.searchsorted(LIMITES, np.asarray(dias_atraso), side='right')
+    resultado[np.asarray(saldos) <= 0] = CANCELADO
+    return resultado
+
+
+def meses_pendientes(hasta):
+    """Meses completos aún sin registrar, desde el siguiente al último registrado hasta `hasta`."""
+    ultimo = MoraMensual.objects.order_by('-periodo').values_list('periodo', flat=True).first()
+    if ultimo:
+        periodo = mes_siguiente(ultimo)
+    else:
+        primero = cierre.prestamos_del_cierre(hasta).order_by('fecha_desembolso').values_list('fecha_desembolso', flat=True).first()
+        if primero is None:
+            return []
+        periodo = primero.replace(day=1)
+    meses = []
+    while periodo <= hasta:
+        meses.append(periodo)
+        periodo = mes_siguiente(periodo)
+    return meses
+
+
+def filas_del_mes(periodo, tamano_bloque=500):
+    """
+    Saldo de capital y días de atraso al cierre de `periodo` por préstamo, con
+    su fecha de desembolso. Si el mes ya está cerrado se leen las filas
+    `CierreMensual` (inmutables); si no, se calculan con `cierre.calcular_bloque`.
+    """
+    if PeriodoCerrado.objects.filter(periodo=periodo).exists():
+        return list(
+            CierreMensual.objects.filter(periodo=periodo).order_by('prestamo_id')
+            .values('prestamo_id', 'dias_atraso', 'saldo_capital', fecha_desembolso=F('prestamo__fecha_desembolso'))
+        )
+    cohortes = dict(cierre.prestamos_del_cierre(periodo).values_list('id', 'fecha_desembolso'))
+    return [
+        {**fila, 'fecha_desembolso': cohortes[fila['prestamo_id']]}
+        for desde_id, hasta_id in cierre.bloques(periodo, tamano_bloque)
+        for fila in cierre.calcular_bloque(desde_id, hasta_id, periodo)
+    ]
+
+
+def registrar_mes(periodo, tamano_bloque=500):
+    """Crea las filas de `periodo` (en una transacción). Devuelve cuántas creó."""
+    # Cualquier fila 'Cancelado' anterior, no solo la del mes previo: si no, el
+    # préstamo volvería a registrarse un mes sí y otro no.
+    cancelados = set(
+        MoraMensual.objects.filter(periodo__lt=periodo, tramo=CANCELADO).values_list('prestamo_id', flat=True)
+    )
+    filas = [fila for fila in filas_del_mes(periodo, tamano_bloque) if fila['prestamo_id'] not in cancelados]
+    if not filas:
+        return 0
+    tramo = tramos([f['dias_atraso'] for f in filas], [f['saldo_capital'] for f in filas])
+    with transaction.atomic():
+        MoraMensual.objects.bulk_create([
+            MoraMensual(
+                prestamo_id=fila['prestamo_id'], periodo=periodo, cohorte=fila['fecha_desembolso'].replace(day=1),
+                tramo=int(t), dias_atraso=fila['dias_atraso'], saldo_capital=fila['saldo_capital'],
+            )
+            for fila, t in zip(filas, tramo)
+        ], batch_size=2000)
+    return len(filas)
+
+
+def periodos_registrados():
+    return list(MoraMensual.objects.order_by('-periodo').values_list('periodo', flat=True).distinct())
+
+
+def matriz_roll_rate(periodo):
+    """
+    Transiciones de tramo entre el mes anterior y `periodo`.
+
+    Devuelve {'conteos', 'tasas', 'tasas_saldo'}: matrices (origen 0-4 x
+    destino 0-5). Las tasas de una fila sin préstamos quedan en NaN.
+    """
+    filas = np.array(
+        MoraMensual.objects.filter(periodo__in=[mes_anterior(periodo), periodo])
+        .order_by('prestamo_id', 'periodo').values_list('prestamo_id', 'tramo', 'saldo_capital'),
+        dtype=float,
+    ).reshape(-1, 3)
+    # Ordenadas por préstamo y mes: dos filas seguidas del mismo préstamo son (antes, ahora).
+    pares = np.flatnonzero(filas[1:, 0] == filas[:-1, 0]) if len(filas) > 1 else np.array([], dtype=int)
+    origen = filas[pares, 1].astype(int)
+    destino = filas[pares + 1, 1].astype(int)
+
+    conteos = np.zeros((CANCELADO, CANCELADO + 1))
+    saldos = np.zeros_like(conteos)
+    np.add.at(conteos, (origen, destino), 1)
+    np.add.at(saldos, (origen, destino), filas[pares, 2])
+    with np.errstate(invalid='ignore', divide='ignore'):
+        tasas = conteos / conteos.sum(axis=1, keepdims=True)
+        tasas_saldo = saldos / saldos.sum(axis=1, keepdims=True)
+    return {'conteos': conteos.astype(int), 'tasas': tasas, 'tasas_saldo': tasas_saldo}
+
+
+def curvas_vintage(tramo_minimo=2):
+    """
+    Saldo en mora (tramo >= `tramo_minimo`, sin contar cancelados) de cada
+    cohorte por mes desde el desembolso, sobre el monto desembolsado.
+
+    Devuelve {'cohortes': [date], 'meses': int, 'tasas': matriz cohorte x mes}
+    con NaN en los meses que la cohorte todavía no alcanzó.
+    """
+    por_mes = list(
+        MoraMensual.objects.values('cohorte', 'periodo').order_by()
+        .annotate(en_mora=Sum('saldo_capital', filter=Q(tramo__gte=tramo_minimo, tramo__lt=CANCELADO), default=0))
+        .values_list('cohorte', 'periodo', 'en_mora')
+    )
+    if not por_mes:
+        return {'cohortes': [], 'meses': 0, 'tasas': np.zeros((0, 0))}
+    desembolsado = dict(
+        Prestamo.objects.filter(id__in=MoraMensual.objects.values('prestamo_id'))
+        .annotate(cohorte=TruncMonth('fecha_desembolso')).values('cohorte').order_by()
+        .annotate(total=Sum('monto')).values_list('cohorte', 'total')
+    )
+
+    cohortes_fila = np.array([c.year * 12 + c.month - 1 for c, _, _ in por_mes])
+    periodos_fila = np.array([p.year * 12 + p.month - 1 for _, p, _ in por_mes])
+    en_mora = np.array([float(m) for _, _, m in por_mes])
+    cohortes, indice = np.unique(cohortes_fila, return_inverse=True)
+    meses_en_libros = periodos_fila - cohortes_fila
+
+    tasas = np.full((len(cohortes), meses_en_libros.max() + 1), np.nan)
+    base = np.array([float(desembolsado.get(datetime.date(c // 12, c % 12 + 1, 1)) or 0) for c in cohortes])
+    with np.errstate(invalid='ignore', divide='ignore'):
+        tasas[indice, meses_en_libros] = en_mora / base[indice]
+    return {
+        'cohortes': [datetime.date(c // 12, c % 12 + 1, 1) for c in cohortes],
+        'meses': tasas.shape[1],
+        'tasas': tasas,
+    }
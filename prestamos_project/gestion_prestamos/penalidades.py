@@ -0,0 +1,115 @@
+"""
+Motor de penalidades por mora a una fecha de corte.
+
+La penalidad de una cuota se devenga por día sobre lo que faltaba pagar de la
+cuota *ese* día: un pago hecho el día `p` reduce la base desde `p` en adelante.
+Así, recalcular un período atrasado (una ejecución que no corrió, una
+corrección de pagos) da el mismo resultado que si el proceso diario hubiera
+corrido cada día, en lugar de aplicar el saldo actual a todo el período.
+
+Los días se cuentan en el intervalo [inicio, fecha_corte): el día de corte
+todavía no se cobra, igual que en la ejecución diaria de `update_penalties`.
+
+`recalcular_a_fecha` recorre la cartera en una sola pasada: las cuotas por id
+y los pagos ordenados por (cuota, fecha), leídos en paralelo como un "merge
+join", sin una consulta por cuota.
+"""
+import datetime
+
+from django.db.models import Exists, OuterRef, Q
+from django.utils import timezone
+
+from .calendario import fecha_inicio_penalidad
+from .dinero import a_centavos, penalidad_centavos
+from .models import Cuota, Pago
+
+
+def inicio_del_dia(fecha):
+    """Primer instante (con zona horaria) del día local `fecha`."""
+    return timezone.make_aware(datetime.datetime.combine(fecha, datetime.time.min))
+
+
+def pagos_por_dia(filas):
+    """Convierte filas (fecha_pago, monto_pagado) en [(fecha local, centavos)], en orden."""
+    return [(timezone.localtime(fecha_pago).date(), a_centavos(monto)) for fecha_pago, monto in filas]
+
+
+def penalidad_en_intervalo(monto_cuota_centavos, tasa_diaria, inicio, desde, hasta, pagos):
+    """
+    Penalidad (en centavos) de los días en [max(inicio, desde), hasta).
+
+    Args:
+        monto_cuota_centavos (int): Monto de la cuota.
+        tasa_diaria (Decimal): Tasa de penalidad diaria como fracción.
+        inicio (date): Primer día que genera penalidad (vencimiento + gracia).
+        desde, hasta (date): Intervalo a devengar.
+        pagos (list): [(fecha, centavos)] ordenados por fecha; pueden incluir
+            pagos anteriores a `desde` (reducen la base desde el principio).
+    """
+    tramo = max(inicio, desde)
+    if tramo >= hasta:
+        return 0
+    pagado = 0
+    total = 0
+    for fecha, monto in pagos:
+        if fecha >= hasta:
+            break
+        if fecha > tramo:
+            total += penalidad_centavos(max(0, monto_cuota_centavos - pagado), tasa_diaria, (fecha - tramo).days)
+            tramo = fecha
+        pagado += monto
+    return total + penalidad_centavos(max(0, monto_cuota_centavos - pagado), tasa_diaria, (hasta - tramo).days)
+
+
+def penalidad_a_fecha(cuota, tipo_prestamo, pagos, fecha_corte):
+    """
+    Penalidad total acumulada por la cuota hasta `fecha_corte` (exclusive), y
+    el primer día de penalidad (None si la cuota no genera penalidad).
+    """
+    if not tipo_prestamo or cuota.fecha_vencimiento >= fecha_corte:
+        return 0, None
+    inicio = fecha_inicio_penalidad(cuota.fecha_vencimiento, tipo_prestamo)
+    penalidad = penalidad_en_intervalo(
+        a_centavos(cuota.monto_cuota), tipo_prestamo.tasa_penalidad_diaria, inicio, inicio, fecha_corte, pagos
+    )
+    return penalidad, inicio
+
+
+def cuotas_a_fecha(fecha_corte):
+    """Cuotas cuya penalidad al `fecha_corte` puede diferir de la guardada."""
+    return Cuota.objects.filter(Q(fecha_vencimiento__lt=fecha_corte) | Q(monto_penalidad_acumulada__gt=0))
+
+
+def cuotas_abiertas_en(desde, hasta):
+    """
+    Cuotas que estuvieron vencidas y sin saldar en algún día de [desde, hasta):
+    vencidas antes de `hasta` y que siguen abiertas o recibieron pagos desde
+    `desde`. Las saldadas antes de `desde` tienen la penalidad ya cerrada.
+    """
+    pagos_recientes = Pago.objects.filter(cuota=OuterRef('pk'), fecha_pago__gte=inicio_del_dia(desde))
+    return Cuota.objects.filter(fecha_vencimiento__lt=hasta).filter(
+        ~Q(estado='pagada') | Exists(pagos_recientes)
+    )
+
+
+def recalcular_a_fecha(cuotas, fecha_corte, tamano_lote=2000):
+    """
+    Recorre `cuotas` y produce (cuota, penalidad en centavos, inicio) con la
+    penalidad acumulada al `fecha_corte`, en una sola pasada por cuotas y pagos.
+    """
+    cuotas = cuotas.select_related('prestamo__tipo_prestamo').order_by('id')
+    pagos = (
+        Pago.objects.filter(cuota__in=cuotas.values('id'), fecha_pago__lt=inicio_del_dia(fecha_corte))
+        .order_by('cuota_id', 'fecha_pago', 'id')
+        .values_list('cuota_id', 'fecha_pago', 'monto_pagado')
+        .iterator(chunk_size=tamano_lote)
+    )
+    siguiente = next(pagos, None)
+    for cuota in cuotas.iterator(chunk_size=tamano_lote):
+        filas = []
+        while siguiente is not None and siguiente[0] <= cuota.id:
+            if siguiente[0] == cuota.id:
+                filas.append(siguiente[1:])
+            siguiente = next(pagos, None)
+        penalidad, inicio = penalidad_a_fecha(cuota, cuota.prestamo.tipo_prestamo, pagos_por_dia(filas), fecha_corte)
+        yield cuota, penalidad, inicio
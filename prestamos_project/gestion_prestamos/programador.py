@@ -0,0 +1,119 @@
+"""
+Programador de tareas periódicas (comando `run_scheduler`).
+
+Cada `ScheduledTask` apunta a una tarea registrada en trabajos.py. Puede haber
+un `run_scheduler` en cada nodo web: para que cada ejecución ocurra una sola
+vez, la instancia que quiere ejecutarla primero toma un bloqueo con una
+actualización condicional (`bloqueada_hasta` vencido o vacío), que es atómica
+en cualquier motor de base de datos. El bloqueo tiene vencimiento, así que si
+la instancia cae a mitad de la ejecución otra la retoma.
+
+Ejecuciones perdidas: si el programador estuvo detenido, la tarea atrasada se
+ejecuta una sola vez (las tareas registradas calculan hasta "hoy", así que una
+ejecución cubre todas las perdidas) y se anota cuántas se recuperaron.
+"""
+import datetime
+import logging
+import time
+
+from django.db.models import F, Q
+from django.utils import timezone
+
+from . import trabajos
+from .models import Job, ScheduledTask
+
+logger = logging.getLogger(__name__)
+
+
+def siguiente_ejecucion(programada, despues_de):
+    """
+    Primer momento programado posterior a `despues_de`, y cuántos momentos
+    programados entre `proxima_ejecucion` y `despues_de` se saltan.
+    """
+    if programada.hora:
+        local = timezone.localtime(despues_de)
+        candidata = timezone.make_aware(datetime.datetime.combine(local.date(), programada.hora))
+        if candidata <= despues_de:
+            candidata = timezone.make_aware(
+                datetime.datetime.combine(local.date() + datetime.timedelta(days=1), programada.hora)
+            )
+        paso = datetime.timedelta(days=1)
+    else:
+        paso = datetime.timedelta(minutes=programada.intervalo_minutos)
+        base = programada.proxima_ejecucion
+        if base > despues_de:
+            return base, 0
+        candidata = base + paso * ((despues_de - base) // paso + 1)
+    omitidas = max(0, (despues_de - programada.proxima_ejecucion) // paso)
+    return candidata, omitidas
+
+
+def tomar_bloqueo(programada, instancia, ahora):
+    """True si esta instancia obtuvo la ejecución de la tarea (ninguna otra la tiene)."""
+    return bool(ScheduledTask.objects.filter(
+        Q(bloqueada_hasta__isnull=True) | Q(bloqueada_hasta__lte=ahora),
+        pk=programada.pk, activa=True, proxima_ejecucion__lte=ahora,
+    ).update(
+        bloqueada_hasta=ahora + datetime.timedelta(minutes=programada.tiempo_maximo_minutos),
+        bloqueada_por=instancia,
+    ))
+
+
+def ejecutar_programada(programada, instancia):
+    """
+    Ejecuta la tarea en este proceso y guarda duración y resultado. La corrida
+    queda también como `Job` (historial con resultado o traceback); no se
+    reintenta: el reintento es la siguiente ejecución programada.
+
+    Respeta el `max_concurrencia` de la tarea igual que `trabajos.reclamar`:
+    si un worker ya la está ejecutando, se libera el bloqueo sin ejecutarla y
+    se devuelve None (se intenta de nuevo en la próxima vuelta del programador).
+    """
+    inicio = timezone.now()
+    job = Job.objects.create(
+        nombre=programada.tarea, argumentos=programada.argumentos, cola='programadas',
+        estado='en_proceso', max_intentos=1, worker=instancia, fecha_inicio=inicio,
+    )
+    if trabajos.excede_concurrencia(job):
+        job.delete()
+        ScheduledTask.objects.filter(pk=programada.pk).update(bloqueada_hasta=None, bloqueada_por='')
+        logger.info('Tarea programada en espera: ya se está ejecutando', extra={'tarea_programada': programada.nombre})
+        return None
+    reloj = time.perf_counter()
+    trabajos.ejecutar(job)
+    duracion = time.perf_counter() - reloj
+
+    correcta = job.estado == 'completado'
+    proxima, omitidas = siguiente_ejecucion(programada, inicio)
+    ScheduledTask.objects.filter(pk=programada.pk).update(
+        proxima_ejecucion=proxima,
+        bloqueada_hasta=None,
+        bloqueada_por='',
+        ultima_ejecucion=inicio,
+        ultima_duracion=duracion,
+        ultimo_resultado='ok' if correcta else 'error',
+        ultimo_error='' if correcta else job.error,
+        ejecuciones=F('ejecuciones') + 1,
+        fallos=F('fallos') + (0 if correcta else 1),
+        ejecuciones_omitidas=F('ejecuciones_omitidas') + omitidas,
+    )
+    logger.info('Tarea programada ejecutada', extra={
+        'tarea_programada': programada.nombre, 'resultado': 'ok' if correcta else 'error',
+        'duracion_ms': round(duracion * 1000, 1), 'omitidas': omitidas, 'job_id': job.pk,
+    })
+    return job
+
+
+def ejecutar_pendientes(instancia, ahora=None):
+    """Ejecuta las tareas vencidas cuyo bloqueo obtenga esta instancia. Devuelve los `Job` creados."""
+    ahora = ahora or timezone.now()
+    ejecutados = []
+    for programada in ScheduledTask.objects.filter(activa=True, proxima_ejecucion__lte=ahora).order_by('proxima_ejecucion'):
+        if programada.tarea not in trabajos.TAREAS:
+            logger.warning('Tarea programada sin tarea registrada', extra={'tarea_programada': programada.nombre})
+            continue
+        if tomar_bloqueo(programada, instancia, ahora):
+            job = ejecutar_programada(programada, instancia)
+            if job is not None:
+                ejecutados.append(job)
+    return ejecutados
@@ -0,0 +1,63 @@
+"""
+Pronóstico de cobros: lo que se espera cobrar cada día de los próximos N días.
+
+`cobros_por_dia` devuelve cantidad de cuotas y monto esperado por fecha de
+vencimiento con una sola consulta agrupada (GROUP BY fecha_vencimiento). El
+monto de cada cuota es lo que falta cobrar de ella: cuota más penalidad menos
+los pagos parciales (ver antiguedad.saldo_por_cobrar). `detalle_cobros` lista
+las cuotas de un rango de fechas con préstamo y cliente ya cargados.
+"""
+import datetime
+
+from django.db.models import Count, Sum
+from django.utils import timezone
+
+from .antiguedad import CERO, DECIMAL, saldo_por_cobrar
+from .models import Cuota
+
+HORIZONTES = (7, 30, 90)
+
+ESTADOS_POR_COBRAR = ('pendiente', 'pagada_parcialmente')
+
+
+def _por_cobrar(desde, hasta):
+    """Cuotas abiertas que vencen en [desde, hasta]."""
+    return Cuota.objects.filter(
+        estado__in=ESTADOS_POR_COBRAR, fecha_vencimiento__gte=desde, fecha_vencimiento__lte=hasta
+    )
+
+
+def cobros_por_dia(dias=30, desde=None):
+    """
+    Cobros esperados desde `desde` (hoy por omisión) durante `dias` días.
+
+    Devuelve {'dias': [{'fecha', 'cuotas', 'monto'}], 'cuotas', 'monto'} con
+    una entrada por cada día del horizonte, también los días sin cobros.
+    """
+    desde = desde or timezone.localdate()
+    hasta = desde + datetime.timedelta(days=dias - 1)
+    agrupado = {
+        fila['fecha_vencimiento']: fila
+        for fila in _por_cobrar(desde, hasta).annotate(saldo=saldo_por_cobrar())
+        .values('fecha_vencimiento').annotate(cuotas=Count('id'), monto=Sum('saldo', output_field=DECIMAL))
+        .order_by()
+    }
+    resultado = {'dias': [], 'cuotas': 0, 'monto': CERO}
+    for i in range(dias):
+        fecha = desde + datetime.timedelta(days=i)
+        fila = agrupado.get(fecha, {})
+        cuotas, monto = fila.get('cuotas', 0), fila.get('monto') or CERO
+        resultado['dias'].append({'fecha': fecha, 'cuotas': cuotas, 'monto': monto})
+        resultado['cuotas'] += cuotas
+        resultado['monto'] += monto
+    return resultado
+
+
+def detalle_cobros(desde, hasta=None):
+    """Cuotas por cobrar entre `desde` y `hasta` (inclusive), con préstamo y cliente, y su `saldo`."""
+    return (
+        _por_cobrar(desde, hasta or desde)
+        .select_related('prestamo__cliente')
+        .annotate(saldo=saldo_por_cobrar())
+        .order_by('fecha_vencimiento', 'prestamo_id')
+    )
@@ -0,0 +1,203 @@
+"""
+Proyección de flujos de la cartera y simulación Monte Carlo de incumplimiento
+y prepago.
+
+`cargar_cartera` lee en una sola consulta las cuotas abiertas de los préstamos
+activos (lo que falta cobrar de cada una y su capital) y las acomoda en
+arreglos NumPy; no recalcula tablas de amortización. Cada préstamo cae en un
+grupo (tipo de préstamo, tramo de atraso actual) y el flujo programado se suma
+por grupo y mes: una matriz grupos x meses.
+
+`simular` genera los escenarios sobre esa matriz. En cada escenario y grupo
+las tasas mensuales de incumplimiento y prepago (ver `SupuestoProyeccion`) se
+multiplican por un factor lognormal; con esas tasas, de lo vigente al inicio
+de cada mes una parte incumple (se pierde su capital pendiente, menos lo
+recuperado), otra prepaga (paga todo su capital pendiente) y el resto paga su
+cuota. Como cada grupo reúne muchos préstamos, dentro de un escenario se usan
+las proporciones esperadas en lugar de sortear préstamo por préstamo; la
+variación entre escenarios viene de las tasas. Todo se calcula de una vez con
+arreglos escenarios x grupos x meses.
+
+Las cuotas ya vencidas se esperan en el primer mes; el riesgo de no cobrarlas
+lo da la tasa de incumplimiento de su tramo.
+"""
+import numpy as np
+from django.db.models import Case, F, When
+from django.utils import timezone
+
+from .antiguedad import DECIMAL, saldo_por_cobrar
+from .models import Cuota, SupuestoProyeccion
+from .mora import LIMITES, mes_siguiente
+from .pronostico import ESTADOS_POR_COBRAR
+
+ESTADOS_ACTIVOS = ('aprobado', 'vencido')
+TRAMOS = 5
+SIN_TIPO = -1
+
+# Supuestos por tramo (0 al día, 1-4 según atraso) cuando no hay uno cargado.
+SUPUESTOS_BASE = {
+    'incumplimiento': (0.005, 0.05, 0.15, 0.30, 0.50),
+    'prepago': (0.01, 0.005, 0.0, 0.0, 0.0),
+    'volatilidad': (0.3, 0.3, 0.3, 0.3, 0.3),
+    'recuperacion': (0.0, 0.0, 0.0, 0.0, 0.0),
+}
+
+PERCENTILES = (5, 50, 95)
+
+
+def _mes_indice(fecha):
+    return fecha.year * 12 + fecha.month - 1
+
+
+def cargar_cartera(hoy=None):
+    """
+    Cuotas abiertas de los préstamos activos como arreglos.
+
+    Devuelve {'hoy', 'tipos': [tipo_id], 'flujo' y 'capital': grupos x meses,
+    'prestamos': cantidad de préstamos por grupo}. El grupo de un préstamo es
+    `indice_del_tipo * TRAMOS + tramo` y el mes 0 es el actual.
+    """
+    hoy = hoy or timezone.localdate()
+    filas = list(
+        Cuota.objects.filter(estado__in=ESTADOS_POR_COBRAR, prestamo__estado__in=ESTADOS_ACTIVOS)
+        # La subconsulta de pagos solo hace falta en las cuotas con pagos parciales.
+        .annotate(por_cobrar=Case(
+            When(estado='pagada_parcialmente', then=saldo_por_cobrar()),
+            default=F('monto_cuota') + F('monto_penalidad_acumulada'), output_field=DECIMAL,
+        ))
+        .order_by().values_list('prestamo_id', 'prestamo__tipo_prestamo_id', 'fecha_vencimiento', 'por_cobrar', 'capital')
+    )
+    if not filas:
+        return {'hoy': hoy, 'tipos': [], 'flujo': np.zeros((0, 1)), 'capital': np.zeros((0, 1)), 'prestamos': np.zeros(0, dtype=int)}
+
+    prestamo_ids, tipo_ids, vencimientos, por_cobrar, capital = zip(*filas)
+    prestamos, prestamo = np.unique(np.array(prestamo_ids), return_inverse=True)
+    tipos, tipo = np.unique(np.array([SIN_TIPO if t is None else t for t in tipo_ids]), return_inverse=True)
+    dia = np.array([fecha.toordinal() for fecha in vencimientos])
+    mes = np.maximum(np.array([_mes_indice(fecha) for fecha in vencimientos]) - _mes_indice(hoy), 0)
+    por_cobrar = np.maximum(np.array(por_cobrar, dtype=float), 0)
+    capital = np.array(capital, dtype=float)
+
+    # Tramo de cada préstamo por su cuota vencida más antigua.
+    primer_vencimiento = np.full(len(prestamos), hoy.toordinal())
+    np.minimum.at(primer_vencimiento, prestamo, dia)
+    tramo_prestamo = np.searchsorted(LIMITES, hoy.toordinal() - primer_vencimiento, side='right')
+    tipo_prestamo = np.zeros(len(prestamos), dtype=int)
+    tipo_prestamo[prestamo] = tipo
+    grupo_prestamo = tipo_prestamo * TRAMOS + tramo_prestamo
+    grupo = grupo_prestamo[prestamo]
+
+    forma = (len(tipos) * TRAMOS, mes.max() + 1)
+    flujo = np.zeros(forma)
+    capital_por_mes = np.zeros(forma)
+    np.add.at(flujo, (grupo, mes), por_cobrar)
+    np.add.at(capital_por_mes, (grupo, mes), capital)
+    return {
+        'hoy': hoy,
+        'tipos': [None if t == SIN_TIPO else int(t) for t in tipos],
+        'flujo': flujo,
+        'capital': capital_por_mes,
+        'prestamos': np.bincount(grupo_prestamo, minlength=forma[0]),
+    }
+
+
+def supuestos(tipos):
+    """
+    Tasas por grupo como arreglos (uno por cada clave de SUPUESTOS_BASE): el
+    supuesto del tipo y tramo, si no el del tramo para todos los tipos, si no
+    el valor base.
+    """
+    cargados = {
+        (s.tipo_prestamo_id, s.tramo): s for s in SupuestoProyeccion.objects.filter(tramo__lt=TRAMOS)
+    }
+    campos = {
+        'incumplimiento': 'tasa_incumplimiento', 'prepago': 'tasa_prepago',
+        'volatilidad': 'volatilidad', 'recuperacion': 'tasa_recuperacion',
+    }
+    tasas = {clave: np.zeros(len(tipos) * TRAMOS) for clave in campos}
+    for i, tipo in enumerate(tipos):
+        for tramo in range(TRAMOS):
+            supuesto = cargados.get((tipo, tramo)) or cargados.get((None, tramo))
+            for clave, campo in campos.items():
+                valor = getattr(supuesto, campo) if supuesto else SUPUESTOS_BASE[clave][tramo]
+                tasas[clave][i * TRAMOS + tramo] = float(valor)
+    return tasas
+
+
+def simular(cartera, tasas, meses=24, escenarios=2000, semilla=None):
+    """
+    Flujos mensuales y pérdidas de `escenarios` escenarios en `meses` meses.
+
+    Devuelve los arreglos 'cobros' (escenarios x meses) y 'perdidas'
+    (escenarios x meses) y 'programado' (meses), el flujo sin incumplimiento
+    ni prepago.
+    """
+    flujo = _a_horizonte(cartera['flujo'], meses)
+    # Capital pendiente al inicio de cada mes: el de las cuotas de ese mes en adelante.
+    pendiente = _a_horizonte(np.cumsum(cartera['capital'][:, ::-1], axis=1)[:, ::-1], meses)
+    grupos = flujo.shape[0]
+    if grupos == 0:
+        vacio = np.zeros((escenarios, meses))
+        return {'cobros': vacio, 'perdidas': vacio.copy(), 'programado': np.zeros(meses)}
+
+    rng = np.random.default_rng(semilla)
+    volatilidad = tasas['volatilidad']
+    # Un factor común por escenario para el incumplimiento (las crisis afectan a
+    # toda la cartera) y otro para el prepago.
+    factor_incumplimiento, factor_prepago = rng.standard_normal((2, escenarios, 1))
+    incumplimiento = np.minimum(
+        tasas['incumplimiento'] * np.exp(volatilidad * factor_incumplimiento - volatilidad ** 2 / 2), 1.0
+    )
+    prepago = np.minimum(
+        tasas['prepago'] * np.exp(volatilidad * factor_prepago - volatilidad ** 2 / 2), 1.0 - incumplimiento
+    )
+    sigue = 1.0 - incumplimiento - prepago
+
+    # Proporción vigente al inicio de cada mes: escenarios x grupos x meses.
+    vigente = sigue[:, :, None] ** np.arange(meses)
+    cobros = vigente * (sigue[:, :, None] * flujo + prepago[:, :, None] * pendiente)
+    perdidas = vigente * (incumplimiento * (1.0 - tasas['recuperacion']))[:, :, None] * pendiente
+    return {'cobros': cobros.sum(axis=1), 'perdidas': perdidas.sum(axis=1), 'programado': flujo.sum(axis=0)}
+
+
+def _a_horizonte(matriz, meses):
+    """Recorta o completa con ceros las columnas hasta `meses`."""
+    resultado = np.zeros((matriz.shape[0], meses))
+    columnas = min(meses, matriz.shape[1])
+    resultado[:, :columnas] = matriz[:, :columnas]
+    return resultado
+
+
+def bandas(simulacion, percentiles=PERCENTILES):
+    """
+    Percentiles por mes del cobro y del cobro acumulado, y de la pérdida total.
+
+    Devuelve {'cobros', 'acumulado': {p: [por mes]}, 'perdida_total': {p: monto},
+    'cobro_esperado', 'perdida_esperada', 'programado': [por mes]}.
+    """
+    cobros, perdidas = simulacion['cobros'], simulacion['perdidas']
+    por_mes = np.percentile(cobros, percentiles, axis=0)
+    acumulado = np.percentile(np.cumsum(cobros, axis=1), percentiles, axis=0)
+    perdida_total = np.percentile(perdidas.sum(axis=1), percentiles)
+    return {
+        'percentiles': list(percentiles),
+        'cobros': {p: fila.tolist() for p, fila in zip(percentiles, por_mes)},
+        'acumulado': {p: fila.tolist() for p, fila in zip(percentiles, acumulado)},
+        'perdida_total': {p: float(v) for p, v in zip(percentiles, perdida_total)},
+        'cobro_esperado': cobros.mean(axis=0).tolist(),
+        'perdida_esperada': float(perdidas.sum(axis=1).mean()),
+        'programado': simulacion['programado'].tolist(),
+    }
+
+
+def proyectar(meses=24, escenarios=2000, semilla=None, hoy=None):
+    """Carga la cartera, simula y resume en bandas; agrega el mes de cada columna."""
+    cartera = cargar_cartera(hoy)
+    resultado = bandas(simular(cartera, supuestos(cartera['tipos']), meses, escenarios, semilla))
+    periodo = cartera['hoy'].replace(day=1)
+    resultado['meses'] = []
+    for _ in range(meses):
+        resultado['meses'].append(periodo)
+        periodo = mes_siguiente(periodo)
+    resultado['prestamos'] = int(cartera['prestamos'].sum())
+    return resultado
@@ -1,7 +1,9 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete, pre_delete
 from django.contrib.auth.models import User, Group
 from django.dispatch import receiver
-from .models import Cliente
+from . import caja, contabilidad
+from .calendario import invalidar_feriados
+from .models import Capital, Cliente, DiaFeriado, GastoPrestamo, Pago, Prestamo
 
 @receiver(post_save, sender=Cliente)
 def create_client_user(sender, instance, created, **kwargs):
@@ -33,3 +35,32 @@ def create_client_user(sender, instance, created, **kwargs):
             # Vincula el usuario recién creado con el perfil del cliente.
             instance.user = user
             instance.save()
+
+@receiver([post_save, post_delete], sender=DiaFeriado)
+def refresh_holiday_cache(sender, **kwargs):
+    """Los vencimientos ajustados dependen de los feriados: se recargan al cambiar."""
+    invalidar_feriados()
+
+@receiver(post_save, sender=Capital)
+def sync_cash_capital(sender, **kwargs):
+    """El capital cargado (o corregido) en el admin entra al libro de caja."""
+    caja.sincronizar_capital()
+
+@receiver(pre_delete, sender=Pago)
+def reverse_cash_payment(sender, instance, **kwargs):
+    caja.revertir(f'Anulación del pago #{instance.pk}', pago=instance)
+    if caja.compensando():
+        contabilidad.anular(f'pago:{instance.pk}')
+
+@receiver(pre_delete, sender=GastoPrestamo)
+def reverse_cash_expense(sender, instance, **kwargs):
+    caja.revertir(f'Anulación del gasto #{instance.pk}', gasto=instance)
+    if caja.compensando():
+        contabilidad.anular(f'gasto:{instance.pk}')
+
+@receiver(pre_delete, sender=Prestamo)
+def reverse_cash_disbursement(sender, instance, **kwargs):
+    """Los pagos y gastos del préstamo se compensan en sus propias señales."""
+    caja.revertir(f'Anulación del desembolso del préstamo #{instance.pk}', prestamo=instance, tipo='desembolso')
+    if caja.compensando():
+        contabilidad.anular(f'prestamo:{instance.pk}')
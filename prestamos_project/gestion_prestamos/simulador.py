@@ -0,0 +1,213 @@
+"""
+Simulador de préstamos: compara varias condiciones para un mismo cliente en
+una sola llamada.
+
+`expandir` arma los escenarios a partir de una base y, opcionalmente, de una
+grilla (`variar`: {campo: [valores]}, se combinan todos) y de una lista de
+escenarios sueltos que cambian algunos campos de la base. `simular` valida
+cada escenario con las mismas reglas del formulario de préstamo, construye
+su tabla con el núcleo de centavos (utils.generar_tabla_centavos) y resume
+cuota, interés total, costo total y TAE. Los tipos de préstamo se leen en
+una sola consulta y las TAE de todos los escenarios se resuelven juntas (ver
+tae.de_tablas), así el costo no depende de cuántos escenarios se pidan más
+allá de armar sus tablas.
+"""
+import datetime
+import itertools
+import math
+from decimal import Decimal, InvalidOperation
+
+from django.core.exceptions import ValidationError
+from django.core.validators import DecimalValidator
+from django.utils import timezone
+
+from . import tae
+from .dinero import a_centavos, a_decimal
+from .models import Prestamo, TipoPrestamo
+from .utils import generar_tabla_centavos
+
+MAX_ESCENARIOS = 200
+
+CAMPOS = (
+    'tipo_prestamo', 'monto', 'tasa_interes', 'periodo_tasa', 'plazo',
+    'frecuencia_pago', 'tipo_amortizacion', 'fecha_desembolso',
+)
+
+OPCIONES = {
+    'periodo_tasa': {clave for clave, _ in TipoPrestamo.PERIODO_TASA_CHOICES},
+    'frecuencia_pago': {clave for clave, _ in Prestamo.FRECUENCIA_CHOICES},
+    'tipo_amortizacion': {clave for clave, _ in Prestamo.TIPO_AMORTIZACION_CHOICES},
+}
+
+
+def expandir(base, variar=None, escenarios=None):
+    """
+    Lista de escenarios (diccionarios con los CAMPOS dados): el producto de la
+    grilla `variar` sobre `base` y luego cada escenario de `escenarios` sobre
+    `base`. Sin grilla ni escenarios, la base sola.
+
+    Lanza ValueError si la forma no es la esperada o si saldrían más de
+    MAX_ESCENARIOS escenarios; el tamaño se calcula antes de armar la grilla.
+    """
+    variar = variar or {}
+    escenarios = escenarios or []
+    if not isinstance(base, dict) or not isinstance(variar, dict) or not isinstance(escenarios, list):
+        raise ValueError('Cuerpo inválido: se espera un objeto JSON con "base", "variar" y/o "escenarios".')
+    for campo, valores in variar.items():
+        if not isinstance(valores, list) or not valores:
+            raise ValueError(f'"variar.{campo}" debe ser una lista de valores no vacía.')
+    if not all(isinstance(escenario, dict) for escenario in escenarios):
+        raise ValueError('Cada elemento de "escenarios" debe ser un objeto.')
+
+    total = (math.prod(len(valores) for valores in variar.values()) if variar else 0) + len(escenarios)
+    if total > MAX_ESCENARIOS:
+        raise ValueError(f'Se admiten hasta {MAX_ESCENARIOS} escenarios por consulta.')
+
+    resultado = []
+    if variar:
+        campos = list(variar)
+        for valores in itertools.product(*(variar[campo] for campo in campos)):
+            resultado.append({**base, **dict(zip(campos, valores))})
+    for escenario in escenarios:
+        resultado.append({**base, **escenario})
+    return resultado or [dict(base)]
+
+
+def _id_tipo(valor):
+    """Id del tipo de préstamo como entero; acepta también el id en texto ("3")."""
+    if isinstance(valor, int) and not isinstance(valor, bool):
+        return valor
+    if isinstance(valor, str) and valor.strip().isdigit():
+        return int(valor)
+    return None
+
+
+def _validar(datos, tipos, hoy):
+    """Convierte y valida un escenario. Devuelve (parametros, errores)."""
+    errores = {}
+    desconocidos = set(datos) - set(CAMPOS)
+    if desconocidos:
+        errores['__all__'] = f"Campos desconocidos: {', '.join(sorted(desconocidos))}."
+
+    tipo = tipos.get(_id_tipo(datos.get('tipo_prestamo')))
+    if tipo is None:
+        errores['tipo_prestamo'] = 'Debe seleccionar un tipo de préstamo.'
+
+    def decimal(campo, defecto):
+        valor = datos.get(campo, defecto)
+        if valor is None:
+            return None
+        try:
+            numero = Decimal(str(valor))
+        except InvalidOperation:
+            numero = None
+        if numero is None or not numero.is_finite():
+            errores[campo] = 'Debe ser un número.'
+            return None
+        # Los mismos dígitos que admite el campo del préstamo (y por lo tanto PrestamoForm).
+        modelo = Prestamo._meta.get_field(campo)
+        try:
+            DecimalValidator(modelo.max_digits, modelo.decimal_places)(numero)
+        except ValidationError as error:
+            errores[campo] = error.messages[0]
+            return None
+        return numero
+
+    monto = decimal('monto', None)
+    tasa = decimal('tasa_interes', tipo.tasa_interes_predeterminada if tipo else None)
+    try:
+        plazo = int(datos.get('plazo'))
+    except (TypeError, ValueError, OverflowError):
+        plazo = None
+        errores['plazo'] = 'Debe ser un número entero.'
+    try:
+        fecha = datetime.date.fromisoformat(datos['fecha_desembolso']) if datos.get('fecha_desembolso') else hoy
+    except (TypeError, ValueError):
+        fecha = None
+        errores['fecha_desembolso'] = 'Use el formato AAAA-MM-DD.'
+
+    parametros = {
+        'periodo_tasa': datos.get('periodo_tasa') or (tipo.periodo_tasa if tipo else 'anual'),
+        'frecuencia_pago': datos.get('frecuencia_pago') or 'mensual',
+        'tipo_amortizacion': datos.get('tipo_amortizacion') or 'saldo_insoluto',
+    }
+    for campo, valores in OPCIONES.items():
+        if parametros[campo] not in valores:
+            errores[campo] = f"Opción inválida. Use una de: {', '.join(sorted(valores))}."
+
+    if monto is None and 'monto' not in errores:
+        errores['monto'] = 'Este campo es obligatorio.'
+    elif monto is not None and monto <= 0:
+        errores['monto'] = 'Debe ser mayor que cero.'
+    if tasa is not None and tasa < 0:
+        errores['tasa_interes'] = 'No puede ser negativa.'
+    if tipo and monto is not None and 'monto' not in errores:
+        if monto < tipo.monto_minimo:
+            errores['monto'] = f"El monto para el tipo de préstamo '{tipo.nombre}' debe ser de al menos ${tipo.monto_minimo:,.2f}."
+        elif monto > tipo.monto_maximo:
+            errores['monto'] = f"El monto para el tipo de préstamo '{tipo.nombre}' no puede exceder los ${tipo.monto_maximo:,.2f}."
+    if tipo and plazo is not None:
+        if plazo < max(tipo.plazo_minimo_meses, 1):
+            errores['plazo'] = f"El plazo para el tipo de préstamo '{tipo.nombre}' debe ser de al menos {tipo.plazo_minimo_meses} meses."
+        elif plazo > tipo.plazo_maximo_meses:
+            errores['plazo'] = f"El plazo para el tipo de préstamo '{tipo.nombre}' no puede exceder los {tipo.plazo_maximo_meses} meses."
+
+    parametros.update(tipo_prestamo=tipo, monto=monto, tasa_interes=tasa, plazo=plazo, fecha_desembolso=fecha)
+    return parametros, errores
+
+
+def simular(escenarios, incluir_tabla=False, hoy=None):
+    """
+    Resume cada escenario de `escenarios` (ver `expandir`). Cada resultado
+    tiene 'parametros' y, si es válido, 'cuota' (la primera), 'numero_cuotas',
+    'total_interes', 'total_a_pagar', 'comision', 'costo_total' (interés más
+    comisión) y 'tae'; con `incluir_tabla`, también 'tabla'. Si no es válido,
+    'errores' por campo.
+    """
+    if len(escenarios) > MAX_ESCENARIOS:
+        raise ValueError(f'Se admiten hasta {MAX_ESCENARIOS} escenarios por consulta.')
+    hoy = hoy or timezone.localdate()
+    ids = {_id_tipo(e.get('tipo_prestamo')) for e in escenarios} - {None}
+    tipos = TipoPrestamo.objects.in_bulk(ids)
+
+    resultados, validos = [], []
+    for datos in escenarios:
+        parametros, errores = _validar(datos, tipos, hoy)
+        resultado = {'parametros': {campo: datos.get(campo) for campo in CAMPOS if campo in datos}}
+        if not errores:
+            prestamo = Prestamo(**parametros)
+            try:
+                validos.append((resultado, prestamo, list(generar_tabla_centavos(prestamo))))
+            except (ValueError, OverflowError):
+                # Un desembolso cercano al año 9999 deja vencimientos fuera del calendario.
+                errores['fecha_desembolso'] = 'Las fechas de vencimiento quedan fuera del calendario.'
+        if errores:
+            resultado['errores'] = errores
+        resultados.append(resultado)
+
+    recibidos = []
+    for resultado, prestamo, filas in validos:
+        comision = a_centavos(prestamo.monto * prestamo.tipo_prestamo.comision_por_desembolso / 100)
+        interes = sum(fila[3] for fila in filas)
+        recibidos.append(prestamo.monto - a_decimal(comision))
+        resultado.update({
+            'cuota': a_decimal(filas[0][2]),
+            'numero_cuotas': len(filas),
+            'total_interes': a_decimal(interes),
+            'total_a_pagar': a_decimal(sum(fila[2] for fila in filas)),
+            'comision': a_decimal(comision),
+            'costo_total': a_decimal(interes + comision),
+        })
+        if incluir_tabla:
+            resultado['tabla'] = [
+                {
+                    'numero_cuota': numero, 'fecha_vencimiento': fecha, 'cuota_fija': a_decimal(cuota),
+                    'interes': a_decimal(interes_c), 'capital': a_decimal(capital), 'saldo_pendiente': a_decimal(saldo),
+                }
+                for numero, fecha, cuota, interes_c, capital, saldo in filas
+            ]
+
+    tasas = tae.de_tablas(recibidos, [p.fecha_desembolso for _, p, _ in validos], [filas for _, _, filas in validos])
+    for (resultado, _, _), tasa in zip(validos, tasas):
+        resultado['tae'] = tasa
+    return resultados
@@ -0,0 +1,165 @@
+"""
+Tasa anual efectiva (TAE) de los préstamos.
+
+La TAE es la tasa `r` que iguala lo que el cliente recibe con el valor presente
+de sus cuotas:
+
+    recibido = sum(cuota_k / (1 + r) ** (dias_k / 365))
+
+donde `dias_k` son los días entre el desembolso y el vencimiento de la cuota
+k. Lo recibido es el monto desembolsado (que ya descuenta los gastos cuando se
+restan del desembolso) menos la comisión por desembolso del tipo de préstamo,
+así la TAE refleja el costo real además de la tasa nominal. Los abonos a
+capital (ver abonos.py) cuentan como pagos más en su fecha, porque reemplazan
+parte de las cuotas originales.
+
+`resolver` despeja la tasa de muchos préstamos a la vez: las cuotas van en una
+matriz préstamos x cuotas (completada con ceros) y se itera Newton sobre
+x = ln(1 + r), con bisección cuando el paso de Newton sale del intervalo que
+contiene la raíz. `actualizar` lee las cuotas y los abonos de un grupo de
+préstamos en una consulta cada uno y guarda la TAE con `bulk_update`.
+"""
+from decimal import Decimal
+
+import numpy as np
+from django.db import transaction
+
+from django.utils import timezone
+
+from .models import AbonoCapital, Cuota, Prestamo
+
+DIAS_POR_ANIO = 365
+# Intervalo de búsqueda de x = ln(1 + r): de -99% a 999.900% anual.
+X_MINIMO = np.log(0.01)
+X_MAXIMO = np.log(1e4)
+
+
+def resolver(recibidos, montos, anios, iteraciones=100, tolerancia=1e-12):
+    """
+    TAE (fracción, p. ej. 0.2682) de cada fila: `recibidos` (n), `montos` y
+    `anios` (n x cuotas, con ceros de relleno). Las filas sin solución (nada
+    recibido, sin cuotas o con la tasa fuera del intervalo de búsqueda)
+    quedan en NaN.
+    """
+    recibidos = np.asarray(recibidos, dtype=float)
+    montos = np.asarray(montos, dtype=float)
+    anios = np.asarray(anios, dtype=float)
+    total = montos.sum(axis=1)
+    validas = (recibidos > 0) & (total > 0)
+
+    # Punto de partida: la tasa exacta si todo se pagara en la fecha promedio de las cuotas.
+    with np.errstate(invalid='ignore', divide='ignore'):
+        plazo_medio = (montos * anios).sum(axis=1) / total
+        x = np.log(total / recibidos) / plazo_medio
+    x = np.where(validas & np.isfinite(x), np.clip(x, X_MINIMO, X_MAXIMO), 0.0)
+    bajo = np.full(len(x), X_MINIMO)
+    alto = np.full(len(x), X_MAXIMO)
+
+    for _ in range(iteraciones):
+        descontados = montos * np.exp(-x[:, None] * anios)
+        valor = descontados.sum(axis=1) - recibidos
+        derivada = -(descontados * anios).sum(axis=1)
+        # El valor presente baja al subir la tasa: la raíz queda del lado donde cambia el signo.
+        bajo = np.where(valor > 0, x, bajo)
+        alto = np.where(valor > 0, alto, x)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            newton = x - valor / derivada
+        siguiente = np.where(np.isfinite(newton) & (newton > bajo) & (newton < alto), newton, (bajo + alto) / 2)
+        cambio = np.abs(siguiente - x)
+        x = siguiente
+        if not (cambio[validas] > tolerancia).any():
+            break
+
+    resueltas = validas & (x > X_MINIMO + tolerancia) & (x < X_MAXIMO - tolerancia)
+    return np.where(resueltas, np.expm1(x), np.nan)
+
+
+def a_porcentaje(tasa):
+    """Fracción a porcentaje con dos decimales (None si no hay tasa)."""
+    if tasa is None or not np.isfinite(tasa):
+        return None
+    return Decimal(str(round(float(tasa) * 100, 2)))
+
+
+def monto_recibido(monto, monto_desembolsado, comision):
+    """Lo que recibe el cliente: el desembolso menos la comisión (en % del monto)."""
+    return (monto_desembolsado or monto) - monto * (comision or 0) / 100
+
+
+def de_tablas(recibidos, desembolsos, tablas):
+    """
+    TAE (en %) de varias tablas en centavos (ver utils.generar_tabla_centavos)
+    resueltas juntas: `recibidos` y `desembolsos` (fechas) van uno por tabla.
+    """
+    if not tablas:
+        return []
+    montos = np.zeros((len(tablas), max(len(filas) for filas in tablas)))
+    anios = np.zeros_like(montos)
+    for i, (desembolso, filas) in enumerate(zip(desembolsos, tablas)):
+        for j, (_, fecha, cuota, *_) in enumerate(filas):
+            montos[i, j] = cuota / 100
+            anios[i, j] = (fecha - desembolso).days / DIAS_POR_ANIO
+    return [a_porcentaje(tasa) for tasa in resolver([float(r) for r in recibidos], montos, anios)]
+
+
+def tae_de_tabla(prestamo, filas):
+    """TAE (en %) de un préstamo sin guardar a partir de su tabla en centavos; la usa la vista previa."""
+    filas = list(filas)
+    if not filas or not prestamo.monto:
+        return None
+    comision = prestamo.tipo_prestamo.comision_por_desembolso if prestamo.tipo_prestamo else 0
+    recibido = monto_recibido(prestamo.monto, prestamo.monto_desembolsado, comision)
+    return de_tablas([recibido], [prestamo.fecha_desembolso], [filas])[0]
+
+
+def calcular(prestamos):
+    """
+    TAE (en %) de los préstamos de `prestamos` (queryset) a partir de sus
+    cuotas guardadas y sus abonos a capital. Devuelve {prestamo_id: Decimal o
+    None}; tres consultas.
+    """
+    datos = list(prestamos.values_list(
+        'id', 'fecha_desembolso', 'monto', 'monto_desembolsado', 'tipo_prestamo__comision_por_desembolso'
+    ))
+    if not datos:
+        return {}
+    prestamo_ids = [fila[0] for fila in datos]
+    cuotas = list(
+        Cuota.objects.filter(prestamo_id__in=prestamo_ids)
+        .order_by('prestamo_id', 'numero_cuota').values_list('prestamo_id', 'fecha_vencimiento', 'monto_cuota')
+    )
+    abonos = [
+        (prestamo_id, timezone.localdate(fecha), monto)
+        for prestamo_id, fecha, monto in AbonoCapital.objects.filter(prestamo_id__in=prestamo_ids).values_list('prestamo_id', 'fecha', 'monto')
+    ]
+    if abonos:
+        # Los pagos de cada préstamo tienen que quedar contiguos; el orden dentro del préstamo no importa.
+        cuotas = sorted(cuotas + abonos, key=lambda pago: pago[0])
+    ids = np.array([fila[0] for fila in datos])
+    orden = np.argsort(ids)
+    ids = ids[orden]
+    desembolsos = np.array([fila[1].toordinal() for fila in datos])[orden]
+    recibidos = np.array([float(monto_recibido(*fila[2:])) for fila in datos])[orden]
+
+    montos = anios = np.zeros((len(ids), 0))
+    if cuotas:
+        prestamo_ids, vencimientos, montos_cuota = zip(*cuotas)
+        fila = np.searchsorted(ids, np.array(prestamo_ids))
+        # Posición de cada cuota dentro de su préstamo (las cuotas vienen ordenadas por préstamo).
+        inicios = np.searchsorted(fila, np.arange(len(ids)))
+        columna = np.arange(len(fila)) - inicios[fila]
+        montos = np.zeros((len(ids), columna.max() + 1))
+        anios = np.zeros_like(montos)
+        montos[fila, columna] = np.array(montos_cuota, dtype=float)
+        anios[fila, columna] = (np.array([f.toordinal() for f in vencimientos]) - desembolsos[fila]) / DIAS_POR_ANIO
+
+    tasas = resolver(recibidos, montos, anios)
+    return {int(pk): a_porcentaje(tasa) for pk, tasa in zip(ids, tasas)}
+
+
+def actualizar(prestamos):
+    """Calcula y guarda la TAE de `prestamos` (queryset). Devuelve cuántos guardó."""
+    tasas = calcular(prestamos)
+    with transaction.atomic():
+        Prestamo.objects.bulk_update([Prestamo(id=pk, tae=tae) for pk, tae in tasas.items()], ['tae'], batch_size=2000)
+    return len(tasas)
@@ -0,0 +1,119 @@
+"""
+Tareas registradas para la cola de trabajos (ver trabajos.py).
+Se importan en `PrestamosConfig.ready()` para que el worker las conozca.
+"""
+import datetime
+import io
+
+from django.core.management import call_command
+from django.db import transaction
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from . import contabilidad, devengo, tae
+from .dinero import a_decimal
+from .models import Cuota, Prestamo
+from .trabajos import tarea
+from .utils import calcular_penalidad_cuota, generar_tabla_centavos
+
+
+@tarea('update_penalties', max_concurrencia=1)
+def actualizar_penalidades(job):
+    """Ejecuta `update_penalties`; nunca dos a la vez."""
+    salida = io.StringIO()
+    call_command('update_penalties', stdout=salida)
+    return {'salida': salida.getvalue()[-2000:]}
+
+
+@tarea('actualizar_estados_prestamos', max_concurrencia=1)
+def actualizar_estados_prestamos(job):
+    """Marca como 'pagado' los préstamos aprobados que ya no tienen cuotas por cobrar."""
+    saldados = list(
+        Prestamo.objects.filter(estado='aprobado')
+        .annotate(
+            total=Count('cuotas'),
+            abiertas=Count('cuotas', filter=Q(cuotas__estado__in=['pendiente', 'pagada_parcialmente', 'vencida'])),
+        )
+        .filter(total__gt=0, abiertas=0)
+        .values_list('pk', flat=True)
+    )
+    Prestamo.objects.filter(pk__in=saldados).update(estado='pagado')
+    return {'pagados': len(saldados)}
+
+
+@tarea('generar_cuotas')
+def generar_cuotas(job, prestamo_id):
+    """Crea la tabla de amortización de un préstamo que todavía no tiene cuotas."""
+    prestamo = Prestamo.objects.select_related('tipo_prestamo').get(pk=prestamo_id)
+    if prestamo.cuotas.exists():
+        return {'cuotas': 0}
+    cuotas = [
+        Cuota(
+            prestamo=prestamo,
+            numero_cuota=numero,
+            fecha_vencimiento=fecha,
+            monto_cuota=a_decimal(cuota_c),
+            capital=a_decimal(capital_c),
+            interes=a_decimal(interes_c),
+            saldo_pendiente=a_decimal(saldo_c),
+        )
+        for numero, fecha, cuota_c, interes_c, capital_c, saldo_c in generar_tabla_centavos(prestamo)
+    ]
+    job.reportar_progreso(50, f'{len(cuotas)} cuotas calculadas')
+    with transaction.atomic():
+        Cuota.objects.bulk_create(cuotas)
+        tae.actualizar(Prestamo.objects.filter(pk=prestamo.pk))
+    return {'cuotas': len(cuotas)}
+
+
+@tarea('penalidades_prestamo')
+def penalidades_prestamo(job, prestamo_id):
+    """Actualiza las penalidades de las cuotas vencidas de un préstamo (la encola `loan_detail`)."""
+    with transaction.atomic():
+        cuotas = list(
+            Cuota.objects.select_for_update(of=('self',)).select_related('prestamo__tipo_prestamo')
+            .filter(prestamo_id=prestamo_id, estado__in=['pendiente', 'pagada_parcialmente'], fecha_vencimiento__lt=timezone.localdate())
+        )
+        for cuota in cuotas:
+            calcular_penalidad_cuota(cuota)
+    return {'cuotas': len(cuotas)}
+
+
+@tarea('contabilizar_dia', max_concurrencia=1)
+def contabilizar_dia(job, fecha=None):
+    """
+    Contabiliza la actividad de `fecha` (AAAA-MM-DD); por omisión, la de ayer.
+    También vuelve a contabilizar los días anteriores con actividad cargada
+    con fecha pasada.
+    """
+    dia = datetime.date.fromisoformat(fecha) if fecha else timezone.localdate() - datetime.timedelta(days=1)
+    asientos = contabilidad.contabilizar_dia(dia)
+    dias_atrasados, asientos_atrasados = contabilidad.contabilizar_atrasados(dia)
+    return {
+        'fecha': dia.isoformat(), 'asientos': asientos,
+        'dias_atrasados': dias_atrasados, 'asientos_atrasados': asientos_atrasados,
+    }
+
+
+@tarea('devengar_intereses', max_concurrencia=1)
+def devengar_intereses(job, fecha=None):
+    """Devenga los intereses del mes hasta `fecha` (AAAA-MM-DD); por omisión, hasta ayer."""
+    dia = datetime.date.fromisoformat(fecha) if fecha else timezone.localdate() - datetime.timedelta(days=1)
+    prestamos, centavos = devengo.devengar_mes(dia)
+    return {'fecha': dia.isoformat(), 'prestamos': prestamos, 'monto': str(a_decimal(centavos))}
+
+
+@tarea('cierre_mensual', max_concurrencia=1)
+def cierre_mensual(job):
+    """Cierra el mes anterior; si ya está cerrado no hace nada."""
+    salida = io.StringIO()
+    call_command('cierre_mensual', stdout=salida)
+    return {'salida': salida.getvalue()[-2000:]}
+
+
+@tarea('snapshot_mora', max_concurrencia=1)
+def snapshot_mora(job):
+    """Registra la mora de los meses completos que aún no tienen foto."""
+    salida = io.StringIO()
+    call_command('snapshot_mora', stdout=salida)
+    return {'salida': salida.getvalue()[-2000:]}
@@ -1,3 +1,1318 @@
-from django.test import TestCase
+import datetime
+import io
+import json
+import random
+import tempfile
+from pathlib import Path
+from decimal import Decimal
+
+import numpy as np
+from django.core.management import CommandError, call_command
+from django.db.models import Count, Sum
+from django.test import SimpleTestCase, TestCase
+from django.utils import timezone
+
+from . import calendario
+from . import abonos, antiguedad, caja, contabilidad, devengo, mora, penalidades, programador, proyeccion, pronostico, tae, trabajos
+from .models import AbonoCapital, Asiento, Capital, CierreMensual, Cliente, Cuota, DevengoInteres, DiaFeriado, EjecucionPenalidades, GastoPrestamo, Job, MoraMensual, MovimientoCaja, Pago, PeriodoCerrado, Prestamo, SaldoCuentaPeriodo, ScheduledTask, SupuestoProyeccion, TipoGasto, TipoPrestamo
+from .dinero import a_centavos, a_decimal, dividir, penalidad_centavos
+from .utils import (
+    _calcular_metodo_frances,
+    _cuota_fija_frances,
+    _fechas_de,
+    _parametros_periodo,
+    calcular_liquidacion,
+    calcular_penalidad_cuota,
+    calcular_tabla_amortizacion,
+    desglose_cuota_frances,
+    generar_tabla_amortizacion,
+    metodo_de_calculo,
+    saldo_frances,
+    saldo_tras_cuotas,
+)
+
+
+def prestamo_aleatorio(rng):
+    """Construye un Prestamo sin guardar con parámetros aleatorios."""
+    # Tasas realistas: hasta 99.99% anual o 15% mensual. Con tasas mayores la
+    # recurrencia iterativa amplifica su propio error de redondeo.
+    periodo_tasa = rng.choice(['anual', 'mensual'])
+    tasa_maxima = 9_999 if periodo_tasa == 'anual' else 1_500
+    return Prestamo(
+        monto=Decimal(rng.randint(100_00, 5_000_000_00)) / 100,
+        tasa_interes=Decimal(rng.randint(0, tasa_maxima)) / 100,
+        periodo_tasa=periodo_tasa,
+        plazo=rng.randint(1, 60),
+        frecuencia_pago=rng.choice(['semanal', 'quincenal', 'mensual']),
+        fecha_desembolso=datetime.date(2024, 1, 1) + datetime.timedelta(days=rng.randint(0, 730)),
+    )
+
+
+def metodo_frances_decimal(prestamo):
+    """
+    Implementación original del método francés con `Decimal`: la referencia
+    contra la que se compara el núcleo de centavos (ver NucleoCentavosTests).
+    """
+    monto_pendiente = prestamo.monto
+    tasa_interes_periodo, numero_pagos = _parametros_periodo(prestamo)
+    cuota_fija = _cuota_fija_frances(monto_pendiente, tasa_interes_periodo, numero_pagos)
+    fechas = _fechas_de(prestamo, numero_pagos)
+    tabla_amortizacion = []
+
+    for i in range(1, numero_pagos + 1):
+        interes_periodo = monto_pendiente * tasa_interes_periodo
+        capital_periodo = cuota_fija - interes_periodo
+        monto_pendiente -= capital_periodo
+
+        if i == numero_pagos:
+            capital_periodo += monto_pendiente
+            monto_pendiente = Decimal(0)
+
+        tabla_amortizacion.append({
+            'numero_cuota': i,
+            'fecha_vencimiento': fechas[i - 1],
+            'cuota_fija': cuota_fija.quantize(Decimal('0.01')),
+            'interes': interes_periodo.quantize(Decimal('0.01')),
+            'capital': capital_periodo.quantize(Decimal('0.01')),
+            'saldo_pendiente': monto_pendiente.quantize(Decimal('0.01')),
+        })
+
+    return tabla_amortizacion
+
+
+class FormaCerradaFrancesTests(SimpleTestCase):
+    """Propiedad: la fórmula cerrada coincide al centavo con la tabla iterativa."""
+
+    def test_coincide_con_tabla_iterativa(self):
+        rng = random.Random(20240101)
+        for _ in range(500):
+            prestamo = prestamo_aleatorio(rng)
+            tabla = _calcular_metodo_frances(prestamo)
+            self.assertEqual(saldo_frances(prestamo, 0), prestamo.monto.quantize(Decimal('0.01')))
+            for fila in tabla:
+                k = fila['numero_cuota']
+                desglose = desglose_cuota_frances(prestamo, k)
+                for campo in ('cuota_fija', 'interes', 'capital', 'saldo_pendiente'):
+                    self.assertEqual(desglose[campo], fila[campo], f"{campo} en cuota {k} de {prestamo.__dict__}")
+                self.assertEqual(saldo_frances(prestamo, k), fila['saldo_pendiente'])
+
+    def test_cuota_fuera_de_rango(self):
+        prestamo = prestamo_aleatorio(random.Random(1))
+        with self.assertRaises(ValueError):
+            desglose_cuota_frances(prestamo, 0)
+
+
+class NucleoCentavosTests(SimpleTestCase):
+    """Equivalencia al centavo entre el núcleo de enteros y los cálculos con Decimal."""
+
+    def test_tabla_francesa_igual_a_implementacion_decimal(self):
+        rng = random.Random(28)
+        for _ in range(500):
+            prestamo = prestamo_aleatorio(rng)
+            self.assertEqual(_calcular_metodo_frances(prestamo), metodo_frances_decimal(prestamo))
+
+    def test_penalidad_igual_a_calculo_decimal(self):
+        rng = random.Random(29)
+        for _ in range(2000):
+            base = Decimal(rng.randint(0, 10_000_000)) / 100
+            tasa = Decimal(rng.randint(0, 99_999)) / 10_000
+            dias = rng.randint(0, 400)
+            esperado = (base * tasa * dias).quantize(Decimal('0.01'))
+            self.assertEqual(a_decimal(penalidad_centavos(a_centavos(base), tasa, dias)), esperado)
+
+    def test_redondeo_al_par_en_empates(self):
+        self.assertEqual(dividir(5, 2), 2)
+        self.assertEqual(dividir(7, 2), 4)
+        self.assertEqual(dividir(-5, 2), -2)
+        self.assertEqual(a_centavos(Decimal('0.125')), 12)
+        self.assertEqual(a_centavos(Decimal('0.135')), 14)
+
+    def test_a_centavos_recibe_unidades_de_moneda(self):
+        self.assertEqual(a_centavos(5), 500)
+        self.assertEqual(a_centavos('5'), 500)
+        self.assertEqual(a_centavos(Decimal('5.00')), 500)
+
+
+class MetodosAmortizacionTests(SimpleTestCase):
+    def test_tipo_amortizacion_selecciona_el_metodo(self):
+        prestamo = prestamo_aleatorio(random.Random(2))
+        prestamo.tipo_amortizacion = 'saldo_insoluto'
+        self.assertEqual(metodo_de_calculo(prestamo), 'frances')
+        prestamo.tipo_amortizacion = 'capital_fijo'
+        self.assertEqual(metodo_de_calculo(prestamo), 'aleman')
+        prestamo.tipo_amortizacion = 'interes_simple'
+        self.assertEqual(metodo_de_calculo(prestamo), 'simple')
+
+    def test_capital_fijo_e_interes_simple_saldan_el_prestamo(self):
+        rng = random.Random(3)
+        for tipo in ('capital_fijo', 'interes_simple'):
+            for _ in range(50):
+                prestamo = prestamo_aleatorio(rng)
+                prestamo.tipo_amortizacion = tipo
+                tabla = calcular_tabla_amortizacion(prestamo)
+                self.assertEqual(tabla[-1]['saldo_pendiente'], Decimal('0.00'))
+                self.assertLessEqual(abs(sum(f['capital'] for f in tabla) - prestamo.monto), Decimal('0.01') * len(tabla))
+                for fila in tabla:
+                    self.assertEqual(saldo_tras_cuotas(prestamo, fila['numero_cuota']), fila['saldo_pendiente'])
+                if tipo == 'interes_simple':
+                    self.assertEqual(len({f['interes'] for f in tabla}), 1)
+                elif len(tabla) > 1 and prestamo.tasa_interes > 0:
+                    self.assertGreaterEqual(tabla[0]['cuota_fija'], tabla[-1]['cuota_fija'])
+
+    def test_generador_es_perezoso(self):
+        prestamo = prestamo_aleatorio(random.Random(4))
+        filas = generar_tabla_amortizacion(prestamo)
+        self.assertEqual(next(filas)['numero_cuota'], 1)
+
+
+class LiquidacionTests(TestCase):
+    def setUp(self):
+        cliente = Cliente.objects.create(nombres='Ana', apellidos='Pérez', numero_documento='00100000001')
+        self.prestamo = Prestamo.objects.create(
+            cliente=cliente,
+            monto=Decimal('12000.00'),
+            tasa_interes=Decimal('24.00'),
+            periodo_tasa='anual',
+            plazo=12,
+            frecuencia_pago='mensual',
+            fecha_desembolso=datetime.date(2025, 1, 10),
+            estado='aprobado',
+        )
+        for fila in _calcular_metodo_frances(self.prestamo):
+            Cuota.objects.create(
+                prestamo=self.prestamo,
+                numero_cuota=fila['numero_cuota'],
+                fecha_vencimiento=fila['fecha_vencimiento'],
+                monto_cuota=fila['cuota_fija'],
+                capital=fila['capital'],
+                interes=fila['interes'],
+                saldo_pendiente=fila['saldo_pendiente'],
+            )
+
+    def test_liquidacion_incluye_vencido_y_penalidades(self):
+        cuota = self.prestamo.cuotas.get(numero_cuota=1)
+        cuota.monto_penalidad_acumulada = Decimal('15.00')
+        cuota.save()
+        self.prestamo.registrar_pago(Decimal('100.00'))
+
+        liquidacion = calcular_liquidacion(self.prestamo, datetime.date(2025, 2, 25))
+
+        self.assertEqual(liquidacion['cuotas_vencidas'], 1)
+        self.assertEqual(liquidacion['saldo_capital'], saldo_frances(self.prestamo, 1))
+        self.assertEqual(liquidacion['vencido_pendiente'], cuota.monto_cuota + Decimal('15.00') - Decimal('100.00'))
+        self.assertGreater(liquidacion['interes_devengado'], Decimal('0'))
+        self.assertEqual(
+            liquidacion['total_liquidacion'],
+            liquidacion['vencido_pendiente'] + liquidacion['saldo_capital'] + liquidacion['interes_devengado'],
+        )
+
+    def test_liquidacion_el_dia_del_desembolso_es_el_capital(self):
+        liquidacion = calcular_liquidacion(self.prestamo, self.prestamo.fecha_desembolso)
+        self.assertEqual(liquidacion['total_liquidacion'], Decimal('12000.00'))
+
+
+class CalendarioTests(TestCase):
+    def setUp(self):
+        calendario.invalidar_feriados()
+        self.tipo = TipoPrestamo.objects.create(
+            nombre='Prueba Calendario', tasa_interes_predeterminada=Decimal('24.00'),
+            monto_maximo=Decimal('100000.00'), plazo_maximo_meses=24,
+            dias_gracia=2, ajuste_dia_no_laborable='siguiente',
+        )
+
+    def test_secuencias_se_reutilizan(self):
+        inicio = datetime.date(2025, 1, 31)
+        primera = calendario.fechas_vencimiento(inicio, 'mensual', 12)
+        self.assertIs(calendario.fechas_vencimiento(inicio, 'mensual', 12), primera)
+        self.assertEqual(primera[0], datetime.date(2025, 2, 28))
+
+    def test_ajuste_por_fin_de_semana_y_feriado(self):
+        # 2025-03-01 es sábado; el lunes 3 es feriado.
+        DiaFeriado.objects.create(fecha=datetime.date(2025, 3, 3), descripcion='Prueba')
+        self.assertEqual(calendario.ajustar_fecha(datetime.date(2025, 3, 1), 'siguiente'), datetime.date(2025, 3, 4))
+        self.assertEqual(calendario.ajustar_fecha(datetime.date(2025, 3, 1), 'anterior'), datetime.date(2025, 2, 28))
+        self.assertEqual(
+            calendario.ajustar_fecha(datetime.date(2025, 5, 31), 'siguiente_modificado'), datetime.date(2025, 5, 30)
+        )
+        self.assertEqual(calendario.siguiente_dia_habil(datetime.date(2025, 2, 28)), datetime.date(2025, 3, 4))
+
+    def test_invalidar_durante_el_calculo_no_mezcla_feriados(self):
+        DiaFeriado.objects.create(fecha=datetime.date(2025, 3, 3), descripcion='Prueba')
+        inicio = datetime.date(2025, 1, 1)
+        instantanea = calendario.feriados()
+        # Otro hilo invalida la caché después de tomar la instantánea: el cálculo usa la recibida.
+        calendario.invalidar_feriados()
+        fechas = calendario._secuencia_ajustada(inicio, 'mensual', 3, 'siguiente', instantanea)
+        self.assertEqual(fechas[1], datetime.date(2025, 3, 4))
+        self.assertEqual(calendario.fechas_vencimiento(inicio, 'mensual', 3, 'siguiente'), fechas)
+
+    def test_tabla_y_gracia_usan_dias_habiles(self):
+        prestamo = Prestamo(
+            monto=Decimal('1000.00'), tasa_interes=Decimal('12.00'), periodo_tasa='anual', plazo=3,
+            frecuencia_pago='mensual', fecha_desembolso=datetime.date(2025, 1, 1), tipo_prestamo=self.tipo,
+        )
+        fechas = [fila['fecha_vencimiento'] for fila in calcular_tabla_amortizacion(prestamo)]
+        self.assertTrue(all(fecha.weekday() < 5 for fecha in fechas))
+        self.assertEqual(fechas[1], datetime.date(2025, 3, 3))  # 1 de marzo cae sábado
+        # Vence el jueves 27 de febrero; 2 días de gracia terminan el sábado -> lunes.
+        self.assertEqual(
+            calendario.fecha_inicio_penalidad(datetime.date(2025, 2, 27), self.tipo), datetime.date(2025, 3, 3)
+        )
+
+
+class SeedPortfolioTests(TestCase):
+    def sembrar(self, semilla):
+        call_command('seed_portfolio', clientes=30, bloque=10, semilla=semilla, fecha_corte=datetime.date(2025, 6, 30),
+                     limpiar=True, stdout=io.StringIO())
+        return (
+            Prestamo.objects.count(),
+            Cuota.objects.count(),
+            Pago.objects.aggregate(total=Sum('monto_pagado'))['total'],
+        )
+
+    def test_cartera_reproducible_y_consistente(self):
+        primera = self.sembrar(5)
+        self.assertEqual(self.sembrar(5), primera)
+        self.assertEqual(Cliente.objects.count(), 30)
+        self.assertFalse(
+            Prestamo.objects.filter(estado='aprobado').values('cliente').annotate(n=Count('id')).filter(n__gt=1).exists()
+        )
+        for cuota in Cuota.objects.filter(estado='pagada_parcialmente'):
+            self.assertLess(cuota.total_pagado, cuota.monto_cuota)
+        self.assertFalse(Pago.objects.filter(fecha_pago__date__gt=datetime.date(2025, 6, 30)).exists())
+
+
+class BenchmarkRendimientoTests(TestCase):
+    def test_informe_y_comparacion_con_linea_base(self):
+        call_command('seed_portfolio', clientes=10, semilla=3, stdout=io.StringIO())
+        with tempfile.TemporaryDirectory() as carpeta:
+            linea_base = Path(carpeta) / 'linea_base.json'
+            opciones = dict(repeticiones=2, repeticiones_procesos=1, prestamos_tabla=5, linea_base=linea_base)
+            call_command('benchmark_rendimiento', guardar_linea_base=True, stdout=io.StringIO(), **opciones)
+            informe = json.loads(linea_base.read_text())
+            self.assertEqual(informe['escenarios']['loan_detail']['repeticiones'], 2)
+            self.assertIn('update_penalties', informe['escenarios'])
+            # Con tolerancia negativa cualquier medición cuenta como regresión.
+            with self.assertRaises(CommandError):
+                call_command('benchmark_rendimiento', tolerancia=-1, stdout=io.StringIO(), stderr=io.StringIO(), **opciones)
+
+
+@trabajos.tarea('prueba_con_error', max_intentos=2)
+def tarea_con_error(job):
+    raise RuntimeError('falla de prueba')
+
+
+@trabajos.tarea('prueba_limitada', max_concurrencia=1)
+def tarea_limitada(job):
+    return 'ok'
+
+
+class TrabajosTests(TestCase):
+    def setUp(self):
+        cliente = Cliente.objects.create(nombres='Ana', apellidos='Pérez', numero_documento='00100000002')
+        self.prestamo = Prestamo.objects.create(
+            cliente=cliente, monto=Decimal('5000.00'), tasa_interes=Decimal('24.00'), periodo_tasa='anual',
+            plazo=6, frecuencia_pago='mensual', fecha_desembolso=datetime.date(2025, 1, 10), estado='aprobado',
+        )
+
+    def test_worker_ejecuta_y_reporta_resultado(self):
+        job = trabajos.enqueue('generar_cuotas', prestamo_id=self.prestamo.pk)
+        call_command('run_worker', una_vez=True, stdout=io.StringIO())
+        job.refresh_from_db()
+        self.assertEqual(job.estado, 'completado')
+        self.assertEqual(job.progreso, 100)
+        self.assertEqual(job.resultado, {'cuotas': 6})
+        self.assertEqual(self.prestamo.cuotas.count(), 6)
+
+    def test_reintentos_y_fallo_definitivo(self):
+        job = trabajos.enqueue('prueba_con_error')
+        trabajos.ejecutar(trabajos.reclamar('prueba'))
+        job.refresh_from_db()
+        self.assertEqual((job.estado, job.intentos), ('pendiente', 1))
+        self.assertGreater(job.ejecutar_despues, job.fecha_creacion)
+        # No se reintenta antes de tiempo.
+        self.assertIsNone(trabajos.reclamar('prueba'))
+        Job.objects.filter(pk=job.pk).update(ejecutar_despues=job.fecha_creacion)
+        trabajos.ejecutar(trabajos.reclamar('prueba'))
+        job.refresh_from_db()
+        self.assertEqual(job.estado, 'fallido')
+        self.assertIn('falla de prueba', job.error)
+
+    def test_limite_de_concurrencia(self):
+        primero = trabajos.enqueue('prueba_limitada')
+        trabajos.enqueue('prueba_limitada')
+        self.assertEqual(trabajos.reclamar('w1').pk, primero.pk)
+        self.assertIsNone(trabajos.reclamar('w2'))
+
+    def test_rescate_cuenta_como_intento(self):
+        job = trabajos.enqueue('prueba_limitada')
+        colgado = timezone.now() - datetime.timedelta(hours=1)
+        for intento in (1, 2):
+            self.assertEqual(trabajos.reclamar('caido').pk, job.pk)
+            Job.objects.filter(pk=job.pk).update(fecha_inicio=colgado)
+            self.assertEqual(trabajos.rescatar_trabajos_colgados(datetime.timedelta(minutes=5)), 1)
+            job.refresh_from_db()
+            self.assertEqual((job.estado, job.intentos), ('pendiente', intento))
+        # El tercer rescate agota los intentos: el trabajo no vuelve a la cola.
+        trabajos.reclamar('caido')
+        Job.objects.filter(pk=job.pk).update(fecha_inicio=colgado)
+        with self.assertLogs('gestion_prestamos.trabajos', level='WARNING'):
+            self.assertEqual(trabajos.rescatar_trabajos_colgados(datetime.timedelta(minutes=5)), 0)
+        job.refresh_from_db()
+        self.assertEqual((job.estado, job.intentos), ('fallido', 3))
+        self.assertIsNone(trabajos.reclamar('caido'))
+
+    def test_tarea_no_registrada(self):
+        with self.assertRaises(ValueError):
+            trabajos.enqueue('no_existe')
+
+
+class ProgramadorTests(TestCase):
+    def setUp(self):
+        self.ahora = timezone.now()
+        ScheduledTask.objects.update(activa=False)
+
+    def programar(self, tarea, **campos):
+        campos.setdefault('intervalo_minutos', 60)
+        campos.setdefault('proxima_ejecucion', self.ahora - datetime.timedelta(minutes=1))
+        return ScheduledTask.objects.create(nombre=tarea, tarea=tarea, **campos)
+
+    def test_tareas_iniciales_programadas(self):
+        self.assertEqual(
+            set(ScheduledTask.objects.values_list('tarea', flat=True)),
+            {'update_penalties', 'actualizar_estados_prestamos', 'contabilizar_dia', 'devengar_intereses', 'cierre_mensual', 'snapshot_mora'},
+        )
+
+    def test_siguiente_ejecucion_diaria_recupera_las_perdidas(self):
+        programada = ScheduledTask(hora=datetime.time(1, 0))
+        programada.proxima_ejecucion = timezone.make_aware(datetime.datetime(2025, 3, 1, 1, 0))
+        despues_de = timezone.make_aware(datetime.datetime(2025, 3, 4, 8, 0))
+        proxima, omitidas = programador.siguiente_ejecucion(programada, despues_de)
+        self.assertEqual(timezone.localtime(proxima), timezone.make_aware(datetime.datetime(2025, 3, 5, 1, 0)))
+        self.assertEqual(omitidas, 3)
+
+    def test_ejecuta_tarea_vencida_y_registra_resultado(self):
+        cliente = Cliente.objects.create(nombres='Ana', apellidos='Pérez', numero_documento='00100000003')
+        prestamo = Prestamo.objects.create(
+            cliente=cliente, monto=Decimal('1000.00'), tasa_interes=Decimal('12.00'), plazo=1,
+            fecha_desembolso=datetime.date(2025, 1, 10), estado='aprobado',
+        )
+        Cuota.objects.create(
+            prestamo=prestamo, numero_cuota=1, fecha_vencimiento=datetime.date(2025, 2, 10), monto_cuota=Decimal('1010.00'),
+            capital=Decimal('1000.00'), interes=Decimal('10.00'), saldo_pendiente=Decimal('0.00'), estado='pagada',
+        )
+        programada = self.programar('actualizar_estados_prestamos',
+                                    proxima_ejecucion=self.ahora - datetime.timedelta(hours=3, minutes=30))
+
+        call_command('run_scheduler', una_vez=True, stdout=io.StringIO())
+
+        prestamo.refresh_from_db()
+        programada.refresh_from_db()
+        self.assertEqual(prestamo.estado, 'pagado')
+        self.assertEqual((programada.ultimo_resultado, programada.ejecuciones, programada.fallos), ('ok', 1, 0))
+        self.assertEqual(programada.ejecuciones_omitidas, 3)
+        self.assertIsNotNone(programada.ultima_duracion)
+        self.assertGreater(programada.proxima_ejecucion, self.ahora)
+        self.assertIsNone(programada.bloqueada_hasta)
+        self.assertEqual(Job.objects.get(cola='programadas').estado, 'completado')
+
+    def test_no_ejecuta_tarea_bloqueada_por_otra_instancia(self):
+        programada = self.programar('actualizar_estados_prestamos',
+                                    bloqueada_hasta=self.ahora + datetime.timedelta(minutes=5), bloqueada_por='otro')
+        self.assertEqual(programador.ejecutar_pendientes('esta'), [])
+        # Vencido el bloqueo (la otra instancia cayó), se retoma.
+        ScheduledTask.objects.filter(pk=programada.pk).update(bloqueada_hasta=self.ahora)
+        self.assertEqual(len(programador.ejecutar_pendientes('esta')), 1)
+        self.assertEqual(len(programador.ejecutar_pendientes('otra')), 0)
+
+    def test_respeta_el_limite_de_concurrencia_de_la_tarea(self):
+        programada = self.programar('prueba_limitada')
+        en_worker = trabajos.enqueue('prueba_limitada')
+        self.assertEqual(trabajos.reclamar('worker').pk, en_worker.pk)
+        with self.assertLogs('gestion_prestamos.programador', level='INFO'):
+            self.assertEqual(programador.ejecutar_pendientes('esta'), [])
+        programada.refresh_from_db()
+        self.assertEqual((programada.ejecuciones, programada.bloqueada_hasta), (0, None))
+        self.assertLessEqual(programada.proxima_ejecucion, self.ahora)
+        self.assertFalse(Job.objects.filter(cola='programadas').exists())
+        # Terminado el trabajo del worker, la tarea programada corre.
+        trabajos.ejecutar(en_worker)
+        self.assertEqual(programador.ejecutar_pendientes('esta')[0].estado, 'completado')
+
+    def test_registra_fallo_y_reprograma(self):
+        programada = self.programar('prueba_con_error')
+        programador.ejecutar_pendientes('esta')
+        programada.refresh_from_db()
+        self.assertEqual((programada.ultimo_resultado, programada.fallos), ('error', 1))
+        self.assertIn('falla de prueba', programada.ultimo_error)
+        self.assertGreater(programada.proxima_ejecucion, self.ahora)
+
+
+class PenalidadesPorBloquesTests(TestCase):
+    def setUp(self):
+        tipo = TipoPrestamo.objects.create(
+            nombre='Mora de Prueba', tasa_interes_predeterminada=Decimal('20.00'), tasa_penalidad_diaria=Decimal('0.002'),
+            dias_gracia=3, monto_minimo=Decimal('100.00'), monto_maximo=Decimal('100000.00'),
+            plazo_minimo_meses=1, plazo_maximo_meses=60,
+        )
+        hoy = timezone.localdate()
+        for i in range(5):
+            cliente = Cliente.objects.create(nombres='Cliente', apellidos=str(i), numero_documento=f'0020000000{i}')
+            prestamo = Prestamo.objects.create(
+                cliente=cliente, tipo_prestamo=tipo, monto=Decimal('3000.00'), tasa_interes=Decimal('20.00'), plazo=3,
+                fecha_desembolso=hoy - datetime.timedelta(days=120), estado='aprobado',
+            )
+            for numero in range(1, 4):
+                cuota = Cuota.objects.create(
+                    prestamo=prestamo, numero_cuota=numero, fecha_vencimiento=hoy - datetime.timedelta(days=100 - 30 * numero + i),
+                    monto_cuota=Decimal('1050.00'), capital=Decimal('1000.00'), interes=Decimal('50.00'),
+                    saldo_pendiente=Decimal(3000 - 1000 * numero),
+                )
+                if numero == 1 and i % 2:
+                    Pago.objects.create(cuota=cuota, monto_pagado=Decimal('400.00'))
+                    cuota.actualizar_estado()
+
+    def penalidades(self):
+        return dict(Cuota.objects.values_list('id', 'monto_penalidad_acumulada'))
+
+    def test_bloques_equivalen_al_calculo_por_cuota(self):
+        for cuota in Cuota.objects.all():
+            calcular_penalidad_cuota(cuota)
+        esperadas = self.penalidades()
+        Cuota.objects.update(monto_penalidad_acumulada=Decimal('0.00'), fecha_ultima_penalidad_calculada=None)
+
+        call_command('update_penalties', chunk_size=4, stdout=io.StringIO())
+
+        self.assertEqual(self.penalidades(), esperadas)
+        ejecucion = EjecucionPenalidades.objects.get()
+        self.assertEqual(ejecucion.estado, 'completada')
+        self.assertEqual(len(ejecucion.rangos), len(ejecucion.rangos_completados))
+        self.assertEqual(ejecucion.monto_penalidades, sum(esperadas.values()))
+
+    def test_segunda_ejecucion_del_dia_no_duplica(self):
+        call_command('update_penalties', chunk_size=4, stdout=io.StringIO())
+        primera = self.penalidades()
+        call_command('update_penalties', chunk_size=4, stdout=io.StringIO())
+        self.assertEqual(self.penalidades(), primera)
+
+    def test_reanuda_desde_el_punto_de_control(self):
+        ids = list(Cuota.objects.order_by('id').values_list('id', flat=True))
+        hecho, pendiente = [ids[0], ids[6]], [ids[7], ids[-1]]
+        EjecucionPenalidades.objects.create(
+            fecha_corte=timezone.localdate(), rangos=[hecho, pendiente], rangos_completados=[hecho],
+        )
+        salida = io.StringIO()
+        call_command('update_penalties', stdout=salida)
+
+        self.assertIn('Reanudando', salida.getvalue())
+        sin_procesar = Cuota.objects.filter(id__lte=ids[6])
+        self.assertFalse(sin_procesar.filter(monto_penalidad_acumulada__gt=0).exists())
+        self.assertTrue(Cuota.objects.filter(id__gte=ids[7], monto_penalidad_acumulada__gt=0).exists())
+        self.assertEqual(EjecucionPenalidades.objects.get().estado, 'completada')
+
+    def test_punto_de_control_de_otro_dia_se_abandona(self):
+        EjecucionPenalidades.objects.create(
+            fecha_corte=timezone.localdate() - datetime.timedelta(days=1), rangos=[[1, 1]],
+        )
+        call_command('update_penalties', stdout=io.StringIO())
+        self.assertEqual(
+            sorted(EjecucionPenalidades.objects.values_list('estado', flat=True)), ['abandonada', 'completada']
+        )
+        self.assertTrue(Cuota.objects.filter(monto_penalidad_acumulada__gt=0).exists())
+
+
+class PenalidadesAFechaTests(TestCase):
+    def setUp(self):
+        self.tipo = TipoPrestamo.objects.create(
+            nombre='Mora Histórica', tasa_interes_predeterminada=Decimal('20.00'), tasa_penalidad_diaria=Decimal('0.01'),
+            dias_gracia=0, monto_minimo=Decimal('100.00'), monto_maximo=Decimal('100000.00'),
+            plazo_minimo_meses=1, plazo_maximo_meses=60, ajuste_dia_no_laborable='ninguno',
+        )
+        self.hoy = timezone.localdate()
+        cliente = Cliente.objects.create(nombres='Luis', apellidos='Mora', numero_documento='00300000001')
+        prestamo = Prestamo.objects.create(
+            cliente=cliente, tipo_prestamo=self.tipo, monto=Decimal('1000.00'), tasa_interes=Decimal('20.00'), plazo=1,
+            fecha_desembolso=self.hoy - datetime.timedelta(days=40), estado='aprobado',
+        )
+        self.cuota = Cuota.objects.create(
+            prestamo=prestamo, numero_cuota=1, fecha_vencimiento=self.hoy - datetime.timedelta(days=10),
+            monto_cuota=Decimal('1000.00'), capital=Decimal('1000.00'), interes=Decimal('0.00'),
+            saldo_pendiente=Decimal('0.00'),
+        )
+
+    def pagar(self, monto, hace_dias):
+        pago = Pago.objects.create(cuota=self.cuota, monto_pagado=monto)
+        fecha = timezone.now() - datetime.timedelta(days=hace_dias)
+        Pago.objects.filter(pk=pago.pk).update(fecha_pago=fecha)
+        self.cuota.actualizar_estado()
+
+    def test_intervalos_con_la_base_de_cada_dia(self):
+        inicio = datetime.date(2025, 1, 1)
+        pagos = [(datetime.date(2024, 12, 20), 10000), (datetime.date(2025, 1, 5), 40000)]
+        # 4 días sobre 900.00 y 6 días sobre 500.00, al 1% diario.
+        self.assertEqual(
+            penalidades.penalidad_en_intervalo(100000, Decimal('0.01'), inicio, inicio, datetime.date(2025, 1, 11), pagos),
+            4 * 900 + 6 * 500,
+        )
+
+    def test_as_of_usa_el_historial_de_pagos(self):
+        # Penalidad ya "cobrada" con la base actual (como haría un backfill tardío).
+        self.pagar(Decimal('600.00'), hace_dias=5)
+        Cuota.objects.filter(pk=self.cuota.pk).update(monto_penalidad_acumulada=Decimal('40.00'))
+
+        call_command('update_penalties', as_of=self.hoy, stdout=io.StringIO())
+
+        self.cuota.refresh_from_db()
+        # 5 días sobre 1000.00 y 5 días sobre 400.00.
+        self.assertEqual(self.cuota.monto_penalidad_acumulada, Decimal('70.00'))
+        self.assertEqual(self.cuota.fecha_ultima_penalidad_calculada, self.hoy)
+
+    def test_ejecucion_diaria_y_recalculo_coinciden(self):
+        self.pagar(Decimal('250.00'), hace_dias=7)
+        self.pagar(Decimal('250.00'), hace_dias=2)
+        call_command('update_penalties', stdout=io.StringIO())
+        self.cuota.refresh_from_db()
+        diaria = self.cuota.monto_penalidad_acumulada
+
+        salida = io.StringIO()
+        call_command('update_penalties', as_of=self.hoy, stdout=salida)
+        self.cuota.refresh_from_db()
+        self.assertEqual(self.cuota.monto_penalidad_acumulada, diaria)
+        self.assertIn('Cuotas corregidas: 0', salida.getvalue())
+
+    def test_as_of_anterior_ignora_pagos_posteriores(self):
+        self.pagar(Decimal('1000.00'), hace_dias=1)
+        call_command('update_penalties', as_of=self.hoy - datetime.timedelta(days=4), stdout=io.StringIO())
+        self.cuota.refresh_from_db()
+        self.assertEqual(self.cuota.monto_penalidad_acumulada, Decimal('60.00'))
+
+    def test_periodo_omite_cuotas_saldadas_antes(self):
+        self.pagar(Decimal('1000.00'), hace_dias=8)
+        desde = self.hoy - datetime.timedelta(days=5)
+        self.assertFalse(penalidades.cuotas_abiertas_en(desde, self.hoy).exists())
+        self.assertTrue(penalidades.cuotas_abiertas_en(desde - datetime.timedelta(days=5), self.hoy).exists())
+
+    def test_validacion_de_opciones(self):
+        with self.assertRaises(CommandError):
+            call_command('update_penalties', desde=self.hoy, stdout=io.StringIO())
+        with self.assertRaises(CommandError):
+            call_command('update_penalties', as_of=self.hoy + datetime.timedelta(days=1), stdout=io.StringIO())
+
+
+class LibroCajaTests(TestCase):
+    def setUp(self):
+        Capital.objects.create(monto_inicial=Decimal('50000.00'))
+        cliente = Cliente.objects.create(nombres='Eva', apellidos='Caja', numero_documento='00400000001')
+        self.prestamo = Prestamo.objects.create(
+            cliente=cliente, monto=Decimal('10500.00'), monto_desembolsado=Decimal('10000.00'),
+            total_gastos_asociados=Decimal('500.00'), tasa_interes=Decimal('24.00'), plazo=2,
+            fecha_desembolso=timezone.localdate() - datetime.timedelta(days=40), estado='aprobado',
+        )
+        GastoPrestamo.objects.create(
+            prestamo=self.prestamo, tipo_gasto=TipoGasto.objects.create(nombre='Notaría'), monto=Decimal('500.00')
+        )
+        for numero in (1, 2):
+            Cuota.objects.create(
+                prestamo=self.prestamo, numero_cuota=numero,
+                fecha_vencimiento=self.prestamo.fecha_desembolso + datetime.timedelta(days=30 * numero),
+                monto_cuota=Decimal('5500.00'), capital=Decimal('5250.00'), interes=Decimal('250.00'),
+                saldo_pendiente=Decimal(10500 - 5250 * numero),
+            )
+
+    def test_saldo_acumulado_por_movimiento(self):
+        self.assertEqual(caja.saldo_actual(), Decimal('50000.00'))
+        self.prestamo.registrar_desembolso()
+        self.prestamo.registrar_desembolso()
+        self.assertEqual(caja.saldo_actual(), Decimal('39500.00'))
+        self.prestamo.registrar_pago(Decimal('7000.00'))
+        self.assertEqual(caja.saldo_actual(), Decimal('46500.00'))
+        self.assertEqual(
+            list(MovimientoCaja.objects.order_by('secuencia').values_list('tipo', flat=True)),
+            ['capital', 'desembolso', 'gasto', 'pago', 'pago'],
+        )
+        self.assertEqual(caja.saldo_al(timezone.localdate() - datetime.timedelta(days=1)), Decimal('0.00'))
+
+    def test_saldo_al_con_movimientos_de_fecha_anterior(self):
+        self.prestamo.registrar_desembolso()
+        self.prestamo.registrar_pago(Decimal('7000.00'))
+        # Los pagos se anexaron al final pero con fecha de hace 5 días, antes del capital y el desembolso.
+        MovimientoCaja.objects.filter(tipo='pago').update(fecha=timezone.now() - datetime.timedelta(days=5))
+        self.assertEqual(caja.saldo_al(timezone.localdate() - datetime.timedelta(days=5)), Decimal('7000.00'))
+        self.assertEqual(caja.saldo_al(timezone.localdate()), caja.saldo_actual())
+
+    def test_eliminar_un_pago_se_compensa(self):
+        self.prestamo.registrar_desembolso()
+        self.prestamo.registrar_pago(Decimal('1000.00'))
+        Pago.objects.get().delete()
+        self.assertEqual(caja.saldo_actual(), Decimal('39500.00'))
+        self.assertEqual(MovimientoCaja.objects.order_by('-secuencia').first().tipo, 'ajuste')
+
+    def test_reconstruir_reproduce_el_historial(self):
+        self.prestamo.registrar_desembolso()
+        self.prestamo.registrar_pago(Decimal('7000.00'))
+        Pago.objects.update(fecha_pago=timezone.now() - datetime.timedelta(days=5))
+        saldo_en_vivo = caja.saldo_actual()
+
+        call_command('rebuild_caja', chunk_size=2, stdout=io.StringIO())
+
+        self.assertEqual(caja.saldo_actual(), saldo_en_vivo)
+        self.assertEqual(list(MovimientoCaja.objects.order_by('secuencia').values_list('secuencia', flat=True)), [1, 2, 3, 4, 5])
+        # Historial: tras el desembolso y antes de los pagos.
+        self.assertEqual(caja.saldo_al(timezone.localdate() - datetime.timedelta(days=10)), Decimal('39500.00'))
+        self.assertEqual(caja.saldo_al(self.prestamo.fecha_desembolso - datetime.timedelta(days=1)), Decimal('0.00'))
+
+
+class ContabilidadTests(TestCase):
+    def setUp(self):
+        self.hoy = timezone.localdate()
+        self.desembolso = self.hoy - datetime.timedelta(days=40)
+        cliente = Cliente.objects.create(nombres='Raúl', apellidos='Libro', numero_documento='00400000002')
+        self.prestamo = Prestamo.objects.create(
+            cliente=cliente, monto=Decimal('10500.00'), monto_desembolsado=Decimal('10000.00'),
+            total_gastos_asociados=Decimal('500.00'), tasa_interes=Decimal('24.00'), plazo=2,
+            fecha_desembolso=self.desembolso, estado='aprobado',
+        )
+        GastoPrestamo.objects.create(
+            prestamo=self.prestamo, tipo_gasto=TipoGasto.objects.create(nombre='Tasación'), monto=Decimal('500.00')
+        )
+        self.cuota = Cuota.objects.create(
+            prestamo=self.prestamo, numero_cuota=1, fecha_vencimiento=self.desembolso + datetime.timedelta(days=30),
+            monto_cuota=Decimal('5500.00'), capital=Decimal('5250.00'), interes=Decimal('250.00'),
+            saldo_pendiente=Decimal('5250.00'),
+        )
+
+    def saldo(self, codigo, periodo):
+        return next(f['saldo'] for f in contabilidad.balanza_de_comprobacion(periodo) if f['codigo'] == codigo)
+
+    def test_distribuir_pago_interes_capital_y_penalidad(self):
+        interes, capital = Decimal('250.00'), Decimal('5250.00')
+        self.assertEqual(contabilidad.distribuir_pago(Decimal('0'), Decimal('100.00'), interes, capital),
+                         (Decimal('100.00'), Decimal('0'), Decimal('0')))
+        self.assertEqual(contabilidad.distribuir_pago(Decimal('100.00'), Decimal('5500.00'), interes, capital),
+                         (Decimal('150.00'), Decimal('5250.00'), Decimal('100.00')))
+
+    def test_desembolso_y_gastos(self):
+        self.assertEqual(contabilidad.contabilizar_dia(self.desembolso), 3)
+        self.assertEqual(self.saldo(contabilidad.CARTERA, self.desembolso), Decimal('10500.00'))
+        self.assertEqual(self.saldo(contabilidad.CAJA, self.desembolso), Decimal('-10500.00'))
+        self.assertEqual(self.saldo(contabilidad.GASTOS_PRESTAMOS, self.desembolso), Decimal('500.00'))
+        # Idempotente: volver a contabilizar el día no duplica asientos ni saldos.
+        self.assertEqual(contabilidad.contabilizar_dia(self.desembolso), 0)
+        self.assertEqual(self.saldo(contabilidad.CARTERA, self.desembolso), Decimal('10500.00'))
+
+    def test_pagos_en_dias_distintos_y_balanza_cuadrada(self):
+        ayer = timezone.now() - datetime.timedelta(days=1)
+        primero = Pago.objects.create(cuota=self.cuota, monto_pagado=Decimal('3000.00'))
+        Pago.objects.filter(pk=primero.pk).update(fecha_pago=ayer)
+        Pago.objects.create(cuota=self.cuota, monto_pagado=Decimal('2600.00'))
+
+        call_command('contabilizar', desde=self.desembolso, hasta=self.hoy, stdout=io.StringIO())
+
+        self.assertEqual(
+            set(Asiento.objects.filter(fecha=self.hoy).values_list('regla', 'monto')),
+            {('pago_capital', Decimal('2500.00')), ('pago_penalidad', Decimal('100.00'))},
+        )
+        filas = contabilidad.balanza_de_comprobacion(self.hoy)
+        self.assertEqual(sum(f['saldo'] for f in filas), 0)
+        self.assertEqual(self.saldo(contabilidad.CARTERA, self.hoy), Decimal('5250.00'))
+        self.assertEqual(self.saldo(contabilidad.INGRESOS_INTERESES, self.hoy), Decimal('-250.00'))
+        self.assertEqual(self.saldo(contabilidad.INGRESOS_PENALIDADES, self.hoy), Decimal('-100.00'))
+
+        materializados = list(SaldoCuentaPeriodo.objects.order_by('cuenta', 'periodo').values_list('debe', 'haber'))
+        contabilidad.recalcular_saldos()
+        self.assertEqual(
+            list(SaldoCuentaPeriodo.objects.order_by('cuenta', 'periodo').values_list('debe', 'haber')),
+            materializados,
+        )
+
+
+    def test_pago_con_fecha_pasada_se_contabiliza_despues(self):
+        contabilidad.contabilizar_dia(self.desembolso)
+        hace_dos_dias = self.hoy - datetime.timedelta(days=2)
+        self.assertEqual(contabilidad.dias_sin_contabilizar(self.hoy), [])
+        # El pago se carga hoy con fecha de hace dos días, ya contabilizado.
+        pago = Pago.objects.create(cuota=self.cuota, monto_pagado=Decimal('3000.00'))
+        Pago.objects.filter(pk=pago.pk).update(
+            fecha_pago=timezone.make_aware(datetime.datetime.combine(hace_dos_dias, datetime.time(12)))
+        )
+        self.assertEqual(contabilidad.dias_sin_contabilizar(self.hoy), [hace_dos_dias])
+
+        self.assertEqual(contabilidad.contabilizar_atrasados(self.hoy), (1, 2))
+        self.assertEqual(contabilidad.dias_sin_contabilizar(self.hoy), [])
+        self.assertEqual(self.saldo(contabilidad.CARTERA, self.hoy), Decimal('7750.00'))
+        self.assertEqual(sum(f['saldo'] for f in contabilidad.balanza_de_comprobacion(self.hoy)), 0)
+
+    def test_borrar_pago_gasto_o_prestamo_anula_sus_asientos(self):
+        contabilidad.contabilizar_dia(self.desembolso)
+        Pago.objects.create(cuota=self.cuota, monto_pagado=Decimal('3000.00'))
+        contabilidad.contabilizar_dia(self.hoy)
+        Pago.objects.get().delete()
+        self.assertEqual(
+            set(Asiento.objects.filter(referencia__startswith='anulacion:').values_list('regla', 'monto', 'fecha')),
+            {('pago_interes', Decimal('250.00'), self.hoy), ('pago_capital', Decimal('2750.00'), self.hoy)},
+        )
+        self.assertEqual(self.saldo(contabilidad.CARTERA, self.hoy), Decimal('10500.00'))
+        self.assertEqual(self.saldo(contabilidad.INGRESOS_INTERESES, self.hoy), Decimal('0.00'))
+
+        # Al borrar el préstamo se anulan el desembolso y los gastos: todas las cuentas vuelven a cero.
+        self.prestamo.delete()
+        self.assertTrue(all(f['saldo'] == 0 for f in contabilidad.balanza_de_comprobacion(self.hoy)))
+        self.assertFalse(Asiento.objects.filter(prestamo__isnull=False).exists())
+
+
+class DevengoInteresesTests(TestCase):
+    def setUp(self):
+        cliente = Cliente.objects.create(nombres='Inés', apellidos='Devengo', numero_documento='00400000003')
+        self.prestamo = Prestamo.objects.create(
+            cliente=cliente, monto=Decimal('10000.00'), tasa_interes=Decimal('36.00'), plazo=2,
+            fecha_desembolso=datetime.date(2025, 1, 15), estado='aprobado',
+        )
+        for numero, vencimiento, interes in ((1, datetime.date(2025, 2, 15), '310.00'), (2, datetime.date(2025, 3, 15), '280.00')):
+            Cuota.objects.create(
+                prestamo=self.prestamo, numero_cuota=numero, fecha_vencimiento=vencimiento,
+                monto_cuota=Decimal('5300.00'), capital=Decimal('5000.00'), interes=Decimal(interes),
+                saldo_pendiente=Decimal(10000 - 5000 * numero),
+            )
+
+    def test_devengo_lineal_por_mes_suma_el_interes(self):
+        montos = []
+        for fin_de_mes in (datetime.date(2025, 1, 31), datetime.date(2025, 2, 28), datetime.date(2025, 3, 31)):
+            devengo.devengar_mes(fin_de_mes)
+            montos.append(DevengoInteres.objects.get(periodo=fin_de_mes.replace(day=1)).monto)
+        self.assertEqual(montos, [Decimal('170.00'), Decimal('280.00'), Decimal('140.00')])
+        self.assertEqual(sum(montos), Decimal('590.00'))
+        self.assertEqual(devengo.devengar_mes(datetime.date(2025, 4, 30)), (0, 0))
+
+    def test_vectorizado_coincide_con_el_calculo_por_cuota(self):
+        generador = random.Random(42)
+        filas = []
+        for _ in range(2000):
+            inicio = generador.randint(0, 400)
+            fin = inicio + generador.choice((0, 7, 14, 15, 28, 30, 31))
+            filas.append((generador.randint(0, 500000), inicio, fin, generador.randint(-40, 440)))
+        base = datetime.date(2025, 1, 1)
+        esperado = [
+            devengo.interes_acumulado(interes, *(base + datetime.timedelta(days=dia) for dia in dias))
+            for interes, *dias in filas
+        ]
+        interes, inicio, fin, hasta = (np.array(columna) for columna in zip(*filas))
+        self.assertEqual(devengo._acumulado(interes, inicio, fin, hasta).tolist(), esperado)
+
+    def test_reejecutar_reemplaza_las_filas_del_mes(self):
+        self.assertEqual(devengo.devengar_mes(datetime.date(2025, 1, 20)), (1, 6000))
+        devengo.devengar_mes(datetime.date(2025, 1, 31))
+        devengo.devengar_mes(datetime.date(2025, 1, 31))
+        fila = DevengoInteres.objects.get()
+        self.assertEqual((fila.fecha_corte, fila.monto), (datetime.date(2025, 1, 31), Decimal('170.00')))
+
+    def test_comando_recalcula_meses_anteriores(self):
+        call_command('devengar_intereses', desde=datetime.date(2025, 1, 1), fecha=datetime.date(2025, 3, 10), stdout=io.StringIO())
+        self.assertEqual(
+            list(DevengoInteres.objects.order_by('periodo').values_list('periodo', 'fecha_corte')),
+            [(datetime.date(2025, 1, 1), datetime.date(2025, 1, 31)), (datetime.date(2025, 2, 1), datetime.date(2025, 2, 28)),
+             (datetime.date(2025, 3, 1), datetime.date(2025, 3, 10))],
+        )
+        self.assertEqual(devengo.resumen(datetime.date(2025, 3, 10))['total'], Decimal('550.00'))
+
+
+class CierreMensualTests(TestCase):
+    def setUp(self):
+        tipo = TipoPrestamo.objects.create(
+            nombre='Cierre de Prueba', tasa_interes_predeterminada=Decimal('36.00'), tasa_penalidad_diaria=Decimal('0.001'),
+            dias_gracia=0, ajuste_dia_no_laborable='ninguno', monto_minimo=Decimal('100.00'),
+            monto_maximo=Decimal('100000.00'), plazo_minimo_meses=1, plazo_maximo_meses=60,
+        )
+        cliente = Cliente.objects.create(nombres='Luis', apellidos='Cierre', numero_documento='00400000004')
+        self.prestamo = Prestamo.objects.create(
+            cliente=cliente, tipo_prestamo=tipo, monto=Decimal('10000.00'), tasa_interes=Decimal('36.00'), plazo=2,
+            fecha_desembolso=datetime.date(2025, 1, 15), estado='aprobado',
+        )
+        cuotas = [
+            Cuota.objects.create(
+                prestamo=self.prestamo, numero_cuota=numero, fecha_vencimiento=vencimiento,
+                monto_cuota=Decimal('5000.00') + Decimal(interes), capital=Decimal('5000.00'), interes=Decimal(interes),
+                saldo_pendiente=Decimal(10000 - 5000 * numero),
+            )
+            for numero, vencimiento, interes in ((1, datetime.date(2025, 2, 15), '310.00'), (2, datetime.date(2025, 3, 15), '280.00'))
+        ]
+        pago = Pago.objects.create(cuota=cuotas[0], monto_pagado=Decimal('5310.00'))
+        Pago.objects.filter(pk=pago.pk).update(fecha_pago=timezone.make_aware(datetime.datetime(2025, 2, 5, 10, 0)))
+
+    def test_cierre_de_febrero_y_marzo(self):
+        call_command('cierre_mensual', periodo=datetime.date(2025, 2, 1), stdout=io.StringIO())
+        call_command('cierre_mensual', periodo=datetime.date(2025, 3, 1), stdout=io.StringIO())
+        campos = ('saldo_capital', 'interes_devengado', 'penalidades', 'pagos_recibidos', 'dias_atraso')
+        febrero, marzo = (
+            CierreMensual.objects.filter(prestamo=self.prestamo).order_by('periodo').values_list(*campos)
+        )
+        self.assertEqual(febrero, (Decimal('5000.00'), Decimal('280.00'), Decimal('0.00'), Decimal('5310.00'), 0))
+        self.assertEqual(marzo, (Decimal('5000.00'), Decimal('140.00'), Decimal('89.76'), Decimal('0.00'), 16))
+        self.assertEqual(PeriodoCerrado.objects.get(periodo=datetime.date(2025, 3, 1)).penalidades, Decimal('89.76'))
+
+    def test_reejecutar_un_mes_cerrado_no_hace_nada(self):
+        call_command('cierre_mensual', periodo=datetime.date(2025, 2, 1), stdout=io.StringIO())
+        salida = io.StringIO()
+        call_command('cierre_mensual', periodo=datetime.date(2025, 2, 1), stdout=salida)
+        self.assertIn('ya está cerrado', salida.getvalue())
+        self.assertEqual(CierreMensual.objects.count(), 1)
+        cierre = CierreMensual.objects.get()
+        with self.assertRaises(ValueError):
+            cierre.save()
+
+    def test_mora_mensual_usa_el_cierre_del_mes_cerrado(self):
+        marzo, abril = datetime.date(2025, 3, 1), datetime.date(2025, 4, 1)
+        call_command('cierre_mensual', periodo=marzo, stdout=io.StringIO())
+        # Un pago cargado después del cierre con fecha de marzo no cambia la foto del mes cerrado.
+        pago = Pago.objects.create(cuota=self.prestamo.cuotas.get(numero_cuota=2), monto_pagado=Decimal('5280.00'))
+        Pago.objects.filter(pk=pago.pk).update(fecha_pago=timezone.make_aware(datetime.datetime(2025, 3, 20, 10, 0)))
+        for periodo in (marzo, abril):
+            mora.registrar_mes(periodo)
+        self.assertEqual(
+            list(MoraMensual.objects.filter(prestamo=self.prestamo).order_by('periodo').values_list('tramo', 'dias_atraso', 'saldo_capital', 'cohorte')),
+            [(1, 16, Decimal('5000.00'), datetime.date(2025, 1, 1)), (mora.CANCELADO, 0, Decimal('0.00'), datetime.date(2025, 1, 1))],
+        )
+
+    def test_no_cierra_el_mes_en_curso(self):
+        with self.assertRaises(CommandError):
+            call_command('cierre_mensual', periodo=timezone.localdate().replace(day=1), stdout=io.StringIO())
+
+
+class AntiguedadSaldosTests(TestCase):
+    def setUp(self):
+        cliente = Cliente.objects.create(nombres='Ana', apellidos='Atraso', numero_documento='00400000005')
+        self.prestamo = Prestamo.objects.create(
+            cliente=cliente, monto=Decimal('10000.00'), tasa_interes=Decimal('24.00'), plazo=7,
+            fecha_desembolso=datetime.date(2025, 1, 1), estado='aprobado',
+        )
+        self.hoy = datetime.date(2025, 6, 30)
+        vencimientos = [
+            (datetime.date(2025, 6, 29), 'pendiente'),            # 1 día
+            (datetime.date(2025, 5, 31), 'pendiente'),            # 30 días
+            (datetime.date(2025, 5, 30), 'pendiente'),            # 31 días
+            (datetime.date(2025, 4, 30), 'pagada_parcialmente'),  # 61 días
+            (datetime.date(2025, 3, 31), 'pendiente'),            # 91 días
+            (datetime.date(2025, 3, 1), 'pagada'),
+            (datetime.date(2025, 6, 30), 'pendiente'),            # vence hoy: no está vencida
+        ]
+        for numero, (vencimiento, estado) in enumerate(vencimientos, start=1):
+            cuota = Cuota.objects.create(
+                prestamo=self.prestamo, numero_cuota=numero, fecha_vencimiento=vencimiento, estado=estado,
+                monto_cuota=Decimal('1000.00'), capital=Decimal('900.00'), interes=Decimal('100.00'),
+                saldo_pendiente=Decimal('0.00'),
+                monto_penalidad_acumulada=Decimal('50.00') if estado == 'pagada_parcialmente' else Decimal('0.00'),
+            )
+            if estado == 'pagada_parcialmente':
+                Pago.objects.create(cuota=cuota, monto_pagado=Decimal('100.00'))
+
+    def test_matriz_por_tramo_con_pagos_parciales(self):
+        with self.assertNumQueries(1):
+            matriz = antiguedad.matriz_antiguedad(self.hoy)
+        self.assertEqual(matriz['tramos'], ['1-30', '31-60', '61-90', '90+'])
+        (fila,) = matriz['filas']
+        self.assertEqual(fila['tipo'], antiguedad.SIN_TIPO)
+        self.assertEqual(
+            [(celda['cuotas'], celda['monto']) for celda in fila['celdas']],
+            [(2, Decimal('2000.00')), (1, Decimal('1000.00')), (1, Decimal('950.00')), (1, Decimal('1000.00'))],
+        )
+        self.assertEqual((matriz['totales']['cuotas'], matriz['totales']['monto']), (5, Decimal('4950.00')))
+
+
+class MoraAnaliticaTests(TestCase):
+    def setUp(self):
+        self.al_dia, self.moroso = [
+            Prestamo.objects.create(
+                cliente=Cliente.objects.create(nombres=nombre, apellidos='Cosecha', numero_documento=documento),
+                monto=Decimal('10000.00'), tasa_interes=Decimal('24.00'), plazo=2,
+                fecha_desembolso=datetime.date(2025, 1, 15), estado='aprobado',
+            )
+            for nombre, documento in (('Al', '00400000006'), ('Moroso', '00400000007'))
+        ]
+        for prestamo in (self.al_dia, self.moroso):
+            for numero in (1, 2):
+                cuota = Cuota.objects.create(
+                    prestamo=prestamo, numero_cuota=numero, fecha_vencimiento=datetime.date(2025, 1 + numero, 15),
+                    monto_cuota=Decimal('5100.00'), capital=Decimal('5000.00'), interes=Decimal('100.00'),
+                    saldo_pendiente=Decimal(10000 - 5000 * numero),
+                )
+                if prestamo == self.al_dia:
+                    pago = Pago.objects.create(cuota=cuota, monto_pagado=Decimal('5100.00'))
+                    Pago.objects.filter(pk=pago.pk).update(
+                        fecha_pago=timezone.make_aware(datetime.datetime(2025, 1 + numero, 10, 12, 0))
+                    )
+        for mes in (1, 2, 3, 4):
+            mora.registrar_mes(datetime.date(2025, mes, 1))
+
+    def test_fotos_por_mes_y_cancelados_una_sola_vez(self):
+        self.assertEqual(
+            list(MoraMensual.objects.filter(prestamo=self.moroso).order_by('periodo').values_list('tramo', 'dias_atraso')),
+            [(0, 0), (1, 13), (2, 44), (3, 74)],
+        )
+        self.assertEqual(
+            list(MoraMensual.objects.filter(prestamo=self.al_dia).order_by('periodo').values_list('tramo', flat=True)),
+            [0, 0, mora.CANCELADO],
+        )
+        self.assertEqual(mora.meses_pendientes(datetime.date(2025, 6, 1)), [datetime.date(2025, 5, 1), datetime.date(2025, 6, 1)])
+
+    def test_cancelado_no_reaparece_en_meses_posteriores(self):
+        for mes in (5, 6, 7):
+            mora.registrar_mes(datetime.date(2025, mes, 1))
+        self.assertEqual(
+            list(MoraMensual.objects.filter(prestamo=self.al_dia).order_by('periodo').values_list('tramo', flat=True)),
+            [0, 0, mora.CANCELADO],
+        )
+        self.assertEqual(MoraMensual.objects.filter(prestamo=self.moroso).count(), 7)
+
+    def test_matriz_roll_rate(self):
+        matriz = mora.matriz_roll_rate(datetime.date(2025, 3, 1))
+        self.assertEqual(matriz['conteos'][0].tolist(), [0, 0, 0, 0, 0, 1])
+        self.assertEqual(matriz['conteos'][1].tolist(), [0, 0, 1, 0, 0, 0])
+        self.assertEqual(matriz['tasas'][1][2], 1.0)
+        self.assertTrue(all(valor != valor for valor in matriz['tasas'][3]))  # sin préstamos: NaN
+
+    def test_curva_vintage_de_la_cohorte(self):
+        vintage = mora.curvas_vintage(tramo_minimo=2)
+        self.assertEqual(vintage['cohortes'], [datetime.date(2025, 1, 1)])
+        self.assertEqual(vintage['tasas'][0].tolist(), [0.0, 0.0, 0.5, 0.5])
+
+
+class PronosticoCobrosTests(TestCase):
+    def setUp(self):
+        self.hoy = timezone.localdate()
+        cliente = Cliente.objects.create(nombres='Tesorería', apellidos='Prueba', numero_documento='00400000008')
+        prestamo = Prestamo.objects.create(
+            cliente=cliente, monto=Decimal('3000.00'), tasa_interes=Decimal('24.00'), plazo=3,
+            fecha_desembolso=self.hoy - datetime.timedelta(days=30), estado='aprobado',
+        )
+        for numero, dias, estado in ((1, 0, 'pagada_parcialmente'), (2, 3, 'pendiente'), (3, 3, 'pagada')):
+            cuota = Cuota.objects.create(
+                prestamo=prestamo, numero_cuota=numero, fecha_vencimiento=self.hoy + datetime.timedelta(days=dias),
+                monto_cuota=Decimal('1000.00'), capital=Decimal('950.00'), interes=Decimal('50.00'),
+                saldo_pendiente=Decimal('0.00'), estado=estado,
+            )
+            if estado == 'pagada_parcialmente':
+                Pago.objects.create(cuota=cuota, monto_pagado=Decimal('400.00'))
+
+    def test_cobros_por_dia_netos_de_pagos(self):
+        with self.assertNumQueries(1):
+            calendario = pronostico.cobros_por_dia(7, self.hoy)
+        self.assertEqual(len(calendario['dias']), 7)
+        self.assertEqual(
+            [(dia['cuotas'], dia['monto']) for dia in calendario['dias'][:4]],
+            [(1, Decimal('600.00')), (0, Decimal('0.00')), (0, Decimal('0.00')), (1, Decimal('1000.00'))],
+        )
+        self.assertEqual((calendario['cuotas'], calendario['monto']), (2, Decimal('1600.00')))
+
+    def test_detalle_con_cliente_en_una_consulta(self):
+        with self.assertNumQueries(1):
+            filas = [(c.numero_cuota, c.prestamo.cliente.nombres, c.saldo) for c in pronostico.detalle_cobros(self.hoy, self.hoy + datetime.timedelta(days=7))]
+        self.assertEqual(filas, [(1, 'Tesorería', Decimal('600.00')), (2, 'Tesorería', Decimal('1000.00'))])
+
+
+class ProyeccionCarteraTests(TestCase):
+    def setUp(self):
+        self.hoy = datetime.date(2026, 3, 15)
+        self.tipo_al_dia = TipoPrestamo.objects.create(
+            nombre='Proyección al día', tasa_interes_predeterminada=Decimal('24.00'),
+            monto_maximo=Decimal('100000.00'), plazo_maximo_meses=24,
+        )
+        self.tipo_atrasado = TipoPrestamo.objects.create(
+            nombre='Proyección atrasado', tasa_interes_predeterminada=Decimal('24.00'),
+            monto_maximo=Decimal('100000.00'), plazo_maximo_meses=24,
+        )
+        # Al día: cuotas en marzo, abril y mayo. Atrasado: una cuota con 40 días de atraso y otra en abril.
+        for documento, tipo, vencimientos in (
+            ('00400000009', self.tipo_al_dia, (datetime.date(2026, 3, 20), datetime.date(2026, 4, 20), datetime.date(2026, 5, 20))),
+            ('00400000010', self.tipo_atrasado, (self.hoy - datetime.timedelta(days=40), datetime.date(2026, 4, 5))),
+        ):
+            cliente = Cliente.objects.create(nombres='Proyección', apellidos=documento, numero_documento=documento)
+            prestamo = Prestamo.objects.create(
+                cliente=cliente, tipo_prestamo=tipo, monto=Decimal('3000.00'), tasa_interes=Decimal('24.00'),
+                plazo=len(vencimientos), fecha_desembolso=datetime.date(2025, 12, 1), estado='aprobado',
+            )
+            for numero, fecha in enumerate(vencimientos, start=1):
+                Cuota.objects.create(
+                    prestamo=prestamo, numero_cuota=numero, fecha_vencimiento=fecha, monto_cuota=Decimal('1000.00'),
+                    capital=Decimal('900.00'), interes=Decimal('100.00'), saldo_pendiente=Decimal('0.00'),
+                )
+
+    def _grupo(self, cartera, tipo, tramo):
+        return cartera['tipos'].index(tipo.id) * proyeccion.TRAMOS + tramo
+
+    def test_carga_por_tipo_tramo_y_mes(self):
+        with self.assertNumQueries(1):
+            cartera = proyeccion.cargar_cartera(self.hoy)
+        al_dia = self._grupo(cartera, self.tipo_al_dia, 0)
+        atrasado = self._grupo(cartera, self.tipo_atrasado, 2)
+        self.assertEqual(cartera['flujo'][al_dia].tolist(), [1000.0, 1000.0, 1000.0])
+        # La cuota vencida se espera en el mes actual.
+        self.assertEqual(cartera['flujo'][atrasado].tolist(), [1000.0, 1000.0, 0.0])
+        self.assertEqual(cartera['prestamos'][[al_dia, atrasado]].tolist(), [1, 1])
+        self.assertEqual(cartera['flujo'].sum(), 5000.0)
+
+    def test_sin_incumplimiento_cobra_lo_programado(self):
+        for tramo in range(proyeccion.TRAMOS):
+            SupuestoProyeccion.objects.create(tramo=tramo, tasa_incumplimiento=0, tasa_prepago=0, volatilidad=0)
+        resultado = proyeccion.proyectar(meses=4, escenarios=50, semilla=1, hoy=self.hoy)
+        self.assertEqual(resultado['programado'], [2000.0, 2000.0, 1000.0, 0.0])
+        for percentil in proyeccion.PERCENTILES:
+            self.assertEqual(resultado['cobros'][percentil], resultado['programado'])
+            self.assertEqual(resultado['perdida_total'][percentil], 0.0)
+        self.assertEqual(resultado['meses'][0], datetime.date(2026, 3, 1))
+        self.assertEqual(resultado['meses'][-1], datetime.date(2026, 6, 1))
+
+    def test_supuesto_por_tipo_y_tramo(self):
+        for tramo in range(proyeccion.TRAMOS):
+            SupuestoProyeccion.objects.create(tramo=tramo, tasa_incumplimiento=0, tasa_prepago=0, volatilidad=0)
+        SupuestoProyeccion.objects.create(
+            tipo_prestamo=self.tipo_atrasado, tramo=2, tasa_incumplimiento=1, volatilidad=0, tasa_recuperacion=Decimal('0.25'),
+        )
+        cartera = proyeccion.cargar_cartera(self.hoy)
+        simulacion = proyeccion.simular(cartera, proyeccion.supuestos(cartera['tipos']), meses=3, escenarios=10, semilla=3)
+        # El préstamo atrasado incumple en el primer mes: se pierde el 75% de su capital.
+        self.assertTrue(np.allclose(simulacion['cobros'], [1000.0, 1000.0, 1000.0]))
+        self.assertTrue(np.allclose(simulacion['perdidas'].sum(axis=1), 0.75 * 1800.0))
+
+    def test_escenarios_reproducibles_y_acotados(self):
+        cartera = proyeccion.cargar_cartera(self.hoy)
+        tasas = proyeccion.supuestos(cartera['tipos'])
+        primera = proyeccion.simular(cartera, tasas, meses=6, escenarios=500, semilla=7)
+        segunda = proyeccion.simular(cartera, tasas, meses=6, escenarios=500, semilla=7)
+        self.assertTrue(np.array_equal(primera['cobros'], segunda['cobros']))
+        # Lo cobrado más lo perdido nunca supera lo pendiente de la cartera.
+        self.assertTrue((primera['cobros'].sum(axis=1) + primera['perdidas'].sum(axis=1) <= 5000.0 + 1e-6).all())
+        resumen = proyeccion.bandas(primera)
+        self.assertLessEqual(resumen['acumulado'][5][-1], resumen['acumulado'][95][-1])
+
+    def test_comando_json(self):
+        salida = io.StringIO()
+        call_command('proyectar_cartera', '--meses', '3', '--escenarios', '100', '--semilla', '1', '--json', stdout=salida)
+        resultado = json.loads(salida.getvalue())
+        self.assertEqual(len(resultado['programado']), 3)
+        self.assertEqual(resultado['prestamos'], 2)
+
+
+class TasaAnualEfectivaTests(TestCase):
+    def test_un_solo_pago_al_anio(self):
+        self.assertAlmostEqual(tae.resolver([1000.0], [[1100.0]], [[1.0]])[0], 0.10, places=10)
+
+    def test_cuotas_mensuales_equivalen_a_la_tasa_compuesta(self):
+        # Préstamo francés de 12 cuotas al 2% mensual: TAE = 1.02^12 - 1.
+        cuota = 1000 * 0.02 / (1 - 1.02 ** -12)
+        tasa = tae.resolver([1000.0], [[cuota] * 12], [[k / 12 for k in range(1, 13)]])[0]
+        self.assertAlmostEqual(tasa, 1.02 ** 12 - 1, places=9)
+
+    def test_vectorizado_anula_el_valor_presente_de_cada_prestamo(self):
+        generador = random.Random(48)
+        recibidos, montos, anios = [], [], []
+        for _ in range(300):
+            cuotas = generador.randint(6, 36)
+            recibido = generador.uniform(500, 50000)
+            # Cuotas irregulares que suman entre 0,9 y 1,5 veces lo recibido.
+            pesos = [generador.random() + 0.1 for _ in range(cuotas)]
+            total = recibido * generador.uniform(0.9, 1.5)
+            recibidos.append(recibido)
+            montos.append([total * peso / sum(pesos) for peso in pesos] + [0.0] * (36 - cuotas))
+            dias = generador.choice((7, 15, 30))
+            anios.append([(k + 1) * dias / 365 for k in range(cuotas)] + [0.0] * (36 - cuotas))
+        # Sin desembolso, y una tasa fuera del intervalo de búsqueda: no tienen solución.
+        for recibido, monto in ((0.0, 100.0), (1.0, 1e9)):
+            recibidos.append(recibido)
+            montos.append([monto] * 36)
+            anios.append([1.0] * 36)
+
+        tasas = tae.resolver(recibidos, montos, anios)
+        self.assertTrue(np.isnan(tasas[-2:]).all())
+        self.assertFalse(np.isnan(tasas[:-2]).any())
+        montos, anios, recibidos = np.array(montos[:-2]), np.array(anios[:-2]), np.array(recibidos[:-2])
+        valor = (montos / (1 + tasas[:-2, None]) ** anios).sum(axis=1) - recibidos
+        self.assertTrue((np.abs(valor) < 1e-6 * recibidos).all())
+
+    def test_comision_y_gastos_del_desembolso_suben_la_tae(self):
+        tipo = TipoPrestamo.objects.create(
+            nombre='Prueba TAE', tasa_interes_predeterminada=Decimal('24.00'), monto_maximo=Decimal('100000.00'),
+            plazo_maximo_meses=24, comision_por_desembolso=Decimal('2.00'),
+        )
+        prestamos = []
+        for documento, tipo_prestamo, desembolsado in (('00400000011', None, Decimal('10000.00')), ('00400000012', tipo, Decimal('9500.00'))):
+            cliente = Cliente.objects.create(nombres='TAE', apellidos=documento, numero_documento=documento)
+            prestamo = Prestamo.objects.create(
+                cliente=cliente, tipo_prestamo=tipo_prestamo, monto=Decimal('10000.00'), monto_desembolsado=desembolsado,
+                tasa_interes=Decimal('24.00'), plazo=12, fecha_desembolso=datetime.date(2025, 1, 15), estado='aprobado',
+            )
+            for fila in calcular_tabla_amortizacion(prestamo):
+                Cuota.objects.create(
+                    prestamo=prestamo, numero_cuota=fila['numero_cuota'], fecha_vencimiento=fila['fecha_vencimiento'],
+                    monto_cuota=fila['cuota_fija'], capital=fila['capital'], interes=fila['interes'],
+                    saldo_pendiente=fila['saldo_pendiente'],
+                )
+            prestamos.append(prestamo)
+
+        with self.assertNumQueries(3):
+            tasas = tae.calcular(Prestamo.objects.filter(pk__in=[p.pk for p in prestamos]))
+        sin_costos, con_costos = tasas[prestamos[0].pk], tasas[prestamos[1].pk]
+        self.assertAlmostEqual(float(sin_costos), 26.82, delta=0.3)
+        # Recibe 9.300 (9.500 menos 2% de comisión sobre 10.000) y paga las mismas cuotas.
+        self.assertGreater(con_costos, sin_costos + 10)
+
+        salida = io.StringIO()
+        call_command('calcular_tae', stdout=salida)
+        self.assertIn('2 préstamo(s)', salida.getvalue())
+        self.assertEqual(
+            dict(Prestamo.objects.filter(pk__in=tasas).values_list('pk', 'tae')), tasas
+        )
+        call_command('calcular_tae', stdout=salida)
+        self.assertIn('No hay préstamos sin TAE.', salida.getvalue())
+
+
+class AbonoCapitalTests(TestCase):
+    def setUp(self):
+        self.hoy = datetime.date(2026, 3, 10)
+        self.documentos = iter(f'004000000{n}' for n in range(13, 40))
+
+    def crear_prestamo(self, plazo=12, pagadas=2, tipo_amortizacion='saldo_insoluto', desembolso=datetime.date(2026, 1, 1)):
+        documento = next(self.documentos)
+        cliente = Cliente.objects.create(nombres='Abono', apellidos=documento, numero_documento=documento)
+        prestamo = Prestamo.objects.create(
+            cliente=cliente, monto=Decimal('12000.00'), tasa_interes=Decimal('24.00'), plazo=plazo,
+            tipo_amortizacion=tipo_amortizacion, fecha_desembolso=desembolso, estado='aprobado',
+        )
+        for fila in calcular_tabla_amortizacion(prestamo):
+            Cuota.objects.create(
+                prestamo=prestamo, numero_cuota=fila['numero_cuota'], fecha_vencimiento=fila['fecha_vencimiento'],
+                monto_cuota=fila['cuota_fija'], capital=fila['capital'], interes=fila['interes'],
+                saldo_pendiente=fila['saldo_pendiente'], estado='pagada' if fila['numero_cuota'] <= pagadas else 'pendiente',
+            )
+        return prestamo
+
+    def filas(self, prestamo):
+        return list(prestamo.cuotas.order_by('numero_cuota').values_list(
+            'numero_cuota', 'fecha_vencimiento', 'monto_cuota', 'interes', 'capital', 'saldo_pendiente', 'estado'
+        ))
+
+    def test_reducir_plazo_mantiene_la_cuota(self):
+        prestamo = self.crear_prestamo()
+        antes = self.filas(prestamo)
+        capital_futuro = sum(fila[4] for fila in antes[2:])
+        abono = abonos.abonar_capital(prestamo, Decimal('3000.00'), abonos.REDUCIR_PLAZO, hoy=self.hoy)
+        despues = self.filas(prestamo)
+
+        # Las cuotas pagadas quedan como estaban.
+        self.assertEqual(despues[:2], antes[:2])
+        nuevas = despues[2:]
+        self.assertLess(len(nuevas), 10)
+        self.assertEqual((abono.cuotas_anteriores, abono.cuotas_nuevas), (10, len(nuevas)))
+        self.assertEqual([fila[0] for fila in nuevas], list(range(3, 3 + len(nuevas))))
+        self.assertEqual([fila[1] for fila in nuevas], [fila[1] for fila in antes[2:2 + len(nuevas)]])
+        self.assertTrue(all(fila[2] == antes[2][2] for fila in nuevas[:-1]))
+        self.assertLessEqual(nuevas[-1][2], antes[2][2])
+        # Como en la tabla original, cada capital se redondea por separado: la suma puede diferir en centavos.
+        self.assertAlmostEqual(sum(fila[4] for fila in nuevas), capital_futuro - Decimal('3000.00'), delta=Decimal('0.05'))
+        self.assertEqual(nuevas[-1][5], Decimal('0.00'))
+        self.assertEqual((abono.saldo_anterior, abono.saldo_nuevo), (capital_futuro, capital_futuro - Decimal('3000.00')))
+
+    def test_reducir_cuota_mantiene_las_fechas(self):
+        # 12.000 en 12 cuotas de capital fijo (1.000) al 2% mensual; quedan 10.000 y se abonan 2.000.
+        for tipo_amortizacion in ('capital_fijo', 'interes_simple'):
+            with self.subTest(tipo_amortizacion=tipo_amortizacion):
+                prestamo = self.crear_prestamo(tipo_amortizacion=tipo_amortizacion)
+                antes = self.filas(prestamo)
+                abonos.abonar_capital(prestamo, Decimal('2000.00'), abonos.REDUCIR_CUOTA, hoy=self.hoy)
+                despues = self.filas(prestamo)
+
+                self.assertEqual(despues[:2], antes[:2])
+                self.assertEqual([fila[:2] for fila in despues], [fila[:2] for fila in antes])
+                nuevas = despues[2:]
+                self.assertTrue(all(nueva[2] < vieja[2] for nueva, vieja in zip(nuevas, antes[2:])))
+                self.assertEqual({fila[4] for fila in nuevas}, {Decimal('800.00')})
+                self.assertEqual(nuevas[-1][5], Decimal('0.00'))
+                intereses = [fila[3] for fila in nuevas]
+                if tipo_amortizacion == 'capital_fijo':
+                    # Interés sobre el saldo: baja 16 por cuota (2% de 800).
+                    self.assertEqual(intereses, [Decimal('160.00') - 16 * i for i in range(10)])
+                else:
+                    # Interés simple: fijo, sobre el capital que queda después del abono.
+                    self.assertEqual(set(intereses), {Decimal('160.00')})
+
+    def test_reducir_plazo_con_capital_fijo(self):
+        for tipo_amortizacion in ('capital_fijo', 'interes_simple'):
+            with self.subTest(tipo_amortizacion=tipo_amortizacion):
+                prestamo = self.crear_prestamo(tipo_amortizacion=tipo_amortizacion)
+                antes = self.filas(prestamo)
+                abonos.abonar_capital(prestamo, Decimal('2000.00'), abonos.REDUCIR_PLAZO, hoy=self.hoy)
+                nuevas = self.filas(prestamo)[2:]
+
+                # Se conserva el capital de cada cuota y el préstamo termina dos cuotas antes.
+                self.assertEqual([fila[:2] for fila in nuevas], [fila[:2] for fila in antes[2:10]])
+                self.assertEqual({fila[4] for fila in nuevas}, {Decimal('1000.00')})
+                self.assertEqual(nuevas[-1][5], Decimal('0.00'))
+                intereses = [fila[3] for fila in nuevas]
+                if tipo_amortizacion == 'capital_fijo':
+                    self.assertEqual(intereses, [Decimal('160.00') - 20 * i for i in range(8)])
+                else:
+                    # Interés simple: el mismo de la tabla original, por menos cuotas.
+                    self.assertEqual(set(intereses), {antes[2][3]})
+
+    def test_consultas_constantes_sin_importar_el_plazo(self):
+        corto, largo = self.crear_prestamo(plazo=12), self.crear_prestamo(plazo=36)
+        with self.assertNumQueries(19):
+            abonos.abonar_capital(corto, Decimal('1000.00'), abonos.REDUCIR_CUOTA, hoy=self.hoy)
+        with self.assertNumQueries(19):
+            abonos.abonar_capital(largo, Decimal('1000.00'), abonos.REDUCIR_CUOTA, hoy=self.hoy)
+
+    def test_recalcula_la_tae(self):
+        # El abono queda con la fecha real: el préstamo se arma alrededor de hoy.
+        hoy = timezone.localdate()
+        prestamo = self.crear_prestamo(desembolso=hoy - datetime.timedelta(days=70))
+        tae.actualizar(Prestamo.objects.filter(pk=prestamo.pk))
+        prestamo.refresh_from_db()
+        antes = prestamo.tae
+        abonos.abonar_capital(prestamo, Decimal('4000.00'), abonos.REDUCIR_CUOTA, hoy=hoy)
+        prestamo.refresh_from_db()
+        # Con el abono como pago el costo es casi el mismo: solo baja por el interés
+        # que el capital abonado ya no genera en lo que queda del período.
+        self.assertLess(prestamo.tae, antes)
+        self.assertAlmostEqual(prestamo.tae, antes, delta=Decimal('1.00'))
+        self.assertEqual(prestamo.tae, tae.calcular(Prestamo.objects.filter(pk=prestamo.pk))[prestamo.pk])
+
+    def test_registra_caja_y_contabilidad(self):
+        prestamo = self.crear_prestamo()
+        abono = abonos.abonar_capital(prestamo, Decimal('1500.00'), abonos.REDUCIR_PLAZO, hoy=self.hoy)
+        movimiento = MovimientoCaja.objects.get(tipo='abono')
+        self.assertEqual((movimiento.monto, movimiento.prestamo_id), (Decimal('1500.00'), prestamo.pk))
+        # La reconstrucción del libro de caja reproduce el desembolso y el abono.
+        self.assertEqual(caja.reconstruir(), 2)
+        self.assertEqual(MovimientoCaja.objects.get(tipo='abono').monto, Decimal('1500.00'))
+
+        contabilidad.contabilizar_dia(timezone.localdate(abono.fecha))
+        asiento = Asiento.objects.get(regla='abono_capital')
+        self.assertEqual((asiento.monto, asiento.cuenta_debe.codigo, asiento.cuenta_haber.codigo),
+                         (Decimal('1500.00'), contabilidad.CAJA, contabilidad.CARTERA))
+
+    def test_abono_total_salda_el_prestamo(self):
+        prestamo = self.crear_prestamo()
+        capital_futuro = sum(fila[4] for fila in self.filas(prestamo)[2:])
+        abonos.abonar_capital(prestamo, capital_futuro, abonos.REDUCIR_PLAZO, hoy=self.hoy)
+        prestamo.refresh_from_db()
+        self.assertEqual(prestamo.estado, 'pagado')
+        self.assertEqual(prestamo.cuotas.count(), 2)
+
+    def test_liquidacion_descuenta_el_abono(self):
+        prestamo = self.crear_prestamo()
+        antes = calcular_liquidacion(prestamo, self.hoy)
+        abonos.abonar_capital(prestamo, Decimal('5000.00'), abonos.REDUCIR_CUOTA, hoy=self.hoy)
+        with self.assertNumQueries(3):
+            despues = calcular_liquidacion(prestamo, self.hoy)
+        self.assertAlmostEqual(despues['saldo_capital'], antes['saldo_capital'] - Decimal('5000.00'), delta=Decimal('0.05'))
+        # El interés del período también corre sobre el capital menor.
+        self.assertLess(despues['interes_devengado'], antes['interes_devengado'])
+        self.assertLessEqual(despues['total_liquidacion'], antes['total_liquidacion'] - Decimal('5000.00') + Decimal('0.05'))
+
+    def test_montos_invalidos(self):
+        prestamo = self.crear_prestamo()
+        for monto in (Decimal('0.00'), Decimal('20000.00')):
+            with self.assertRaises(ValueError):
+                abonos.abonar_capital(prestamo, monto, abonos.REDUCIR_PLAZO, hoy=self.hoy)
+        with self.assertRaises(ValueError):
+            abonos.abonar_capital(prestamo, Decimal('100.00'), 'otro', hoy=self.hoy)
+        self.assertFalse(AbonoCapital.objects.exists())
 
-# Create your tests here.
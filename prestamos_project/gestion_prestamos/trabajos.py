@@ -0,0 +1,169 @@
+"""
+Cola de trabajos en segundo plano respaldada por la base de datos.
+
+Las tareas se registran con `@tarea('nombre')` y se encolan con
+`enqueue('nombre', **argumentos)` (o `enqueue_unico`, que no duplica un
+trabajo pendiente con los mismos argumentos); el comando `run_worker` las reclama y
+ejecuta. Cada tarea recibe el `Job` como primer argumento para reportar su
+avance con `job.reportar_progreso(porcentaje, mensaje)`.
+
+Reclamo de trabajos: en PostgreSQL se usa `SELECT ... FOR UPDATE SKIP LOCKED`,
+así varios workers toman trabajos distintos sin esperarse. En SQLite (sin
+bloqueo por fila) se usa una actualización condicional: solo uno de los
+workers logra pasar el trabajo de 'pendiente' a 'en_proceso'.
+"""
+import datetime
+import logging
+import traceback
+
+from django.db import connection, transaction
+from django.db.models import Count, F
+from django.utils import timezone
+
+from . import metricas
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+TAREAS = {}
+
+# Espera antes de reintentar: RETRASO_REINTENTO * 2**(intentos - 1).
+RETRASO_REINTENTO = datetime.timedelta(seconds=30)
+
+
+def tarea(nombre, max_concurrencia=None, max_intentos=3):
+    """
+    Registra una función como tarea ejecutable por `run_worker`.
+
+    Args:
+        nombre (str): Nombre con el que se encola.
+        max_concurrencia (int): Máximo de trabajos de esta tarea en ejecución a la vez.
+        max_intentos (int): Intentos antes de marcar el trabajo como fallido.
+    """
+    def decorador(funcion):
+        funcion.max_concurrencia = max_concurrencia
+        funcion.max_intentos = max_intentos
+        TAREAS[nombre] = funcion
+        return funcion
+    return decorador
+
+
+def enqueue(nombre, cola='default', prioridad=0, ejecutar_despues=None, **argumentos):
+    """Encola una tarea registrada y devuelve el `Job` creado."""
+    if nombre not in TAREAS:
+        raise ValueError(f"La tarea '{nombre}' no está registrada.")
+    return Job.objects.create(
+        nombre=nombre,
+        argumentos=argumentos,
+        cola=cola,
+        prioridad=prioridad,
+        max_intentos=TAREAS[nombre].max_intentos,
+        ejecutar_despues=ejecutar_despues or timezone.now(),
+    )
+
+
+def enqueue_unico(nombre, cola='default', prioridad=0, **argumentos):
+    """Como `enqueue`, pero si ya hay un trabajo igual pendiente devuelve ese en lugar de crear otro."""
+    pendiente = Job.objects.filter(nombre=nombre, estado='pendiente', argumentos=argumentos).first()
+    return pendiente or enqueue(nombre, cola=cola, prioridad=prioridad, **argumentos)
+
+
+def _tareas_al_limite():
+    """Nombres de las tareas que ya alcanzaron su máximo de ejecuciones simultáneas."""
+    limitadas = {nombre: f.max_concurrencia for nombre, f in TAREAS.items() if f.max_concurrencia}
+    if not limitadas:
+        return []
+    en_proceso = Job.objects.filter(estado='en_proceso', nombre__in=limitadas).values('nombre').annotate(n=Count('id'))
+    return [fila['nombre'] for fila in en_proceso if fila['n'] >= limitadas[fila['nombre']]]
+
+
+def _candidatos(colas):
+    return Job.objects.filter(
+        estado='pendiente', cola__in=colas, ejecutar_despues__lte=timezone.now()
+    ).exclude(nombre__in=_tareas_al_limite()).order_by('-prioridad', 'id')
+
+
+def reclamar(worker, colas=('default',)):
+    """Toma el siguiente trabajo disponible para `worker`, o devuelve None."""
+    marcar = {'estado': 'en_proceso', 'worker': worker, 'fecha_inicio': timezone.now()}
+    if connection.features.has_select_for_update_skip_locked:
+        with transaction.atomic():
+            job = _candidatos(colas).select_for_update(skip_locked=True).first()
+            if job is None:
+                return None
+            Job.objects.filter(pk=job.pk).update(**marcar)
+    else:
+        for job in _candidatos(colas)[:10]:
+            if Job.objects.filter(pk=job.pk, estado='pendiente').update(**marcar):
+                break
+        else:
+            return None
+    job.refresh_from_db()
+
+    # Dos workers pueden pasar el filtro de concurrencia a la vez: si este
+    # trabajo excede el límite, se devuelve a la cola.
+    if excede_concurrencia(job):
+        Job.objects.filter(pk=job.pk).update(estado='pendiente', worker='', fecha_inicio=None)
+        return None
+    return job
+
+
+def excede_concurrencia(job):
+    """
+    True si `job` (ya 'en_proceso') supera el `max_concurrencia` de su tarea.
+    Entre trabajos marcados a la vez, gana el de menor id.
+    """
+    limite = TAREAS[job.nombre].max_concurrencia if job.nombre in TAREAS else None
+    return bool(limite) and Job.objects.filter(estado='en_proceso', nombre=job.nombre, pk__lt=job.pk).count() >= limite
+
+
+def ejecutar(job):
+    """Ejecuta un trabajo reclamado y guarda su resultado, o programa el reintento."""
+    job.intentos += 1
+    funcion = TAREAS.get(job.nombre)
+    try:
+        if funcion is None:
+            raise LookupError(f"La tarea '{job.nombre}' no está registrada en este worker.")
+        with metricas.medir_trabajo(job.nombre):
+            resultado = funcion(job, **job.argumentos)
+    except Exception:
+        job.error = traceback.format_exc()
+        if job.intentos < job.max_intentos:
+            job.estado = 'pendiente'
+            job.ejecutar_despues = timezone.now() + RETRASO_REINTENTO * 2 ** (job.intentos - 1)
+        else:
+            job.estado = 'fallido'
+            job.fecha_fin = timezone.now()
+        logger.exception('Error en el trabajo', extra={'job_id': job.pk, 'tarea': job.nombre, 'intento': job.intentos})
+    else:
+        job.estado = 'completado'
+        job.resultado = resultado
+        job.progreso = 100
+        job.fecha_fin = timezone.now()
+        logger.info('Trabajo completado', extra={'job_id': job.pk, 'tarea': job.nombre})
+    job.save(update_fields=[
+        'estado', 'intentos', 'resultado', 'error', 'progreso', 'ejecutar_despues', 'fecha_fin',
+    ])
+    return job
+
+
+def rescatar_trabajos_colgados(tiempo_maximo):
+    """
+    Devuelve a la cola los trabajos 'en_proceso' más antiguos que `tiempo_maximo`
+    (worker caído). El rescate cuenta como un intento: si con él se alcanza
+    `max_intentos`, el trabajo se marca 'fallido' en lugar de reencolarse, así
+    una tarea que tumba al worker no se repite para siempre.
+    """
+    ahora = timezone.now()
+    colgados = Job.objects.filter(estado='en_proceso', fecha_inicio__lt=ahora - tiempo_maximo)
+    error = 'El worker dejó de responder durante la ejecución.'
+    with transaction.atomic():
+        fallidos = colgados.filter(intentos__gte=F('max_intentos') - 1).update(
+            estado='fallido', intentos=F('intentos') + 1, worker='', fecha_fin=ahora, error=error,
+        )
+        reencolados = colgados.update(
+            estado='pendiente', intentos=F('intentos') + 1, worker='', fecha_inicio=None, error=error,
+        )
+    if fallidos:
+        logger.warning('Trabajos colgados marcados como fallidos', extra={'trabajos': fallidos})
+    return reencolados
@@ -1,11 +1,63 @@
+from django.db import transaction
 from django.utils import timezone
-import datetime
+from django.db.models import Count, Max, Min, Q, Sum
+import decimal
+import math
 from decimal import Decimal
+from .calendario import ajuste_de, fecha_inicio_penalidad, fechas_vencimiento
+from .dinero import (
+    a_centavos, a_decimal, a_fraccion, a_punto_fijo, de_punto_fijo, dividir, reducir,
+)
+from .models import AbonoCapital, Cuota, Pago
+from .penalidades import pagos_por_dia, penalidad_en_intervalo
+
+# ==================================================
+# === REGISTRO DE MÉTODOS DE AMORTIZACIÓN ===
+# ==================================================
+# Cada método es un generador que produce las filas de la tabla una a una,
+# con montos en centavos enteros (ver `dinero.py`).
+# Así una vista previa puede tomar solo la primera página (con `itertools.islice`)
+# sin calcular el resto, y los procesos por lotes consumen las filas directamente.
+METODOS_AMORTIZACION = {}
+
+# `Prestamo.tipo_amortizacion` tiene prioridad sobre `TipoPrestamo.metodo_calculo`;
+# 'saldo_insoluto' conserva el método configurado en el tipo de préstamo.
+METODO_POR_TIPO_AMORTIZACION = {
+    'capital_fijo': 'aleman',
+    'interes_simple': 'simple',
+}
+
+def registrar_metodo(nombre):
+    """Decorador que registra un generador de tabla bajo `nombre`."""
+    def decorador(generador):
+        METODOS_AMORTIZACION[nombre] = generador
+        return generador
+    return decorador
+
+def metodo_de_calculo(prestamo):
+    """Devuelve la clave del método de amortización que corresponde al préstamo."""
+    metodo = METODO_POR_TIPO_AMORTIZACION.get(prestamo.tipo_amortizacion)
+    if metodo is None:
+        metodo = prestamo.tipo_prestamo.metodo_calculo if prestamo.tipo_prestamo else 'frances'
+    # Por defecto, o si el método no es reconocido, usamos el francés.
+    return metodo if metodo in METODOS_AMORTIZACION else 'frances'
+
+def generar_tabla_amortizacion(prestamo):
+    """
+    Devuelve un generador con las filas de la tabla de amortización del préstamo.
+
+    Args:
+        prestamo (Prestamo): El objeto Prestamo para el cual calcular la tabla.
+
+    Returns:
+        generator: Produce un diccionario por cuota, en orden.
+    """
+    return (_fila(*fila) for fila in generar_tabla_centavos(prestamo))
 
 def calcular_tabla_amortizacion(prestamo):
     """
     Calcula la tabla de amortización para un préstamo dado, 
-    delegando en el método de cálculo especificado por el tipo de préstamo.
+    delegando en el método de cálculo especificado por el préstamo o su tipo.
 
     Args:
         prestamo (Prestamo): El objeto Prestamo para el cual calcular la tabla.
@@ -13,26 +65,20 @@ def calcular_tabla_amortizacion(prestamo):
     Returns:
         list: Una lista de diccionarios, donde cada diccionario representa una cuota.
     """
-    metodo_calculo = prestamo.tipo_prestamo.metodo_calculo if prestamo.tipo_prestamo else 'frances'
-
-    if metodo_calculo == 'frances':
-        return _calcular_metodo_frances(prestamo)
-    # elif metodo_calculo == 'aleman':
-    #     return _calcular_metodo_aleman(prestamo)
-    else:
-        # Por defecto, o si el método no es reconocido, usamos el francés.
-        return _calcular_metodo_frances(prestamo)
+    return list(generar_tabla_amortizacion(prestamo))
 
-def _calcular_metodo_frances(prestamo):
+def _parametros_periodo(prestamo):
     """
-    Calcula la tabla de amortización usando el método francés (cuotas fijas).
+    Convierte la tasa y el plazo del préstamo a la tasa por período de pago
+    y al número total de pagos según la frecuencia.
+
+    Returns:
+        tuple: (tasa_interes_periodo, numero_pagos)
     """
-    monto_pendiente = prestamo.monto
     tasa_interes = prestamo.tasa_interes / Decimal(100)
     periodo_tasa = prestamo.periodo_tasa
     frecuencia = prestamo.frecuencia_pago
     plazo_meses = prestamo.plazo
-    fecha_inicio = prestamo.fecha_desembolso
 
     # --- Lógica de Tasa de Interés Corregida ---
     
@@ -58,54 +104,419 @@ def _calcular_metodo_frances(prestamo):
         tasa_interes_periodo = tasa_mensual
         numero_pagos = plazo_meses
 
-    tabla_amortizacion = []
+    return tasa_interes_periodo, numero_pagos
 
+def _cuota_fija_frances(monto, tasa_interes_periodo, numero_pagos):
+    """Cuota constante del método francés (fórmula de anualidad)."""
     if tasa_interes_periodo > 0:
-        cuota_fija = (monto_pendiente * tasa_interes_periodo) / (1 - (1 + tasa_interes_periodo)**(-numero_pagos))
+        return (monto * tasa_interes_periodo) / (1 - (1 + tasa_interes_periodo)**(-numero_pagos))
+    return monto / numero_pagos
+
+def _fechas_de(prestamo, numero_pagos):
+    """Secuencia de vencimientos (cacheada) del préstamo, ajustada a días hábiles si aplica."""
+    return fechas_vencimiento(
+        prestamo.fecha_desembolso, prestamo.frecuencia_pago, numero_pagos, ajuste_de(prestamo.tipo_prestamo)
+    )
+
+def _tasa_periodo_fraccion(prestamo):
+    """
+    Igual que `_parametros_periodo`, pero devuelve la tasa por período como una
+    fracción exacta de enteros para el núcleo de centavos.
+
+    Returns:
+        tuple: (numerador, denominador, numero_pagos)
+    """
+    numerador, denominador = a_fraccion(prestamo.tasa_interes)
+    denominador *= 100
+    if prestamo.periodo_tasa != 'mensual':
+        denominador *= 12
+
+    frecuencia = prestamo.frecuencia_pago
+    if frecuencia == 'quincenal':
+        return (*reducir(numerador, denominador * 2), prestamo.plazo * 2)
+    if frecuencia == 'semanal':
+        return (*reducir(numerador, denominador * 4), prestamo.plazo * 4) # Aproximación
+    return (*reducir(numerador, denominador), prestamo.plazo)
+
+def _fila(i, fecha_vencimiento, monto_cuota, interes, capital, saldo):
+    """Arma una fila de la tabla a partir de montos en centavos (borde con los modelos)."""
+    return {
+        'numero_cuota': i,
+        'fecha_vencimiento': fecha_vencimiento,
+        'cuota_fija': a_decimal(monto_cuota),
+        'interes': a_decimal(interes),
+        'capital': a_decimal(capital),
+        'saldo_pendiente': a_decimal(saldo),
+    }
+
+def generar_tabla_centavos(prestamo):
+    """
+    Como `generar_tabla_amortizacion`, pero produce tuplas en centavos enteros
+    `(numero_cuota, fecha_vencimiento, monto_cuota, interes, capital, saldo)`
+    para los procesos por lotes que no necesitan `Decimal`.
+    """
+    return METODOS_AMORTIZACION[metodo_de_calculo(prestamo)](prestamo)
+
+# Los generadores registrados trabajan en punto fijo y redondean a centavos con
+# `de_punto_fijo` (ROUND_HALF_EVEN).
+
+@registrar_metodo('frances')
+def _generar_metodo_frances(prestamo):
+    """
+    Genera la tabla de amortización usando el método francés (cuotas fijas).
+    """
+    tasa_num, tasa_den, numero_pagos = _tasa_periodo_fraccion(prestamo)
+    fechas = _fechas_de(prestamo, numero_pagos)
+
+    monto_pendiente = a_punto_fijo(a_centavos(prestamo.monto))
+
+    # Cuota fija exacta: P·i / (1 - (1 + i)^-n), con i = tasa_num / tasa_den.
+    if tasa_num > 0:
+        factor = (tasa_den + tasa_num) ** numero_pagos
+        cuota_fija = dividir(
+            monto_pendiente * tasa_num * factor,
+            tasa_den * (factor - tasa_den ** numero_pagos)
+        )
     else:
-        cuota_fija = monto_pendiente / numero_pagos
+        cuota_fija = dividir(monto_pendiente, numero_pagos)
+    cuota_fija_centavos = de_punto_fijo(cuota_fija)
 
     for i in range(1, numero_pagos + 1):
-        interes_periodo = monto_pendiente * tasa_interes_periodo
+        interes_periodo = dividir(monto_pendiente * tasa_num, tasa_den)
         capital_periodo = cuota_fija - interes_periodo
         monto_pendiente -= capital_periodo
 
-        # --- Lógica de Fecha de Vencimiento ---
-        if frecuencia == 'mensual':
-            año_futuro = fecha_inicio.year + (fecha_inicio.month + i - 1) // 12
-            mes_futuro = (fecha_inicio.month + i - 1) % 12 + 1
-            import calendar
-            ultimo_dia_del_mes = calendar.monthrange(año_futuro, mes_futuro)[1]
-            dia_vencimiento = min(fecha_inicio.day, ultimo_dia_del_mes)
-            fecha_vencimiento = datetime.date(año_futuro, mes_futuro, dia_vencimiento)
-        elif frecuencia == 'quincenal':
-            fecha_vencimiento = fecha_inicio + datetime.timedelta(days=15 * i)
-        elif frecuencia == 'semanal':
-            fecha_vencimiento = fecha_inicio + datetime.timedelta(weeks=i)
-        else: # Default to monthly
-            año_futuro = fecha_inicio.year + (fecha_inicio.month + i - 1) // 12
-            mes_futuro = (fecha_inicio.month + i - 1) % 12 + 1
-            import calendar
-            ultimo_dia_del_mes = calendar.monthrange(año_futuro, mes_futuro)[1]
-            dia_vencimiento = min(fecha_inicio.day, ultimo_dia_del_mes)
-            fecha_vencimiento = datetime.date(año_futuro, mes_futuro, dia_vencimiento)
+        # Ajuste final para la última cuota para que el saldo sea exactamente cero.
+        if i == numero_pagos:
+            capital_periodo += monto_pendiente
+            monto_pendiente = 0
 
+        yield (i, fechas[i - 1], cuota_fija_centavos,
+               de_punto_fijo(interes_periodo), de_punto_fijo(capital_periodo),
+               de_punto_fijo(monto_pendiente))
+
+def _calcular_metodo_frances(prestamo):
+    """
+    Calcula la tabla de amortización usando el método francés (cuotas fijas).
+    """
+    return [_fila(*fila) for fila in _generar_metodo_frances(prestamo)]
+
+@registrar_metodo('aleman')
+def _generar_metodo_aleman(prestamo):
+    """
+    Genera la tabla usando el método alemán (capital fijo): cada cuota amortiza
+    la misma porción de capital y el interés se calcula sobre el saldo insoluto,
+    por lo que las cuotas son decrecientes.
+    """
+    tasa_num, tasa_den, numero_pagos = _tasa_periodo_fraccion(prestamo)
+    fechas = _fechas_de(prestamo, numero_pagos)
+
+    monto = a_punto_fijo(a_centavos(prestamo.monto))
+    monto_pendiente = monto
+    capital_fijo = dividir(monto, numero_pagos)
+
+    for i in range(1, numero_pagos + 1):
+        interes_periodo = dividir(monto_pendiente * tasa_num, tasa_den)
+        capital_periodo = capital_fijo
+        monto_pendiente = dividir(monto * (numero_pagos - i), numero_pagos)
 
-        # Ajuste final para la última cuota para que el saldo sea exactamente cero.
         if i == numero_pagos:
             capital_periodo += monto_pendiente
-            monto_pendiente = Decimal(0)
-
-        tabla_amortizacion.append({
-            'numero_cuota': i,
-            'fecha_vencimiento': fecha_vencimiento,
-            'cuota_fija': cuota_fija.quantize(Decimal('0.01')),
-            'interes': interes_periodo.quantize(Decimal('0.01')),
-            'capital': capital_periodo.quantize(Decimal('0.01')),
-            'saldo_pendiente': monto_pendiente.quantize(Decimal('0.01')),
-        })
-    
-    return tabla_amortizacion
+            monto_pendiente = 0
+
+        yield (i, fechas[i - 1],
+               de_punto_fijo(capital_periodo + interes_periodo), de_punto_fijo(interes_periodo),
+               de_punto_fijo(capital_periodo), de_punto_fijo(monto_pendiente))
+
+@registrar_metodo('simple')
+def _generar_metodo_simple(prestamo):
+    """
+    Genera la tabla usando interés simple (flat): el interés total se calcula
+    sobre el monto original y se reparte en partes iguales junto con el capital.
+    """
+    tasa_num, tasa_den, numero_pagos = _tasa_periodo_fraccion(prestamo)
+    fechas = _fechas_de(prestamo, numero_pagos)
+
+    monto = a_punto_fijo(a_centavos(prestamo.monto))
+    interes_periodo = dividir(monto * tasa_num, tasa_den)
+    capital_fijo = dividir(monto, numero_pagos)
+    interes_centavos = de_punto_fijo(interes_periodo)
+
+    for i in range(1, numero_pagos + 1):
+        capital_periodo = capital_fijo
+        monto_pendiente = dividir(monto * (numero_pagos - i), numero_pagos)
+
+        if i == numero_pagos:
+            capital_periodo += monto_pendiente
+            monto_pendiente = 0
+
+        yield (i, fechas[i - 1],
+               de_punto_fijo(capital_periodo + interes_periodo), interes_centavos,
+               de_punto_fijo(capital_periodo), de_punto_fijo(monto_pendiente))
+
+# --- Reamortización tras un abono a capital ---
+
+REDUCIR_PLAZO = 'reducir_plazo'
+REDUCIR_CUOTA = 'reducir_cuota'
+
+def generar_reamortizacion(prestamo, saldo, fechas, modo, referencia):
+    """
+    Genera las cuotas que reemplazan a las futuras después de un abono a capital.
+
+    Args:
+        prestamo (Prestamo): Define el método y la tasa por período.
+        saldo (int): Capital a reamortizar, en centavos.
+        fechas (list): Vencimientos de las cuotas que se reemplazan, en orden.
+        modo (str): `REDUCIR_CUOTA` conserva la cantidad de cuotas y baja su monto;
+            `REDUCIR_PLAZO` conserva la cuota (el capital por cuota en los métodos
+            de capital fijo) y termina antes.
+        referencia (tuple): (monto_cuota, interes, capital) en centavos de la
+            primera cuota reemplazada; la usa `REDUCIR_PLAZO`.
+
+    Yields:
+        tuple: Como `generar_tabla_centavos`, numeradas desde 1 y usando las
+        primeras fechas de `fechas`.
+    """
+    tasa_num, tasa_den, _ = _tasa_periodo_fraccion(prestamo)
+    metodo = metodo_de_calculo(prestamo)
+    pendiente = a_punto_fijo(saldo)
+    n = len(fechas)
+    if pendiente <= 0 or n == 0:
+        return
+
+    if metodo == 'frances':
+        if modo == REDUCIR_CUOTA and tasa_num > 0:
+            factor = (tasa_den + tasa_num) ** n
+            cuota = dividir(pendiente * tasa_num * factor, tasa_den * (factor - tasa_den ** n))
+        elif modo == REDUCIR_CUOTA:
+            cuota = dividir(pendiente, n)
+        else:
+            cuota = a_punto_fijo(referencia[0])
+        for i, fecha in enumerate(fechas, start=1):
+            interes = dividir(pendiente * tasa_num, tasa_den)
+            capital = cuota - interes
+            ultima = i == n or capital >= pendiente
+            monto_cuota = cuota
+            if ultima:
+                capital = pendiente
+                if modo == REDUCIR_PLAZO:
+                    monto_cuota = capital + interes
+            pendiente -= capital
+            yield (i, fecha, de_punto_fijo(monto_cuota), de_punto_fijo(interes),
+                   de_punto_fijo(capital), de_punto_fijo(pendiente))
+            if ultima:
+                return
+
+    # Alemán e interés simple amortizan el mismo capital en cada cuota.
+    capital_fijo = dividir(pendiente, n) if modo == REDUCIR_CUOTA else a_punto_fijo(referencia[2])
+    interes_simple = dividir(pendiente * tasa_num, tasa_den) if modo == REDUCIR_CUOTA else a_punto_fijo(referencia[1])
+    for i, fecha in enumerate(fechas, start=1):
+        interes = dividir(pendiente * tasa_num, tasa_den) if metodo == 'aleman' else interes_simple
+        capital = min(capital_fijo, pendiente)
+        if i == n:
+            capital = pendiente
+        pendiente -= capital
+        yield (i, fecha, de_punto_fijo(capital + interes), de_punto_fijo(interes),
+               de_punto_fijo(capital), de_punto_fijo(pendiente))
+        if pendiente == 0:
+            return
+
+# --- Consultas de acceso directo (forma cerrada) al método francés ---
+# Las funciones siguientes usan las fórmulas de anualidad para obtener el saldo,
+# el interés o el capital de cualquier período sin recorrer la tabla completa.
+# Coinciden al centavo con `_calcular_metodo_frances`.
+
+def _saldo_frances_exacto(monto, tasa_interes_periodo, cuota_fija, k):
+    """Saldo (sin redondear) después de pagar `k` cuotas."""
+    if tasa_interes_periodo > 0:
+        # La resta de dos términos del orden de (1 + i)^k pierde dígitos; se amplía
+        # la precisión en proporción al tamaño de ese factor.
+        with decimal.localcontext() as ctx:
+            ctx.prec += int(k * math.log10(1 + float(tasa_interes_periodo))) + 1
+            factor = (1 + tasa_interes_periodo) ** k
+            saldo = monto * factor - cuota_fija * (factor - 1) / tasa_interes_periodo
+        return +saldo
+    return monto - cuota_fija * k
+
+def saldo_frances(prestamo, k):
+    """
+    Devuelve el saldo de capital pendiente después de pagar la cuota `k`.
+
+    Args:
+        prestamo (Prestamo): El préstamo (no necesita estar guardado).
+        k (int): Número de cuotas pagadas (0 = saldo inicial).
+
+    Returns:
+        Decimal: El saldo redondeado a centavos.
+    """
+    tasa_interes_periodo, numero_pagos = _parametros_periodo(prestamo)
+    if k >= numero_pagos:
+        return Decimal(0).quantize(Decimal('0.01'))
+    cuota_fija = _cuota_fija_frances(prestamo.monto, tasa_interes_periodo, numero_pagos)
+    saldo = _saldo_frances_exacto(prestamo.monto, tasa_interes_periodo, cuota_fija, max(k, 0))
+    return saldo.quantize(Decimal('0.01'))
+
+def saldo_tras_cuotas(prestamo, k):
+    """
+    Saldo de capital después de `k` cuotas según el método del préstamo.
+    Los métodos alemán e interés simple amortizan capital lineal, así que
+    también tienen forma cerrada.
+    """
+    if metodo_de_calculo(prestamo) == 'frances':
+        return saldo_frances(prestamo, k)
+    _, numero_pagos = _parametros_periodo(prestamo)
+    if k >= numero_pagos:
+        return a_decimal(0)
+    return a_decimal(dividir(a_centavos(prestamo.monto) * (numero_pagos - max(k, 0)), numero_pagos))
+
+def desglose_cuota_frances(prestamo, k):
+    """
+    Calcula una fila de la tabla de amortización francesa sin generar las demás.
+
+    Returns:
+        dict: Con las mismas claves que `_calcular_metodo_frances`, excepto la fecha.
+    """
+    tasa_interes_periodo, numero_pagos = _parametros_periodo(prestamo)
+    if not 1 <= k <= numero_pagos:
+        raise ValueError(f"La cuota {k} está fuera del rango 1..{numero_pagos}.")
+
+    cuota_fija = _cuota_fija_frances(prestamo.monto, tasa_interes_periodo, numero_pagos)
+    saldo_anterior = _saldo_frances_exacto(prestamo.monto, tasa_interes_periodo, cuota_fija, k - 1)
+    interes_periodo = saldo_anterior * tasa_interes_periodo
+
+    if k == numero_pagos:
+        # La última cuota absorbe el saldo restante, igual que en la tabla.
+        capital_periodo = saldo_anterior
+        saldo = Decimal(0)
+    else:
+        capital_periodo = cuota_fija - interes_periodo
+        saldo = saldo_anterior - capital_periodo
+
+    return {
+        'numero_cuota': k,
+        'cuota_fija': cuota_fija.quantize(Decimal('0.01')),
+        'interes': interes_periodo.quantize(Decimal('0.01')),
+        'capital': capital_periodo.quantize(Decimal('0.01')),
+        'saldo_pendiente': saldo.quantize(Decimal('0.01')),
+    }
+
+def calcular_liquidacion(prestamo, fecha=None):
+    """
+    Calcula el monto necesario para saldar un préstamo en una fecha dada.
+
+    La liquidación se compone de:
+      - Lo pendiente de las cuotas ya vencidas (cuota + penalidad - pagado).
+      - El saldo de capital según la fórmula cerrada tras las cuotas vencidas.
+        Si hubo abonos a capital, el plan original ya no aplica y el saldo es
+        el capital de las cuotas guardadas que aún no vencen.
+      - El interés devengado desde el último vencimiento, prorrateado por días.
+      - Menos lo abonado por adelantado a cuotas que aún no vencen.
+
+    Solo ejecuta tres consultas agregadas, sin importar el plazo del préstamo.
+
+    Args:
+        prestamo (Prestamo): Un préstamo guardado con sus cuotas generadas.
+        fecha (date, optional): Fecha de la liquidación. Por defecto, hoy.
+
+    Returns:
+        dict: Desglose de la liquidación con valores Decimal redondeados.
+    """
+    fecha = fecha or timezone.localdate()
+    centavo = Decimal('0.01')
+    cero = Decimal('0.00')
+    vencida = Q(fecha_vencimiento__lte=fecha)
+
+    cuotas = prestamo.cuotas.aggregate(
+        numero_vencidas=Count('id', filter=vencida),
+        monto_vencido=Sum('monto_cuota', filter=vencida),
+        penalidades=Sum('monto_penalidad_acumulada'),
+        ultimo_vencimiento=Max('fecha_vencimiento', filter=vencida),
+        proximo_vencimiento=Min('fecha_vencimiento', filter=~vencida),
+        capital_por_vencer=Sum('capital', filter=~vencida),
+    )
+    pagos = Pago.objects.filter(cuota__prestamo=prestamo).aggregate(
+        pagado_vencidas=Sum('monto_pagado', filter=Q(cuota__fecha_vencimiento__lte=fecha)),
+        pagado_adelantado=Sum('monto_pagado', filter=Q(cuota__fecha_vencimiento__gt=fecha)),
+    )
+
+    k = cuotas['numero_vencidas']
+    penalidades = cuotas['penalidades'] or cero
+    pagado_adelantado = pagos['pagado_adelantado'] or cero
+    vencido_pendiente = max(
+        cero,
+        (cuotas['monto_vencido'] or cero) + penalidades - (pagos['pagado_vencidas'] or cero)
+    )
+
+    abonado = AbonoCapital.objects.filter(prestamo=prestamo).aggregate(total=Sum('monto'))['total']
+
+    tasa_interes_periodo, numero_pagos = _parametros_periodo(prestamo)
+    if abonado:
+        # Las cuotas futuras se reamortizaron (ver abonos.py): su capital es lo que falta.
+        saldo_capital = (cuotas['capital_por_vencer'] or cero).quantize(centavo)
+    else:
+        saldo_capital = saldo_tras_cuotas(prestamo, k)
+    # En interés simple el interés del período se calcula sobre el monto original, menos lo abonado.
+    base_interes = prestamo.monto - (abonado or cero) if metodo_de_calculo(prestamo) == 'simple' else saldo_capital
+
+    # Interés devengado del período en curso, proporcional a los días transcurridos.
+    interes_devengado = cero
+    inicio_periodo = cuotas['ultimo_vencimiento'] or prestamo.fecha_desembolso
+    fin_periodo = cuotas['proximo_vencimiento']
+    if k < numero_pagos and fin_periodo and fin_periodo > inicio_periodo and fecha > inicio_periodo:
+        fraccion = Decimal((fecha - inicio_periodo).days) / Decimal((fin_periodo - inicio_periodo).days)
+        interes_devengado = (base_interes * tasa_interes_periodo * fraccion).quantize(centavo)
+
+    total = max(cero, vencido_pendiente + saldo_capital + interes_devengado - pagado_adelantado)
+
+    return {
+        'fecha': fecha,
+        'cuotas_vencidas': k,
+        'vencido_pendiente': vencido_pendiente.quantize(centavo),
+        'penalidades': penalidades.quantize(centavo),
+        'saldo_capital': saldo_capital,
+        'interes_devengado': interes_devengado,
+        'pagado_adelantado': pagado_adelantado.quantize(centavo),
+        'total_liquidacion': total.quantize(centavo),
+    }
+
+def penalidad_a_acumular(cuota, tipo_prestamo, pagos, hoy):
+    """
+    Penalidad (en centavos) que se debe sumar a la cuota por los días
+    transcurridos desde el último cálculo hasta `hoy`, o None si la cuota no
+    se actualiza (no vencida, en período de gracia o ya calculada hoy).
+
+    `pagos` es el historial de la cuota como [(fecha, centavos)] (ver
+    penalidades.pagos_por_dia): cada día se cobra sobre lo pendiente ese día.
+    """
+    # Solo calcular penalidad si la cuota está pendiente o parcialmente pagada y vencida
+    if cuota.estado not in ['pendiente', 'pagada_parcialmente'] or cuota.fecha_vencimiento >= hoy:
+        return None
+    if not tipo_prestamo:
+        return None # No hay tipo de préstamo, no se puede calcular penalidad
+
+    # Calcular la fecha a partir de la cual se aplica la penalidad
+    # (días de gracia, trasladados al siguiente día hábil si el tipo lo configura)
+    inicio_penalidad = fecha_inicio_penalidad(cuota.fecha_vencimiento, tipo_prestamo)
+
+    # Si la fecha de inicio de penalidad es en el futuro, no hay penalidad aún
+    if inicio_penalidad >= hoy:
+        return None
+
+    # Determinar la fecha desde la que se debe calcular la penalidad
+    # Si ya se calculó antes, empezar desde el día siguiente a la última fecha calculada
+    # Si no se ha calculado nunca, empezar desde la fecha de inicio de penalidad
+    fecha_desde_calculo = cuota.fecha_ultima_penalidad_calculada or inicio_penalidad
+
+    # Asegurarse de no calcular penalidad para el día actual si ya se calculó
+    if fecha_desde_calculo >= hoy:
+        return None
+
+    # Monto base para la penalidad: monto_cuota menos lo pagado de esa cuota
+    # hasta cada día del intervalo (nunca negativo)
+    return penalidad_en_intervalo(
+        a_centavos(cuota.monto_cuota), tipo_prestamo.tasa_penalidad_diaria,
+        inicio_penalidad, fecha_desde_calculo, hoy, pagos,
+    )
 
 def calcular_penalidad_cuota(cuota):
     """
@@ -113,42 +524,55 @@ def calcular_penalidad_cuota(cuota):
     La penalidad se calcula sobre el monto pendiente de la cuota.
     """
     hoy = timezone.localdate() # Usar timezone.localdate() para la fecha actual
-    
-    # Solo calcular penalidad si la cuota está pendiente o parcialmente pagada y vencida
-    if cuota.estado in ['pendiente', 'pagada_parcialmente'] and cuota.fecha_vencimiento < hoy:
-        
-        # Obtener la tasa de penalidad y días de gracia del tipo de préstamo
-        tipo_prestamo = cuota.prestamo.tipo_prestamo
-        if not tipo_prestamo:
-            return # No hay tipo de préstamo, no se puede calcular penalidad
 
-        tasa_penalidad_diaria = tipo_prestamo.tasa_penalidad_diaria
-        dias_gracia = tipo_prestamo.dias_gracia
+    # Se descartan primero las cuotas no vencidas para no consultar sus pagos.
+    if cuota.estado not in ['pendiente', 'pagada_parcialmente'] or cuota.fecha_vencimiento >= hoy:
+        return
+    pagos = pagos_por_dia(cuota.pagos.order_by('fecha_pago', 'id').values_list('fecha_pago', 'monto_pagado'))
+    penalidad_calculada = penalidad_a_acumular(cuota, cuota.prestamo.tipo_prestamo, pagos, hoy)
+    if penalidad_calculada is None:
+        return
 
-        # Calcular la fecha a partir de la cual se aplica la penalidad
-        fecha_inicio_penalidad = cuota.fecha_vencimiento + datetime.timedelta(days=dias_gracia)
+    cuota.monto_penalidad_acumulada += a_decimal(penalidad_calculada)
+    cuota.fecha_ultima_penalidad_calculada = hoy
+    cuota.save()
 
-        # Si la fecha de inicio de penalidad es en el futuro, no hay penalidad aún
-        if fecha_inicio_penalidad >= hoy:
-            return
+def procesar_bloque_penalidades(desde_id, hasta_id, hoy):
+    """
+    Actualiza las penalidades de las cuotas vencidas con id entre `desde_id` y
+    `hasta_id` en una transacción corta (un bloque de `update_penalties`).
+    Devuelve (cuotas cuya penalidad aumentó, monto sumado en centavos).
 
-        # Determinar la fecha desde la que se debe calcular la penalidad
-        # Si ya se calculó antes, empezar desde el día siguiente a la última fecha calculada
-        # Si no se ha calculado nunca, empezar desde la fecha de inicio de penalidad
-        fecha_desde_calculo = cuota.fecha_ultima_penalidad_calculada or fecha_inicio_penalidad
-        
-        # Asegurarse de no calcular penalidad para el día actual si ya se calculó
-        if fecha_desde_calculo < hoy:
-            dias_atraso_calculo = (hoy - fecha_desde_calculo).days
-            
-            # Monto base para la penalidad: monto_cuota menos lo ya pagado de esa cuota
-            monto_base_penalidad = cuota.monto_cuota - (cuota.total_pagado if cuota.total_pagado is not None else Decimal('0.00'))
-            
-            # Asegurarse de que el monto base no sea negativo
-            monto_base_penalidad = max(Decimal('0.00'), monto_base_penalidad)
-
-            penalidad_calculada = monto_base_penalidad * tasa_penalidad_diaria * dias_atraso_calculo
-            
-            cuota.monto_penalidad_acumulada += penalidad_calculada.quantize(Decimal('0.01'))
+    Es idempotente en el día: una cuota ya calculada `hoy` no vuelve a sumar,
+    así que repetir un bloque (reanudación tras una interrupción) es seguro.
+    """
+    with transaction.atomic():
+        cuotas = list(
+            Cuota.objects.select_for_update(of=('self',))
+            .select_related('prestamo__tipo_prestamo')
+            .filter(id__range=(desde_id, hasta_id), estado__in=['pendiente', 'pagada_parcialmente'],
+                    fecha_vencimiento__lt=hoy)
+        )
+        pagos = {}
+        filas = (
+            Pago.objects.filter(cuota__in=[cuota.id for cuota in cuotas])
+            .order_by('cuota_id', 'fecha_pago', 'id').values_list('cuota_id', 'fecha_pago', 'monto_pagado')
+        )
+        for cuota_id, fecha_pago, monto in filas:
+            pagos.setdefault(cuota_id, []).append((fecha_pago, monto))
+        actualizadas = []
+        con_penalidad = 0
+        monto_total = 0
+        for cuota in cuotas:
+            penalidad = penalidad_a_acumular(
+                cuota, cuota.prestamo.tipo_prestamo, pagos_por_dia(pagos.get(cuota.id, [])), hoy
+            )
+            if penalidad is None:
+                continue
+            cuota.monto_penalidad_acumulada += a_decimal(penalidad)
             cuota.fecha_ultima_penalidad_calculada = hoy
-            cuota.save()
\ No newline at end of file
+            actualizadas.append(cuota)
+            con_penalidad += penalidad > 0
+            monto_total += penalidad
+        Cuota.objects.bulk_update(actualizadas, ['monto_penalidad_acumulada', 'fecha_ultima_penalidad_calculada'])
+    return con_penalidad, monto_total